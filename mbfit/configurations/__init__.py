@@ -3,6 +3,7 @@ from .normal_modes_configuration_generator import NormalModesConfigurationGenera
 from .configuration_generator_2b import DistanceSamplingConfigurationGenerator
 from .configuration_generator_nb import RandomSamplingConfigurationGenerator
 from .atom_distance_configuration_generator import AtomDistanceConfigurationGenerator
-from .configurations_splitter import split_configurations, MolecularDescriptor, RMSDDescriptor, RMSDDistanceDescriptor, RandomDescriptor
+from .configurations_splitter import split_configurations, MolecularDescriptor, RMSDDescriptor, RMSDDistanceDescriptor, KabschRMSDDescriptor, PermutationRMSDDescriptor, RandomDescriptor
 from .geometry_optimizer import optimize_geometry
 from .normal_modes_generator import generate_normal_modes
+from .overlap_checker import OverlapChecker
@@ -52,59 +52,21 @@ class AtomDistanceConfigurationGenerator(DistanceSamplingConfigurationGenerator)
         self.mol1_atom_index = mol1_atom_index
         self.mol2_atom_index = mol2_atom_index
 
-    def move_to_config(self, random, molecule1, molecule2, distance):
+    def get_standard_orientation(self, molecule, monomer_index):
         """
-        Moves the molecules to a configuration with the given distance between their atoms of rotation.
-
-        Raises RanOutOfAttemptsException if a configuration is failed to be found after a certain number of attempts.
+        Gets the positions of the atoms of a geometry of one of the monomers in standard orientation, rotated onto its
+        principal axes and centered on its centering atom.
 
         Args:
-            random              - The Random object used to generate the configuration.
-            molecule1           - Molecule object of the 1st monomer.
-            molecule2           - Molecule object of the 2nd monomer.
-            distance            - Distance between the centering atoms of the two molecules.
+            molecule            - Molecule object of a geometry of the monomer. It is not moved.
+            monomer_index       - 0 if the geometry is of the 1st monomer, 1 if it is of the 2nd monomer.
 
         Returns:
-            None.
+            (num_atoms, 3) numpy array of the positions of the atoms in standard orientation.
         """
 
-        # put both geoemtries in standard orientation if they are not already
-        molecule1.move_to_center_of_mass()
-        molecule2.move_to_center_of_mass()
-        molecule1.rotate_on_principal_axes()
-        molecule2.rotate_on_principal_axes()
-
-        mol1_atom = molecule1.get_atoms()[self.mol1_atom_index]
-        mol2_atom = molecule2.get_atoms()[self.mol2_atom_index]
-
-        molecule1.translate(-mol1_atom.get_x(), -mol1_atom.get_y(), -mol1_atom.get_z())
-        molecule2.translate(-mol2_atom.get_x(), -mol2_atom.get_y(), -mol2_atom.get_z())
-
-        # move the 2nd molecule away from the first
-        molecule2.translate(distance, 0, 0)
-
-        for attempt in range(self.num_attempts):
-
-            # rotate each molecule a random amount
-            molecule1.rotate(Quaternion.get_random_rotation_quaternion(random), 0, 0, 0)
-            molecule2.rotate(Quaternion.get_random_rotation_quaternion(random), distance, 0, 0)
-
-            # setting a flag variable to keep track of a valid configuration
-            flag = True
-
-            # loop through atoms in molecule 1
-            for atom1 in molecule1.get_atoms():
-                # loop through atoms in molecule 2
-                for atom2 in molecule2.get_atoms():
-                    # get the sum of the venderwall radii of the pair
-                    sum_vdw_distance = atom1.get_vdw_radius() + atom2.get_vdw_radius()
-                    # comparing with our factor (default = 0.8)
-                    if atom1.distance(atom2) < self.min_inter_distance * sum_vdw_distance:
-                        flag = False
+        coordinates = super(AtomDistanceConfigurationGenerator, self).get_standard_orientation(molecule, monomer_index)
 
-            # Returning only valid configurations.
-            if flag:
-                return
+        atom_index = self.mol1_atom_index if monomer_index == 0 else self.mol2_atom_index
 
-        # if we run out of attempts without generating a valid configuration, raise an exception
-        raise RanOutOfAttemptsException
+        return coordinates - coordinates[atom_index]
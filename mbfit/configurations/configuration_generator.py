@@ -1,9 +1,21 @@
 # external package imports
+import os, itertools, collections, concurrent.futures, contextlib
 from random import randint
+import numpy
 
 # absolute module imports
 from mbfit.utils import SettingsReader, system, files
-from mbfit.molecule import xyz_to_molecules
+from mbfit.molecule import Molecule, xyz_to_molecules, ConfigurationWriter, MoleculeBatch
+from mbfit.exceptions import InvalidValueError
+
+# number of configurations in each MoleculeBatch yielded by generate_configuration_batches()
+CONFIGS_PER_BATCH = 1000
+
+# number of configurations generated by each task of generate_configurations_in_parallel()
+CONFIGS_PER_TASK = 1000
+
+# number of random placements of the molecules that generators which reject overlapping placements try at once
+ATTEMPTS_PER_BATCH = 16
 
 class ConfigurationGenerator(object):
     """
@@ -23,7 +35,7 @@ class ConfigurationGenerator(object):
 
         self.settings = SettingsReader(settings_path)
 
-    def generate_configurations(self, molecule_lists, num_configs, seed=None):
+    def generate_configurations(self, molecule_lists, num_configs, seed=None, config_range=None):
         """
         Generates Configurations of one or more molecules.
 
@@ -34,6 +46,9 @@ class ConfigurationGenerator(object):
             num_configs     - The number of configurations to generate.
             seed            - Seed for the random number generator. The same seed will yield the same configurations
                     when all else is held equal.
+            config_range    - (start, stop) to only generate configurations start to stop - 1 of the num_configs
+                    configurations, from the same part of the distribution they would be generated from in one run,
+                    such as a range from get_task_ranges(). Default is to generate all of them.
 
         Yields:
             Molecule objects containing the new configurations.
@@ -41,6 +56,97 @@ class ConfigurationGenerator(object):
 
         raise NotImplementedError
 
+    def generate_configuration_batches(self, molecule_lists, num_configs, seed=None, config_range=None):
+        """
+        Generates the same configurations as generate_configurations(), as MoleculeBatches, so they can be written in
+        bulk.
+
+        By default, the Molecules from generate_configurations() are grouped into batches of up to CONFIGS_PER_BATCH.
+        Implementations that can build the coordinates of their configurations without building a Molecule for each
+        one should override this method.
+
+        Args:
+            molecule_lists  - List of lists of molecules to generate configurations from, see generate_configurations().
+            num_configs     - The number of configurations to generate.
+            seed            - Seed for the random number generator. The same seed will yield the same configurations
+                    when all else is held equal.
+            config_range    - (start, stop) to only generate some of the configurations, see generate_configurations().
+
+        Yields:
+            MoleculeBatch objects containing the new configurations, in order.
+        """
+
+        molecules = self.generate_configurations(molecule_lists, num_configs, seed=seed, config_range=config_range)
+
+        while True:
+            batch = list(itertools.islice(molecules, CONFIGS_PER_BATCH))
+
+            if len(batch) == 0:
+                return
+
+            yield MoleculeBatch.from_molecules(batch)
+
+    def get_task_ranges(self, num_configs, configs_per_task):
+        """
+        Splits the configurations of a run into ranges that can be generated independently of each other, by passing
+        each range as the config_range of generate_configuration_batches().
+
+        By default, each range has configs_per_task configurations, except for the last one. Implementations that
+        place their configurations in groups should override this method so that no group is split between ranges.
+
+        Args:
+            num_configs     - The number of configurations in the run.
+            configs_per_task - The number of configurations in each range.
+
+        Returns:
+            List of (start, stop) ranges of the indices of the configurations, in order.
+        """
+
+        return [(start, min(start + configs_per_task, num_configs)) for start in range(0, num_configs, configs_per_task)]
+
+    def get_template(self, molecule_lists):
+        """
+        Gets a Molecule with the atoms of one geometry of every molecule in molecule_lists, in order, and the fragments
+        described in the settings file.
+
+        The settings file is only read once, so the coordinates of each configuration can be stamped into the template
+        with get_copy_with_coordinates() or stored in a MoleculeBatch with the template.
+
+        Args:
+            molecule_lists  - List of lists of molecules to generate configurations from, see generate_configurations().
+
+        Returns:
+            A new Molecule at the positions of the first geometry of each molecule.
+        """
+
+        molecules = [molecules_list[0] for molecules_list in molecule_lists]
+
+        return Molecule.read_xyz_direct(str(sum([molecule.get_num_atoms() for molecule in molecules])) + "\n\n" + "\n".join([molecule.to_xyz() for molecule in molecules]), settings=self.settings)
+
+    @staticmethod
+    def get_batches(template, configs):
+        """
+        Groups the coordinates of configurations into MoleculeBatches of up to CONFIGS_PER_BATCH configurations.
+
+        Args:
+            template        - Molecule with the fragments and atoms of every configuration, see get_template().
+            configs         - Iterable of (num_atoms, 3) numpy arrays of the positions of the atoms in each
+                    configuration.
+
+        Yields:
+            MoleculeBatch objects of the configurations, in order.
+        """
+
+        configs = iter(configs)
+
+        while True:
+            coordinates = list(itertools.islice(configs, CONFIGS_PER_BATCH))
+
+            if len(coordinates) == 0:
+                return
+
+            yield MoleculeBatch(template, numpy.array(coordinates))
+
     def get_rand_seed(self):
         """
         Gets a new random seed and logs a message to the console.
@@ -58,26 +164,179 @@ class ConfigurationGenerator(object):
         return seed
 
     @staticmethod
-    def generate_configs_from_file_to_file(geo_paths, out_path, config_generator, num_configs, seed=None):
+    def get_random_generator(seed):
+        """
+        Creates a numpy random Generator from a seed.
+
+        Args:
+            seed            - Integer seed, may be negative.
+
+        Returns:
+            A new numpy.random.Generator. The same seed will yield the same random numbers.
+        """
+
+        # numpy only accepts seeds that are not negative, so negative seeds wrap around to large positive seeds
+        return numpy.random.default_rng(seed % (1 << 64))
+
+    @staticmethod
+    def generate_configs_from_file_to_file(geo_paths, out_path, config_generator, num_configs, seed=None,
+                                           num_workers=1):
         """
         This function reads geometries from filepaths, feeds them into a config_generator, and then writes
         the output to another file.
 
         Args:
-            geo_paths       - List of local paths to '.xyz' files containing geometries to generate configurations with.
-            out_path        - Local path to '.xyz' file to write configurations to.
+            geo_paths       - List of local paths to '.xyz' or '.npz' files containing geometries to generate
+                    configurations with.
+            out_path        - Local path to '.xyz' or '.npz' file to write configurations to.
             config_generator - Implementation of ConfigurationGenerator to use to generate the configurations.
             num_configs     - The number of configurations to generate.
             seed            - Seed given to config_generator. The same seed will produce the same configurations when
                     all else is held equal.
+            num_workers     - Number of processes to generate the configurations in. If more than 1, the
+                    configurations are generated by generate_configurations_in_parallel(), so they are different from
+                    the configurations generated with the same seed in 1 process, but drawn from the same
+                    distributions. Default is 1.
         """
 
-        molecule_lists = [xyz_to_molecules(path) for path in geo_paths]
+        if num_workers < 1:
+            raise InvalidValueError("num_workers", num_workers, "must be at least 1")
+
+        if num_workers == 1:
+            molecule_lists = [xyz_to_molecules(path) for path in geo_paths]
+
+            batches = config_generator.generate_configuration_batches(molecule_lists, num_configs, seed=seed)
 
-        molecules = config_generator.generate_configurations(molecule_lists, num_configs, seed=seed)
+        else:
+            if seed is None:
+                seed = config_generator.get_rand_seed()
+
+            system.format_print("Generating configurations in {} processes.".format(num_workers), italics=True)
+
+            batches = generate_configurations_in_parallel(geo_paths, config_generator, num_configs, seed, num_workers)
 
         out_path = files.init_file(out_path)
 
-        with open(out_path, "w") as out_file:
-            for molecule_index, molecule in enumerate(molecules):
-                out_file.write("{}\n{}\n{}\n".format(molecule.get_num_atoms(), molecule_index, molecule.to_xyz()))
+        num_written = 0
+
+        with ConfigurationWriter(out_path) as out_file:
+            for batch in batches:
+                # the comment line of each configuration is its index
+                out_file.write_batch(batch, comments=range(num_written, num_written + len(batch)))
+                num_written += len(batch)
+
+# the ConfigurationGenerator and geometries of each worker process started by generate_configurations_in_parallel()
+worker_config_generator = None
+worker_molecule_lists = None
+
+def initialize_worker(config_generator, geo_paths):
+    """
+    Sets up a worker process of generate_configurations_in_parallel().
+
+    Args:
+        config_generator    - Implementation of ConfigurationGenerator to use to generate the configurations.
+        geo_paths           - List of local paths to '.xyz' or '.npz' files containing geometries to generate
+                configurations with.
+
+    Returns:
+        None.
+    """
+
+    global worker_config_generator, worker_molecule_lists
+
+    worker_config_generator = config_generator
+    worker_molecule_lists = [xyz_to_molecules(path) for path in geo_paths]
+
+def generate_configurations_in_worker(num_configs, config_range, seed):
+    """
+    Performs one task of generate_configurations_in_parallel() in a worker process.
+
+    Args:
+        num_configs         - The number of configurations in the whole run.
+        config_range        - (start, stop) of the configurations of this task.
+        seed                - Seed for the random number generator of this task.
+
+    Returns:
+        MoleculeBatch of the generated configurations, or None if no configurations could be generated.
+    """
+
+    # generators move the molecules they are given, so every task starts from the geometries as they were read, no
+    # matter which tasks this worker did before
+    molecule_lists = [[molecule.get_copy() for molecule in molecules] for molecules in worker_molecule_lists]
+
+    # every task prints the same messages, so progress is printed by the parent process instead
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        batches = list(worker_config_generator.generate_configuration_batches(molecule_lists, num_configs, seed=seed,
+                                                                              config_range=config_range))
+
+    if len(batches) == 0:
+        return None
+
+    return MoleculeBatch(batches[0].get_template(), numpy.concatenate([batch.get_coordinates() for batch in batches]))
+
+def generate_configurations_in_parallel(geo_paths, config_generator, num_configs, seed, num_workers):
+    """
+    Generates configurations in a pool of worker processes.
+
+    The configurations are split into tasks of about CONFIGS_PER_TASK configurations by
+    config_generator.get_task_ranges(). Each task is generated by its own call to
+    config_generator.generate_configuration_batches(), with a seed drawn from its own stream spawned from seed by
+    numpy.random.SeedSequence. The tasks are yielded in order, so the same seed always gives the same configurations
+    in the same order, no matter how many workers there are or which worker does which task.
+
+    Each task generates its configurations from its own part of the distributions of config_generator, so
+    distributions that change over the course of the configurations, such as a progression of distances, are gone
+    over once, as they are in 1 process. Configurations that a task cannot generate are not made up for by the other
+    tasks, so fewer than num_configs configurations may be generated.
+
+    Args:
+        geo_paths           - List of local paths to '.xyz' or '.npz' files containing geometries to generate
+                configurations with.
+        config_generator    - Implementation of ConfigurationGenerator to use to generate the configurations.
+        num_configs         - The number of configurations to generate.
+        seed                - Integer seed for the random number generators of the tasks, may be negative.
+        num_workers         - Number of worker processes.
+
+    Yields:
+        MoleculeBatch of the configurations of each task, in order. Tasks that could not generate any configurations
+        are skipped.
+    """
+
+    task_ranges = config_generator.get_task_ranges(num_configs, CONFIGS_PER_TASK)
+
+    # numpy only accepts seeds that are not negative, so negative seeds wrap around to large positive seeds
+    task_seeds = [int(seed_sequence.generate_state(1, numpy.uint64)[0])
+                  for seed_sequence in numpy.random.SeedSequence(seed % (1 << 64)).spawn(len(task_ranges))]
+
+    tasks = zip(itertools.repeat(num_configs), task_ranges, task_seeds)
+
+    total_configs = 0
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers, initializer=initialize_worker,
+            initargs=(config_generator, geo_paths)) as executor:
+
+        # never more than twice as many tasks as there are workers are ahead of the one being yielded, so the
+        # configurations that are waiting to be written do not fill the memory.
+        running = collections.deque(executor.submit(generate_configurations_in_worker, *task)
+                                    for task in itertools.islice(tasks, 2 * num_workers))
+
+        while len(running) > 0:
+            batch = running.popleft().result()
+
+            for task in itertools.islice(tasks, 1):
+                running.append(executor.submit(generate_configurations_in_worker, *task))
+
+            if batch is None:
+                continue
+
+            total_configs += len(batch)
+            system.format_print("{} configs done...".format(total_configs), italics=True)
+
+            yield batch
+
+    system.format_print("Done! Generated {} configurations.".format(total_configs), bold=True,
+                        color=system.Color.GREEN)
+
+    if total_configs < num_configs:
+        system.format_print("Generated fewer than {} configs because it was too hard to generate configs over the given distribution.".format(num_configs), bold=True,
+                            color=system.Color.GREEN)
@@ -1,12 +1,13 @@
 # External package imports
-import math
+import math, itertools
 from random import Random
+import numpy
 
 # Absolute module impots
 from mbfit.utils import Quaternion
-from mbfit.molecule import Molecule
 from mbfit.utils import files, system
-from .configuration_generator import ConfigurationGenerator
+from .configuration_generator import ConfigurationGenerator, ATTEMPTS_PER_BATCH
+from .overlap_checker import OverlapChecker
 from mbfit.utils.distribution_function import LinearDistributionFunction, LogarithmicDistributionFunction, RandomDistributionFunction
 
 class DistanceSamplingConfigurationGenerator(ConfigurationGenerator):
@@ -68,57 +69,145 @@ class DistanceSamplingConfigurationGenerator(ConfigurationGenerator):
         system.format_print("Distance Distribution: {} for x in range [0,1].".format(self.distance_distribution.to_string(dep_name="dist (A)")),
                             italics=True)
 
-    def move_to_config(self, random, molecule1, molecule2, distance):
+    def get_standard_orientation(self, molecule, monomer_index):
         """
-        Moves the molecules to a configuration with the given distance between their centers of
-        mass. Raises RanOutOfAttemptsException if a configuration is failed to be found after a certain number of attempts.
+        Gets the positions of the atoms of a geometry of one of the monomers in standard orientation, centered on its
+        center of mass and rotated onto its principal axes.
 
         Args:
-            random              - The Random object used to generate the configuration.
-            molecule1           - Molecule object of the 1st monomer.
-            molecule2           - Molecule object of the 2nd monomer.
+            molecule            - Molecule object of a geometry of the monomer. It is not moved.
+            monomer_index       - 0 if the geometry is of the 1st monomer, 1 if it is of the 2nd monomer.
+
+        Returns:
+            (num_atoms, 3) numpy array of the positions of the atoms in standard orientation.
+        """
+
+        molecule = molecule.get_copy_with_coordinates(molecule.get_coordinate_array())
+
+        molecule.move_to_center_of_mass()
+        molecule.rotate_on_principal_axes()
+
+        return molecule.get_coordinate_array()
+
+    def get_config_coordinates(self, random, coordinates1, coordinates2, distance, overlap_checker):
+        """
+        Gets the positions of the atoms of a configuration with the given distance between the centers of mass of the
+        monomers. Raises RanOutOfAttemptsException if a configuration is failed to be found after a certain number of
+        attempts.
+
+        ATTEMPTS_PER_BATCH random rotations of the monomers are tried at once, and the first one in which the monomers
+        do not overlap is kept.
+
+        Args:
+            random              - The numpy random Generator used to generate the configuration.
+            coordinates1        - Positions of the atoms of the 1st monomer in standard orientation, see
+                    get_standard_orientation().
+            coordinates2        - Positions of the atoms of the 2nd monomer in standard orientation.
             distance            - Distance between the centers of mass of the two molecules.
+            overlap_checker     - OverlapChecker of the two monomers.
 
         Returns:
-            None.
+            (num_atoms, 3) numpy array of the positions of the atoms of the 1st monomer followed by the atoms of the 2nd
+            monomer.
         """
 
-        # put both geometries in standard orientation if they are not already
-        molecule1.move_to_center_of_mass()
-        molecule2.move_to_center_of_mass()
-        molecule1.rotate_on_principal_axes()
-        molecule2.rotate_on_principal_axes()
+        # the 2nd molecule is moved away from the first after it is rotated
+        offset = numpy.array([distance, 0, 0])
 
-        # move the 2nd molecule away from the first
-        molecule2.translate(distance, 0, 0)
+        for attempt in range(0, self.num_attempts, ATTEMPTS_PER_BATCH):
 
-        for attempt in range(self.num_attempts):
+            num_proposals = min(ATTEMPTS_PER_BATCH, self.num_attempts - attempt)
 
             # rotate each molecule a random amount
-            molecule1.rotate(Quaternion.get_random_rotation_quaternion(random), 0, 0, 0)
-            molecule2.rotate(Quaternion.get_random_rotation_quaternion(random), distance, 0, 0)
-
-            # setting a flag variable to keep track of a valid configuration
-            flag = True
-
-            # loop through atoms in molecule 1
-            for atom1 in molecule1.get_atoms():
-                # loop through atoms in molecule 2
-                for atom2 in molecule2.get_atoms():
-                    # get the sum of the venderwall radii of the pair
-                    sum_vdw_distance = atom1.get_vdw_radius() + atom2.get_vdw_radius()
-                    # comparing with our factor (default = 0.8)
-                    if atom1.distance(atom2) < self.min_inter_distance * sum_vdw_distance:
-                        flag = False
+            rotations1 = Quaternion.get_random_rotation_matrices(random, num_proposals)
+            rotations2 = Quaternion.get_random_rotation_matrices(random, num_proposals)
+
+            configs = numpy.concatenate([coordinates1 @ rotations1.transpose(0, 2, 1),
+                                         coordinates2 @ rotations2.transpose(0, 2, 1) + offset], axis=1)
 
             # Returning only valid configurations.
-            if flag:
-                return
+            valid_configs = numpy.flatnonzero(~overlap_checker.overlaps_batch(configs))
+
+            if len(valid_configs) > 0:
+                return configs[valid_configs[0]]
 
         # if we run out of attempts without generating a valid configuration, raise an exception
         raise RanOutOfAttemptsException
 
-    def generate_configurations(self, molecule_lists, num_configs, seed=None):
+    def get_step_size(self, num_configs):
+        """
+        Gets the step size of the grid the configurations are placed on, as a fraction of the domain [0,1] of the
+        distance distribution.
+
+        Args:
+            num_configs     - The number of configurations to generate.
+
+        Returns:
+            The step size of the grid.
+        """
+
+        # if use_grid is false, set the step size to even space the configurations
+        if not self.use_grid:
+            return 1 / num_configs
+
+        return self.step_size
+
+    def get_step_counts(self, num_configs):
+        """
+        Gets the number of configurations placed at each step of the grid when every configuration can be placed.
+
+        Args:
+            num_configs     - The number of configurations to generate.
+
+        Returns:
+            List of the number of configurations at each step of the grid.
+        """
+
+        # how many steps the grid will have
+        num_steps = math.floor(1 / self.get_step_size(num_configs))
+
+        step_counts = []
+        total_configs = 0
+
+        for step in range(num_steps):
+            # the configurations left are spread evenly over the steps left, as they are by
+            # generate_config_coordinates().
+            step_counts.append(math.ceil((num_configs - total_configs) / (num_steps - step)))
+            total_configs += step_counts[-1]
+
+        return step_counts
+
+    def get_task_ranges(self, num_configs, configs_per_task):
+        """
+        Splits the configurations of a run into ranges of whole steps of the grid, of at least configs_per_task
+        configurations each except for the last one.
+
+        Args:
+            num_configs     - The number of configurations in the run.
+            configs_per_task - The least number of configurations in each range.
+
+        Returns:
+            List of (start, stop) ranges of the indices of the configurations, in order.
+        """
+
+        task_ranges = []
+
+        start = 0
+        stop = 0
+
+        for step_count in self.get_step_counts(num_configs):
+            stop += step_count
+
+            if stop - start >= configs_per_task:
+                task_ranges.append((start, stop))
+                start = stop
+
+        if stop > start:
+            task_ranges.append((start, stop))
+
+        return task_ranges
+
+    def generate_configurations(self, molecule_lists, num_configs, seed=None, config_range=None):
         """
         Generates configurations of the given molecule.
 
@@ -129,25 +218,85 @@ class DistanceSamplingConfigurationGenerator(ConfigurationGenerator):
             num_configs     - The number of configurations to generate.
             seed            - Seed for the random number generator. The same seed will yield the same configurations
                     when all else is held equal.
+            config_range    - (start, stop) to only generate configurations start to stop - 1 of the num_configs
+                    configurations, at the steps of the grid they would be placed at in one run. Should be a range
+                    from get_task_ranges(). Default is to generate all of them.
 
         Yields:
             Molecule objects containing the new configurations.
         """
 
+        template = self.get_template(molecule_lists)
+
+        for coordinates in self.generate_config_coordinates(molecule_lists, num_configs, seed=seed,
+                                                            config_range=config_range):
+            yield template.get_copy_with_coordinates(coordinates)
+
+    def generate_configuration_batches(self, molecule_lists, num_configs, seed=None, config_range=None):
+        """
+        Generates the same configurations as generate_configurations(), as MoleculeBatches, without building a Molecule
+        for each configuration.
+
+        Args:
+            molecule_lists  - List of lists of molecules to generate configurations from, see generate_configurations().
+            num_configs     - The number of configurations to generate.
+            seed            - Seed for the random number generator. The same seed will yield the same configurations
+                    when all else is held equal.
+            config_range    - (start, stop) to only generate some of the configurations, see generate_configurations().
+
+        Yields:
+            MoleculeBatch objects containing the new configurations, in order.
+        """
+
+        template = self.get_template(molecule_lists)
+
+        yield from self.get_batches(template, self.generate_config_coordinates(molecule_lists, num_configs, seed=seed,
+                                                                               config_range=config_range))
+
+    def generate_config_coordinates(self, molecule_lists, num_configs, seed=None, config_range=None):
+        """
+        Generates the positions of the atoms of configurations of the given molecule.
+
+        Args:
+            molecule_lists  - List of lists of molecules to generate configurations from, see generate_configurations().
+            num_configs     - The number of configurations to generate.
+            seed            - Seed for the random number generator. The same seed will yield the same configurations
+                    when all else is held equal.
+            config_range    - (start, stop) to only generate some of the configurations, see generate_configurations().
+
+        Yields:
+            (num_atoms, 3) numpy arrays of the positions of the atoms of the 1st monomer followed by the atoms of the 2nd
+            monomer in each new configuration, in the same order as the atoms of get_template().
+        """
+
         if seed is None:
             seed = self.get_rand_seed()
 
         molecules1 = molecule_lists[0]
         molecules2 = molecule_lists[1]
 
-        # if use_grid is false, set the step size to even space the configurations
-        if not self.use_grid:
-            step_size = 1 / num_configs
+        # put every geometry in standard orientation once, rather than once per attempt
+        coordinates1 = [self.get_standard_orientation(molecule, 0) for molecule in molecules1]
+        coordinates2 = [self.get_standard_orientation(molecule, 1) for molecule in molecules2]
+
+        # every geometry of a monomer has the same atoms, so the minimum distances are the same for every configuration
+        overlap_checker = OverlapChecker([molecules1[0], molecules2[0]], self.min_inter_distance)
+
+        step_size = self.get_step_size(num_configs)
+
+        # the steps of the grid to place configurations at
+        if config_range is None:
+            steps = range(math.floor(1 / step_size))
         else:
-            step_size = self.step_size
+            start, stop = config_range
 
-        # how many steps the grid will have
-        num_steps = math.floor(1 / step_size)
+            step_counts = self.get_step_counts(num_configs)
+
+            # the steps that configurations start to stop - 1 are placed at in one run
+            steps = [step for step, step_stop in enumerate(itertools.accumulate(step_counts))
+                     if step_stop - step_counts[step] < stop and step_stop > start]
+
+            num_configs = stop - start
 
         # keeps track of how many total configurations have been generated
         total_configs = 0
@@ -155,6 +304,9 @@ class DistanceSamplingConfigurationGenerator(ConfigurationGenerator):
         # construct a psuedo-random number generator
         self.random.seed(seed)
 
+        # construct a numpy random number generator for the rotations, which are generated in batches
+        placement_random = self.get_random_generator(seed)
+
         system.format_print(
             "Beginning 2B configurations generation with smooth distribution. Will generate {} configs.".format(
                 num_configs),
@@ -165,31 +317,30 @@ class DistanceSamplingConfigurationGenerator(ConfigurationGenerator):
         for cycle_index in range(0, 3):
 
             # loop over each step on our grid
-            for step in range(num_steps):
+            for step_index, step in enumerate(steps):
 
                 # loop over how many configs we want to generate at this step in the grid, which is equal
                 #   to the number of configs remaining to be generated divided by the number of steps left.
                 #   this ensures that unless a config at the last step is impossible, we will always have
                 #   exactly num_configs configs.
 
-                for config in range(math.ceil((num_configs - total_configs) / (num_steps - step))):
+                for config in range(math.ceil((num_configs - total_configs) / (len(steps) - step_index))):
 
                     distance = self.distance_distribution.get_value(step * step_size)
 
                     # first select a random geometry for each monomer
-                    molecule1 = self.random.choice(molecules1)
-                    molecule2 = self.random.choice(molecules2)
+                    index1 = self.random.randrange(len(molecules1))
+                    index2 = self.random.randrange(len(molecules2))
 
                     try:
-                        self.move_to_config(self.random, molecule1, molecule2, distance)
+                        coordinates = self.get_config_coordinates(placement_random, coordinates1[index1],
+                                                                  coordinates2[index2], distance, overlap_checker)
 
                     except RanOutOfAttemptsException:
                         # if we didn't find a valid configuration, skip this config
                         continue
 
-                    mol = Molecule.read_xyz_direct(str(molecule1.get_num_atoms() + molecule2.get_num_atoms()) + "\n\n" + molecule1.to_xyz() + "\n" + molecule2.to_xyz(), settings=self.settings)
-
-                    yield mol
+                    yield coordinates
 
                     total_configs += 1
 
@@ -213,6 +364,6 @@ class DistanceSamplingConfigurationGenerator(ConfigurationGenerator):
 
 class RanOutOfAttemptsException(Exception):
     """
-    Used to check if move_to_config runs out of attempts
+    Used to check if get_config_coordinates runs out of attempts
     """
     pass
@@ -1,14 +1,15 @@
 # External package imports
 import math
 from random import Random, randint
+import numpy
 
 # Absolute module impots
 from mbfit.utils import Quaternion
-from mbfit.molecule import Molecule
 from mbfit.utils import system
 from mbfit.utils.distribution_function import LogarithmicDistributionFunction, LinearDistributionFunction
 
-from .configuration_generator import ConfigurationGenerator
+from .configuration_generator import ConfigurationGenerator, ATTEMPTS_PER_BATCH
+from .overlap_checker import OverlapChecker
 
 class RandomSamplingConfigurationGenerator(ConfigurationGenerator):
     """
@@ -55,52 +56,71 @@ class RandomSamplingConfigurationGenerator(ConfigurationGenerator):
                             italics=True)
 
 
-    def move_to_config(self, random, molecules, distances):
+    def get_standard_orientation(self, molecule):
         """
-        Moves the molecules to a configuration with the given distance between their centers of
-        mass and the point 0,0,0. Raises RanOutOfAttemptsException if a configuration is failed to be found after a certain number of attempts.
+        Gets the positions of the atoms of a geometry in standard orientation, centered on its center of mass and
+        rotated onto its principal axes.
 
         Args:
-            random              - The Random object used to generate the configuration.
-            molecules           - The molecules to place in the configuration.
+            molecule            - Molecule object of the geometry. It is not moved.
+
+        Returns:
+            (num_atoms, 3) numpy array of the positions of the atoms in standard orientation.
+        """
+
+        molecule = molecule.get_copy_with_coordinates(molecule.get_coordinate_array())
+
+        molecule.move_to_center_of_mass()
+        molecule.rotate_on_principal_axes()
+
+        return molecule.get_coordinate_array()
+
+    def get_config_coordinates(self, random, coordinates_list, distances, overlap_checker):
+        """
+        Gets the positions of the atoms of a configuration with the given distance between the centers of mass of each
+        molecule and the point 0,0,0. Raises RanOutOfAttemptsException if a configuration is failed to be found after a
+        certain number of attempts.
+
+        ATTEMPTS_PER_BATCH random rotations and directions of the molecules are tried at once, and the first one in
+        which no molecules overlap is kept.
+
+        Args:
+            random              - The numpy random Generator used to generate the configuration.
+            coordinates_list    - Positions of the atoms of each molecule in standard orientation, see
+                    get_standard_orientation().
             distances           - Distance of each monomer from 0,0,0.
+            overlap_checker     - OverlapChecker of the molecules.
 
         Returns:
-            None.
+            (num_atoms, 3) numpy array of the positions of the atoms of every molecule, in order.
         """
 
-        for attempt in range(self.num_attempts):
+        for attempt in range(0, self.num_attempts, ATTEMPTS_PER_BATCH):
 
-            for molecule, distance in zip(molecules, distances):
-                molecule.move_to_center_of_mass()
-                molecule.rotate_on_principal_axes()
+            num_proposals = min(ATTEMPTS_PER_BATCH, self.num_attempts - attempt)
 
-                molecule.rotate(Quaternion.get_random_rotation_quaternion(random), 0, 0, 0)
-                molecule.translate(*Quaternion.get_random_rotation_quaternion(random).rotate(distance, 0, 0))
+            configs = []
 
-            # setting a flag variable to keep track of a valid configuration
-            flag = True
+            for coordinates, distance in zip(coordinates_list, distances):
 
-            for index1, molecule1 in enumerate(molecules):
-                for index2, molecule2 in enumerate(molecules[index1 + 1:]):
-                    # loop through atoms in molecule 1
-                    for atom1 in molecule1.get_atoms():
-                        # loop through atoms in molecule 2
-                        for atom2 in molecule2.get_atoms():
-                            # get the sum of the venderwall radii of the pair
-                            sum_vdw_distance = atom1.get_vdw_radius() + atom2.get_vdw_radius()
-                            # comparing with our factor (default = 0.8)
-                            if atom1.distance(atom2) < self.min_inter_distance * sum_vdw_distance:
-                                flag = False
+                # rotate each molecule a random amount, then move it the given distance in a random direction
+                rotations = Quaternion.get_random_rotation_matrices(random, num_proposals)
+                directions = Quaternion.get_random_rotation_matrices(random, num_proposals)[:, :, 0]
+
+                configs.append(coordinates @ rotations.transpose(0, 2, 1) + distance * directions[:, numpy.newaxis, :])
+
+            configs = numpy.concatenate(configs, axis=1)
 
             # Returning only valid configurations.
-            if flag:
-                return
+            valid_configs = numpy.flatnonzero(~overlap_checker.overlaps_batch(configs))
+
+            if len(valid_configs) > 0:
+                return configs[valid_configs[0]]
 
         # if we run out of attempts without generating a valid configuration, raise an exception
         raise RanOutOfAttemptsException
 
-    def generate_configurations(self, molecule_lists, num_configs, seed=None):
+    def generate_configurations(self, molecule_lists, num_configs, seed=None, config_range=None):
         """
         Generates configurations of the given molecule.
 
@@ -111,17 +131,76 @@ class RandomSamplingConfigurationGenerator(ConfigurationGenerator):
             num_configs     - The number of configurations to generate.
             seed            - Seed for the random number generator. The same seed will yield the same configurations
                     when all else is held equal.
+            config_range    - (start, stop) to only generate configurations start to stop - 1 of the num_configs
+                    configurations. The distances are random, so these are drawn from the same distribution as all of
+                    them. Default is to generate all of them.
 
         Yields:
             Molecule objects containing the new configurations.
         """
 
+        template = self.get_template(molecule_lists)
+
+        for coordinates in self.generate_config_coordinates(molecule_lists, num_configs, seed=seed,
+                                                            config_range=config_range):
+            yield template.get_copy_with_coordinates(coordinates)
+
+    def generate_configuration_batches(self, molecule_lists, num_configs, seed=None, config_range=None):
+        """
+        Generates the same configurations as generate_configurations(), as MoleculeBatches, without building a Molecule
+        for each configuration.
+
+        Args:
+            molecule_lists  - List of lists of molecules to generate configurations from, see generate_configurations().
+            num_configs     - The number of configurations to generate.
+            seed            - Seed for the random number generator. The same seed will yield the same configurations
+                    when all else is held equal.
+            config_range    - (start, stop) to only generate some of the configurations, see generate_configurations().
+
+        Yields:
+            MoleculeBatch objects containing the new configurations, in order.
+        """
+
+        template = self.get_template(molecule_lists)
+
+        yield from self.get_batches(template, self.generate_config_coordinates(molecule_lists, num_configs, seed=seed,
+                                                                               config_range=config_range))
+
+    def generate_config_coordinates(self, molecule_lists, num_configs, seed=None, config_range=None):
+        """
+        Generates the positions of the atoms of configurations of the given molecules.
+
+        Args:
+            molecule_lists  - List of lists of molecules to generate configurations from, see generate_configurations().
+            num_configs     - The number of configurations to generate.
+            seed            - Seed for the random number generator. The same seed will yield the same configurations
+                    when all else is held equal.
+            config_range    - (start, stop) to only generate some of the configurations, see generate_configurations().
+
+        Yields:
+            (num_atoms, 3) numpy arrays of the positions of the atoms of every molecule in each new configuration, in
+            the same order as the atoms of get_template().
+        """
+
         if seed is None:
             seed = self.get_rand_seed()
 
+        if config_range is not None:
+            num_configs = config_range[1] - config_range[0]
+
         # construct a psuedo-random number generator
         random = Random(seed)
 
+        # construct a numpy random number generator for the rotations, which are generated in batches
+        placement_random = self.get_random_generator(seed)
+
+        # put every geometry in standard orientation once, rather than once per attempt
+        coordinates_lists = [[self.get_standard_orientation(molecule) for molecule in molecules_list]
+                             for molecules_list in molecule_lists]
+
+        # every geometry of a molecule has the same atoms, so the minimum distances are the same for every configuration
+        overlap_checker = OverlapChecker([molecules_list[0] for molecules_list in molecule_lists], self.min_inter_distance)
+
         # setting the total number of configs
         total_configs = num_configs
 
@@ -132,18 +211,19 @@ class RandomSamplingConfigurationGenerator(ConfigurationGenerator):
         while total_configs > 0:
             distances = [self.distance_distribution.get_value(random.uniform(0, 1)) for molecules in molecule_lists]
 
-            molecules = [random.choice(molecules_list) for molecules_list in molecule_lists]
+            indices = [random.randrange(len(molecules_list)) for molecules_list in molecule_lists]
 
             # generating one confiugration at that random distance
 
             try:
-                self.move_to_config(random, molecules, distances)
+                coordinates = self.get_config_coordinates(placement_random,
+                                                          [coordinates_list[index] for coordinates_list, index in zip(coordinates_lists, indices)],
+                                                          distances, overlap_checker)
             except RanOutOfAttemptsException:
                 # if we didn't find a valid configuration, skip this config
                 continue
 
-            mol = Molecule.read_xyz_direct(str(sum([molecule.get_num_atoms() for molecule in molecules])) + "\n\n" + "\n".join([molecule.to_xyz() for molecule in molecules]), settings=self.settings)
-            yield mol
+            yield coordinates
 
             # decrementing required number of configs
             total_configs -= 1
@@ -159,6 +239,6 @@ class RandomSamplingConfigurationGenerator(ConfigurationGenerator):
 
 class RanOutOfAttemptsException(Exception):
     """
-    Used to check if move_to_config runs out of attempts
+    Used to check if get_config_coordinates runs out of attempts
     """
     pass
@@ -2,7 +2,7 @@
 import random
 
 # absolute module imports
-from mbfit.molecule import xyz_to_molecules
+from mbfit.molecule import xyz_to_molecules, ConfigurationWriter
 from mbfit.utils import SettingsReader
 
 def split_configurations(settings_path, configurations_path, training_set_path, test_set_path, training_set_size,
@@ -15,9 +15,9 @@ def split_configurations(settings_path, configurations_path, training_set_path,
 
     Args:
         settings_path       - Local path to ".in"i file containing relevent settings information.
-        configurations_path - Local path to the ".xyz" file to read configurations to be split.
-        training_set_path   - Local path to the ".xyz" file to write the training set to.
-        test_set_path       - Local path to the ".xyz" file to write the test set to.
+        configurations_path - Local path to the ".xyz" or ".npz" file to read configurations to be split.
+        training_set_path   - Local path to the ".xyz" or ".npz" file to write the training set to.
+        test_set_path       - Local path to the ".xyz" or ".npz" file to write the test set to.
         training_set_size   - The desired size of the training set, all other molecules will be put into the test set.
         molecular_descriptor - The MolecularDescriptor used to measure the difference between two molecules.
 
@@ -102,31 +102,19 @@ def split_configurations(settings_path, configurations_path, training_set_path,
         training_set.append(train_set_molecule)
         molecules.remove(train_set_molecule)
 
-    with open(training_set_path, "w") as training_set_file:
+    with ConfigurationWriter(training_set_path) as training_set_file:
 
         for index, molecule in training_set:
 
-            # write number of atoms to training set file
-            training_set_file.write("{}\n".format(molecule.get_num_atoms()))
-
-            # write comment line to training set file
-            training_set_file.write("\n")
-
-            # write geometry to training set file
-            training_set_file.write("{}\n".format(molecule.to_xyz()))
+            # write geometry to training set file, with an empty comment line
+            training_set_file.write_molecule(molecule)
         
-    with open(test_set_path, "w") as test_set_file:
+    with ConfigurationWriter(test_set_path) as test_set_file:
 
         for index, molecule in molecules:
 
-            # write number of atoms to test set file
-            test_set_file.write("{}\n".format(molecule.get_num_atoms()))
-
-            # write comment line to test set file
-            test_set_file.write("\n")
-
-            # write geometry to test set file
-            test_set_file.write("{}\n".format(molecule.to_xyz()))
+            # write geometry to test set file, with an empty comment line
+            test_set_file.write_molecule(molecule)
 
 class MolecularDescriptor():
     def difference(molecule1, molecule2):
@@ -160,6 +148,48 @@ class RMSDDistanceDescriptor(MolecularDescriptor):
         """
         return molecule1.distancermsd(molecule2)
 
+class KabschRMSDDescriptor(MolecularDescriptor):
+    def difference(self, molecule1, molecule2):
+        """
+        Finds the difference between these two molecules using the rmsd of their atom positions after the second
+        molecule is translated and rotated to best match the first.
+
+        Args:
+            molecule1       - The first molecule to compare.
+            molecule2       - The second molecule to compare.
+
+        Returns:
+            The rmsd of the positions of the equivelent atoms in each molecule after alignment.
+        """
+        return molecule1.kabsch_rmsd(molecule2)
+
+class PermutationRMSDDescriptor(MolecularDescriptor):
+    def __init__(self, align=True):
+        """
+        Creates a new PermutationRMSDDescriptor.
+
+        Args:
+            align           - If True, the second molecule is also translated and rotated to best match the first.
+
+        Returns:
+            A new PermutationRMSDDescriptor.
+        """
+        self.align = align
+
+    def difference(self, molecule1, molecule2):
+        """
+        Finds the difference between these two molecules using the rmsd of their atom positions after atoms of the
+        second molecule with the same symmetry class are swapped to best match the first. Requires scipy.
+
+        Args:
+            molecule1       - The first molecule to compare.
+            molecule2       - The second molecule to compare.
+
+        Returns:
+            The smallest rmsd of the positions of the atoms in each molecule over the swaps of equivelent atoms.
+        """
+        return molecule1.permutation_rmsd(molecule2, align=self.align)
+
 class RandomDescriptor(MolecularDescriptor):
     def difference(self, molecule1, molecule2):
         """
@@ -2,7 +2,7 @@
 from mbfit import calculator
 from mbfit.calculator import Model
 from mbfit.utils import SettingsReader, files, system
-from mbfit.molecule import xyz_to_molecules
+from mbfit.molecule import xyz_to_molecules, ConfigurationWriter
 
 def optimize_geometry(settings_path, unopt_path, opt_path, method, basis, qm_options={}):
     """
@@ -10,8 +10,8 @@ def optimize_geometry(settings_path, unopt_path, opt_path, method, basis, qm_opt
 
     Args:
         settings_path       - Local path to the ".ini" file with all relevent settings.
-        unopt_path          - Local path to the ".xyz" file to read the unoptimized geometry from.
-        opt_path            - Local path to the ".xyz" file to write the optimized geometry to.
+        unopt_path          - Local path to the ".xyz" or ".npz" file to read the unoptimized geometry from.
+        opt_path            - Local path to the ".xyz" or ".npz" file to write the optimized geometry to.
         qm_options           - Dictionary of extra arguments to be passed to the QM code doing the calculation.
 
     Returns:
@@ -34,10 +34,8 @@ def optimize_geometry(settings_path, unopt_path, opt_path, method, basis, qm_opt
     opt_path = files.init_file(opt_path, files.OverwriteMethod.get_from_settings(settings))
 
     # write the optimized geometry to the output file
-    with open(opt_path, "w") as opt_file:
-        opt_file.write("{}\n".format(opt_molecule.get_num_atoms()))
-        opt_file.write("{}\n".format(energy))
-        opt_file.write("{}\n".format(opt_molecule.to_xyz()))
+    with ConfigurationWriter(opt_path, energy_names=["energy"]) as opt_file:
+        opt_file.write_molecule(opt_molecule, [energy])
 
     system.format_print("Geometry optimization complete! Optimized geometry in {}.".format(opt_path),
             bold=True, color=system.Color.GREEN)
@@ -1,14 +1,15 @@
-import math, numpy
-from random import Random
+import numpy
 
 from mbfit.utils import system, constants
+from mbfit.molecule import MoleculeBatch
 from mbfit.exceptions import LineFormatError, ParsingError, InvalidValueError, InconsistentValueError
 from mbfit.utils.distribution_function import ConstantDistributionFunction, PiecewiseDistributionFunction,\
                                                            LinearDistributionFunction, GeometricDistributionFunction
 
 from .configuration_generator import ConfigurationGenerator
 
-
+# number of configurations generated at a time
+CONFIG_BLOCK_SIZE = 10000
 
 class NormalModesConfigurationGenerator(ConfigurationGenerator):
     """
@@ -283,66 +284,89 @@ class NormalModesConfigurationGenerator(ConfigurationGenerator):
 
         return frequencies, reduced_masses, normal_modes
 
-    def make_config(self, molecule, G, random):
+    def get_mass_scaled_normal_modes(self, molecule):
         """
-        Gets a single configuration based on the input molecule, and G.
+        Mass-scales and normalizes the normal modes of the given molecule.
 
         Args:
-            molecule            - The molecule to generate a configuration of.
-            G                   - The sqrt of the mass-scaled covariance matrix.
-            random              - The random object to use to generate the configuration.
+            molecule            - The optimized geometry the normal modes are of.
 
         Returns:
-            A configurations
+            (num_modes, 3 * num_atoms) numpy array with one mass-scaled, normalized normal mode per row.
         """
 
-        molecule = molecule.get_copy()
+        # scale each element of the normal modes relative to its atom's mass relative to the mass of an electron
+        # (for some reason)
+        sqrt_masses = numpy.sqrt(molecule.get_masses() * constants.mass_electron_per_mass_proton)
 
-        # calculate the dimension of this molecule
-        dim = 3 * molecule.get_num_atoms()
+        normal_modes = numpy.array(self.normal_modes, dtype=float) * sqrt_masses[:, numpy.newaxis]
+        normal_modes = normal_modes.reshape(len(self.normal_modes), -1)
+
+        # normalize each normal mode by dividing by its length
+        return normal_modes / numpy.linalg.norm(normal_modes, axis=1)[:, numpy.newaxis]
+
+    def get_mode_amplitudes(self, temperatures):
+        """
+        Gets the standard deviation of the displacement along each normal mode at each of the given temperatures.
+
+        These are the square roots of d in G = ( d * U * U^T )^(1/2), where U are the normal modes.
+
+        Args:
+            temperatures        - List of temperatures in atomic units, one per configuration.
+
+        Returns:
+            (num_temperatures, num_modes) numpy array of standard deviations. Normal modes with frequencies too low to
+            have an effect have a standard deviation of 0.
+        """
 
-        # initialize the displacement lists to all zero, they track this configurations displacement from the
-        # optimized geometry
-        displacement = [[0, 0, 0] for i in range(molecule.get_num_atoms())]
+        temperatures = numpy.array(temperatures, dtype=float)[:, numpy.newaxis]
+        frequencies = numpy.array(self.frequencies)
 
-        # generate a list of random numbers in a normal distribution, with mean 0 and standard deviation 1
-        norm_dist_list = [random.normalvariate(0, 1) for i in range(dim)]
+        freq_cutoff = 10 * constants.cmtoau
+
+        # the values for frequencies below the cutoff are thrown away, so they may divide by zero
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            if self.classical:
+                d = temperatures / (frequencies ** 2)
+
+            else:
+                # if temp is not significantly larger than 0 (so it is close to 0), then we must use a different
+                # formula to avoid divide-by-zero error.
+                hot = temperatures > 1.0e-8
+                d = numpy.where(hot, 0.5 / (numpy.tanh(frequencies / (2 * numpy.where(hot, temperatures, 1))) * frequencies),
+                                0.5 / frequencies)
 
-        # loop over each atom's displacement
-        for atom_index, atom, atom_displacement in zip(range(molecule.get_num_atoms()), molecule.get_atoms(),
-                                                       displacement):
+            # check if frequency is high enough to have an effect
+            return numpy.where(frequencies >= freq_cutoff, numpy.sqrt(d), 0)
 
-            # loop over x, y, and z in the current atom's displacement
-            for coordinate_index in range(3):
-                # set the displacement equal to the inner product of the corresponding column vector from G and the
-                # random number list
-                atom_displacement[coordinate_index] = numpy.dot([g[atom_index * 3 + coordinate_index] for g in G],
-                                                                norm_dist_list)
+    def make_configs(self, molecule, normal_modes, amplitudes, random):
+        """
+        Gets a block of configurations based on the input molecule, by displacing it along its normal modes.
 
-                # unscale the atom displacement ordinate by the molecules mass relative to that of an electron
-                atom_displacement[coordinate_index] /= math.sqrt(
-                    atom.get_mass() * constants.mass_electron_per_mass_proton)
+        Args:
+            molecule            - The molecule to generate configurations of.
+            normal_modes        - The mass-scaled normal modes of the molecule, from get_mass_scaled_normal_modes().
+            amplitudes          - (num_configs, num_modes) array of the standard deviation of the displacement along
+                    each normal mode in each configuration, from get_mode_amplitudes().
+            random              - The numpy random Generator to use to generate the configurations.
 
-        # scale the bohr constants from meters to angstroms
-        bohr = constants.bohr * 1e10
+        Returns:
+            MoleculeBatch of the configurations.
+        """
 
-        # loop over each atom in the molecule
-        for atom_index, atom in enumerate(molecule.get_atoms()):
-            # scale each atom's coordinates to atomic units and add the displacement
-            x = atom.get_x() / bohr + displacement[atom_index][0]
-            y = atom.get_y() / bohr + displacement[atom_index][1]
-            z = atom.get_z() / bohr + displacement[atom_index][2]
+        # displace each configuration along each normal mode by a random number in a normal distribution with mean 0
+        # and standard deviation 1 times the mode's amplitude, so all of the displacements are one matrix product
+        displacements = (random.standard_normal(amplitudes.shape) * amplitudes) @ normal_modes
 
-            # convert back to angstroms
-            x *= bohr
-            y *= bohr
-            z *= bohr
+        # unscale the displacement ordinates by the atoms' masses relative to that of an electron
+        displacements /= numpy.sqrt(numpy.repeat(molecule.get_masses(), 3) * constants.mass_electron_per_mass_proton)
 
-            atom.set_xyz(x, y, z)
+        # the displacements are in atomic units, so convert them to angstroms before adding them to the coordinates
+        coordinates = molecule.get_coordinate_array() + displacements.reshape(len(amplitudes), -1, 3) * constants.bohr_to_ang
 
-        return molecule
+        return MoleculeBatch(molecule, coordinates)
 
-    def generate_configurations(self, molecule_lists, num_configs, seed=None):
+    def generate_configurations(self, molecule_lists, num_configs, seed=None, config_range=None):
         """
         Generates Normal modes configurations of the given molecule.
 
@@ -352,11 +376,38 @@ class NormalModesConfigurationGenerator(ConfigurationGenerator):
             num_configs     - The number of configurations to generate.
             seed            - Seed for the random number generator. The same seed will yield the same configurations
                     when all else is held equal.
+            config_range    - (start, stop) to only generate configurations start to stop - 1 of the num_configs
+                    configurations, at the temperatures they would have in one run. Default is to generate all of
+                    them.
 
         Yields:
             Molecule objects containing the new configurations.
         """
 
+        for batch in self.generate_configuration_batches(molecule_lists, num_configs, seed=seed,
+                                                         config_range=config_range):
+            yield from batch
+
+    def generate_configuration_batches(self, molecule_lists, num_configs, seed=None, config_range=None):
+        """
+        Generates Normal modes configurations of the given molecule, as MoleculeBatches of up to CONFIG_BLOCK_SIZE
+        configurations.
+
+        Configurations are generated a block at a time, each block with a few matrix products, and the random numbers
+        do not depend on the size of the blocks.
+
+        Args:
+            molecule_lists  - A List of lists containing only a single element such that molecule_lists[0][0] is the
+                    optimized geometry for the configuration generation.
+            num_configs     - The number of configurations to generate.
+            seed            - Seed for the random number generator. The same seed will yield the same configurations
+                    when all else is held equal.
+            config_range    - (start, stop) to only generate some of the configurations, see generate_configurations().
+
+        Yields:
+            MoleculeBatch objects containing the new configurations, in order.
+        """
+
         system.format_print("Beginning normal modes configuration generation.",
                             bold=True, color=system.Color.YELLOW)
 
@@ -366,8 +417,8 @@ class NormalModesConfigurationGenerator(ConfigurationGenerator):
         # parse the molecule from the input ".xyz" into a Molecule object
         molecule = molecule_lists[0][0]
 
-        # create a new random object from the seed.
-        random = Random(seed)
+        # create a new random generator from the seed.
+        random = self.get_random_generator(seed)
 
         # calculate the dimension of this molecule
         dim = 3 * molecule.get_num_atoms()
@@ -382,73 +433,22 @@ class NormalModesConfigurationGenerator(ConfigurationGenerator):
         system.format_print("Will generate {} configs over the temperature distribution.".format(num_configs),
                             italics=True)
 
-        # mass-scale and normalize the normal modes
-        for normal_mode in self.normal_modes:
-
-            # normalization scale is used to keep track of the length of the normal mode vector to normalize it.
-            normalization_scale = 0
-
-            for coordinates, atom in zip(normal_mode, molecule.get_atoms()):
-
-                # scale each element of the normal modes relative to its atom's mass relative to the mass of an electron
-                # (for some reason)
-                sqrt_mass = math.sqrt(atom.get_mass() * constants.mass_electron_per_mass_proton)
-                for i in range(3):
-                    coordinates[i] = coordinates[i] * sqrt_mass
+        normal_modes = self.get_mass_scaled_normal_modes(molecule)
 
-                # add each ordinate squared to the normalization scale
-                normalization_scale += coordinates[0] ** 2
-                normalization_scale += coordinates[1] ** 2
-                normalization_scale += coordinates[2] ** 2
-
-            normalization_scale = math.sqrt(normalization_scale)
-
-            # normalize the normal mode by dividing by the normalization scale
-            for coordinates in normal_mode:
-                for i in range(3):
-                    coordinates[i] = coordinates[i] / normalization_scale
-
-        freq_cutoff = 10 * constants.cmtoau
+        if config_range is None:
+            config_range = (0, num_configs)
 
         # Generate the temp configs.
-        if num_configs > 0:
+        if config_range[1] > config_range[0]:
             system.format_print("Generating Temperature Distribution Configs...", italics=True)
 
-            # loop over each temp distribution config to generate
-            for config_index in range(num_configs):
-
-                temp = self.temp_distribution.get_value(config_index / (num_configs - 1))
-
-                # fill G with all 0s
-                G = [[0 for i in range(dim)] for k in range(dim)]  # sqrt of the mass-scaled covariance matrix
-
-                # for each normal mode, frequency pair, update d and G.
-                for normal_mode_index, frequency, reduced_mass, normal_mode in zip(range(len(self.frequencies)),
-                                                                                   self.frequencies,
-                                                                                   self.reduced_masses,
-                                                                                   self.normal_modes):
-
-                    # check if frequency is high enough to have an effect
-                    if frequency >= freq_cutoff:
-
-                        if self.classical:
-                            d = temp / (frequency ** 2)
-
-                        elif temp > 1.0e-8:
-                            # if temp is significantly larger than 0, then set this normal mode's d by the formula
-                            d = 0.5 / (numpy.tanh(frequency / (2 * temp)) * frequency)
-
-                        # if temp is not significantly larger than 0 (so it is close to 0), then we must use a different
-                        # formula to avoid divide-by-zero error.
-                        else:
-                            d = 0.5 / frequency
+            temps = [self.temp_distribution.get_value(config_index / max(num_configs - 1, 1))
+                     for config_index in range(*config_range)]
 
-                        # G = ( d * U * U^T )^(1/2), where U are normal modes
-                        for i in range(dim):
-                            for j in range(dim):
-                                G[i][j] += math.sqrt(d) * normal_mode[i // 3][i % 3] * normal_mode[j // 3][j % 3]
+            amplitudes = self.get_mode_amplitudes(temps)
 
-                yield self.make_config(molecule, G, random)
+            for block_start in range(0, len(temps), CONFIG_BLOCK_SIZE):
+                yield self.make_configs(molecule, normal_modes, amplitudes[block_start:block_start + CONFIG_BLOCK_SIZE], random)
 
             system.format_print("... Successfully generated temperature distribution configs!", italics=True)
 
@@ -0,0 +1,188 @@
+import numpy
+
+from mbfit.exceptions import LibraryNotAvailableError
+
+# only import scipy if it is installed.
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    pass
+
+# number of atoms from which OverlapChecker finds close atoms with a KD-tree by default, if scipy is installed
+KD_TREE_MIN_ATOMS = 512
+
+# minimum number of atoms whose distances to the other atoms OverlapChecker computes at a time without a KD-tree
+DENSE_BLOCK_ATOMS = 64
+
+class OverlapChecker(object):
+    """
+    Checks if molecules placed around each other overlap, meaning an atom in one molecule is closer to an atom in
+    another molecule than min_inter_distance times the sum of their van der Waals radii.
+
+    The minimum distance between every pair of atoms is computed once, so each check is a few numpy operations on the
+    coordinates, which stop at the first block of atoms that overlaps. The molecules must always have the same atoms in
+    the same order, but may be anywhere.
+    """
+
+    def __init__(self, molecules, min_inter_distance, use_kd_tree=None):
+        """
+        Creates a new OverlapChecker.
+
+        Args:
+            molecules       - List of the Molecules to check, in the order their coordinates are given to overlaps().
+            min_inter_distance - Two atoms in different molecules overlap if they are closer than this times the
+                    sum of their van der Waals radii.
+            use_kd_tree     - If True, close atoms are found with a scipy KD-tree, which is faster for large
+                    clusters. If False, the distance between every pair of atoms is computed. If None, a KD-tree is
+                    used for KD_TREE_MIN_ATOMS or more atoms if scipy is installed.
+
+        Returns:
+            A new OverlapChecker.
+        """
+
+        atoms_per_molecule = [molecule.get_num_atoms() for molecule in molecules]
+
+        # the molecule each atom is in
+        self.molecule_indices = numpy.repeat(numpy.arange(len(molecules)), atoms_per_molecule)
+
+        # the atoms are checked in blocks of whole molecules with at least DENSE_BLOCK_ATOMS atoms, except the last
+        self.block_starts = [0]
+
+        for molecule_end in numpy.cumsum(atoms_per_molecule):
+            if molecule_end - self.block_starts[-1] >= DENSE_BLOCK_ATOMS:
+                self.block_starts.append(molecule_end)
+
+        if self.block_starts[-1] < len(self.molecule_indices):
+            self.block_starts.append(len(self.molecule_indices))
+
+        radii = numpy.concatenate([molecule.get_vdw_radii() for molecule in molecules] + [numpy.empty(0)])
+
+        min_distances = min_inter_distance * (radii[:, numpy.newaxis] + radii[numpy.newaxis, :])
+
+        # atoms in the same molecule never overlap. Their squared minimum distance is -inf rather than 0, since rounding
+        # can make the squared distance of an atom to itself slightly negative.
+        same_molecule = self.molecule_indices[:, numpy.newaxis] == self.molecule_indices[numpy.newaxis, :]
+        min_distances[same_molecule] = 0
+
+        self.squared_min_distances = numpy.where(same_molecule, -numpy.inf, min_distances ** 2)
+        self.max_min_distance = float(min_distances.max()) if min_distances.size > 0 else 0.0
+
+        if use_kd_tree is None:
+            try:
+                cKDTree
+                use_kd_tree = len(radii) >= KD_TREE_MIN_ATOMS
+            except NameError:
+                use_kd_tree = False
+
+        elif use_kd_tree:
+            try:
+                cKDTree
+            except NameError:
+                raise LibraryNotAvailableError("scipy") from None
+
+        self.use_kd_tree = use_kd_tree
+
+    def get_num_atoms(self):
+        """
+        Gets the total number of atoms in the molecules checked by this OverlapChecker.
+
+        Args:
+            None.
+
+        Returns:
+            The number of atoms.
+        """
+
+        return len(self.molecule_indices)
+
+    def overlaps(self, coordinates):
+        """
+        Checks if the molecules overlap at the given positions.
+
+        Args:
+            coordinates     - (num_atoms, 3) numpy array of the positions of the atoms of every molecule, in the
+                    order the molecules were given to this OverlapChecker.
+
+        Returns:
+            True if any two atoms in different molecules are too close, False otherwise.
+        """
+
+        if self.use_kd_tree:
+            return self.overlaps_kd_tree(coordinates)
+
+        squared_norms = numpy.einsum("ij,ij->i", coordinates, coordinates)
+
+        # check each block of atoms against itself and the atoms after it, and stop at the first overlap
+        for start, end in zip(self.block_starts[:-1], self.block_starts[1:]):
+
+            # |a - b|^2 = |a|^2 + |b|^2 - 2 a.b, which needs one matrix product rather than an array of differences
+            squared_distances = squared_norms[start:end, numpy.newaxis] + squared_norms[numpy.newaxis, start:] \
+                                - 2 * (coordinates[start:end] @ coordinates[start:].T)
+
+            if numpy.any(squared_distances < self.squared_min_distances[start:end, start:]):
+                return True
+
+        return False
+
+    def overlaps_kd_tree(self, coordinates):
+        """
+        Checks if the molecules overlap at the given positions, only computing the distances between atoms that a
+        KD-tree finds are close enough that they might overlap. Requires scipy.
+
+        Args:
+            coordinates     - (num_atoms, 3) numpy array of the positions of the atoms of every molecule, in the
+                    order the molecules were given to this OverlapChecker.
+
+        Returns:
+            True if any two atoms in different molecules are too close, False otherwise.
+        """
+
+        try:
+            cKDTree
+        except NameError:
+            raise LibraryNotAvailableError("scipy") from None
+
+        pairs = cKDTree(coordinates).query_pairs(self.max_min_distance, output_type="ndarray")
+
+        if len(pairs) == 0:
+            return False
+
+        squared_distances = numpy.sum((coordinates[pairs[:, 0]] - coordinates[pairs[:, 1]]) ** 2, axis=1)
+
+        return bool(numpy.any(squared_distances < self.squared_min_distances[pairs[:, 0], pairs[:, 1]]))
+
+    def overlaps_batch(self, coordinates):
+        """
+        Checks if the molecules overlap in each of many configurations at once.
+
+        Args:
+            coordinates     - (num_configs, num_atoms, 3) numpy array of the positions of the atoms of every molecule in
+                    each configuration, in the order the molecules were given to this OverlapChecker.
+
+        Returns:
+            (num_configs,) numpy array, True for each configuration in which any two atoms in different molecules are
+            too close, False otherwise.
+        """
+
+        if self.use_kd_tree:
+            return numpy.array([self.overlaps_kd_tree(config) for config in coordinates], dtype=bool)
+
+        overlapping = numpy.zeros(len(coordinates), dtype=bool)
+
+        squared_norms = numpy.einsum("cij,cij->ci", coordinates, coordinates)
+
+        for start, end in zip(self.block_starts[:-1], self.block_starts[1:]):
+
+            # configurations that already overlap do not need to be checked again
+            remaining = numpy.flatnonzero(~overlapping)
+
+            if len(remaining) == 0:
+                break
+
+            squared_distances = squared_norms[remaining, start:end, numpy.newaxis] \
+                                + squared_norms[remaining, numpy.newaxis, start:] \
+                                - 2 * (coordinates[remaining, start:end] @ coordinates[remaining, start:].transpose(0, 2, 1))
+
+            overlapping[remaining] = numpy.any(squared_distances < self.squared_min_distances[start:end, start:], axis=(1, 2))
+
+        return overlapping
@@ -1,4 +1,5 @@
 from .database import Database
+from .database import ConnectionPool
 from .database_cleaner import clean_database
 from .database_cleaner import reset_database
 from .database_cleaner import delete_calculations
@@ -10,6 +11,7 @@ from .database_filler import retrieve_energies
 from .database_initializer import initialize_database
 from .training_set_generator import generate_1b_training_set, generate_2b_training_set, generate_training_set
 from .job_handler import JobHandler
+from .result_writer import ResultWriter
 from .psi4_job_handler import Psi4JobHandler
 from .qchem_job_handler import QchemJobHandler
 from .job_handler_utils import get_job_handler
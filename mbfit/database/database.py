@@ -1,26 +1,182 @@
 # external package imports
-import itertools, numpy as np, copy, sys, os
+import itertools, numpy as np, sys, os, io, time, threading, contextlib, queue
 
 # absolute module imports
-from mbfit.molecule import Atom, Fragment, Molecule
+from mbfit.molecule import Atom, Fragment, Molecule, molecule_hasher
 from mbfit.exceptions import PotentialFittingError, NoSuchMoleculeError, DatabaseOperationError, \
         DatabaseInitializationError, DatabaseNotEmptyError, DatabaseConnectionError, InvalidValueError, \
         NoPendingCalculationsError, StandardOrderError, LibraryNotAvailableError
-from mbfit.utils import SettingsReader
+from mbfit.utils import SettingsReader, system
 
 # only import psycopg2 if it is installed.
 try:
     import psycopg2
+    import psycopg2.pool
 except ModuleNotFoundError:
     pass
 
+class ConnectionPool():
+
+    """
+    Pool of open connections to a database that can be shared between many Database objects and threads, so
+    that long runs reuse connections instead of reconnecting to the database over and over.
+    """
+
+    # process-wide pools, one per config file, used by Database(config_file, pool=True)
+    pools = {}
+    pools_lock = threading.Lock()
+
+    def __init__(self, config_file, min_connections=1, max_connections=8):
+        """
+        Initializer for connection pool. Opens min_connections connections to the database right away.
+
+        Args:
+            config_file     - .ini file containing host, port, database, username, and password.
+                    Make sure only you have access to this file or your password will be compromised!
+            min_connections - Number of connections to keep open at all times.
+            max_connections - Maximum number of connections that can be lent out at once.
+
+        Returns:
+            A new ConnectionPool object.
+        """
+
+        # Check if psycopg2 is installed.
+        try:
+            import psycopg2.pool
+        except ModuleNotFoundError:
+            raise LibraryNotAvailableError("psycopg2")
+
+        if min_connections < 0:
+            raise InvalidValueError("min_connections", min_connections, "must be at least 0")
+
+        if max_connections < max(min_connections, 1):
+            raise InvalidValueError("max_connections", max_connections, "must be at least 1 and min_connections")
+
+        config = SettingsReader(config_file)
+
+        host = config.get("database", "host")
+        port = config.get("database", "port")
+        database = config.get("database", "database")
+        username = config.get("database", "username")
+        password = config.get("database", "password")
+
+        self.name = host + " " + database
+
+        try:
+            self.pool = psycopg2.pool.ThreadedConnectionPool(min_connections, max_connections,
+                    "host='{}' port={} dbname='{}' user='{}' password='{}'".format(host, port, database, username, password))
+        except psycopg2.OperationalError as e:
+            raise DatabaseConnectionError(self.name, str(e))
+
+    @staticmethod
+    def get_pool(config_file):
+        """
+        Gets the process-wide connection pool for a config file, creating it if it does not exist yet.
+
+        Args:
+            config_file     - .ini file containing host, port, database, username, and password.
+
+        Returns:
+            The ConnectionPool for this config file.
+        """
+
+        key = os.path.abspath(config_file)
+
+        with ConnectionPool.pools_lock:
+            try:
+                return ConnectionPool.pools[key]
+            except KeyError:
+                pool = ConnectionPool(config_file)
+                ConnectionPool.pools[key] = pool
+                return pool
+
+    @staticmethod
+    def close_all_pools():
+        """
+        Closes all the process-wide connection pools created by get_pool().
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        """
+
+        with ConnectionPool.pools_lock:
+            pools = list(ConnectionPool.pools.values())
+            ConnectionPool.pools.clear()
+
+        for pool in pools:
+            pool.close()
+
+    def get_name(self):
+        """
+        Gets the name of the database this pool connects to.
+
+        Args:
+            None.
+
+        Returns:
+            The name of this pool's database.
+        """
+
+        return self.name
+
+    def get_connection(self):
+        """
+        Borrows a connection from this pool. Give it back with put_connection() once done with it.
+
+        Args:
+            None.
+
+        Returns:
+            An open psycopg2 connection.
+        """
+
+        try:
+            return self.pool.getconn()
+        except psycopg2.pool.PoolError as e:
+            raise DatabaseConnectionError(self.name, str(e))
+        except psycopg2.OperationalError as e:
+            raise DatabaseConnectionError(self.name, str(e))
+
+    def put_connection(self, connection):
+        """
+        Gives a connection back to this pool. Any changes that have not been saved are rolled back.
+
+        Args:
+            connection      - A connection borrowed from this pool with get_connection().
+
+        Returns:
+            None.
+        """
+
+        # do not hand the notices of this session to the next one
+        if not connection.closed:
+            del connection.notices[:]
+
+        self.pool.putconn(connection)
+
+    def close(self):
+        """
+        Closes all connections in this pool, including the ones currently lent out.
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        """
+
+        self.pool.closeall()
+
 class Database():
 
     """
     Database class. Allows one to access a database and perform operations on it.
     """
     
-    def __init__(self, config_file, batch_size=100):
+    def __init__(self, config_file, batch_size=100, itersize=2000, pool=None):
         """
         Initializer for database object. Opens connection and sets up cursor.
 
@@ -30,6 +186,11 @@ class Database():
             batch_size      - number of operations to perfrom on the database per round trip to the server.
                     larger numbers will be more efficient, but you should not exceed a couple thousand.
                     Default is 100.
+            itersize        - number of rows to fetch per round trip to the server when streaming the results
+                    of a query through a server-side cursor. Default is 2000.
+            pool            - ConnectionPool to borrow the connection from instead of opening a new one. close()
+                    gives the connection back to the pool. If True, the process-wide pool for config_file is used,
+                    see ConnectionPool.get_pool(). Default is None, which opens a new connection.
 
         Returns:
             A new Database object.
@@ -44,6 +205,29 @@ class Database():
         self.batch_size = 0
         self.set_batch_size(batch_size)
 
+        self.itersize = 0
+        self.set_itersize(itersize)
+
+        # used to give each server-side cursor a unique name
+        self.stream_count = itertools.count()
+
+        # molecules built from the database, cached for the whole session, see get_molecule_template()
+        self.empty_molecules = {}
+        self.molecule_templates = {}
+
+        if pool is True:
+            pool = ConnectionPool.get_pool(config_file)
+
+        # kept so open_new_session() can connect to the same database again
+        self.config_file = config_file
+        self.pool = pool
+
+        if self.pool is not None:
+            self.name = self.pool.get_name()
+            self.connection = self.pool.get_connection()
+            self.cursor = self.connection.cursor()
+            return
+
         # parse the user's config file to get their login info
 
         config = SettingsReader(config_file)
@@ -124,13 +308,52 @@ class Database():
         Always close the database after you are done using it.
         Closing the database does NOT automatically save it.
         Any non-saved changes will be lost.
+        If this database's connection was borrowed from a ConnectionPool, it is given back to the pool instead.
         Args:
             None.
         Returns:
             None.
         """
 
-        self.connection.close()
+        if self.pool is not None:
+            self.pool.put_connection(self.connection)
+        else:
+            self.connection.close()
+
+    def open_new_session(self):
+        """
+        Opens a new connection to the same database as this one, for instance to use from another thread.
+        If this database's connection was borrowed from a ConnectionPool, so is the new one.
+        Args:
+            None.
+        Returns:
+            A new Database object with the same batch size and itersize as this one.
+        """
+
+        return Database(self.config_file, batch_size=self.get_batch_size(), itersize=self.get_itersize(),
+                        pool=self.pool)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def open_session(database_config, pool=None):
+        """
+        Opens a database for the duration of a with block. Lets functions that take a config file also take an
+        already open Database, so one session can be passed through many calls.
+        Args:
+            database_config - .ini file containing host, port, database, username, and password, or an already
+                    open Database. An open Database is saved but not closed at the end of the with block.
+            pool            - ConnectionPool to borrow the connection from, see __init__(). Ignored if
+                    database_config is an open Database.
+        Yields:
+            The Database.
+        """
+
+        if isinstance(database_config, Database):
+            yield database_config
+            database_config.save()
+        else:
+            with Database(database_config, pool=pool) as database:
+                yield database
 
     def set_batch_size(self, batch_size):
         """
@@ -158,6 +381,32 @@ class Database():
 
         return self.batch_size
 
+    def set_itersize(self, itersize):
+        """
+        Sets the number of rows to fetch per server round trip when streaming query results
+        through a server-side cursor.
+        Args:
+            itersize        - The number of rows to fetch per server round trip.
+        Returns:
+            None.
+        """
+
+        if itersize < 1:
+            raise InvalidValueError("itersize", itersize, "must be at least 1.")
+
+        self.itersize = itersize
+
+    def get_itersize(self):
+        """
+        Gets the itersize, the number of rows fetched per server round trip when streaming query results.
+        Args:
+            None.
+        Returns:
+            itersize
+        """
+
+        return self.itersize
+
     def get_notices(self):
         """
         Gets a list of all notices received from the Database. A notice is a logging message or warning that does
@@ -235,6 +484,7 @@ class Database():
 
         if confirm == "confirm":
             self.execute("PERFORM annihilate();", ())
+            self.clear_molecule_cache()
         else:
             print(
                 "annihilate failed. specify confirm = \"confirm\" if deletion of all content in the database is desired.")
@@ -297,6 +547,76 @@ class Database():
             self.connection.rollback()
             raise DatabaseOperationError(self.name, str(e.diag.message_primary)) from None
 
+    def stream_execute(self, command, params):
+        """
+        Executes a PostgreSQL query in the database and streams its rows through a named (server-side) cursor.
+        Rows are fetched itersize at a time, so the whole result of a large query is never held in memory
+        on the client at once, and only one query is sent to the server.
+        Args:
+            command         - The query to run.
+            params          - Parameters for the query.
+        Yields:
+            Each row of the result of the query.
+        """
+
+        # WITH HOLD keeps the cursor open if the caller saves the database while consuming the rows
+        cursor = self.connection.cursor(name="mbfit_stream_{}".format(next(self.stream_count)), withhold=True)
+        cursor.itersize = self.itersize
+
+        try:
+            cursor.execute(command, params)
+
+            for row in cursor:
+                yield row
+
+        except psycopg2.OperationalError as e:
+            raise DatabaseOperationError(self.name, str(e.diag.message_primary)) from None
+        except psycopg2.InternalError as e:
+            self.connection.rollback()
+            raise DatabaseOperationError(self.name, str(e.diag.message_primary)) from None
+        except psycopg2.ProgrammingError as e:
+            self.connection.rollback()
+            raise DatabaseOperationError(self.name, str(e.diag.message_primary)) from None
+        finally:
+            # the cursor no longer exists on the server if the transaction was rolled back
+            try:
+                cursor.close()
+            except psycopg2.Error:
+                pass
+
+    def keyset_execute(self, command, params, stream=False):
+        """
+        Executes a query over one of the database functions that page their results by molecule hash, and
+        yields the rows of every page.
+        The function must take the last hash of the previous page and the page size as its final two arguments,
+        and return the hash of each configuration as the first column of its rows.
+        Args:
+            command         - The query to run, with '%s's for the last hash and page size at the end.
+            params          - Parameters for the query, not including the last hash and page size.
+            stream          - If True, fetch every page in one query through a server-side cursor. Otherwise,
+                    fetch batch_size rows per query.
+        Yields:
+            Each row of the result of the query.
+        """
+
+        if stream:
+            yield from self.stream_execute(command, tuple(params) + ("", None))
+            return
+
+        # hash of the last configuration of the previous batch, each batch starts after it.
+        last_hash = ""
+
+        while True:
+            self.single_execute(command, tuple(params) + (last_hash, self.batch_size))
+            rows = self.cursor.fetchall()
+
+            yield from rows
+
+            if len(rows) < self.batch_size:
+                return
+
+            last_hash = rows[-1][0]
+
     def create_postgres_array(self, *values):
         """
         Creates a postgres array with an arbitrary number of values.
@@ -312,7 +632,108 @@ class Database():
 
         return "{" + ",".join([str(i) for i in values]) + "}"
 
-    def add_calculations(self, molecule_list, method, basis, cp, *tags, optimized=False):
+    def copy_rows(self, table, columns, rows):
+        """
+        Streams rows into a table using COPY FROM STDIN.
+        Much faster than INSERTs for large numbers of rows, and intended for
+        filling staging tables before a set-based operation.
+        Args:
+            table           - The table to copy the rows into.
+            columns         - List of the names of the columns to fill, in the order of the values of each row.
+            rows            - Iterable of rows, each a tuple of values. Lists are converted to
+                    postgres arrays and None to NULL.
+        Returns:
+            The number of rows copied.
+        """
+
+        buffer = io.StringIO()
+        num_rows = 0
+
+        for row in rows:
+            buffer.write("\t".join([self.format_copy_value(value) for value in row]))
+            buffer.write("\n")
+            num_rows += 1
+
+        buffer.seek(0)
+
+        try:
+            self.cursor.copy_expert("COPY {} ({}) FROM STDIN".format(table, ", ".join(columns)), buffer)
+        except psycopg2.OperationalError as e:
+            raise DatabaseOperationError(self.name, str(e.diag.message_primary)) from None
+        except (psycopg2.InternalError, psycopg2.ProgrammingError, psycopg2.DataError) as e:
+            self.connection.rollback()
+            raise DatabaseOperationError(self.name, str(e.diag.message_primary)) from None
+
+        return num_rows
+
+    def format_copy_value(self, value):
+        """
+        Formats a single value for the text format of COPY FROM STDIN.
+        Args:
+            value           - The value to format.
+        Returns:
+            The value as an escaped string.
+        """
+
+        if value is None:
+            return "\\N"
+        if isinstance(value, bool):
+            return "t" if value else "f"
+        if isinstance(value, (list, tuple, np.ndarray)):
+            value = self.create_postgres_array(*value)
+
+        return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace("\r", "\\r").replace("\t", "\\t")
+
+    def get_fragment_constructors(self, molecule):
+        """
+        Builds the construct_fragment() calls describing each type of fragment in a molecule.
+        Args:
+            molecule        - The molecule to describe, should already be in standard order.
+        Returns:
+            (command_string, params, fragment_counts)
+            command_string  - Comma separated construct_fragment() calls to be put inside an ARRAY[].
+            params          - The params for the calls in command_string.
+            fragment_counts - The number of each type of fragment in the molecule.
+        """
+
+        command_string = ""
+        params = []
+
+        fragments = [fragment.get_name() for fragment in molecule.get_fragments()]
+
+        frag_names, counts = np.unique(fragments, return_counts=True, axis=0)
+        fragment_counts = [int(i) for i in counts]
+
+        for frag_name in frag_names:
+
+            fragment = None
+
+            for frag in molecule.get_fragments():
+                if frag.get_name() == frag_name:
+                    fragment = frag
+
+            atoms = [[atom.get_name(), atom.get_symmetry_class()] for atom in fragment.get_atoms()]
+
+            symbol_symmetry_pairs, counts = np.unique(atoms, return_counts=True, axis=0)
+            atom_counts = [int(i) for i in counts]
+
+            symbol_symmetry_count_pairs = [[symbol_symmetry_pairs[i][0], symbol_symmetry_pairs[i][1], counts[i]]
+                                           for i in range(len(atom_counts))]
+            symbol_symmetry_count_pairs.sort(key=lambda x: x[1])
+
+            symbols = [symbol for symbol, symmetry, count in symbol_symmetry_count_pairs]
+            symmetries = [chr(65 + index) for index in range(len(symbol_symmetry_count_pairs))]
+            counts = [count for symbol, symmetry, count in symbol_symmetry_count_pairs]
+            command_string += "construct_fragment(%s, %s, %s, %s, %s, %s, %s)"
+            if not frag_name == frag_names[-1]:
+                command_string += ", "
+            params += (frag_name, fragment.get_charge(), fragment.get_spin_multiplicity(), fragment.get_SMILE(),
+                       self.create_postgres_array(*symbols),
+                       self.create_postgres_array(*symmetries), self.create_postgres_array(*counts))
+
+        return command_string, params, fragment_counts
+
+    def add_calculations(self, molecule_list, method, basis, cp, *tags, optimized=False, bulk=False):
         """
         Adds new calculations to the database.
         Will queue the database to calculate the energies of each molecule in the list
@@ -325,10 +746,16 @@ class Database():
             cp              - True if counterpoise correction should be used in the calculation of the molecules' energies.
             tags            - Set of tags to label these calculations in the database.
             optimized       - True if all molecules represent optimized geometries.
+            bulk            - If True, use bulk_add_calculations() to COPY the molecules into the database and add
+                    them with set-based operations. Much faster for large numbers of molecules.
         Returns:
             None.
         """
 
+        if bulk:
+            self.bulk_add_calculations(molecule_list, method, basis, cp, *tags, optimized=optimized)
+            return
+
         command_string = ""
         params = []
 
@@ -352,37 +779,9 @@ class Database():
             command_string += "PERFORM add_calculation(%s, %s, ARRAY["
             params += (molecule.get_SHA1(), molecule.get_name())
 
-            fragments = [fragment.get_name() for fragment in molecule.get_fragments()]
-
-            frag_names, counts = np.unique(fragments, return_counts=True, axis=0)
-            fragment_counts = [int(i) for i in counts]
-
-            for frag_name in frag_names:
-
-                fragment = None
-
-                for frag in molecule.get_fragments():
-                    if frag.get_name() == frag_name:
-                        fragment = frag
-
-                atoms = [[atom.get_name(), atom.get_symmetry_class()] for atom in fragment.get_atoms()]
-
-                symbol_symmetry_pairs, counts = np.unique(atoms, return_counts=True, axis=0)
-                atom_counts = [int(i) for i in counts]
-
-                symbol_symmetry_count_pairs = [[symbol_symmetry_pairs[i][0], symbol_symmetry_pairs[i][1], counts[i]]
-                                               for i in range(len(atom_counts))]
-                symbol_symmetry_count_pairs.sort(key=lambda x: x[1])
-
-                symbols = [symbol for symbol, symmetry, count in symbol_symmetry_count_pairs]
-                symmetries = [chr(65 + index) for index in range(len(symbol_symmetry_count_pairs))]
-                counts = [count for symbol, symmetry, count in symbol_symmetry_count_pairs]
-                command_string += "construct_fragment(%s, %s, %s, %s, %s, %s, %s)"
-                if not frag_name == frag_names[-1]:
-                    command_string += ", "
-                params += (frag_name, fragment.get_charge(), fragment.get_spin_multiplicity(), fragment.get_SMILE(),
-                           self.create_postgres_array(*symbols),
-                           self.create_postgres_array(*symmetries), self.create_postgres_array(*counts))
+            fragment_command_string, fragment_params, fragment_counts = self.get_fragment_constructors(molecule)
+            command_string += fragment_command_string
+            params += fragment_params
 
             command_string += "], %s, %s, %s, %s, %s, %s, %s);"
             params += (
@@ -399,6 +798,90 @@ class Database():
         if batch_count != 0:
             self.execute(command_string, params)
 
+    def bulk_add_calculations(self, molecule_list, method, basis, cp, *tags, optimized=False, chunk_size=10000):
+        """
+        Adds new calculations to the database using set-based operations.
+        The molecules are streamed into a temporary staging table with COPY FROM STDIN, then the
+        database adds all of them to its tables at once. Has the same effect as add_calculations(),
+        but is much faster when adding large numbers of molecules.
+        All molecules must be of the same type.
+        Args:
+            molecule_list   - List of molecules whose energies are wanted.
+            method          - Method to use to calculate the molecules' energies.
+            basis           - Basis to use to calculate the molecules' energies.
+            cp              - True if counterpoise correction should be used in the calculation of the molecules' energies.
+            tags            - Set of tags to label these calculations in the database.
+            optimized       - True if all molecules represent optimized geometries.
+            chunk_size      - Number of molecules to buffer in memory before each COPY.
+        Returns:
+            The number of new configurations added to the database.
+        """
+
+        start_time = time.time()
+
+        template = None
+
+        num_rows = 0
+        configs = []
+
+        for molecule in molecule_list:
+            if template is None:
+                order, frag_order = molecule.get_standard_order_order()
+                SMILES = [frag.get_standard_SMILE() for frag in molecule.get_standard_order()]
+                self.single_execute("SELECT begin_bulk_add_calculations()", ())
+
+                # every molecule in molecule_list has its atoms in the same order as this one
+                template = molecule.get_reordered_copy(order, frag_order, SMILES)
+                atom_order = molecule.get_atom_order(order, frag_order)
+
+            configs.append(molecule.get_coordinate_array()[atom_order])
+
+            if len(configs) == chunk_size:
+                num_rows += self.copy_calculations(template, configs)
+                configs = []
+
+        if template is None:
+            return 0
+
+        if len(configs) != 0:
+            num_rows += self.copy_calculations(template, configs)
+
+        fragment_command_string, fragment_params, fragment_counts = self.get_fragment_constructors(template)
+
+        self.single_execute("SELECT bulk_add_calculations(%s, ARRAY[" + fragment_command_string + "], %s, %s, %s, %s, %s, %s)",
+                            [template.get_name()] + fragment_params + [fragment_counts, method, basis, cp,
+                                                                       self.create_postgres_array(*tags), optimized])
+
+        new_configs = self.cursor.fetchone()[0]
+
+        elapsed_time = time.time() - start_time
+
+        system.format_print("Bulk added {} configurations ({} new) in {:.2f} seconds ({:.1f} rows/sec).".format(
+                num_rows, new_configs, elapsed_time, num_rows / max(elapsed_time, 1e-9)), italics=True)
+
+        return new_configs
+
+    def copy_calculations(self, template, configs):
+        """
+        Copies configurations of a molecule into the staging table of bulk_add_calculations(). All configurations are
+        hashed at once.
+        Args:
+            template        - Molecule in standard order with the name, atoms, charge and spin multiplicity of the
+                    configurations.
+            configs         - List of (num_atoms, 3) numpy arrays of the positions of the atoms in standard order.
+        Returns:
+            The number of rows copied.
+        """
+
+        coordinates = np.array(configs).reshape(len(configs), -1)
+
+        hashes = molecule_hasher.get_SHA1s(template.get_name(), template.get_symbols(), template.get_charge(),
+                                           template.get_spin_multiplicity(), coordinates)
+
+        rows = zip(hashes, coordinates.tolist())
+
+        return self.copy_rows("pg_temp.calculation_staging", ["mol_hash", "atom_coordinates"], rows)
+
     def build_empty_molecule(self, mol_name):
         """
         Returns a copy of the mol_name molecule from inside the database with all atom
@@ -465,7 +948,87 @@ class Database():
 
         return count
 
-    def get_all_calculations(self, client_name, *tags, calculations_to_do=sys.maxsize):
+    def get_molecule_template(self, mol_name, names=None, SMILES=None):
+        """
+        Gets a template of the mol_name molecule, see build_molecule_template(). Both the empty molecule read from
+        the database and the template are cached for the rest of the session, so each is only built once per
+        molecule name and order.
+        Params:
+            mol_name        - The name of the molecule.
+            names           - Order the fragments of the template to match this list. If None, the template is
+                    in standard order.
+            SMILES          - Order the atoms of the fragments of the template to match these SMILE strings.
+                    Ignored if names is None.
+        Returns:
+            (template, atom_order, order), see build_molecule_template(). Do not modify them.
+        """
+
+        key = (mol_name, None if names is None else tuple(names), None if names is None else tuple(SMILES))
+
+        try:
+            return self.molecule_templates[key]
+        except KeyError:
+            pass
+
+        try:
+            empty_molecule = self.empty_molecules[mol_name]
+        except KeyError:
+            empty_molecule = self.build_empty_molecule(mol_name)
+            self.empty_molecules[mol_name] = empty_molecule
+
+        self.molecule_templates[key] = self.build_molecule_template(empty_molecule, names, SMILES)
+
+        return self.molecule_templates[key]
+
+    def clear_molecule_cache(self):
+        """
+        Forgets all molecules cached by get_molecule_template(). Only needed if molecule definitions are removed
+        from the database during the session.
+        Params:
+            None.
+        Returns:
+            None.
+        """
+
+        self.empty_molecules = {}
+        self.molecule_templates = {}
+
+    @staticmethod
+    def build_molecule_template(empty_molecule, names=None, SMILES=None):
+        """
+        Builds a template that the coordinates of configurations read from the database can be stamped into with
+        Molecule.get_copy_with_coordinates(), so each configuration does not have to be copied and reordered.
+        Params:
+            empty_molecule  - The molecule as built by build_empty_molecule(), its atoms are in the same order as
+                    the coordinates in the database.
+            names           - Order the fragments of the template to match this list. If None, the template is
+                    in standard order.
+            SMILES          - Order the atoms of the fragments of the template to match these SMILE strings.
+                    Ignored if names is None.
+        Returns:
+            (template, atom_order, order)
+            template        - Copy of empty_molecule in the requested order.
+            atom_order      - numpy array where atom_order[i] is the index in the database coordinates of
+                    atom i of the template.
+            order           - The order of the fragments in the template, as from Molecule.get_reorder_order().
+        """
+
+        # give each atom a distinct position, so that the reordering can be traced back to the database order.
+        molecule = empty_molecule.get_copy_with_coordinates([(index, index, index) for index in range(empty_molecule.get_num_atoms())])
+
+        if names is None:
+            order, frag_orders = molecule.get_standard_order_order()
+            SMILES = [frag.get_standard_SMILE() for frag in molecule.get_standard_order()]
+        else:
+            order, frag_orders = molecule.get_reorder_order(names, SMILES)
+
+        template = molecule.get_reordered_copy(order, frag_orders, SMILES)
+
+        atom_order = np.array([int(atom.get_x()) for atom in template.get_atoms()], dtype=int)
+
+        return template, atom_order, order
+
+    def get_all_calculations(self, client_name, *tags, calculations_to_do=sys.maxsize, stream=False, prefetch=False):
         """
         Gets uncalculaed energies from the database so that the user can calculate them.
         Pass the output into set_properties to update the energies in the database.
@@ -473,6 +1036,10 @@ class Database():
             client_name     - The name of the client that will perform these calculations.
             tags            - Only fetch calculations with these tags.
             calculations_to_do - Maximum number of calculations to fetch. Defualt is unlimited.
+            stream          - If True, claim all the calculations of each molecule in one query and stream them
+                    through a server-side cursor instead of claiming batch_size calculations per query.
+            prefetch        - If True, claim the next batch of calculations in the background while the current
+                    batch is being used, see prefetch_calculation_batches(). Ignored if stream is True.
         Yields:
             (molecule, method, basis, cp, use_cp, frag_indices)
             molecule        - The molecule whose energy should be calculated.
@@ -486,55 +1053,161 @@ class Database():
             use cp for some of their energies.
         """
 
-        name_to_order_dict = {}
+        if stream:
+            pending_calcs = self.stream_calculations(client_name, tags, calculations_to_do)
+        elif prefetch:
+            pending_calcs = itertools.chain.from_iterable(
+                    self.prefetch_calculation_batches(client_name, tags, calculations_to_do))
+        else:
+            pending_calcs = itertools.chain.from_iterable(
+                    self.claim_calculation_batches(client_name, tags, calculations_to_do))
 
-        while True:
+        name_to_template_dict = {}
 
-            self.single_execute("SELECT * FROM get_pending_molecule_name(%s)", (self.create_postgres_array(*tags),))
+        for molecule_name, atom_coordinates, model, frag_indices, use_cp in pending_calcs:
 
-            molecule_name = self.cursor.fetchone()[0]
+            try:
+                template, atom_order = name_to_template_dict[molecule_name]
+            except KeyError:
+                template, atom_order, order = self.get_molecule_template(molecule_name)
+                name_to_template_dict[molecule_name] = template, atom_order
 
-            if molecule_name == "":
-                break
+            molecule = template.get_copy_with_coordinates(np.reshape(atom_coordinates, (-1, 3))[atom_order])
+
+            method = model[:model.index("/")]
+            model = model[model.index("/") + 1:]
+            basis = model[:model.index("/")]
+            cp = model[model.index("/") + 1:] == "True"
 
-            self.single_execute("SELECT * FROM get_pending_calculations(%s, %s, %s, %s)", (
-            molecule_name, client_name, self.create_postgres_array(*tags),
-            min(self.batch_size, calculations_to_do)))
+            yield molecule, method, basis, cp, use_cp, frag_indices
+
+    def claim_calculation_batches(self, client_name, tags, calculations_to_do=sys.maxsize):
+        """
+        Claims pending calculations from the database, batch_size at a time. Each batch takes a single query.
+        Args:
+            client_name     - The name of the client that will perform these calculations.
+            tags            - List of tags, only claim calculations with at least one of these tags.
+            calculations_to_do - Maximum number of calculations to claim. Default is unlimited.
+        Yields:
+            Lists of (molecule_name, atom_coordinates, model, frag_indices, use_cp), all calculations in a
+            batch are of the same molecule.
+        """
+
+        while calculations_to_do > 0:
+            self.single_execute("SELECT * FROM claim_pending_calculations(%s, %s, %s)", (
+                client_name, self.create_postgres_array(*tags), min(self.batch_size, calculations_to_do)))
 
             pending_calcs = self.cursor.fetchall()
 
+            # nothing is pending, or every remaining calculation is being claimed by another client
+            if len(pending_calcs) == 0:
+                return
+
             calculations_to_do -= len(pending_calcs)
 
-            empty_molecule = self.build_empty_molecule(molecule_name)
-            empty_molecule = empty_molecule.get_standard_copy()
+            yield pending_calcs
 
-            for atom_coordinates, model, frag_indices, use_cp in pending_calcs:
-                molecule = copy.deepcopy(empty_molecule)
+    def prefetch_calculation_batches(self, client_name, tags, calculations_to_do=sys.maxsize):
+        """
+        Same as claim_calculation_batches(), but the batches are claimed on a new connection by a background
+        thread, which claims the next batch while the current one is being used.
+        Each batch is saved as soon as it is claimed. If the caller stops early, up to two batches it never got
+        are left dispatched, call reset_dispatched() to set them back to pending.
+        Args:
+            client_name     - The name of the client that will perform these calculations.
+            tags            - List of tags, only claim calculations with at least one of these tags.
+            calculations_to_do - Maximum number of calculations to claim. Default is unlimited.
+        Yields:
+            Lists of (molecule_name, atom_coordinates, model, frag_indices, use_cp), all calculations in a
+            batch are of the same molecule.
+        """
 
-                for atom in molecule.get_atoms():
-                    atom.set_xyz(atom_coordinates[0], atom_coordinates[1], atom_coordinates[2])
-                    atom_coordinates = atom_coordinates[3:]
+        batches = queue.Queue(1)
+        stop = threading.Event()
 
-                method = model[:model.index("/")]
-                model = model[model.index("/") + 1:]
-                basis = model[:model.index("/")]
-                cp = model[model.index("/") + 1:] == "True"
+        session = self.open_new_session()
 
+        def put(item):
+            # gives up once the caller stops asking for batches
+            while not stop.is_set():
                 try:
-                    order, frag_orders, SMILES = name_to_order_dict[molecule.get_name()]
-                except KeyError:
-                    order, frag_orders = molecule.get_standard_order_order()
-                    SMILES = [frag.get_standard_SMILE() for frag in molecule.get_standard_order()]
-                    name_to_order_dict[molecule.get_name()] = order, frag_orders, SMILES
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def claim_batches():
+            try:
+                with session:
+                    for batch in session.claim_calculation_batches(client_name, tags, calculations_to_do):
+                        session.save()
+                        if not put(batch):
+                            return
+            except Exception as e:
+                put(e)
+                return
+
+            put(None)
+
+        thread = threading.Thread(target=claim_batches, name="mbfit_prefetch", daemon=True)
+        thread.start()
+
+        try:
+            while True:
+                batch = batches.get()
+
+                if batch is None:
+                    return
+
+                if isinstance(batch, Exception):
+                    raise batch
+
+                yield batch
+        finally:
+            stop.set()
+            thread.join()
+
+    def stream_calculations(self, client_name, tags, calculations_to_do=sys.maxsize):
+        """
+        Claims all the pending calculations of one molecule at a time in a single query, and streams them through
+        a server-side cursor.
+        Args:
+            client_name     - The name of the client that will perform these calculations.
+            tags            - List of tags, only claim calculations with at least one of these tags.
+            calculations_to_do - Maximum number of calculations to claim. Default is unlimited.
+        Yields:
+            (molecule_name, atom_coordinates, model, frag_indices, use_cp)
+        """
+
+        while calculations_to_do > 0:
+
+            self.single_execute("SELECT * FROM get_pending_molecule_name(%s)", (self.create_postgres_array(*tags),))
 
-                molecule = molecule.get_reordered_copy(order, frag_orders, SMILES)
+            molecule_name = self.cursor.fetchone()[0]
+
+            if molecule_name == "":
+                return
+
+            num_claimed = 0
+
+            # a NULL batch size claims every pending calculation of this molecule
+            for atom_coordinates, model, frag_indices, use_cp in self.stream_execute(
+                    "SELECT * FROM get_pending_calculations(%s, %s, %s, %s)", (
+                    molecule_name, client_name, self.create_postgres_array(*tags),
+                    calculations_to_do if calculations_to_do < 2 ** 31 else None)):
+
+                num_claimed += 1
 
-                yield molecule, method, basis, cp, use_cp, frag_indices
+                yield molecule_name, atom_coordinates, model, frag_indices, use_cp
 
-            if calculations_to_do < 1:
+            # every remaining calculation is being claimed by another client
+            if num_claimed == 0:
                 return
 
-    def set_properties(self, calculation_results, overwrite=False):
+            calculations_to_do -= num_claimed
+
+    def set_properties(self, calculation_results, overwrite=False, bulk=False):
         """
         Sets newly calculated energies in the database.
         Args:
@@ -549,10 +1222,17 @@ class Database():
                     result      - True if the calculation succeeded.
                     energy      - The calculated energy in atomic units. Not used in result is False.
                     log_text    - The text of the log file for this calculation.
+            overwrite       - If True, overwrite the energies of calculations that are already complete or failed.
+            bulk            - If True, use bulk_set_properties() to COPY the results into the database and set
+                    them with set-based operations. Much faster for large numbers of results.
         Returns:
             None.
         """
 
+        if bulk:
+            self.bulk_set_properties(calculation_results, overwrite=overwrite)
+            return
+
         command_string = ""
         params = []
 
@@ -587,6 +1267,65 @@ class Database():
         if batch_count != 0:
             self.execute(command_string, params)
 
+    def bulk_set_properties(self, calculation_results, overwrite=False, chunk_size=10000):
+        """
+        Sets newly calculated energies in the database using set-based operations.
+        The results are streamed into a temporary staging table with COPY FROM STDIN, then the
+        database sets all of them at once. Has the same effect as set_properties(), but is much
+        faster when setting large numbers of results.
+        Args:
+            calculation_results - List of tuples of format
+                    (molecule, method, basis, cp, use_cp, frag_indices, result, energy, log_text), see
+                    set_properties().
+            overwrite       - If True, overwrite the energies of calculations that are already complete or failed.
+            chunk_size      - Number of results to buffer in memory before each COPY.
+        Returns:
+            The number of calculations whose energies were set.
+        """
+
+        start_time = time.time()
+
+        name_to_order_dict = {}
+
+        columns = ["mol_hash", "model_name", "use_cp", "frag_indices", "result", "energy", "log_text"]
+
+        num_rows = 0
+        rows = []
+
+        self.single_execute("SELECT begin_bulk_set_properties()", ())
+
+        for molecule, method, basis, cp, use_cp, frag_indices, result, energy, log_text in calculation_results:
+            try:
+                order, frag_orders, SMILES = name_to_order_dict[molecule.get_name()]
+            except KeyError:
+                order, frag_orders = molecule.get_standard_order_order()
+                SMILES = [frag.get_standard_SMILE() for frag in molecule.get_standard_order()]
+                name_to_order_dict[molecule.get_name()] = order, frag_orders, SMILES
+
+            molecule = molecule.get_reordered_copy(order, frag_orders, SMILES)
+
+            model_name = method + "/" + basis + "/" + str(cp)
+
+            rows.append((molecule.get_SHA1(), model_name, use_cp, list(frag_indices), result, energy, log_text))
+
+            if len(rows) == chunk_size:
+                num_rows += self.copy_rows("pg_temp.properties_staging", columns, rows)
+                rows = []
+
+        if len(rows) != 0:
+            num_rows += self.copy_rows("pg_temp.properties_staging", columns, rows)
+
+        self.single_execute("SELECT bulk_set_properties(%s)", (overwrite,))
+
+        num_set = self.cursor.fetchone()[0]
+
+        elapsed_time = time.time() - start_time
+
+        system.format_print("Bulk submitted {} results ({} set) in {:.2f} seconds ({:.1f} rows/sec).".format(
+                num_rows, num_set, elapsed_time, num_rows / max(elapsed_time, 1e-9)), italics=True)
+
+        return num_set
+
     def get_1B_training_set(self, molecule_name, names, SMILES, method, basis, cp, *tags):
         """
         Gets a 1B training set from the calculated energies in the database.
@@ -608,36 +1347,17 @@ class Database():
         """
 
         model_name = "{}/{}/{}".format(method, basis, cp)
-        batch_offset = 0
 
-        self.single_execute("SELECT * FROM count_entries(%s)", (molecule_name,))
-        max_count = self.cursor.fetchone()[0]
+        template = None
 
-        empty_molecule = self.build_empty_molecule(molecule_name)
+        training_set = self.keyset_execute("SELECT * FROM get_1B_training_set(%s, %s, %s, %s, %s)", (
+        molecule_name, model_name, self.create_postgres_array(*tags)))
 
-        order, frag_orders = None, None
+        for mol_hash, atom_coordinates, energy in training_set:
+            if template is None:
+                template, atom_order, order = self.get_molecule_template(molecule_name, names, SMILES)
 
-        while True:
-            self.single_execute("SELECT * FROM get_1B_training_set(%s, %s, %s, %s, %s)", (
-            molecule_name, model_name, self.create_postgres_array(*tags), batch_offset, self.batch_size))
-            training_set = self.cursor.fetchall()
-
-            for atom_coordinates, energy in training_set:
-                molecule = copy.deepcopy(empty_molecule)
-
-                for atom in molecule.get_atoms():
-                    atom.set_xyz(atom_coordinates[0], atom_coordinates[1], atom_coordinates[2])
-                    atom_coordinates = atom_coordinates[3:]
-
-                if order is None:
-                    order, frag_orders = molecule.get_reorder_order(names, SMILES)
-
-                yield molecule.get_reordered_copy(order, frag_orders, SMILES), energy
-
-            batch_offset += self.batch_size
-
-            if batch_offset > max_count:
-                return
+            yield template.get_copy_with_coordinates(np.reshape(atom_coordinates, (-1, 3))[atom_order]), energy
 
     def get_training_set_size(self, names, method, basis, cp, *tags):
         model_name = "{}/{}/{}".format(method, basis, cp)
@@ -653,53 +1373,35 @@ class Database():
 
         return count
 
-    def get_training_set(self, names, SMILES, method, basis, cp, *tags):
+    def get_training_set(self, names, SMILES, method, basis, cp, *tags, stream=False):
 
         self.clear_notices()
 
         model_name = "{}/{}/{}".format(method, basis, cp)
-        batch_offset = 0
 
-        order, frag_orders, energies_order = None, None, None
+        template, energies_order = None, None
 
         standard_names = sorted(names)
 
         molecule_name = "-".join(standard_names)
 
-        max_count = self.get_training_set_size(names, method, basis, cp, *tags)
-
-        empty_molecule = self.build_empty_molecule(molecule_name)
-
-        while True:
-            self.single_execute("SELECT * FROM get_training_set(%s, %s, %s, %s, %s, %s)", (
-                molecule_name, self.create_postgres_array(*standard_names), model_name,
-                self.create_postgres_array(*tags), batch_offset,
-                self.batch_size))
-            training_set = self.cursor.fetchall()
-
-            for atom_coordinates, binding_energy, nb_energy, deformation_energies in training_set:
-                molecule = copy.deepcopy(empty_molecule)
-
-                for atom in molecule.get_atoms():
-                    atom.set_xyz(atom_coordinates[0], atom_coordinates[1], atom_coordinates[2])
-                    atom_coordinates = atom_coordinates[3:]
+        training_set = self.keyset_execute("SELECT * FROM get_training_set(%s, %s, %s, %s, %s, %s)", (
+            molecule_name, self.create_postgres_array(*standard_names), model_name,
+            self.create_postgres_array(*tags)), stream=stream)
 
-                if order is None:
-                    order, frag_orders = molecule.get_reorder_order(names, SMILES)
-                    energies_order = Database.get_energies_order(order, molecule.get_num_fragments(), False)
+        for mol_hash, atom_coordinates, binding_energy, nb_energy, deformation_energies in training_set:
+            if template is None:
+                template, atom_order, order = self.get_molecule_template(molecule_name, names, SMILES)
+                energies_order = Database.get_energies_order(order, template.get_num_fragments(), False)
 
-                deformation_energies = [deformation_energies[i] for i in energies_order[:len(deformation_energies)]]
+            deformation_energies = [deformation_energies[i] for i in energies_order[:len(deformation_energies)]]
 
-                yield molecule.get_reordered_copy(order, frag_orders,
-                                                  SMILES), binding_energy, nb_energy, deformation_energies
+            yield template.get_copy_with_coordinates(np.reshape(atom_coordinates, (-1, 3))[atom_order]), \
+                  binding_energy, nb_energy, deformation_energies
 
-            batch_offset += self.batch_size
-
-            if batch_offset > max_count:                
-                if self.get_last_notice() is not None and "Multiple optimized geometries" in self.get_last_notice():
-                    print(self.get_last_notice(), "Using the lowest energy optimized geometry to calculate deformation"
-                                                              " energies for this training set.")
-                return
+        if self.get_last_notice() is not None and "Multiple optimized geometries" in self.get_last_notice():
+            print(self.get_last_notice(), "Using the lowest energy optimized geometry to calculate deformation"
+                                                      " energies for this training set.")
 
     def get_2B_training_set(self, molecule_name, names, SMILES, method, basis, cp, *tags):
         """
@@ -726,83 +1428,44 @@ class Database():
         """
 
         model_name = "{}/{}/{}".format(method, basis, cp)
-        batch_offset = 0
 
-        order, frag_orders = None, None
+        template = None
 
         monomer1_name, monomer2_name = sorted([names[0], names[1]])
 
         molecule_name = monomer1_name + "-" + monomer2_name
 
-        self.single_execute("SELECT * FROM count_entries(%s)", (molecule_name,))
-        max_count = self.cursor.fetchone()[0]
-
-        empty_molecule = self.build_empty_molecule(molecule_name)
-
-        while True:
-            self.single_execute("SELECT * FROM get_2B_training_set(%s, %s, %s, %s, %s, %s, %s)", (
-            molecule_name, monomer1_name, monomer2_name, model_name, self.create_postgres_array(*tags),
-            batch_offset, self.batch_size))
-            training_set = self.cursor.fetchall()
-
-            for atom_coordinates, binding_energy, interaction_energy, monomer1_energy, monomer2_energy in training_set:
-                molecule = copy.deepcopy(empty_molecule)
-
-                for atom in molecule.get_atoms():
-                    atom.set_xyz(atom_coordinates[0], atom_coordinates[1], atom_coordinates[2])
-                    atom_coordinates = atom_coordinates[3:]
+        training_set = self.keyset_execute("SELECT * FROM get_2B_training_set(%s, %s, %s, %s, %s, %s, %s)", (
+        molecule_name, monomer1_name, monomer2_name, model_name, self.create_postgres_array(*tags)))
 
-                if order is None:
-                    order, frag_orders = molecule.get_reorder_order(names, SMILES)
+        for mol_hash, atom_coordinates, binding_energy, interaction_energy, monomer1_energy, monomer2_energy in training_set:
+            if template is None:
+                template, atom_order, order = self.get_molecule_template(molecule_name, names, SMILES)
 
-                if order == [1, 0]:
-                    monomer1_energy, monomer2_energy = monomer2_energy, monomer1_energy
+            if order == [1, 0]:
+                monomer1_energy, monomer2_energy = monomer2_energy, monomer1_energy
 
-                yield molecule.get_reordered_copy(order, frag_orders,
-                                                  SMILES), binding_energy, interaction_energy, monomer1_energy, monomer2_energy
+            yield template.get_copy_with_coordinates(np.reshape(atom_coordinates, (-1, 3))[atom_order]), \
+                  binding_energy, interaction_energy, monomer1_energy, monomer2_energy
 
-            batch_offset += self.batch_size
-
-            if batch_offset > max_count:
-                return
-
-    def export_calculations(self, names, SMILES, method, basis, cp, *tags):
+    def export_calculations(self, names, SMILES, method, basis, cp, *tags, stream=False):
 
         model_name = "{}/{}/{}".format(method, basis, cp)
-        batch_offset = 0
 
-        order, frag_orders, energies_order = None, None, None
+        template, energies_order = None, None
 
         molecule_name = "-".join(sorted(names))
 
-        self.single_execute("SELECT * FROM count_entries(%s)", (molecule_name,))
-        max_count = self.cursor.fetchone()[0]
-
-        empty_molecule = self.build_empty_molecule(molecule_name)
-
-        while True:
-            self.single_execute("SELECT * FROM export_calculations(%s, %s, %s, %s, %s)", (
-                molecule_name, model_name, self.create_postgres_array(*tags), batch_offset, self.batch_size))
-            calculations = self.cursor.fetchall()
-
-            for atom_coordinates, energies in calculations:
-                molecule = copy.deepcopy(empty_molecule)
-
-                for atom in molecule.get_atoms():
-                    atom.set_xyz(atom_coordinates[0], atom_coordinates[1], atom_coordinates[2])
-                    atom_coordinates = atom_coordinates[3:]
+        calculations = self.keyset_execute("SELECT * FROM export_calculations(%s, %s, %s, %s, %s)", (
+            molecule_name, model_name, self.create_postgres_array(*tags)), stream=stream)
 
-                if order is None:
-                    order, frag_orders = molecule.get_reorder_order(names, SMILES)
-                    energies_order = self.get_energies_order(order, molecule.get_num_fragments(), cp)
+        for mol_hash, atom_coordinates, energies in calculations:
+            if template is None:
+                template, atom_order, order = self.get_molecule_template(molecule_name, names, SMILES)
+                energies_order = self.get_energies_order(order, template.get_num_fragments(), cp)
 
-                yield molecule.get_reordered_copy(order, frag_orders,
-                                                  SMILES), [energies[i] for i in energies_order]
-
-            batch_offset += self.batch_size
-
-            if batch_offset > max_count:
-                return
+            yield template.get_copy_with_coordinates(np.reshape(atom_coordinates, (-1, 3))[atom_order]), \
+                  [energies[i] for i in energies_order]
 
     def import_calculations(self, molecule_energies_pairs, method, basis, cp, *tags, optimized=False):
         """
@@ -913,36 +1576,18 @@ class Database():
         """
 
         model_name = "{}/{}/{}".format(method, basis, cp)
-        batch_offset = 0
-
-        self.single_execute("SELECT * FROM count_entries(%s)", (molecule_name,))
-        max_count = self.cursor.fetchone()[0]
 
-        empty_molecule = self.build_empty_molecule(molecule_name)
+        template = None
 
-        order, frag_orders = None, None
+        failed_configs = self.keyset_execute("SELECT * FROM get_failed_configs(%s, %s, %s, %s, %s)", (
+            molecule_name, model_name, self.create_postgres_array(*tags)))
 
-        while True:
-            self.single_execute("SELECT * FROM get_failed_configs(%s, %s, %s, %s, %s)", (
-                molecule_name, model_name, self.create_postgres_array(*tags), batch_offset, self.batch_size))
-            training_set = self.cursor.fetchall()
+        for mol_hash, atom_coordinates, frag_indices, used_cp in failed_configs:
+            if template is None:
+                template, atom_order, order = self.get_molecule_template(molecule_name, names, SMILES)
 
-            for atom_coordinates, frag_indices, used_cp in training_set:
-                molecule = copy.deepcopy(empty_molecule)
-
-                for atom in molecule.get_atoms():
-                    atom.set_xyz(atom_coordinates[0], atom_coordinates[1], atom_coordinates[2])
-                    atom_coordinates = atom_coordinates[3:]
-
-                if order is None:
-                    order, frag_orders = molecule.get_reorder_order(names, SMILES)
-
-                yield molecule.get_reordered_copy(order, frag_orders, SMILES), frag_indices, used_cp
-
-            batch_offset += self.batch_size
-
-            if batch_offset > max_count:
-                return
+            yield template.get_copy_with_coordinates(np.reshape(atom_coordinates, (-1, 3))[atom_order]), \
+                  frag_indices, used_cp
 
     def reset_all_calculations(self, *tags):
         """
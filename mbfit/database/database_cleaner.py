@@ -12,13 +12,14 @@ def clean_database(settings_path, database_config_path, *tags):
         settings_path       - Local path to ".ini" file containing all relevent settings.
         database_config_path - .ini file containing host, port, database, username, and password.
                     Make sure only you have access to this file or your password will be compromised!
+                    May also be an already open Database, which is used instead of opening a new one.
         tags                - Reset calculations with one of these tags.
 
     Returns:
         None.
     """
 
-    with Database(database_config_path) as database:
+    with Database.open_session(database_config_path) as database:
 
         database.reset_dispatched(*tags)
 
@@ -31,13 +32,14 @@ def reset_database(settings_path, database_config_path, *tags):
         settings_path       - Local path to ".ini" file containing all relevent settings.
         database_config_path - .ini file containing host, port, database, username, and password.
                     Make sure only you have access to this file or your password will be compromised!
+                    May also be an already open Database, which is used instead of opening a new one.
         tags                - Reset calculations with one of these tags.
 
     Returns:
         None.
     """
 
-    with Database(database_config_path) as database:
+    with Database.open_session(database_config_path) as database:
 
         database.reset_failed(*tags)
 
@@ -55,6 +57,7 @@ def delete_calculations(settings_path, database_config_path, configurations_path
         settings_path       - Local path to ".ini" file containing all relevent settings.
         database_config_path - .ini file containing host, port, database, username, and password.
                     Make sure only you have access to this file or your password will be compromised!
+                    May also be an already open Database, which is used instead of opening a new one.
         configurations_path - '.xyz' file. Remove tags from calculations involving these molecules.
         method  - Remove tags from calculations with this method.
         basis   - Remove tags from calculations with this basis.
@@ -68,7 +71,7 @@ def delete_calculations(settings_path, database_config_path, configurations_path
     """
     molecules = parse_training_set_file(configurations_path, SettingsReader(settings_path))
 
-    with Database(database_config_path) as database:
+    with Database.open_session(database_config_path) as database:
 
         database.delete_calculations(molecules, method, basis, cp, *tags, delete_complete_calculations=delete_complete_calculations)
 
@@ -86,6 +89,7 @@ def delete_all_calculations(settings_path, database_config_path, molecule_name,
         settings_path       - Local path to ".ini" file containing all relevent settings.
         database_config_path - .ini file containing host, port, database, username, and password.
                     Make sure only you have access to this file or your password will be compromised!
+                    May also be an already open Database, which is used instead of opening a new one.
         molecule_name - Remove tags from calculations involving molecules of this type.
         method  - Remove tags from calculations with this method.
         basis   - Remove tags from calculations with this basis.
@@ -98,7 +102,7 @@ def delete_all_calculations(settings_path, database_config_path, molecule_name,
         None.
     """
 
-    with Database(database_config_path) as database:
+    with Database.open_session(database_config_path) as database:
 
         database.delete_all_calculations(molecule_name, method, basis, cp, *tags, delete_complete_calculations=delete_complete_calculations)
 
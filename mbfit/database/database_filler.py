@@ -1,94 +1,301 @@
 # external package imports
-import sys
+import sys, os, itertools, collections, concurrent.futures, contextlib, threading, signal
 
 # absolute module imports
 from mbfit import calculator
 from mbfit.calculator import Model
-from mbfit.exceptions import LibraryCallError
+from mbfit.exceptions import LibraryCallError, InvalidValueError
 from mbfit.utils import SettingsReader, files, system
 
 # local module imports
 from .database import Database
+from .result_writer import ResultWriter
 
 
-def fill_database(settings_path, database_config_path, client_name, *tags, calculation_count=sys.maxsize, qm_options={}):
+def fill_database(settings_path, database_config_path, client_name, *tags, calculation_count=sys.maxsize, qm_options={},
+        num_workers=1, threads_per_worker=None):
     """
     Loops over uncalculated energies in a database and calculates them.
 
-    Results are submitted to the database in batches. If interrupted
-    all results since the last batch will be stuck on "running".
-    call clean_database() to set them back to pending.
+    Results are submitted to the database in batches by a background thread while the next calculations run.
+    Results that are still queued are submitted when the calculations end, including when they end because
+    of an exception or a SIGTERM. If the process is killed in any other way, all results since the last batch
+    will be stuck on "running". call clean_database() to set them back to pending.
 
     Args:
         settings_path       - Local path to the file with all relevant settings information.
         database_config_path - .ini file containing host, port, database, username, and password.
                     Make sure only you have access to this file or your password will be compromised!
+                    May also be an already open Database, which is used instead of opening a new one.
         client_name         - Name of the client performing these calculations.
         calculation_count   - Maximum number of calculations to perform. Default is unlimited.
         qm_options           - Dictionary of extra arguments to be passed to the QM code doing the calculation.
+        num_workers         - Number of calculations to run at the same time, each in its own process. All results
+                    are still submitted to the database by this process. Default is 1.
+        threads_per_worker  - Number of threads each calculation may use. Default is the num_threads
+                    setting of the QM code in the settings file.
 
     Returns:
         None.
     """
 
-    # open the database
-    with Database(database_config_path) as database:
+    if num_workers < 1:
+        raise InvalidValueError("num_workers", num_workers, "must be at least 1")
 
-        total_pending = database.count_pending_calculations(*tags)
-        system.format_print("Beginning calculations. {} total calculations with tags {} pending in database. Calculating {} of them.".format(total_pending, tags, min(calculation_count, total_pending)),
-                bold=True, color=system.Color.YELLOW)
+    if threads_per_worker is not None and threads_per_worker < 1:
+        raise InvalidValueError("threads_per_worker", threads_per_worker, "must be at least 1")
 
+    # the workers are started before the database is opened, so they do not inherit its connections or the threads
+    # that claim calculations and write results.
+    executor = start_workers(settings_path, num_workers, threads_per_worker) if num_workers > 1 else None
 
-        calc = calculator.get_calculator(settings_path)
+    try:
+        # open the database
+        with Database.open_session(database_config_path) as database:
 
-        counter = 0
-        successes = 0
-        failures = 0
+            total_pending = database.count_pending_calculations(*tags)
+            system.format_print("Beginning calculations. {} total calculations with tags {} pending in database. Calculating {} of them.".format(total_pending, tags, min(calculation_count, total_pending)),
+                    bold=True, color=system.Color.YELLOW)
 
-        calculation_results = []
-        
-        for molecule, method, basis, cp, use_cp, frag_indices in database.get_all_calculations(client_name, *tags, calculations_to_do=calculation_count):
-            
-            counter += 1
+            counter = 0
+            successes = 0
+            failures = 0
 
-            try:
-                model = Model(method, basis, use_cp)
+            # the next batch of calculations is claimed while the current one is being calculated. Each batch is saved
+            # as soon as it is claimed, so the writer can set the properties of its calculations right away.
+            calculations = database.get_all_calculations(client_name, *tags, calculations_to_do=calculation_count,
+                    prefetch=True)
 
-                # calculate the missing energy
-                energy, log_path = calc.calculate_energy(molecule, model, frag_indices, qm_options=qm_options)
-                with open(log_path, "r") as log_file:
-                    log_text = log_file.read()
-                calculation_results.append((molecule, method, basis, cp, use_cp, frag_indices, True, energy, log_text))
-                successes += 1
-            
-            except LibraryCallError as e:
-                if e.log_path is not None:
-                    with open(e.log_path, "r") as log_file:
-                        log_text = log_file.read()
-                    if log_text is "":
-                        log_text = "<Log file was empty.>"
-                    calculation_results.append((molecule, method, basis, cp, use_cp, frag_indices, False, 0, log_text))
-                else:
-                    log_text = "<Error occurred without producing log file.>"
-                    calculation_results.append((molecule, method, basis, cp, use_cp, frag_indices, False, 0, log_text))
-                failures += 1
-
-
-            if len(calculation_results) >= database.get_batch_size():
-                database.set_properties(calculation_results)
-                calculation_results = []
-                # save changes to the database
-                database.save()
-
-            if counter % 10 == 0:
-                system.format_print("Performed {} calculations so far. {} Successes and {} Failures so far.".format(counter, successes, failures),
-                        italics=True)
-
-        database.set_properties(calculation_results)
-
-        system.format_print("Done! Performed {} calculations. {} Successes and {} Failures. {} calculations with tags {} remain pending in database.".format(counter, successes, failures, total_pending - counter, tags),
-                bold=True, color=system.Color.GREEN)
+            if num_workers > 1:
+                system.format_print("Running {} calculations at a time.".format(num_workers), italics=True)
+
+                results = calculate_energies_in_parallel(executor, calculations, num_workers, qm_options=qm_options)
+            else:
+                calc = calculator.get_calculator(settings_path)
+                set_num_threads(calc, threads_per_worker)
+
+                results = (calculate_energy(calc, *calculation, qm_options=qm_options) for calculation in calculations)
+
+            # results are written through a second connection, since this one is busy claiming calculations.
+            with database.open_new_session() as writer_database, ResultWriter(writer_database) as writer, \
+                    exit_on_sigterm():
+
+                for calculation_result in results:
+
+                    counter += 1
+
+                    if calculation_result[6]:
+                        successes += 1
+                    else:
+                        failures += 1
+
+                    writer.put(calculation_result)
+
+                    if counter % 10 == 0:
+                        system.format_print("Performed {} calculations so far. {} Successes and {} Failures so far.".format(counter, successes, failures),
+                                italics=True)
+
+            system.format_print("Done! Performed {} calculations. {} Successes and {} Failures. {} calculations with tags {} remain pending in database.".format(counter, successes, failures, total_pending - counter, tags),
+                    bold=True, color=system.Color.GREEN)
+    finally:
+        # after a SIGTERM or exception, the queued calculations are dropped rather than waited for.
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+@contextlib.contextmanager
+def exit_on_sigterm():
+    """
+    Turns a SIGTERM into a SystemExit for the duration of a with block, so the cleanup code of the block still runs
+    when a batch job is pre-empted. Does nothing outside of the main thread, where signals cannot be handled.
+
+    Args:
+        None.
+
+    Yields:
+        None.
+    """
+
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def handle_sigterm(signal_number, frame):
+        sys.exit(128 + signal_number)
+
+    previous_handler = signal.signal(signal.SIGTERM, handle_sigterm)
+
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+
+def calculate_energy(calc, molecule, method, basis, cp, use_cp, frag_indices, qm_options={}):
+    """
+    Performs one calculation claimed from the database.
+
+    Args:
+        calc                - The Calculator to perform the calculation with.
+        molecule            - The molecule of this calculation.
+        method              - Method of this calculation.
+        basis               - Basis of this calculation.
+        cp                  - True if the model of this calculation includes counterpoise correction.
+        use_cp              - True if counterpoise correction should be used for this calculation.
+        frag_indices        - List of indices of fragments to include in the calculation.
+        qm_options          - Dictionary of extra arguments to be passed to the QM code doing the calculation.
+
+    Returns:
+        (molecule, method, basis, cp, use_cp, frag_indices, result, energy, log_text), as taken by
+        Database.set_properties().
+    """
+
+    try:
+        model = Model(method, basis, use_cp)
+
+        # calculate the missing energy
+        energy, log_path = calc.calculate_energy(molecule, model, frag_indices, qm_options=qm_options)
+        with open(log_path, "r") as log_file:
+            log_text = log_file.read()
+        return (molecule, method, basis, cp, use_cp, frag_indices, True, energy, log_text)
+
+    except LibraryCallError as e:
+        if e.log_path is not None:
+            with open(e.log_path, "r") as log_file:
+                log_text = log_file.read()
+            if log_text == "":
+                log_text = "<Log file was empty.>"
+        else:
+            log_text = "<Error occurred without producing log file.>"
+        return (molecule, method, basis, cp, use_cp, frag_indices, False, 0, log_text)
+
+def set_num_threads(calc, num_threads):
+    """
+    Sets the number of threads a Calculator's QM code may use.
+
+    Args:
+        calc                - The Calculator.
+        num_threads         - The number of threads. If None, the Calculator's settings are left alone.
+
+    Returns:
+        None.
+    """
+
+    if num_threads is None:
+        return
+
+    calc.settings.set("psi4", "num_threads", str(num_threads))
+    calc.settings.set("qchem", "num_threads", str(num_threads))
+
+# the Calculator of each worker process started by calculate_energies_in_parallel()
+worker_calculator = None
+
+def initialize_worker(settings_path, threads_per_worker):
+    """
+    Sets up a worker process of calculate_energies_in_parallel().
+
+    Args:
+        settings_path       - Local path to the file with all relevant settings information.
+        threads_per_worker  - Number of threads the calculations of this worker may use, or None to use the
+                settings file.
+
+    Returns:
+        None.
+    """
+
+    global worker_calculator
+
+    # SIGTERM is handled by the process that started the workers, which exits once they are no longer needed.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    worker_calculator = calculator.get_calculator(settings_path)
+    set_num_threads(worker_calculator, threads_per_worker)
+
+    # calculations of different fragments of the same molecule share a log path, so each worker writes its logs
+    # to its own directory.
+    log_path = worker_calculator.settings.get("files", "log_path")
+    worker_calculator.settings.set("files", "log_path", os.path.join(log_path, "worker_{}".format(os.getpid())))
+
+def calculate_energy_in_worker(calculation, qm_options):
+    """
+    Performs one calculation in a worker process of calculate_energies_in_parallel().
+
+    Args:
+        calculation         - (molecule, method, basis, cp, use_cp, frag_indices), as yielded by
+                Database.get_all_calculations().
+        qm_options          - Dictionary of extra arguments to be passed to the QM code doing the calculation.
+
+    Returns:
+        (molecule, method, basis, cp, use_cp, frag_indices, result, energy, log_text), as taken by
+        Database.set_properties().
+    """
+
+    return calculate_energy(worker_calculator, *calculation, qm_options=qm_options)
+
+def start_workers(settings_path, num_workers, threads_per_worker=None):
+    """
+    Starts a pool of worker processes for calculate_energies_in_parallel().
+
+    The workers are started right away rather than when the first calculation is submitted, so they can be started
+    before any database connections or threads exist for them to inherit.
+
+    Args:
+        settings_path       - Local path to the file with all relevant settings information.
+        num_workers         - Number of worker processes.
+        threads_per_worker  - Number of threads each calculation may use, or None to use the settings file.
+
+    Returns:
+        A concurrent.futures.ProcessPoolExecutor. The caller is responsible for shutting it down.
+    """
+
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=num_workers, initializer=initialize_worker,
+            initargs=(settings_path, threads_per_worker))
+
+    # the first task starts the workers.
+    executor.submit(int).result()
+
+    return executor
+
+def calculate_energies_in_parallel(executor, calculations, num_workers, qm_options={}):
+    """
+    Performs calculations in a pool of worker processes.
+
+    Calculations are taken from the input lazily, never more than twice as many as there are workers ahead of the
+    one whose result is being yielded, so the input can be a generator that claims calculations from the database as
+    it goes. Results are yielded in the order the calculations were claimed, so a slow calculation holds back the
+    results after it, but not the calculations after it.
+
+    If this generator is stopped early, by an exception such as the SystemExit of a SIGTERM or by being closed, the
+    queued calculations are cancelled and the executor is shut down without waiting for the running ones.
+
+    Args:
+        executor            - The pool of worker processes, from start_workers().
+        calculations        - Iterable of (molecule, method, basis, cp, use_cp, frag_indices), as yielded by
+                Database.get_all_calculations().
+        num_workers         - Number of worker processes in the executor.
+        qm_options          - Dictionary of extra arguments to be passed to the QM code doing the calculation.
+
+    Yields:
+        (molecule, method, basis, cp, use_cp, frag_indices, result, energy, log_text) for each calculation, in the
+        order they were claimed.
+    """
+
+    calculations = iter(calculations)
+
+    try:
+        running = collections.deque(executor.submit(calculate_energy_in_worker, calculation, qm_options)
+                                    for calculation in itertools.islice(calculations, 2 * num_workers))
+
+        while len(running) > 0:
+            result = running.popleft().result()
+
+            for calculation in itertools.islice(calculations, 1):
+                running.append(executor.submit(calculate_energy_in_worker, calculation, qm_options))
+
+            yield result
 
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
 
 def generate_inputs_from_database(settings_path, database_path):
     """
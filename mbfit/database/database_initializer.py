@@ -5,7 +5,8 @@ from mbfit.utils import SettingsReader, system
 # local module imports
 from .database import Database
 
-def initialize_database(settings_path, database_config_path, training_set_path, method, basis, cp, *tags, optimized = False):
+def initialize_database(settings_path, database_config_path, training_set_path, method, basis, cp, *tags, optimized = False,
+                        bulk = False):
     """
     Adds energies to be calculated to an existing database.
 
@@ -13,12 +14,15 @@ def initialize_database(settings_path, database_config_path, training_set_path,
         settings_path       - Local path to the ".ini" file with all relevant settings.
         database_config_path - .ini file containing host, port, database, username, and password.
                     Make sure only you have access to this file or your password will be compromised!
-        training_set_path      - Local path to the ".xyz" training set file.
+                    May also be an already open Database, which is used instead of opening a new one.
+        training_set_path      - Local path to the ".xyz" or ".npz" training set file.
         method              - QM method to use to calculate the energy of these configurations.
         basis               - QM basis to use to calculate the energy of these configurations.
         cp                  - Use counterpoise correction for these configurations?
         tags                - Label this calculation with these tags.
         optimized 			- Are these configurations optimized geometries? Default is False.
+        bulk                - If True, COPY the configurations into the database and add them with set-based
+                operations. Much faster for large training sets. Default is False.
 
     Returns:
         None.
@@ -29,9 +33,9 @@ def initialize_database(settings_path, database_config_path, training_set_path,
     molecules = parse_training_set_file(training_set_path, SettingsReader(settings_path))
 
 
-    with Database(database_config_path) as database:
+    with Database.open_session(database_config_path) as database:
         pre_pending = database.count_pending_calculations(*tags)
-        database.add_calculations(molecules, method, basis, cp, *tags, optimized = optimized)
+        database.add_calculations(molecules, method, basis, cp, *tags, optimized = optimized, bulk = bulk)
         post_pending = database.count_pending_calculations(*tags)
 
     system.format_print("Configurations added successfully! {} new calculations with tags {} to perform.".format(post_pending - pre_pending, tags), bold=True, color=system.Color.GREEN)
@@ -49,6 +49,9 @@ create unique index molecule_list_mol_hash_uindex
 create index molecule_list_mol_name_index
 	on molecule_list (mol_name);
 
+create index molecule_list_mol_name_mol_hash_index
+	on molecule_list (mol_name, mol_hash);
+
 create table atom_info
 (
 	atomic_symbol varchar not null
@@ -499,30 +502,36 @@ create function get_pending_calculations(molecule_name character varying, input_
 	language plpgsql
 as $$
 DECLARE
-    molecule_hash VARCHAR;
-    id INTEGER;
 
   BEGIN
 
-    FOR molecule_hash, model, indices, get_pending_calculations.use_cp IN SELECT pending_calculations.mol_hash, pending_calculations.model_name, pending_calculations.frag_indices, pending_calculations.use_cp FROM
-      pending_calculations INNER JOIN molecule_list ON pending_calculations.mol_hash = molecule_list.mol_hash
-      INNER JOIN tags ON pending_calculations.mol_hash = tags.mol_hash AND pending_calculations.model_name = tags.model_name WHERE
-      molecule_list.mol_name = molecule_name AND tags.tag_names && input_tags LIMIT batch_size
-    LOOP
-
-      INSERT INTO log_files(start_time, client_name) VALUES (clock_timestamp(), input_client_name) RETURNING log_id
-        INTO id;
-
-      UPDATE molecule_properties SET status='dispatched', most_recent_log_id=id WHERE mol_hash = molecule_hash AND model_name = model AND frag_indices = indices AND molecule_properties.use_cp = get_pending_calculations.use_cp;
-
-      DELETE FROM pending_calculations WHERE mol_hash = molecule_hash AND model_name = model AND frag_indices = indices AND pending_calculations.use_cp = get_pending_calculations.use_cp;
-
-      SELECT atom_coordinates, mol_name from molecule_list WHERE mol_hash = molecule_hash
-        INTO coords;
-
-      RETURN NEXT;
-
-    END LOOP;
+    -- Claim up to batch_size pending calculations in a single statement. Rows locked by other clients that are
+    -- claiming calculations at the same time are skipped, so concurrent clients always claim disjoint batches.
+    RETURN QUERY
+    WITH claimed AS (
+      DELETE FROM pending_calculations
+      WHERE pending_calculations.ctid IN (
+        SELECT pending_calculations.ctid FROM
+          pending_calculations INNER JOIN molecule_list ON pending_calculations.mol_hash = molecule_list.mol_hash
+          INNER JOIN tags ON pending_calculations.mol_hash = tags.mol_hash AND pending_calculations.model_name = tags.model_name WHERE
+          molecule_list.mol_name = molecule_name AND tags.tag_names && input_tags
+          LIMIT batch_size
+          FOR UPDATE OF pending_calculations SKIP LOCKED
+      )
+      RETURNING pending_calculations.mol_hash AS claimed_hash, pending_calculations.model_name AS claimed_model,
+        pending_calculations.frag_indices AS claimed_indices, pending_calculations.use_cp AS claimed_use_cp,
+        nextval(pg_get_serial_sequence('log_files', 'log_id'))::integer AS claimed_log_id
+    ), new_logs AS (
+      INSERT INTO log_files (log_id, start_time, client_name)
+        SELECT claimed.claimed_log_id, clock_timestamp(), input_client_name FROM claimed
+    ), dispatched AS (
+      UPDATE molecule_properties SET status='dispatched', most_recent_log_id=claimed.claimed_log_id
+        FROM claimed
+        WHERE molecule_properties.mol_hash = claimed.claimed_hash AND molecule_properties.model_name = claimed.claimed_model
+        AND molecule_properties.frag_indices = claimed.claimed_indices AND molecule_properties.use_cp = claimed.claimed_use_cp
+    )
+    SELECT molecule_list.atom_coordinates, claimed.claimed_model, claimed.claimed_indices, claimed.claimed_use_cp
+      FROM claimed INNER JOIN molecule_list ON claimed.claimed_hash = molecule_list.mol_hash;
 
   END;
 
@@ -944,7 +953,127 @@ DECLARE
 
 $$;
 
-create function get_1b_training_set(molecule_name character varying, model character varying, input_tags character varying[], batch_offset integer, batch_size integer) returns TABLE(coords double precision[], energy double precision)
+create function begin_bulk_add_calculations() returns void
+	security definer
+	SET search_path=public, pg_temp
+	language plpgsql
+as $$
+DECLARE
+
+  BEGIN
+    -- Staging table lives in the session's temp schema and disappears when the transaction commits.
+    CREATE TEMP TABLE IF NOT EXISTS calculation_staging
+    (
+      mol_hash varchar not null,
+      atom_coordinates double precision[] not null
+    ) ON COMMIT DROP;
+
+    TRUNCATE pg_temp.calculation_staging;
+
+    -- The table is owned by the definer of this function, so the calling user must be allowed to COPY into it.
+    EXECUTE format('GRANT INSERT ON pg_temp.calculation_staging TO %%I', session_user);
+  END;
+
+$$;
+
+create function bulk_add_calculations(molecule_name character varying, fragments fragment[], counts integer[], method character varying, basis character varying, cp boolean, input_tags character varying[], optimized boolean) returns integer
+	security definer
+	SET search_path=public, pg_temp
+	language plpgsql
+as $$
+DECLARE
+  model varchar;
+  all_frags INTEGER[];
+  i INTEGER;
+  x integer;
+  z integer;
+  new_configs INTEGER;
+  tag_name VARCHAR;
+  BEGIN
+
+    model := concat(method, '/', basis, '/');
+    IF cp THEN
+      model := concat(model, 'True');
+    ELSE
+      model := concat(model, 'False');
+    end if;
+
+    -- Check to Make sure the current user has write priveleges on all training sets for these geometries
+
+    FOREACH tag_name IN ARRAY input_tags
+    LOOP
+      IF NOT training_set_exists(tag_name)
+      THEN
+        -- If the training set does not exist, create it giving current user all privileges
+        INSERT INTO training_sets (admins, tag_name, read_users, write_users)
+            VALUES (ARRAY[get_user_id()], tag_name, ARRAY[get_user_id()], ARRAY[get_user_id()]);
+      ELSIF NOT has_write_privilege(tag_name)
+      THEN
+        -- If training set does exist and current user doesn't have write privileges, Error.
+        raise EXCEPTION 'User %% does not have write privileges on training set %%', session_user, tag_name;
+      END IF;
+    END LOOP;
+
+    PERFORM add_molecule_info(molecule_name, fragments, counts);
+    PERFORM add_model_info(method, basis, cp);
+
+    i = 0;
+    FOREACH x IN ARRAY counts LOOP
+      FOR z IN 1..x LOOP
+        all_frags := all_frags || i;
+        i := i + 1;
+      END LOOP;
+    END LOOP;
+
+    INSERT INTO molecule_list (mol_hash, mol_name, atom_coordinates)
+        SELECT DISTINCT ON (mol_hash) mol_hash, molecule_name, atom_coordinates FROM calculation_staging
+        ON CONFLICT (mol_hash) DO NOTHING;
+
+    -- configurations without any properties in this model are new, so give them an empty tag list
+    INSERT INTO tags (mol_hash, model_name, tag_names)
+        SELECT DISTINCT staging.mol_hash, model, '{}'::varchar[] FROM calculation_staging staging
+        WHERE NOT EXISTS(SELECT mol_hash FROM molecule_properties WHERE molecule_properties.mol_hash = staging.mol_hash AND model_name = model)
+        ON CONFLICT (mol_hash, model_name) DO NOTHING;
+
+    GET DIAGNOSTICS new_configs = ROW_COUNT;
+
+    -- the full n-mer is never counterpoise corrected, monomers are computed both with and without counterpoise
+    -- correction, and all other sub-clusters are counterpoise corrected only when cp is True.
+    WITH new_properties AS (
+      INSERT INTO molecule_properties (mol_hash, model_name, frag_indices, energies, atomic_charges, status, past_log_ids, use_cp)
+          SELECT new_hashes.mol_hash, model, jobs.indices, '{}', '{}', 'pending', '{}', jobs.cp_flag FROM
+          (SELECT DISTINCT staging.mol_hash FROM calculation_staging staging
+           WHERE NOT EXISTS(SELECT mol_hash FROM molecule_properties WHERE molecule_properties.mol_hash = staging.mol_hash AND model_name = model)) new_hashes
+          CROSS JOIN
+          (SELECT perm AS indices, unnest(CASE WHEN NOT cp OR l = array_length(all_frags, 1) THEN ARRAY[False]
+                                               WHEN l = 1 THEN ARRAY[True, False]
+                                               ELSE ARRAY[True] END) AS cp_flag
+           FROM combinations(all_frags)) jobs
+          RETURNING molecule_properties.mol_hash, molecule_properties.frag_indices, molecule_properties.use_cp
+    )
+    INSERT INTO pending_calculations (mol_hash, model_name, frag_indices, use_cp)
+        SELECT new_properties.mol_hash, model, new_properties.frag_indices, new_properties.use_cp FROM new_properties;
+
+    FOREACH tag_name IN ARRAY input_tags LOOP
+      UPDATE tags SET tag_names=(tag_name || tags.tag_names)
+          FROM (SELECT DISTINCT mol_hash FROM calculation_staging) staging
+          WHERE tags.mol_hash = staging.mol_hash AND tags.model_name = model AND NOT tag_name = ANY(tags.tag_names);
+    END LOOP;
+
+    IF optimized = True THEN
+      INSERT INTO optimized_geometries (mol_name, mol_hash, model_name)
+          SELECT DISTINCT molecule_name, staging.mol_hash, model FROM calculation_staging staging
+          WHERE NOT EXISTS(SELECT mol_hash FROM optimized_geometries WHERE mol_name = molecule_name AND optimized_geometries.mol_hash = staging.mol_hash AND model_name = model);
+    END IF;
+
+    TRUNCATE calculation_staging;
+
+    RETURN new_configs;
+  END;
+
+$$;
+
+create function get_1b_training_set(molecule_name character varying, model character varying, input_tags character varying[], last_hash character varying, batch_size integer) returns TABLE(config_hash character varying, coords double precision[], energy double precision)
 	security definer
 	SET search_path=public, pg_temp
 	language plpgsql
@@ -1017,43 +1146,31 @@ DECLARE
           RAISE EXCEPTION 'No optimized energy in database.';
         END IF;
 
-        FOR hash IN SELECT mol_hash FROM molecule_list WHERE mol_name = molecule_name OFFSET batch_offset LIMIT batch_size
+        -- page through the training set ordered by hash, starting after the last hash of the previous page
+        FOR hash IN SELECT molecule_list.mol_hash
+            FROM molecule_list INNER JOIN tags
+            ON molecule_list.mol_hash = tags.mol_hash
+            WHERE molecule_list.mol_name = molecule_name AND tags.model_name = model AND tags.tag_names && input_tags
+            AND molecule_list.mol_hash > last_hash
+            AND EXISTS(SELECT status FROM molecule_properties WHERE molecule_properties.mol_hash = molecule_list.mol_hash
+            AND molecule_properties.model_name = model AND frag_indices = '{0}' AND status = 'complete')
+            ORDER BY molecule_list.mol_hash
+            LIMIT batch_size
         LOOP
-          valid_tags := FALSE;
-
-
-          SELECT tag_names FROM tags WHERE mol_hash = hash AND model_name = model LIMIT 1
-            INTO mol_tags;
-
-          IF NOT mol_tags ISNULL THEN
-            FOREACH mol_tag IN ARRAY mol_tags
-            LOOP
-
-
-              IF (SELECT mol_tag = ANY(input_tags)) THEN
-                valid_tags := TRUE;
-              END IF;
-
-            END LOOP;
-
-            IF (SELECT valid_tags) THEN
-              SELECT * FROM molecule_properties WHERE mol_hash = hash AND model_name = model AND frag_indices = '{0}'
-                  INTO mol_properties;
-                IF mol_properties.status = 'complete' THEN
-                  SELECT atom_coordinates  FROM molecule_list WHERE mol_hash = hash
-                    INTO coords;
-                  energy := mol_properties.energies[1] - optimized_energy;
-                  RETURN NEXT;
-                END IF;
-            END IF;
-          end if;
+          SELECT * FROM molecule_properties WHERE mol_hash = hash AND model_name = model AND frag_indices = '{0}' AND status = 'complete'
+              INTO mol_properties;
+          SELECT atom_coordinates  FROM molecule_list WHERE mol_hash = hash
+            INTO coords;
+          config_hash := hash;
+          energy := mol_properties.energies[1] - optimized_energy;
+          RETURN NEXT;
 
         END LOOP;
       END;
 
 $$;
 
-create function get_2b_training_set(molecule_name character varying, monomer1_name character varying, monomer2_name character varying, model character varying, input_tags character varying[], batch_offset integer, batch_size integer) returns TABLE(coords double precision[], binding_energy double precision, interaction_energy double precision, monomer1_deformation_energy double precision, monomer2_deformation_energy double precision)
+create function get_2b_training_set(molecule_name character varying, monomer1_name character varying, monomer2_name character varying, model character varying, input_tags character varying[], last_hash character varying, batch_size integer) returns TABLE(config_hash character varying, coords double precision[], binding_energy double precision, interaction_energy double precision, monomer1_deformation_energy double precision, monomer2_deformation_energy double precision)
 	security definer
 	SET search_path=public, pg_temp
 	language plpgsql
@@ -1066,7 +1183,6 @@ DECLARE
         mol_tag VARCHAR;
         valid_tags BOOL;
         optimized_properties molecule_properties;
-        dimer_status VARCHAR;
         dimer_energies FLOAT[];
         monomer1_energies FLOAT[];
         monomer2_energies FLOAT[];
@@ -1173,71 +1289,58 @@ DECLARE
           RAISE EXCEPTION 'No monomer2 optimized energy in database.';
         END IF;
 
-        FOR hash IN SELECT mol_hash FROM molecule_list WHERE mol_name = molecule_name OFFSET batch_offset LIMIT batch_size
+        -- page through the training set ordered by hash, starting after the last hash of the previous page
+        FOR hash IN SELECT molecule_list.mol_hash
+            FROM molecule_list INNER JOIN tags
+            ON molecule_list.mol_hash = tags.mol_hash
+            WHERE molecule_list.mol_name = molecule_name AND tags.model_name = model AND tags.tag_names && input_tags
+            AND molecule_list.mol_hash > last_hash
+            AND EXISTS(SELECT status FROM molecule_properties WHERE molecule_properties.mol_hash = molecule_list.mol_hash
+            AND molecule_properties.model_name = model AND frag_indices = '{0, 1}' AND use_cp = False AND status = 'complete')
+            ORDER BY molecule_list.mol_hash
+            LIMIT batch_size
         LOOP
-          valid_tags := FALSE;
+          SELECT energies FROM molecule_properties WHERE mol_hash = hash AND model_name = model AND frag_indices = '{0, 1}' AND use_cp = False
+              INTO dimer_energies;
 
-          SELECT tag_names FROM tags WHERE mol_hash = hash AND model_name = model LIMIT 1
-            INTO mol_tags;
-
-          FOREACH mol_tag IN ARRAY mol_tags
-          LOOP
+          SELECT atom_coordinates  FROM molecule_list WHERE mol_hash = hash
+            INTO coords;
 
+          SELECT energies FROM molecule_properties WHERE mol_hash = hash AND model_name = model AND frag_indices = '{0}' AND use_cp = False
+            INTO monomer1_energies;
+          SELECT energies FROM molecule_properties WHERE mol_hash = hash AND model_name = model AND frag_indices = '{1}' AND use_cp = False
+            INTO monomer2_energies;
 
-            IF (SELECT mol_tag = ANY(input_tags)) THEN
-              valid_tags := TRUE;
-            END IF;
-
-          END LOOP;
-
+          IF substring(model, char_length(model) - 3, 4) = 'True' THEN
+            SELECT energies FROM molecule_properties WHERE mol_hash = hash AND model_name = model AND frag_indices = '{0}' AND use_cp = True
+              INTO monomer1_cp_energies;
+            SELECT energies FROM molecule_properties WHERE mol_hash = hash AND model_name = model AND frag_indices = '{1}' AND use_cp = True
+              INTO monomer2_cp_energies;
 
-          IF (SELECT valid_tags) THEN
-            SELECT energies, status FROM molecule_properties WHERE mol_hash = hash AND model_name = model AND frag_indices = '{0, 1}' AND use_cp = False
-                INTO dimer_energies, dimer_status;
-
-            IF dimer_status = 'complete' THEN
-              SELECT atom_coordinates  FROM molecule_list WHERE mol_hash = hash
-                INTO coords;
-
-              SELECT energies FROM molecule_properties WHERE mol_hash = hash AND model_name = model AND frag_indices = '{0}' AND use_cp = False
-                INTO monomer1_energies;
-              SELECT energies FROM molecule_properties WHERE mol_hash = hash AND model_name = model AND frag_indices = '{1}' AND use_cp = False
-                INTO monomer2_energies;
-
-              IF substring(model, char_length(model) - 3, 4) = 'True' THEN
-                SELECT energies FROM molecule_properties WHERE mol_hash = hash AND model_name = model AND frag_indices = '{0}' AND use_cp = True
-                  INTO monomer1_cp_energies;
-                SELECT energies FROM molecule_properties WHERE mol_hash = hash AND model_name = model AND frag_indices = '{1}' AND use_cp = True
-                  INTO monomer2_cp_energies;
-
-                interaction_energy := dimer_energies[1] - monomer1_cp_energies[1] - monomer2_cp_energies[1];
-              ELSE
-                interaction_energy := dimer_energies[1] - monomer1_energies[1] - monomer2_energies[1];
-              END IF;
+            interaction_energy := dimer_energies[1] - monomer1_cp_energies[1] - monomer2_cp_energies[1];
+          ELSE
+            interaction_energy := dimer_energies[1] - monomer1_energies[1] - monomer2_energies[1];
+          END IF;
 
-              monomer1_deformation_energy := monomer1_energies[1] - optimized_monomer1_energy;
-              monomer2_deformation_energy := monomer2_energies[1] - optimized_monomer2_energy;
-              binding_energy := interaction_energy + monomer1_deformation_energy + monomer2_deformation_energy;
+          monomer1_deformation_energy := monomer1_energies[1] - optimized_monomer1_energy;
+          monomer2_deformation_energy := monomer2_energies[1] - optimized_monomer2_energy;
+          binding_energy := interaction_energy + monomer1_deformation_energy + monomer2_deformation_energy;
 
-              RETURN NEXT;
-            END IF;
-          END IF;
+          config_hash := hash;
+          RETURN NEXT;
 
         END LOOP;
       END;
 
 $$;
 
-create function get_failed_configs(molecule_name character varying, model character varying, input_tags character varying[], batch_offset integer, batch_size integer) returns TABLE(coords double precision[], frags integer[], used_cp boolean)
+create function get_failed_configs(molecule_name character varying, model character varying, input_tags character varying[], last_hash character varying, batch_size integer) returns TABLE(config_hash character varying, coords double precision[], frags integer[], used_cp boolean)
 	security definer
 	SET search_path=public, pg_temp
 	language plpgsql
 as $$
 DECLARE
         hash VARCHAR;
-        mol_tags VARCHAR[];
-        mol_tag VARCHAR;
-        valid_tags BOOL;
         mol_properties molecule_properties;
         tag_name varchar;
       BEGIN
@@ -1258,35 +1361,25 @@ DECLARE
           END IF;
         END LOOP;
 
-        FOR hash IN SELECT mol_hash FROM molecule_list WHERE mol_name = molecule_name OFFSET batch_offset LIMIT batch_size
+        -- page through the failed configs ordered by hash, starting after the last hash of the previous page
+        FOR hash IN SELECT molecule_list.mol_hash
+            FROM molecule_list INNER JOIN tags
+            ON molecule_list.mol_hash = tags.mol_hash
+            WHERE molecule_list.mol_name = molecule_name AND tags.model_name = model AND tags.tag_names && input_tags
+            AND molecule_list.mol_hash > last_hash
+            AND EXISTS(SELECT status FROM molecule_properties WHERE molecule_properties.mol_hash = molecule_list.mol_hash
+            AND molecule_properties.model_name = model AND frag_indices = '{0}' AND status = 'failed')
+            ORDER BY molecule_list.mol_hash
+            LIMIT batch_size
         LOOP
-          valid_tags := FALSE;
-
-
-          SELECT tag_names FROM tags WHERE mol_hash = hash AND model_name = model LIMIT 1
-            INTO mol_tags;
-
-          FOREACH mol_tag IN ARRAY mol_tags
-          LOOP
-
-
-            IF (SELECT mol_tag = ANY(input_tags)) THEN
-              valid_tags := TRUE;
-            END IF;
-
-          END LOOP;
-
-          IF (SELECT valid_tags) THEN
-            SELECT * FROM molecule_properties WHERE mol_hash = hash AND model_name = model AND frag_indices = '{0}'
-                INTO mol_properties;
-              IF mol_properties.status = 'failed' THEN
-                SELECT atom_coordinates FROM molecule_list WHERE mol_hash = hash
-                  INTO coords;
-                frags := mol_properties.frag_indices;
-                used_cp = mol_properties.use_cp;
-                RETURN NEXT;
-              END IF;
-          END IF;
+          SELECT * FROM molecule_properties WHERE mol_hash = hash AND model_name = model AND frag_indices = '{0}' AND status = 'failed'
+              INTO mol_properties;
+          SELECT atom_coordinates FROM molecule_list WHERE mol_hash = hash
+            INTO coords;
+          config_hash := hash;
+          frags := mol_properties.frag_indices;
+          used_cp = mol_properties.use_cp;
+          RETURN NEXT;
 
         END LOOP;
       END;
@@ -1700,6 +1793,7 @@ DECLARE
         INNER JOIN tags
         ON pending_calculations.mol_hash = tags.mol_hash AND pending_calculations.model_name = tags.model_name
         WHERE tags.tag_names && input_tags LIMIT 1
+        FOR UPDATE OF pending_calculations SKIP LOCKED
     INTO hash;
 
     IF hash ISNULL
@@ -1717,6 +1811,29 @@ DECLARE
 
 $$;
 
+create function claim_pending_calculations(input_client_name character varying, input_tags character varying[], batch_size integer) returns TABLE(mol_name character varying, coords double precision[], model character varying, indices integer[], use_cp boolean)
+	security definer
+	SET search_path=public, pg_temp
+	language plpgsql
+as $$
+DECLARE
+  pending_name varchar;
+  BEGIN
+
+    -- Pick a molecule with pending calculations and claim up to batch_size of them, in one round trip.
+    pending_name := get_pending_molecule_name(input_tags);
+
+    IF pending_name = ''
+    THEN
+      RETURN;
+    END IF;
+
+    RETURN QUERY SELECT pending_name, pending.coords, pending.model, pending.indices, pending.use_cp
+      FROM get_pending_calculations(pending_name, input_client_name, input_tags, batch_size) AS pending;
+  END;
+
+$$;
+
 create function count_training_set_size(molecule_name character varying, model character varying, input_tags character varying[]) returns integer
 	security definer
 	SET search_path=public, pg_temp
@@ -1755,16 +1872,13 @@ DECLARE
 
 $$;
 
-create function export_calculations(molecule_name character varying, model character varying, input_tags character varying[], batch_offset integer, batch_size integer) returns TABLE(coords double precision[], energies double precision[])
+create function export_calculations(molecule_name character varying, model character varying, input_tags character varying[], last_hash character varying, batch_size integer) returns TABLE(config_hash character varying, coords double precision[], energies double precision[])
 	security definer
 	SET search_path=public, pg_temp
 	language plpgsql
 as $$
 DECLARE
         hash VARCHAR;
-        mol_tags VARCHAR[];
-        mol_tag VARCHAR;
-        valid_tags BOOL;
         mol_properties molecule_properties;
         tag_name varchar;
       BEGIN
@@ -1785,48 +1899,31 @@ DECLARE
           END IF;
         END LOOP;
 
-        <<main_loop>>
-        FOR hash IN SELECT mol_hash FROM molecule_list WHERE mol_name = molecule_name
-            ORDER BY mol_hash
-            OFFSET batch_offset LIMIT batch_size
+        -- page through the complete calculations ordered by hash, starting after the last hash of the previous page
+        FOR hash IN SELECT molecule_list.mol_hash
+            FROM molecule_list INNER JOIN tags
+            ON molecule_list.mol_hash = tags.mol_hash
+            WHERE molecule_list.mol_name = molecule_name AND tags.model_name = model AND tags.tag_names && input_tags
+            AND molecule_list.mol_hash > last_hash
+            AND 'complete'=ALL(SELECT status FROM molecule_properties WHERE molecule_properties.mol_hash = molecule_list.mol_hash AND molecule_properties.model_name
+            = model)
+            ORDER BY molecule_list.mol_hash
+            LIMIT batch_size
         LOOP
-          valid_tags := FALSE;
-
-
-          SELECT tag_names FROM tags WHERE mol_hash = hash AND model_name = model LIMIT 1
-            INTO mol_tags;
-
-          IF NOT mol_tags ISNULL THEN
-            FOREACH mol_tag IN ARRAY mol_tags
-            LOOP
-
-
-              IF (SELECT mol_tag = ANY(input_tags)) THEN
-                valid_tags := TRUE;
-              END IF;
-
-            END LOOP;
-
-            IF (SELECT valid_tags) THEN
-              energies = '{}';
-              for mol_properties IN SELECT * FROM molecule_properties
-                  WHERE mol_hash = hash AND model_name = model ORDER BY array_length(frag_indices, 1) ASC, frag_indices ASC, use_cp DESC
-              LOOP
-
-                IF mol_properties.status != 'complete' THEN
-                  CONTINUE main_loop;
-                end if;
+          energies = '{}';
+          for mol_properties IN SELECT * FROM molecule_properties
+              WHERE mol_hash = hash AND model_name = model ORDER BY array_length(frag_indices, 1) ASC, frag_indices ASC, use_cp DESC
+          LOOP
 
-                energies = energies || mol_properties.energies[1];
+            energies = energies || mol_properties.energies[1];
 
-              end loop;
+          end loop;
 
-              SELECT atom_coordinates  FROM molecule_list WHERE mol_hash = hash
-                    INTO coords;
+          SELECT atom_coordinates  FROM molecule_list WHERE mol_hash = hash
+                INTO coords;
 
-              RETURN NEXT;
-            END IF;
-          end if;
+          config_hash := hash;
+          RETURN NEXT;
 
         END LOOP;
       END;
@@ -1851,7 +1948,7 @@ DECLARE
 
 $$;
 
-create function get_training_set(molecule_name character varying, monomer_names character varying[], model character varying, input_tags character varying[], batch_offset integer, batch_size integer) returns TABLE(coords double precision[], binding_energy double precision, nb_energy double precision, deformation_energies double precision[])
+create function get_training_set(molecule_name character varying, monomer_names character varying[], model character varying, input_tags character varying[], last_hash character varying, batch_size integer) returns TABLE(config_hash character varying, coords double precision[], binding_energy double precision, nb_energy double precision, deformation_energies double precision[])
 	security definer
 	SET search_path=public, pg_temp
 	language plpgsql
@@ -1968,8 +2065,9 @@ DECLARE
             WHERE molecule_list.mol_name = molecule_name AND tags.model_name = model AND tags.tag_names && input_tags
             AND 'complete'=ALL(SELECT status FROM molecule_properties WHERE molecule_properties.mol_hash = molecule_list.mol_hash AND molecule_properties.model_name
             = model)
+            AND molecule_list.mol_hash > last_hash
             ORDER BY molecule_list.mol_hash
-            OFFSET batch_offset LIMIT batch_size
+            LIMIT batch_size
         LOOP
           -- Get the deformation energy for each monomer
           deformation_energies := '{}';
@@ -2043,6 +2141,7 @@ DECLARE
               WHERE mol_hash = hash
           INTO coords;
 
+          config_hash := hash;
           RETURN NEXT;
 
         END LOOP;
@@ -2109,3 +2208,83 @@ DECLARE
   END;
 
 $$;
+
+create function begin_bulk_set_properties() returns void
+	security definer
+	SET search_path=public, pg_temp
+	language plpgsql
+as $$
+DECLARE
+
+  BEGIN
+    -- Staging table lives in the session's temp schema and disappears when the transaction commits.
+    -- row_index keeps track of the order the results were submitted in.
+    CREATE TEMP TABLE IF NOT EXISTS properties_staging
+    (
+      row_index serial not null,
+      mol_hash varchar not null,
+      model_name varchar not null,
+      use_cp boolean not null,
+      frag_indices integer[] not null,
+      result boolean not null,
+      energy double precision,
+      log_text varchar
+    ) ON COMMIT DROP;
+
+    TRUNCATE pg_temp.properties_staging;
+
+    -- The table is owned by the definer of this function, so the calling user must be allowed to COPY into it.
+    EXECUTE format('GRANT INSERT ON pg_temp.properties_staging TO %%I', session_user);
+    EXECUTE format('GRANT USAGE ON SEQUENCE pg_temp.properties_staging_row_index_seq TO %%I', session_user);
+  END;
+
+$$;
+
+create function bulk_set_properties(overwrite boolean) returns integer
+	security definer
+	SET search_path=public, pg_temp
+	language plpgsql
+as $$
+DECLARE
+    num_set INTEGER;
+  BEGIN
+
+    IF EXISTS(SELECT status FROM properties_staging staging INNER JOIN molecule_properties
+        ON molecule_properties.mol_hash = staging.mol_hash AND molecule_properties.model_name = staging.model_name
+        AND molecule_properties.frag_indices = staging.frag_indices AND molecule_properties.use_cp = staging.use_cp
+        WHERE molecule_properties.status = 'pending') THEN
+      RAISE EXCEPTION 'Trying to set energy of calculation that does not have status = "dispatched" or status = "complete" or status = "failed"';
+    END IF;
+
+    -- If the same calculation is submitted more than once, the first result is kept, unless overwrite is True, in
+    -- which case the last result is kept.
+    WITH results AS (
+      SELECT DISTINCT ON (staging.mol_hash, staging.model_name, staging.frag_indices, staging.use_cp) * FROM properties_staging staging
+          ORDER BY staging.mol_hash, staging.model_name, staging.frag_indices, staging.use_cp,
+          CASE WHEN overwrite THEN -staging.row_index ELSE staging.row_index END
+    ), updated AS (
+      -- complete and failed calculations are only updated when overwrite is True, and start over with no energies.
+      UPDATE molecule_properties SET
+          energies = CASE WHEN results.result
+                     THEN results.energy || (CASE WHEN molecule_properties.status = 'dispatched' THEN molecule_properties.energies ELSE '{}' END)
+                     ELSE (CASE WHEN molecule_properties.status = 'dispatched' THEN molecule_properties.energies ELSE '{}' END) || results.energy END,
+          status = CASE WHEN results.result THEN 'complete'::status_enum ELSE 'failed'::status_enum END
+          FROM results
+          WHERE molecule_properties.mol_hash = results.mol_hash AND molecule_properties.model_name = results.model_name
+          AND molecule_properties.frag_indices = results.frag_indices AND molecule_properties.use_cp = results.use_cp
+          AND (molecule_properties.status = 'dispatched' OR (overwrite AND molecule_properties.status IN ('complete', 'failed')))
+          RETURNING molecule_properties.most_recent_log_id, results.log_text
+    ), logs AS (
+      UPDATE log_files SET end_time=clock_timestamp(), log_text=updated.log_text
+          FROM updated
+          WHERE log_files.log_id = updated.most_recent_log_id
+    )
+    SELECT COUNT(*) FROM updated
+      INTO num_set;
+
+    TRUNCATE properties_staging;
+
+    RETURN num_set;
+  END;
+
+$$;
@@ -30,6 +30,7 @@ class JobHandler(object):
         Args:
             database_config_path - .ini file containing host, port, database, username, and password.
                         Make sure only you have access to this file or your password will be compromised!
+                        May also be an already open Database, which is used instead of opening a new one.
             client_name         - Name of the client that will perform these jobs
             job_dir             - Local path to the directory to place the job files in.
             tags                - Onlt  make jobs for calculations marked with at least one of these tags.
@@ -46,7 +47,7 @@ class JobHandler(object):
         counter = 0
 
         # open the database
-        with Database(database_config_path) as database:
+        with Database.open_session(database_config_path, pool=True) as database:
 
             total_pending = database.count_pending_calculations(*tags)
             system.format_print(
@@ -79,13 +80,14 @@ class JobHandler(object):
         Args:
             database_config_path - .ini file containing host, port, database, username, and password.
                         Make sure only you have access to this file or your password will be compromised!
+                        May also be an already open Database, which is used instead of opening a new one.
             job_dir             - Local path the the directory to search.
 
         Returns:
             None.
         """
 
-        with Database(database_config_path) as db:
+        with Database.open_session(database_config_path, pool=True) as db:
             pre_num_dispatched = db.count_dispatched_calculations()
 
         system.format_print("Reading jobs from directory {} into database.".format(job_dir),
@@ -104,8 +106,8 @@ class JobHandler(object):
             calculation_results.append(self.read_job(directory + "/output.ini", directory + "/output.log"))
 
             if len(calculation_results) > 1000:
-                with Database(database_config_path) as db:
-                    db.set_properties(calculation_results, overwrite=overwrite)
+                with Database.open_session(database_config_path, pool=True) as db:
+                    db.set_properties(calculation_results, overwrite=overwrite, bulk=True)
                 calculation_results = []
 
             counter += 1
@@ -113,13 +115,13 @@ class JobHandler(object):
             if counter % 100 == 0:
                 system.format_print("Read {} jobs so far.".format(counter), italics=True)
 
-        with Database(database_config_path) as db:
-            db.set_properties(calculation_results, overwrite=overwrite)
+        with Database.open_session(database_config_path, pool=True) as db:
+            db.set_properties(calculation_results, overwrite=overwrite, bulk=True)
 
         system.format_print("Completed reading jobs. Read {} in total.".format(counter), bold=True,
                             color=system.Color.GREEN)
 
-        with Database(database_config_path) as db:
+        with Database.open_session(database_config_path, pool=True) as db:
             post_num_dispatched = db.count_dispatched_calculations()
 
         num_new = pre_num_dispatched - post_num_dispatched
@@ -0,0 +1,181 @@
+# external package imports
+import threading, queue
+
+# absolute module imports
+from mbfit.exceptions import InvalidValueError
+
+class ResultWriter(object):
+    """
+    Submits calculation results to a database from a background thread, so new calculations can run while the
+    results of earlier ones are being written.
+    """
+
+    def __init__(self, database, batch_size=None, max_queue_size=None):
+        """
+        Creates a new ResultWriter and starts its thread.
+
+        Args:
+            database        - The Database to write results to. No other thread may use it until this writer is
+                    closed.
+            batch_size      - Number of results to submit with each call to Database.set_properties(). Results are
+                    saved after each batch. Default is the batch size of database.
+            max_queue_size  - Maximum number of results waiting to be written, put() blocks while the queue is full.
+                    Default is four times batch_size.
+
+        Returns:
+            A new ResultWriter.
+        """
+
+        if batch_size is None:
+            batch_size = database.get_batch_size()
+
+        if batch_size < 1:
+            raise InvalidValueError("batch_size", batch_size, "must be at least 1")
+
+        if max_queue_size is None:
+            max_queue_size = 4 * batch_size
+
+        self.database = database
+        self.batch_size = batch_size
+
+        self.queue = queue.Queue(max_queue_size)
+
+        # exception raised in the writer thread, re-raised in the calling thread by put() and close()
+        self.error = None
+
+        self.num_written = 0
+
+        self.thread = threading.Thread(target=self.write_results, name="mbfit_result_writer", daemon=True)
+        self.thread.start()
+
+    # the __enter__() and __exit__() methods define a ResultWriter as a context manager, meaning you can use
+    # with ... as ... syntax on it
+
+    def __enter__(self):
+        """
+        Simply returns self. Called when entering the context manager.
+
+        Args:
+            None.
+
+        Returns:
+            self.
+        """
+
+        return self
+
+    def __exit__(self, exception, value, traceback):
+        """
+        Writes all remaining results and stops the writer thread. Called when exiting the context manager.
+        Results are written even if the block raised an exception, so they are not left dispatched.
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        """
+
+        try:
+            self.close()
+        except Exception:
+            # do not hide the exception that ended the with block
+            if exception is None:
+                raise
+
+        # returning false lets the context manager know that no exceptions were handled in the __exit__() method
+        return False
+
+    def put(self, calculation_result):
+        """
+        Queues a result to be written to the database.
+
+        Args:
+            calculation_result - (molecule, method, basis, cp, use_cp, frag_indices, result, energy, log_text), see
+                    Database.set_properties().
+
+        Returns:
+            None.
+        """
+
+        self.raise_error()
+
+        self.queue.put(calculation_result)
+
+    def close(self):
+        """
+        Writes all queued results to the database and stops the writer thread.
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        """
+
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+        self.raise_error()
+
+    def get_num_written(self):
+        """
+        Gets the number of results written to the database so far.
+
+        Args:
+            None.
+
+        Returns:
+            The number of results written.
+        """
+
+        return self.num_written
+
+    def raise_error(self):
+        """
+        Re-raises the exception that stopped the writer thread, if there was one.
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        """
+
+        if self.error is not None:
+            raise self.error
+
+    def write_results(self):
+        """
+        Body of the writer thread. Writes queued results in batches until None is queued.
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        """
+
+        calculation_results = []
+
+        while True:
+            calculation_result = self.queue.get()
+
+            if calculation_result is not None:
+                calculation_results.append(calculation_result)
+
+            if len(calculation_results) > 0 and (calculation_result is None or len(calculation_results) >= self.batch_size):
+                # once writing has failed, keep emptying the queue so put() never blocks forever.
+                if self.error is None:
+                    try:
+                        self.database.set_properties(calculation_results)
+                        self.database.save()
+                        self.num_written += len(calculation_results)
+                    except Exception as e:
+                        self.error = e
+
+                calculation_results = []
+
+            if calculation_result is None:
+                return
@@ -1,6 +1,7 @@
 import warnings
 # absolute module imports
 from mbfit.utils import constants, SettingsReader, files
+from mbfit.molecule import ConfigurationWriter
 from mbfit.exceptions import NoEnergiesError, NoOptimizedEnergyError, MultipleOptimizedEnergiesError, NoEnergyInRangeError
 
 # local module imports
@@ -18,6 +19,7 @@ def generate_1b_training_set(settings_path, database_config_path, training_set_p
         settings_path       - Local path to the ".ini" file with all relevent settings information.
         database_config_path - .ini file containing host, port, database, username, and password.
                     Make sure only you have access to this file or your password will be compromised!
+                    May also be an already open Database, which is used instead of opening a new one.
         training_set_path   - Local path to file to write training set to.
         molecule_name       - The name of the molecule to generate a training set for.
         method              - Use energies calculated with this method. Use % for any method.
@@ -40,7 +42,7 @@ def generate_1b_training_set(settings_path, database_config_path, training_set_p
     SMILES = settings.get("molecule", "SMILES").split(",")
     
     # open the database
-    with Database(database_config_path) as database:
+    with Database.open_session(database_config_path) as database:
 
         print("Creating a fitting input file from database into file {}".format(training_set_path))
 
@@ -81,6 +83,7 @@ def generate_2b_training_set(settings_path, database_config_path, training_set_p
         settings_path       - Local path to the ".ini" file with all relevent settings information.
         database_config_path - .ini file containing host, port, database, username, and password.
                     Make sure only you have access to this file or your password will be compromised!
+                    May also be an already open Database, which is used instead of opening a new one.
         training_set_path   - Local path to file to write training set to.
         molecule_name       - The name of this dimer.
         method              - Use energies calculated with this method. Use % for any method.
@@ -103,7 +106,7 @@ def generate_2b_training_set(settings_path, database_config_path, training_set_p
     SMILES = settings.get("molecule", "SMILES").split(",")
     
     # open the database
-    with Database(database_config_path) as database:
+    with Database.open_session(database_config_path) as database:
 
         print("Creating a fitting input file from database into file {}".format(training_set_path))
 
@@ -152,7 +155,9 @@ def generate_training_set(settings_path, database_config_path, training_set_path
         settings_path       - Local path to the ".ini" file with all relevent settings information.
         database_config_path - .ini file containing host, port, database, username, and password.
                     Make sure only you have access to this file or your password will be compromised!
-        training_set_path   - Local path to file to write training set to.
+                    May also be an already open Database, which is used instead of opening a new one.
+        training_set_path   - Local path to file to write training set to. Written as an ".npz" configuration file
+                if it ends in ".npz", with the same energies as the comment lines of an ".xyz" file.
         method              - Use energies calculated with this method. Use % for any method.
         basis               - Use energies calculated with this basis. Use % for any basis.
         cp                  - Use energies calculated with this cp. Use 0 for False, 1 for True, or % for any cp.
@@ -174,7 +179,7 @@ def generate_training_set(settings_path, database_config_path, training_set_path
     SMILES = settings.get("molecule", "SMILES").split(",")
 
     # open the database
-    with Database(database_config_path) as database:
+    with Database.open_session(database_config_path) as database:
 
         training_set_size = database.get_training_set_size(names, method, basis, cp, *tags)
         system.format_print("Creating a fitting input file from database into file {} with up to {} geometries.".format(training_set_path, training_set_size),
@@ -184,7 +189,15 @@ def generate_training_set(settings_path, database_config_path, training_set_path
         count_configs = 0
         filtered_configs = 0
 
-        with open(files.init_file(training_set_path, files.OverwriteMethod.get_from_settings(settings)), "w") as output:
+        # the energies written on the comment line of each configuration
+        if deprecated_fitcode and len(names) == 1:
+            energy_names = ["binding_energy"]
+        elif deprecated_fitcode and len(names) == 2:
+            energy_names = ["binding_energy", "nb_energy", "deformation_energy_1", "deformation_energy_2"]
+        else:
+            energy_names = ["binding_energy", "nb_energy"]
+
+        with ConfigurationWriter(files.init_file(training_set_path, files.OverwriteMethod.get_from_settings(settings)), energy_names) as output:
             for molecule, binding_energy, nb_energy, deformation_energies in database.get_training_set(names, SMILES, method, basis, cp, *tags):
 
                 binding_energy *= constants.au_to_kcal
@@ -201,23 +214,8 @@ def generate_training_set(settings_path, database_config_path, training_set_path
                     filtered_configs += 1
                     continue
 
-                # write the number of atoms to the output file
-                output.write(str(molecule.get_num_atoms()) + "\n")
-
-                if deprecated_fitcode:
-                    if molecule.get_num_fragments() == 1:
-                        output.write("{}".format(binding_energy))
-                    elif molecule.get_num_fragments() == 2:
-                        output.write("{} {} {} {}".format(binding_energy, nb_energy, deformation_energies[0], deformation_energies[1]))
-                    else:
-                        output.write("{} {}".format(binding_energy, nb_energy))
-                else:
-                    output.write("{} {}".format(binding_energy, nb_energy))
-
-                output.write("\n")
-
-                # write the molecule's atoms' coordinates to the xyz file
-                output.write(molecule.to_xyz() + "\n")
+                # write the molecule's atoms' coordinates with its energies on the comment line
+                output.write_molecule(molecule, [binding_energy, nb_energy, *deformation_energies][:len(energy_names)])
 
                 # increment the counter
                 count_configs += 1
@@ -7,6 +7,7 @@ from matplotlib import rcParams
 
 from mbfit.utils import system, files
 from mbfit.training_set import TrainingSet
+from mbfit.molecule import is_npz_file, npz_to_xyz
 
 class Evaluator:
 
@@ -22,8 +23,15 @@ class Evaluator:
         if correlation_file_path is None:
             correlation_file_path = files.init_file(os.path.join(self.settings.get("files", "log_path"), "eval.dat"))
 
+        # the eval executable can only read .xyz files
+        eval_file_path = training_set_file_path
+
+        if is_npz_file(training_set_file_path):
+            eval_file_path = files.init_file(os.path.join(self.settings.get("files", "log_path"), "eval.xyz"), files.OverwriteMethod.OVERWRITE)
+            npz_to_xyz(training_set_file_path, eval_file_path)
+
         with open(correlation_file_path, "w") as correlation_file:
-            system.call(self.path_to_eval_file, parameter_file_path, training_set_file_path, out_file=correlation_file)
+            system.call(self.path_to_eval_file, parameter_file_path, eval_file_path, out_file=correlation_file)
 
         with open(correlation_file_path, "r") as correlation_file:
 
@@ -111,6 +111,7 @@ def get_1b_dataset(file_path_MB, file_path_MB_params, database_config_path, name
         file_path_MB_params - The file path containing the list of MB parameters.
         database_config_path - .ini file containing host, port, database, username, and password.
                     Make sure only you have access to this file or your password will be compromised!
+                    May also be an already open Database, which is used instead of opening a new one.
         names         - List of name of the monomer.
         SMILES        - List of SMILE string of the monomer, the atoms in the training set will
                 be in this order.
@@ -121,7 +122,7 @@ def get_1b_dataset(file_path_MB, file_path_MB_params, database_config_path, name
     
     mb = []
 
-    with Database(database_config_path) as database:
+    with Database.open_session(database_config_path) as database:
 
         energy_molecule_pairs = list(database.get_training_set(names, SMILES, method, basis, cp, tag))
 
@@ -165,6 +166,7 @@ def get_2b_dataset(file_path_TTM, file_path_TTM_params, file_path_MB, file_path_
         file_path_MB_params - The file path containing the list of MB parameters.
         database_config_path - .ini file containing host, port, database, username, and password.
                     Make sure only you have access to this file or your password will be compromised!
+                    May also be an already open Database, which is used instead of opening a new one.
         names - names of the two monomers.
         SMILES - SMILE strings of the two monomers
         method - The specified basis for the calculations/fit.
@@ -175,7 +177,7 @@ def get_2b_dataset(file_path_TTM, file_path_TTM_params, file_path_MB, file_path_
     ttm = []
     mb = []
 
-    with Database(database_config_path) as database:
+    with Database.open_session(database_config_path) as database:
 
         energy_molecule_pairs = list(database.get_training_set(names, SMILES, method, basis, cp, tag))
 
@@ -229,6 +231,7 @@ def make_1b_graphs(settings_path, file_path_MB, file_path_MB_params, database_co
         file_path_MB_params - The file path containing the list of MB parameters.
         database_config_path - .ini file containing host, port, database, username, and password.
                     Make sure only you have access to this file or your password will be compromised!
+                    May also be an already open Database, which is used instead of opening a new one.
         method - The specified basis for the calculations/fit.
         cp - The specified cp for the calculations/fit.
         tag - A set of tags associated with the data during the calculations/fit.
@@ -261,6 +264,7 @@ def make_2b_graphs(settings_path, file_path_TTM, file_path_TTM_params, file_path
         file_path_MB_params - The file path containing the list of MB parameters.
         database_config_path - .ini file containing host, port, database, username, and password.
                     Make sure only you have access to this file or your password will be compromised!
+                    May also be an already open Database, which is used instead of opening a new one.
         monomer1_name - The name of the first monomer from which the calculations must be made.
         monomer2_name - The name of the second monomer from which the calculations must be made.
         method - The specified basis for the calculations/fit.
@@ -4,7 +4,7 @@ import os, sys, contextlib, glob
 # local module imports
 from .utils import SettingsReader, files, system
 from . import configurations, database, polynomials, fitting
-from .molecule import xyz_to_molecules
+from .molecule import xyz_to_molecules, is_npz_file, npz_to_xyz
 from mbfit.exceptions import InconsistentValueError
 
 
@@ -170,7 +170,7 @@ def generate_normal_mode_configurations(settings_path, opt_geo_path, normal_mode
 def generate_2b_configurations(settings_path, geo1_path, geo2_path, number_of_configs, configurations_path, 
         min_distance=1, max_distance=5, min_inter_distance=0.8, progression=False, use_grid=False,
         step_size=0.5, num_attempts=100, logarithmic=False, distribution=None,
-        mol1_atom_index=None, mol2_atom_index=None, seed=None):
+        mol1_atom_index=None, mol2_atom_index=None, seed=None, num_workers=1):
     """
     Generates 2b configurations for a given dimer by rotating them randomly over a distribution of
     distances.
@@ -209,6 +209,13 @@ def generate_2b_configurations(settings_path, geo1_path, geo2_path, number_of_co
         mol2_atom_index     - If specified, then the second molecule will be centered around the atom at this index
                 rather than its center of mass.
         seed                - The same seed will generate the same configurations.
+        num_workers         - Number of processes to generate the configurations in. A seed gives different
+                configurations in more than 1 process than in 1 process, but always the same ones for any number of
+                processes above 1. In more than 1 process, the configurations are generated in tasks of about 1000,
+                each over its own range of the distances, so they have the same distribution of distances as in 1
+                process. Configurations that cannot be placed at the distances of one task are not made up for at the
+                larger distances of the other tasks, as they are in 1 process, so fewer configurations may be
+                generated.
 
     Returns:
         None.
@@ -244,10 +251,13 @@ def generate_2b_configurations(settings_path, geo1_path, geo2_path, number_of_co
                                                                              configurations_path,
                                                                              config_generator,
                                                                              number_of_configs,
-                                                                             seed=seed)
+                                                                             seed=seed,
+                                                                             num_workers=num_workers)
+
 def generate_atom_distance_configurations(settings_path, geo1_path, geo2_path, number_of_configs, configurations_path,
         mol1_atom_index, mol2_atom_index, min_distance=1, max_distance=5, min_inter_distance=0.8, progression=False,
-        use_grid=False, step_size=0.5, num_attempts=100, logarithmic=False, distribution=None, seed=None):
+        use_grid=False, step_size=0.5, num_attempts=100, logarithmic=False, distribution=None, seed=None,
+        num_workers=1):
     """
     Generates 2b configurations for a given dimer by placing two atoms a certain distance apart and applying
     random rotations.
@@ -272,6 +282,13 @@ def generate_atom_distance_configurations(settings_path, geo1_path, geo2_path, n
                 be implemented over the domain [0,1]. So the first config will have distance =
                 distribution.get_value(0) and the last config will have distance = distribution.get_value(1).
         seed                - The same seed will generate the same configurations.
+        num_workers         - Number of processes to generate the configurations in. A seed gives different
+                configurations in more than 1 process than in 1 process, but always the same ones for any number of
+                processes above 1. In more than 1 process, the configurations are generated in tasks of about 1000,
+                each over its own range of the distances, so they have the same distribution of distances as in 1
+                process. Configurations that cannot be placed at the distances of one task are not made up for at the
+                larger distances of the other tasks, as they are in 1 process, so fewer configurations may be
+                generated.
 
     Returns:
         None.
@@ -291,10 +308,12 @@ def generate_atom_distance_configurations(settings_path, geo1_path, geo2_path, n
                                                                              configurations_path,
                                                                              config_generator,
                                                                              number_of_configs,
-                                                                             seed=seed)
+                                                                             seed=seed,
+                                                                             num_workers=num_workers)
 
 def generate_configurations(settings_path, number_of_configs, configurations_path, *geo_paths, radius=10,
-                            min_inter_distance=0.8, num_attempts=100, seed=None, logarithmic=False, distribution=None):
+                            min_inter_distance=0.8, num_attempts=100, seed=None, logarithmic=False, distribution=None,
+                            num_workers=1):
     """
     Generates a set of n body configurations by randomly placing monomer geometries in a sphere.
 
@@ -317,6 +336,11 @@ def generate_configurations(settings_path, number_of_configs, configurations_pat
                 is ignored and this distribution is used to choose the distances between configurations. Should
                 be implemented over the domain [0,1]. So the first config will have distance =
                 distribution.get_value(0) and the last config will have distance = distribution.get_value(1).
+        num_workers         - Number of processes to generate the configurations in. A seed gives different
+                configurations in more than 1 process than in 1 process, but always the same ones for any number of
+                processes above 1. In more than 1 process, the configurations are generated in tasks of 1000, and each
+                task samples the distance distribution on its own. The distances are random, so this does not change
+                their distribution.
 
     Returns:
         None
@@ -333,9 +357,11 @@ def generate_configurations(settings_path, number_of_configs, configurations_pat
                                                                              configurations_path,
                                                                              config_generator,
                                                                              number_of_configs,
-                                                                             seed=seed)
+                                                                             seed=seed,
+                                                                             num_workers=num_workers)
 
-def init_database(settings_path, database_config_path, configurations_path, method, basis, cp, *tags, optimized = False):
+def init_database(settings_path, database_config_path, configurations_path, method, basis, cp, *tags, optimized = False,
+                  bulk = False):
     """
     Creates a database from the given configuration .xyz files. Can be called on a new database
     to create a new database, or an existing database to add more energies to be calculated
@@ -344,21 +370,23 @@ def init_database(settings_path, database_config_path, configurations_path, meth
         settings_path       - Local path to the file containing all relevent settings information.
         database_config_path - .ini file containing host, port, database, username, and password.
                     Make sure only you have access to this file or your password will be compromised!
-        configurations_path - Local path to a single .xyz file.
+        configurations_path - Local path to a single .xyz or .npz file.
         method              - QM method to use to calculate the energy of these configurations.
         basis               - QM basis to use to calculate the energy of these configurations.
         cp                  - Use counterpoise correction for these configurations?
         tags                - Mark the new configurations with these tags.
         optimized           - Are these configurations optimized geometries? Defualt is False.
+        bulk                - If True, use the much faster bulk ingestion path of the database. Default is False.
 
     Returns:
         None.
     """
 
-    database.initialize_database(settings_path, database_config_path, configurations_path, method, basis, cp, *tags, optimized = optimized)
+    database.initialize_database(settings_path, database_config_path, configurations_path, method, basis, cp, *tags, optimized = optimized, bulk = bulk)
 
 
-def fill_database(settings_path, database_config_path, client_name, *tags, calculation_count = sys.maxsize, qm_options={}):
+def fill_database(settings_path, database_config_path, client_name, *tags, calculation_count = sys.maxsize, qm_options={},
+        num_workers = 1, threads_per_worker = None):
     """
     Goes through all the uncalculated energies in a database and calculates them. Will take a while. May be interrupted
     and restarted.
@@ -371,6 +399,9 @@ def fill_database(settings_path, database_config_path, client_name, *tags, calcu
         tags                - Only perform calculations marked with at least one of these tags.
         calculation_count   - Maximum number of calculations to perform. Unlimited if None.
         qm_options           - Dictionary of extra arguments to be passed to the QM code doing the calculation.
+        num_workers         - Number of calculations to run at the same time, each in its own process.
+        threads_per_worker  - Number of threads each calculation may use. Default is the num_threads
+                    setting of the QM code in the settings file.
 
     Returns:
         None.
@@ -379,7 +410,8 @@ def fill_database(settings_path, database_config_path, client_name, *tags, calcu
     if calculation_count is None:
         calculation_count = sys.maxsize
 
-    database.fill_database(settings_path, database_config_path, client_name, *tags, calculation_count=calculation_count, qm_options=qm_options)
+    database.fill_database(settings_path, database_config_path, client_name, *tags, calculation_count=calculation_count, qm_options=qm_options,
+            num_workers=num_workers, threads_per_worker=threads_per_worker)
 
 def make_jobs(settings_path, database_config_path, client_name, job_dir, *tags, num_jobs=sys.maxsize, qm_options={}):
     """
@@ -436,7 +468,8 @@ def generate_training_set(settings_path, database_config_path, training_set_path
         settings_path       - Local path to the ".ini" file with all relevent settings information.
         database_config_path - .ini file containing host, port, database, username, and password.
                     Make sure only you have access to this file or your password will be compromised!
-        training_set_path   - Local path to file to write training set to.
+        training_set_path   - Local path to file to write training set to. Written as an ".npz" configuration file
+                if it ends in ".npz".
         method              - Use energies calculated with this method. Use % for any method.
         basis               - Use energies calculated with this basis. Use % for any basis.
         cp                  - Use energies calculated with this cp. Use 0 for False, 1 for True, or % for any cp.
@@ -802,7 +835,8 @@ def prepare_fits(settings_path, fit_dir_path, training_set_path, fits_path, DE=2
     Args:
         settings_path       - Local path to the file containing all relevent settings information.
         fit_dir_path        - Local path to the directory containing the compiled fitcode.
-        training_set_path   - Local path to training set to use for all the fits.
+        training_set_path   - Local path to training set to use for all the fits. An ".npz" training set is converted
+                to an ".xyz" file in fits_path, since the fitcode can only read ".xyz" files.
         fits_path           - Local path to the directory to create the fits in.
         DE                  - Low DE places more weight on low energy training set items. 
                               Large DE places even weight on all training set items. Weights w_n are computed as
@@ -825,6 +859,11 @@ def prepare_fits(settings_path, fit_dir_path, training_set_path, fits_path, DE=2
     if not os.path.exists(fit_folder_prefix):
         os.mkdir(fit_folder_prefix)
 
+    if is_npz_file(training_set_path):
+        xyz_training_set_path = os.path.join(fit_folder_prefix, os.path.splitext(os.path.basename(training_set_path))[0] + ".xyz")
+        npz_to_xyz(training_set_path, xyz_training_set_path)
+        training_set_path = xyz_training_set_path
+
     if ttm:
         fit_executable_path = os.path.join(workdir, fit_dir_path, "bin/fit-{}b-ttm".format(nb))
     elif over_ttm:
@@ -1,4 +1,7 @@
 from .atom import Atom
 from .fragment import Fragment
 from .molecule import Molecule
-from .molecule_parser import xyz_to_molecules, parse_training_set_file
+from .molecule_batch import MoleculeBatch
+from .molecule_parser import xyz_to_molecules, parse_training_set_file, parse_training_set_chunks, read_training_set_indices, count_molecules
+from .configuration_file import ConfigurationWriter, is_npz_file, read_npz_file, write_npz_file, npz_to_xyz
+from .xyz_index import IndexedXYZFile, get_xyz_index
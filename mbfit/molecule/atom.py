@@ -1,10 +1,14 @@
 import math, numpy as np
-from mbfit.utils import constants
+from mbfit.utils import constants, periodic_table
+from mbfit.exceptions import InvalidValueError
 from mbfit.utils.math import test_difference_under_threshold
 
 class Atom(object):
     """
     Stores name, x, y, and z of a single atom
+
+    The position is stored in the numpy array xyz. Once this atom is part of a Fragment, xyz is a view into a row of
+    the coordinate array of that Fragment, so whole fragments and molecules can be moved with numpy operations.
     """
 
     def __init__(self, name, symmetry_class, x, y, z):
@@ -23,6 +27,16 @@ class Atom(object):
 
         self.name = name
         self.symmetry_class = symmetry_class
+
+        # the atomic number is looked up once, and used to look up the other properties of this atom. It is None if
+        # name is not an atomic symbol, then the getters of those properties raise an error.
+        try:
+            self.atomic_number = periodic_table.get_atomic_number(name)
+        except InvalidValueError:
+            self.atomic_number = None
+
+        # position of this atom, see set_coordinate_view()
+        self.xyz = np.zeros(3)
         self.set_xyz(x, y, z)
 
     def get_name(self):
@@ -75,7 +89,10 @@ class Atom(object):
             The atomic number of this atom
         """
 
-        return constants.symbol_to_number(self.name)
+        if self.atomic_number is None:
+            return constants.symbol_to_number(self.name)
+
+        return self.atomic_number
 
     def get_mass(self):
         """
@@ -88,7 +105,7 @@ class Atom(object):
             The atomic mass of this atom in g/mol
         """
 
-        return constants.symbol_to_mass(self.name)
+        return float(periodic_table.masses[self.get_atomic_number()])
 
     def get_radius(self):
         """
@@ -101,7 +118,7 @@ class Atom(object):
             The atomic radius of this atom
         """
 
-        return constants.symbol_to_radius(self.name)
+        return float(periodic_table.radii[self.get_atomic_number()])
 
     def get_covalent_radius(self):
         """
@@ -114,7 +131,7 @@ class Atom(object):
             The covalent radius of this atom
         """
 
-        return constants.symbol_to_covalent_radius(self.name)
+        return float(periodic_table.covalent_radii[self.get_atomic_number()])
 
     def get_vdw_radius(self):
         """
@@ -126,7 +143,7 @@ class Atom(object):
         Returns:
             The vanderwalls radius of this atom
         """
-        return constants.symbol_to_vdw_radius(self.name)
+        return float(periodic_table.get_vdw_radii(self.get_atomic_number()))
 
     def get_base_priority(self):
         """
@@ -140,7 +157,7 @@ class Atom(object):
             The priority of this atom.
         """
 
-        return constants.symbol_to_number(self.name)
+        return self.get_atomic_number()
 
 
     def get_x(self):
@@ -154,7 +171,7 @@ class Atom(object):
             The x position of this atom in angstroms
         """
 
-        return self.x
+        return float(self.xyz[0])
 
     def get_y(self):
         """
@@ -167,7 +184,7 @@ class Atom(object):
             The y position of this atom in angstroms
         """
 
-        return self.y
+        return float(self.xyz[1])
 
     def get_z(self):
         """
@@ -180,7 +197,7 @@ class Atom(object):
             The z position of this atom in angstroms
         """
 
-        return self.z
+        return float(self.xyz[2])
 
     def set_x(self, x):
         """
@@ -195,7 +212,7 @@ class Atom(object):
 
         if x == -0.0:
             x = 0.0
-        self.x = x
+        self.xyz[0] = x
 
     def set_y(self, y):
         """
@@ -210,7 +227,7 @@ class Atom(object):
 
         if y == -0.0:
             y = 0.0
-        self.y = y
+        self.xyz[1] = y
 
     def set_z(self, z):
         """
@@ -225,7 +242,7 @@ class Atom(object):
 
         if z == -0.0:
             z = 0.0
-        self.z = z
+        self.xyz[2] = z
 
     def set_xyz(self, x, y, z):
         """
@@ -257,9 +274,23 @@ class Atom(object):
             None
         """
 
-        self.x += x
-        self.y += y
-        self.z += z
+        self.xyz += (x, y, z)
+
+    def set_coordinate_view(self, xyz):
+        """
+        Moves the position of this atom into the given array, which is then used to store it.
+
+        Used by Fragment to make its atoms views into its coordinate array.
+
+        Args:
+            xyz - numpy array of length 3 to store the position of this atom in.
+
+        Returns:
+            None
+        """
+
+        xyz[:] = self.xyz
+        self.xyz = xyz
 
     def rotate(self, quaternion, origin_x = 0, origin_y = 0, origin_z = 0):
         """
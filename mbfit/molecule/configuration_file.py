@@ -0,0 +1,339 @@
+import struct, zipfile
+import numpy
+
+from mbfit.exceptions import InvalidValueError, InconsistentValueError
+from .molecule import Molecule
+from .molecule_batch import MoleculeBatch
+
+# version of the layout of the arrays in an ".npz" configuration file, increased whenever it changes
+NPZ_FORMAT_VERSION = 1
+
+def is_npz_file(file_path):
+    """
+    Checks if a file should be read and written as an ".npz" configuration file rather than an ".xyz" file.
+
+    Args:
+        file_path       - Local path to the file.
+
+    Returns:
+        True if the file path ends in ".npz", False otherwise.
+    """
+
+    return str(file_path).lower().endswith(".npz")
+
+def get_template(symbols, atoms_per_fragment, name_per_fragment, charge_per_fragment, spin_per_fragment, symmetry_per_fragment, SMILE_per_fragment):
+    """
+    Creates a template Molecule for a MoleculeBatch from its atomic symbols and the information about each fragment.
+
+    Args:
+        symbols         - List of the atomic symbols of every atom in the molecule, in order.
+        atoms_per_fragment - List containing the number of atoms in each fragment.
+        name_per_fragment - List containing the names of each fragment.
+        charge_per_fragment - List containing the charges of each fragment.
+        spin_per_fragment - List containing the spin multiplicities of each fragment.
+        symmetry_per_fragment - List containing the symmetries of each fragment, in format A1B2.
+        SMILE_per_fragment - List containing the SMILE strings of each fragment.
+
+    Returns:
+        A new Molecule with every atom at the origin.
+    """
+
+    if sum(atoms_per_fragment) != len(symbols):
+        raise InconsistentValueError("total atoms in configuration file", "fragments", len(symbols), atoms_per_fragment, "fragments list must sum to total atoms in the configuration file")
+
+    xyz = "{}\n\n".format(len(symbols)) + "\n".join("{} 0 0 0".format(symbol) for symbol in symbols)
+
+    return Molecule.read_xyz(xyz, atoms_per_fragment, name_per_fragment, charge_per_fragment, spin_per_fragment, symmetry_per_fragment, SMILE_per_fragment)
+
+def write_npz_file(file_path, batch, energies = None, energy_names = ()):
+    """
+    Writes configurations and their energies to an ".npz" configuration file.
+
+    The file is an uncompressed numpy ".npz" archive holding the information about each fragment, the atomic symbols, a
+    (num_configs, num_atoms, 3) array of coordinates and a (num_configs, num_energies) array of energies, with one
+    named column per energy. Being uncompressed, the coordinates and energies can be memory mapped when the file is read.
+
+    Args:
+        file_path       - Local path to the ".npz" file to write.
+        batch           - MoleculeBatch of the configurations to write.
+        energies        - (num_configs, num_energies) array-like of the energies of each configuration, or None if
+                there are no energies.
+        energy_names    - List of the name of each column of energies.
+
+    Returns:
+        None.
+    """
+
+    energy_names = list(energy_names)
+
+    if energies is None:
+        energies = numpy.zeros((len(batch), len(energy_names)))
+
+    energies = numpy.asarray(energies, dtype=float)
+
+    if energies.shape != (len(batch), len(energy_names)):
+        raise InconsistentValueError("shape of energies", "number of configurations and energy names", energies.shape, (len(batch), len(energy_names)), "there must be one energy per name for each configuration.")
+
+    fragments = batch.get_template().get_fragments()
+
+    with open(file_path, "wb") as npz_file:
+        numpy.savez(npz_file,
+                    format_version=numpy.array(NPZ_FORMAT_VERSION),
+                    fragments=numpy.array([fragment.get_num_atoms() for fragment in fragments], dtype=int),
+                    names=numpy.array([fragment.get_name() for fragment in fragments], dtype=str),
+                    charges=numpy.array([fragment.get_charge() for fragment in fragments], dtype=int),
+                    spins=numpy.array([fragment.get_spin_multiplicity() for fragment in fragments], dtype=int),
+                    symmetry=numpy.array([fragment.get_symmetry() for fragment in fragments], dtype=str),
+                    SMILES=numpy.array([fragment.get_SMILE() for fragment in fragments], dtype=str),
+                    symbols=numpy.array(batch.get_symbols(), dtype=str),
+                    coordinates=batch.get_coordinates(),
+                    energy_names=numpy.array(energy_names, dtype=str).reshape(len(energy_names)),
+                    energies=energies)
+
+def get_npz_memmap(file_path, array_name):
+    """
+    Memory maps one array in an uncompressed ".npz" file, so only the parts of it that are used are read from disk.
+
+    numpy.load() can only memory map ".npy" files, but the arrays in an uncompressed ".npz" file are ".npy" files
+    stored as is in a zip archive, so they can be mapped once their position in the archive is known.
+
+    Args:
+        file_path       - Local path to the ".npz" file.
+        array_name      - The name of the array in the file.
+
+    Returns:
+        Copy-on-write numpy.memmap of the array, changing it does not change the file. An ordinary numpy array if the
+        array is compressed or empty and cannot be memory mapped.
+    """
+
+    with zipfile.ZipFile(file_path) as npz_zip:
+        info = npz_zip.getinfo(array_name + ".npy")
+
+        if info.compress_type != zipfile.ZIP_STORED:
+            with npz_zip.open(info) as npy_file:
+                return numpy.lib.format.read_array(npy_file)
+
+    with open(file_path, "rb") as npz_file:
+        # the stored data follows the 30 byte local header of the entry, its file name and its extra field
+        npz_file.seek(info.header_offset)
+        local_header = npz_file.read(30)
+        name_length, extra_length = struct.unpack("<HH", local_header[26:30])
+        npz_file.seek(info.header_offset + 30 + name_length + extra_length)
+
+        version = numpy.lib.format.read_magic(npz_file)
+
+        if version == (1, 0):
+            shape, fortran_order, dtype = numpy.lib.format.read_array_header_1_0(npz_file)
+        else:
+            shape, fortran_order, dtype = numpy.lib.format.read_array_header_2_0(npz_file)
+
+        offset = npz_file.tell()
+
+    if numpy.prod(shape) == 0:
+        return numpy.zeros(shape, dtype=dtype)
+
+    return numpy.memmap(file_path, dtype=dtype, mode="c", shape=shape, order="F" if fortran_order else "C", offset=offset)
+
+def read_npz_file(file_path, mmap = True):
+    """
+    Reads the configurations and energies in an ".npz" configuration file, see write_npz_file().
+
+    Args:
+        file_path       - Local path to the ".npz" file to read.
+        mmap            - If True, the coordinates and energies are memory mapped, so reading the file is nearly
+                instant and only the configurations that are used are read from disk. Otherwise, they are read into
+                memory.
+
+    Returns:
+        (batch, energies, energy_names) where batch is a MoleculeBatch of the configurations, energies is a
+        (num_configs, num_energies) numpy array and energy_names is the list of the name of each column of energies.
+    """
+
+    with numpy.load(file_path) as npz:
+        if "format_version" not in npz.files or int(npz["format_version"]) > NPZ_FORMAT_VERSION:
+            raise InvalidValueError("configuration file", file_path, "must be an .npz file written by write_npz_file() with format version at most {}".format(NPZ_FORMAT_VERSION))
+
+        template = get_template(npz["symbols"].tolist(), npz["fragments"].tolist(), npz["names"].tolist(),
+                                npz["charges"].tolist(), npz["spins"].tolist(), npz["symmetry"].tolist(),
+                                npz["SMILES"].tolist())
+
+        energy_names = npz["energy_names"].tolist()
+
+        if not mmap:
+            return MoleculeBatch(template, npz["coordinates"]), npz["energies"], energy_names
+
+    return MoleculeBatch(template, get_npz_memmap(file_path, "coordinates")), get_npz_memmap(file_path, "energies"), energy_names
+
+def npz_to_xyz(npz_path, xyz_path, chunk_size = 10000):
+    """
+    Converts an ".npz" configuration file into an ".xyz" file, for programs that can only read ".xyz" files, such as
+    the fitting code.
+
+    Args:
+        npz_path        - Local path to the ".npz" file to read.
+        xyz_path        - Local path to the ".xyz" file to write.
+        chunk_size      - Number of configurations to convert at a time.
+
+    Returns:
+        None.
+    """
+
+    batch, energies, energy_names = read_npz_file(npz_path)
+
+    with open(xyz_path, "w") as xyz_file:
+        for start in range(0, len(batch), chunk_size):
+            for config_energies, xyz in zip(energies[start:start + chunk_size].tolist(), batch[start:start + chunk_size].to_xyz()):
+                xyz_file.write("{}\n{}\n{}\n".format(batch.get_num_atoms(), " ".join(str(energy) for energy in config_energies), xyz))
+
+class ConfigurationWriter(object):
+    """
+    Writes configurations one at a time or in batches to either an ".xyz" file or an ".npz" configuration file,
+    depending on the extension of the file path.
+
+    Configurations written to an ".npz" file are kept in memory until the writer is closed, since the whole
+    coordinate array is written at once.
+    """
+
+    def __init__(self, file_path, energy_names = ()):
+        """
+        Creates a new ConfigurationWriter and opens its file.
+
+        Args:
+            file_path       - Local path to the ".xyz" or ".npz" file to write.
+            energy_names    - List of the name of each energy written with every configuration.
+
+        Returns:
+            A new ConfigurationWriter.
+        """
+
+        self.file_path = file_path
+        self.energy_names = list(energy_names)
+
+        self.template = None
+        self.configs = []
+        self.energies = []
+
+        self.xyz_file = None if is_npz_file(file_path) else open(file_path, "w")
+
+    def write_molecule(self, molecule, energies = (), comment = None):
+        """
+        Writes one configuration.
+
+        Args:
+            molecule        - The Molecule to write. Every molecule written to an ".npz" file must have the same
+                    fragments and atoms in the same order.
+            energies        - List of the energies of this configuration, one per energy name.
+            comment         - Comment line of this configuration in an ".xyz" file. If None, the energies separated by
+                    spaces. Not written to an ".npz" file.
+
+        Returns:
+            None.
+        """
+
+        if len(energies) != len(self.energy_names):
+            raise InconsistentValueError("energies", "energy names", energies, self.energy_names, "there must be one energy per name for each configuration.")
+
+        if self.xyz_file is not None:
+            if comment is None:
+                comment = " ".join(str(energy) for energy in energies)
+
+            self.xyz_file.write("{}\n{}\n{}\n".format(molecule.get_num_atoms(), comment, molecule.to_xyz()))
+            return
+
+        self.check_template(molecule)
+
+        # the coordinate array of the molecule moves with it, so a copy is kept
+        self.configs.append(numpy.array(molecule.get_coordinate_array()[numpy.newaxis]))
+        self.energies.append([list(energies)])
+
+    def write_batch(self, batch, energies = None, comments = None):
+        """
+        Writes many configurations at once.
+
+        The configurations are formatted in bulk by MoleculeBatch.to_xyz(), so the ".xyz" file is the same as if each
+        configuration were written by write_molecule().
+
+        Args:
+            batch           - MoleculeBatch of the configurations to write. Every batch written to an ".npz" file must
+                    have the same fragments and atoms in the same order.
+            energies        - (num_configs, num_energies) array-like of the energies of each configuration, one column
+                    per energy name. May be None if there are no energy names.
+            comments        - Iterable of the comment line of each configuration in an ".xyz" file. If None, the
+                    energies of each configuration separated by spaces. Not written to an ".npz" file.
+
+        Returns:
+            None.
+        """
+
+        if energies is None:
+            energies = numpy.zeros((len(batch), 0))
+
+        energies = numpy.asarray(energies, dtype=float)
+
+        if energies.shape != (len(batch), len(self.energy_names)):
+            raise InconsistentValueError("shape of energies", "number of configurations and energy names", energies.shape, (len(batch), len(self.energy_names)), "there must be one energy per name for each configuration.")
+
+        if self.xyz_file is not None:
+            if comments is None:
+                comments = (" ".join(str(energy) for energy in config_energies) for config_energies in energies.tolist())
+
+            self.xyz_file.write("".join("{}\n{}\n{}\n".format(batch.get_num_atoms(), comment, xyz)
+                                        for comment, xyz in zip(comments, batch.to_xyz())))
+            return
+
+        self.check_template(batch.get_template())
+
+        self.configs.append(numpy.array(batch.get_coordinates()))
+        self.energies.append(energies)
+
+    def check_template(self, molecule):
+        """
+        Checks that a configuration written to an ".npz" file has the same fragments and atoms as the first one
+        written, which is kept as the template of the file.
+
+        Args:
+            molecule        - Molecule with the fragments and atoms of the configuration.
+
+        Returns:
+            None.
+        """
+
+        if self.template is None:
+            self.template = molecule.get_copy_with_coordinates(molecule.get_coordinate_array())
+
+        elif molecule.get_symbols() != self.template.get_symbols() or molecule.get_symmetry() != self.template.get_symmetry():
+            raise InconsistentValueError("first molecule", "molecule {}".format(sum(len(configs) for configs in self.configs)),
+                                         self.template.get_name() + " " + self.template.get_symmetry(),
+                                         molecule.get_name() + " " + molecule.get_symmetry(),
+                                         "all molecules in an .npz file must have the same fragments and atoms in the same order.")
+
+    def close(self):
+        """
+        Finishes writing the file. Nothing is written to an ".npz" file until it is closed.
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        """
+
+        if self.xyz_file is not None:
+            self.xyz_file.close()
+            return
+
+        if self.template is None:
+            raise InvalidValueError("configurations", "[]", "an .npz file must contain at least one configuration")
+
+        write_npz_file(self.file_path, MoleculeBatch(self.template, numpy.concatenate(self.configs)),
+                       numpy.concatenate([numpy.asarray(energies, dtype=float).reshape(len(configs), len(self.energy_names))
+                                          for configs, energies in zip(self.configs, self.energies)]),
+                       self.energy_names)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        # do not write a partial .npz file if an error stopped the writing
+        if exception_type is None or self.xyz_file is not None:
+            self.close()
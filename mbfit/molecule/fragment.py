@@ -1,19 +1,27 @@
 import numpy
 import itertools
+import copy
 import collections
 import functools
 
 from .atom import Atom
 
 from mbfit.exceptions import InvalidValueError, InconsistentValueError, XYZFormatError
+from mbfit.utils import periodic_table
 
 # absolute package imports
 from mbfit.polynomials.molecule_in_parser import FragmentParser
+from mbfit.utils import LRUCache
 
 class Fragment(object):
     """
     Stores name, charge, spin multiplicity, and atoms of a fragment
     """
+
+    # SMILE string -> (atomic symbols, connectivity matrix), see get_parsed_SMILE()
+    SMILE_cache = LRUCache(max_size=4096)
+    # (SMILE string, symmetry) -> (standard order, priority ranks), see get_canonical_order()
+    standard_order_cache = LRUCache(max_size=4096)
     
     def __init__(self, atoms, name, charge, spin_multiplicity, SMILE):
         """
@@ -34,15 +42,24 @@ class Fragment(object):
 
         # Array of atoms in this molecule
 
-        atomic_symbols, self.connectivity_matrix, loose_bonds = self.parse_SMILE(SMILE)
+        # SMILE string this fragment was created with
+        self.SMILE = SMILE
 
-        if loose_bonds != []:
-            raise InvalidValueError("SMILE string", SMILE, "All numbered bonds must be closed.")
+        atomic_symbols, self.connectivity_matrix = self.get_parsed_SMILE(SMILE)
 
         self.atoms = []
         for atom in atoms:
             self.add_atom(atom)
 
+        # (num_atoms, 3) array of the positions of the atoms in this fragment, see get_coordinate_array()
+        self.coordinates = None
+        # the row of coordinates each atom stores its position in
+        self.atom_coordinates = []
+        # atomic numbers, masses and atomic symbols of the atoms in this fragment, filled in along with coordinates
+        self.atomic_numbers = None
+        self.masses = None
+        self.symbols = None
+
         if len(atomic_symbols) != len(self.atoms):
             raise InconsistentValueError("Number of atoms", "SMILE string", len(self.atoms), SMILE, "SMILE string must have exactly one atomic symbol per atom in the Fragment.")
 
@@ -58,6 +75,34 @@ class Fragment(object):
             raise InvalidValueError("spin multiplicity", spin_multiplicity, "1 or greater")
         self.spin_multiplicity = spin_multiplicity
 
+    def get_parsed_SMILE(self, SMILE):
+        """
+        Gets the atomic symbols and connectivity matrix of a SMILE string.
+
+        Parsed SMILE strings are stored in SMILE_cache, which is shared by every fragment in this process, so each
+        SMILE string is only parsed once.
+
+        Args:
+            SMILE           - The SMILE string to parse.
+
+        Returns:
+            (atomic symbols, connectivity matrix) as tuples, which must not be modified.
+        """
+
+        parsed_SMILE = Fragment.SMILE_cache.get(SMILE)
+
+        if parsed_SMILE is None:
+            atomic_symbols, connectivity_matrix, loose_bonds = self.parse_SMILE(SMILE)
+
+            if loose_bonds != []:
+                raise InvalidValueError("SMILE string", SMILE, "All numbered bonds must be closed.")
+
+            parsed_SMILE = (tuple(atomic_symbols), tuple(tuple(row) for row in connectivity_matrix))
+
+            Fragment.SMILE_cache.put(SMILE, parsed_SMILE)
+
+        return parsed_SMILE
+
     def parse_SMILE(self, SMILE):
 
         if len(SMILE) == 0:
@@ -281,13 +326,15 @@ class Fragment(object):
         if len(self.get_atoms()) == 0:
             return ""
 
+        standard_order = self.get_standard_order()
+
         # used to build the symmetry string
-        symmetry = self.get_standard_order()[0].get_symmetry_class()
+        symmetry = standard_order[0].get_symmetry_class()
 
         # used to count how many atoms there are of the current symmetry
         symmetric_atom_count = 1
 
-        for atom in self.get_standard_order()[1:]:
+        for atom in standard_order[1:]:
 
             # if this atom has a different symmetry than the one before it
             if atom.get_symmetry_class() != symmetry[-1]:
@@ -316,7 +363,7 @@ class Fragment(object):
 
         index_to_bond_dict = {}
 
-        connectivity_matrix = self.get_connectivity_matrix()
+        connectivity_matrix = self.connectivity_matrix
 
         for this_index, this_atom in enumerate(self.get_atoms()):
             SMILE += "[" + this_atom.get_name() + "]"
@@ -354,18 +401,20 @@ class Fragment(object):
 
         connectivity_matrix = self.get_standard_connectivity_matrix()
 
-        for this_index, this_atom in enumerate(self.get_standard_order()):
+        standard_order = self.get_standard_order()
+
+        for this_index, this_atom in enumerate(standard_order):
             SMILE += "[" + this_atom.get_name() + "]"
 
             if this_index != 0:
-                for other_index, other_atom in list(enumerate(self.get_standard_order()))[:this_index - 1]:
+                for other_index, other_atom in list(enumerate(standard_order))[:this_index - 1]:
                     # check if any previously reserved bonds are completed.
                     if connectivity_matrix[this_index][other_index]:
                         bond_num = index_to_bond_dict[other_index][0]
                         index_to_bond_dict[other_index] = index_to_bond_dict[other_index][1:]
                         SMILE += "%" + str(bond_num)
 
-            for other_index, other_atom in list(enumerate(self.get_standard_order()))[this_index + 2:]:
+            for other_index, other_atom in list(enumerate(standard_order))[this_index + 2:]:
                 # check if any new bonds must be reserved
                 if connectivity_matrix[this_index][other_index]:
                     try:
@@ -375,7 +424,7 @@ class Fragment(object):
                     SMILE += "%" + str(next_bond)
                     next_bond += 1
 
-            if this_index < (len(self.get_standard_order()) - 1):
+            if this_index < (len(standard_order) - 1):
                 if not connectivity_matrix[this_index][this_index + 1]:
                     SMILE += "."
 
@@ -420,6 +469,118 @@ class Fragment(object):
 
         return len(self.atoms)
 
+    def has_current_coordinates(self):
+        """
+        Checks whether every atom in this fragment stores its position in the coordinate array of this fragment.
+
+        This stops being the case when atoms are added to this fragment or when one of its atoms is added to
+        another fragment.
+
+        Args:
+            None
+
+        Returns:
+            True if the coordinate array of this fragment is up to date, otherwise False.
+        """
+
+        if self.coordinates is None or len(self.atom_coordinates) != len(self.atoms):
+            return False
+
+        for atom, atom_coordinates in zip(self.atoms, self.atom_coordinates):
+            if atom.xyz is not atom_coordinates:
+                return False
+
+        return True
+
+    def set_coordinate_view(self, coordinates):
+        """
+        Moves the positions of the atoms in this fragment into the given array, which is then used to store them.
+
+        Used by Molecule to make the coordinate arrays of its fragments views into one array.
+
+        Args:
+            coordinates - (num_atoms, 3) numpy array to store the positions of the atoms in.
+
+        Returns:
+            None
+        """
+
+        if len(self.atoms) > 0:
+            coordinates[:] = [atom.xyz for atom in self.atoms]
+
+        self.coordinates = coordinates
+        self.atom_coordinates = list(coordinates)
+
+        for atom, atom_coordinates in zip(self.atoms, self.atom_coordinates):
+            atom.xyz = atom_coordinates
+
+        self.atomic_numbers = numpy.array([atom.get_atomic_number() for atom in self.atoms], dtype=int)
+        self.masses = periodic_table.get_masses(self.atomic_numbers)
+        self.symbols = numpy.array([atom.get_name() for atom in self.atoms], dtype=str)
+
+    def get_coordinate_array(self):
+        """
+        Gets the positions of the atoms in this fragment as one contiguous array.
+
+        The array is shared with the atoms, so changing it moves the atoms.
+
+        Args:
+            None
+
+        Returns:
+            (num_atoms, 3) numpy array of the positions of the atoms in this fragment.
+        """
+
+        if not self.has_current_coordinates():
+            self.set_coordinate_view(numpy.empty((len(self.atoms), 3)))
+
+        return self.coordinates
+
+    def get_atomic_numbers(self):
+        """
+        Gets the atomic numbers of the atoms in this fragment.
+
+        Args:
+            None
+
+        Returns:
+            numpy array of the atomic numbers of the atoms in this fragment.
+        """
+
+        self.get_coordinate_array()
+
+        return self.atomic_numbers
+
+    def get_masses(self):
+        """
+        Gets the masses of the atoms in this fragment.
+
+        Args:
+            None
+
+        Returns:
+            numpy array of the masses of the atoms in this fragment in g/mol.
+        """
+
+        self.get_coordinate_array()
+
+        return self.masses
+
+    def get_symbols(self):
+        """
+        Gets the atomic symbols of the atoms in this fragment.
+
+        Args:
+            None
+
+        Returns:
+            numpy array of the atomic symbols of the atoms in this fragment.
+        """
+
+        self.get_coordinate_array()
+
+        return self.symbols
+
     def translate(self, x, y, z):
         """
         Translates all the atoms in this fragment by the given coordinates
@@ -433,8 +594,8 @@ class Fragment(object):
             None
         """
 
-        for atom in self.get_atoms():
-            atom.translate(x, y, z)
+        coordinates = self.get_coordinate_array()
+        coordinates += (x, y, z)
 
     def rotate(self, quaternion, origin_x = 0, origin_y = 0, origin_z = 0):
         """
@@ -450,28 +611,32 @@ class Fragment(object):
             None
         """
 
-        for atom in self.get_atoms():
-            atom.rotate(quaternion, origin_x, origin_y, origin_z)
+        coordinates = self.get_coordinate_array()
+        coordinates[:] = quaternion.rotate_coordinates(coordinates, origin_x, origin_y, origin_z)
+
+        # adding 0 turns any -0.0 into 0.0, as Atom.set_xyz() does
+        coordinates += 0.0
 
     def get_connectivity_matrix(self):
+        """
+        Gets the connectivity matrix of this fragment.
+
+        Args:
+            None
 
-        return self.connectivity_matrix
+        Returns:
+            A new list of lists, where connectivity_matrix[i][k] is True if atoms i and k are bonded.
+        """
+
+        return [list(row) for row in self.connectivity_matrix]
 
     def get_standard_connectivity_matrix(self):
     
-        atoms = self.get_atoms()
-        standard_atoms = self.get_standard_order()
+        standard_order = self.get_standard_order_order()
 
-        connectivity_matrix = self.get_connectivity_matrix()
+        connectivity_matrix = self.connectivity_matrix
 
-        standard_connectivity_matrix = [[False for atom2 in standard_atoms] for atom1 in standard_atoms]
-        
-        for standard_index1, atom1 in enumerate(standard_atoms):
-            for standard_index2, atom2 in enumerate(standard_atoms):
-                index1 = atoms.index(atom1)
-                index2 = atoms.index(atom2)
-                if connectivity_matrix[index1][index2]:
-                    standard_connectivity_matrix[standard_index1][standard_index2] = True    
+        standard_connectivity_matrix = [[connectivity_matrix[index1][index2] for index2 in standard_order] for index1 in standard_order]
 
         return standard_connectivity_matrix
 
@@ -491,7 +656,7 @@ class Fragment(object):
 
         excluded_pairs = []
 
-        connectivity_matrix = self.get_connectivity_matrix()
+        connectivity_matrix = self.connectivity_matrix
 
         # current matrix represents connectivity_matrix^x where x is the same as as in the excluded_1x pairs we are currently generating
         current_matrix = connectivity_matrix
@@ -722,6 +887,101 @@ class Fragment(object):
         else:
             return 0
     
+    def get_canonical_order(self):
+        """
+        Gets the standard order of the atoms in this fragment along with the priority rank of each atom.
+
+        The result only depends on the SMILE string and symmetry of this fragment, so it is computed once per
+        (SMILE string, symmetry) and stored in standard_order_cache, which is shared by every fragment in this process.
+
+        Args:
+            None.
+
+        Returns:
+            (order, ranks), where order[i] = index of the atom that should be in index i to put this fragment in
+            standard order and ranks[i] = rank of atom i, which is equal for two atoms if and only if
+            compare_priority() considers them to have the same priority. Both are tuples.
+        """
+
+        key = (self.SMILE, self.get_symmetry())
+
+        canonical_order = Fragment.standard_order_cache.get(key)
+
+        if canonical_order is None:
+            canonical_order = self.compute_canonical_order()
+            Fragment.standard_order_cache.put(key, canonical_order)
+
+        return canonical_order
+
+    def compute_canonical_order(self):
+        """
+        Computes the standard order of the atoms in this fragment along with the priority rank of each atom, see
+        get_canonical_order().
+
+        Instead of sorting with compare_priority(), each atom is given a key holding everything compare_priority()
+        looks at: its base priority followed by the keys of its substituents, from highest to lowest priority. Keys
+        compare the same way compare_priority() does, so the order is identical, but the key of each substituent is
+        only built once. In fragments without rings the key of a substituent only depends on the atom it is reached
+        from, so keys are shared between all the atoms of the fragment.
+
+        Args:
+            None.
+
+        Returns:
+            (order, ranks) as tuples.
+        """
+
+        connectivity_matrix = self.connectivity_matrix
+        num_atoms = len(self.get_atoms())
+
+        priorities = [atom.get_base_priority() for atom in self.get_atoms()]
+        neighbors = [[other for other in range(num_atoms) if connectivity_matrix[index][other]] for index in range(num_atoms)]
+
+        # a fragment has no rings if it has one less bond than atoms in each of its connected parts
+        num_bonds = sum(len(bonded) for bonded in neighbors) // 2
+        num_parts = 0
+        unvisited = set(range(num_atoms))
+        while len(unvisited) > 0:
+            num_parts += 1
+            to_visit = [unvisited.pop()]
+            while len(to_visit) > 0:
+                for other in neighbors[to_visit.pop()]:
+                    if other in unvisited:
+                        unvisited.remove(other)
+                        to_visit.append(other)
+
+        has_rings = num_bonds != num_atoms - num_parts
+
+        keys = {}
+
+        def get_key(index, visited, previous_index):
+            # without rings, the only visited atom next to this one is the one it was reached from
+            key_index = (index, visited) if has_rings else (index, previous_index)
+
+            try:
+                return keys[key_index]
+            except KeyError:
+                pass
+
+            visited = visited | {index}
+
+            substituent_keys = [get_key(other, visited, index) for other in neighbors[index] if other not in visited]
+
+            key = (priorities[index], tuple(sorted(substituent_keys, reverse = True)))
+            keys[key_index] = key
+
+            return key
+
+        atom_keys = [get_key(index, frozenset(), None) for index in range(num_atoms)]
+
+        # sorted() is stable, so atoms with the same priority keep their order, as they do when sorting with compare_priority()
+        order = tuple(sorted(range(num_atoms), key = atom_keys.__getitem__, reverse = True))
+
+        rank_of_key = {key: rank for rank, key in enumerate(sorted(set(atom_keys)))}
+        ranks = tuple(rank_of_key[key] for key in atom_keys)
+
+        return order, ranks
+
     def get_standard_order(self):
         """
         Gets the atoms of this fragment in standard order.
@@ -733,13 +993,9 @@ class Fragment(object):
             List of the atoms of this molecule sorted in standard order.
         """
 
-        connectivity_matrix = self.get_connectivity_matrix()
-
-        visited = [False for atom in self.get_atoms()]
-        
-        sorted_atoms = sorted(self.get_atoms(), reverse = True, key = functools.cmp_to_key(functools.partial(self.compare_priority, visited1 = visited, visited2 = visited, connectivity_matrix = connectivity_matrix)))
+        atoms = self.get_atoms()
 
-        return sorted_atoms
+        return [atoms[index] for index in self.get_canonical_order()[0]]
 
     def confirm_standard_order(self):
         """
@@ -769,12 +1025,9 @@ class Fragment(object):
             user_symmetry - User-specified symmetry.
         """
 
-        connectivity_matrix = self.get_connectivity_matrix()
-
-        visited1 = [False for atom in self.get_atoms()]
-        visited2 = [False for atom in self.get_atoms()]
+        standard_order, ranks = self.get_canonical_order()
 
-        standard_order = self.get_standard_order()
+        atoms = self.get_atoms()
 
         # get the auto generated symmetry
         standard_symmetry = ""
@@ -783,8 +1036,9 @@ class Fragment(object):
         next_letter = 'A'
         sym_count = 0
 
-        for atom in standard_order:
-            if prev_atom is None or self.compare_priority(prev_atom, atom, visited1, visited2, connectivity_matrix) != 0:
+        for index in standard_order:
+            atom = atoms[index]
+            if prev_atom is None or ranks[prev_index] != ranks[index]:
                 if sym_count > 0:
                     standard_symmetry += str(sym_count)
                 standard_symmetry += next_letter
@@ -793,6 +1047,7 @@ class Fragment(object):
 
             sym_count += 1
             prev_atom = atom
+            prev_index = index
 
         if sym_count > 0:
             standard_symmetry += str(sym_count)
@@ -805,7 +1060,7 @@ class Fragment(object):
         sym_count = 0
         used_symmetries = {}
 
-        for atom in standard_order:
+        for atom in [atoms[index] for index in standard_order]:
             if prev_atom is None or prev_atom.get_symmetry_class() != atom.get_symmetry_class():
                 if sym_count > 0:
                     user_symmetry += str(sym_count)
@@ -855,6 +1110,27 @@ class Fragment(object):
 
         return self.get_reordered_copy(self.get_reorder_order(SMILE), SMILE)
 
+    def get_copy_with_coordinates(self, coordinates):
+        """
+        Gets a copy of this fragment with its atoms moved to new positions.
+
+        Unlike get_reordered_copy(), the SMILE string is not parsed again, so this is cheap enough to call once
+        per configuration when many configurations share the same fragment.
+
+        Args:
+            coordinates - The new positions of the atoms in this fragment, as a (num_atoms, 3) array-like.
+
+        Returns:
+            A copy of this fragment with the same atoms in the same order, at the new positions.
+        """
+
+        fragment = copy.copy(self)
+
+        fragment.atoms = [Atom(atom.get_name(), atom.get_symmetry_class(), x, y, z)
+                          for atom, (x, y, z) in zip(self.get_atoms(), coordinates)]
+
+        return fragment
+
     def get_standard_order_order(self):
         """
         Gets the order the atoms in this fragment must be in to be in standard order.
@@ -866,9 +1142,7 @@ class Fragment(object):
             A list of indices, where indices[i] = index of atom that should be in index i to put this fragment in standard order.
         """
 
-        order = [self.get_atoms().index(atom) for atom in self.get_standard_order()]
-
-        return order
+        return list(self.get_canonical_order()[0])
 
     def get_reorder_order(self, SMILE):
         """
@@ -882,26 +1156,23 @@ class Fragment(object):
             order match the SMILE string.
         """
 
-        # get all atoms for this fragment in standard order
-        atoms = self.get_standard_order()
+        # get the indices of all atoms for this fragment in standard order
+        standard_order = self.get_standard_order_order()
 
         # get all atomic symbols from the SMILE
-        atomic_symbols, c, l = self.parse_SMILE(SMILE)
+        atomic_symbols, connectivity_matrix = self.get_parsed_SMILE(SMILE)
 
         # make a test fragment in the order specified by the SMILE.
         test_atoms = []
         for index, atomic_symbol in enumerate(atomic_symbols):
             test_atoms.append(Atom(atomic_symbol, atomic_symbol, index, index, index))
-            test_atoms[-1].index = index
 
         test_frag = Fragment(test_atoms, self.get_name(), self.get_charge(), self.get_spin_multiplicity(), SMILE)
 
-        final_atoms = [None for atom in atoms]
-
-        for index, atom in enumerate(test_frag.get_standard_order()):
-            final_atoms[atom.index] = atoms[index]
+        order = [None for index in standard_order]
 
-        order = [self.get_atoms().index(atom) for atom in final_atoms]
+        for index, test_index in enumerate(test_frag.get_standard_order_order()):
+            order[test_index] = standard_order[index]
 
         return order
 
@@ -947,6 +1218,15 @@ class Fragment(object):
 
         return frag
 
+    def __getstate__(self):
+        # copies and unpickled fragments get separate arrays for each atom rather than views, so the coordinate array
+        # is left out to be rebuilt from the atoms
+        state = self.__dict__.copy()
+        state["coordinates"] = None
+        state["atom_coordinates"] = []
+
+        return state
+
     def __eq__(self, other):
         if not self.get_name() == other.get_name():
             return False
@@ -1,9 +1,10 @@
 import numpy, math, itertools
 
-from hashlib import sha1
-
 from mbfit.exceptions import XYZFormatError, InvalidValueError, InconsistentValueError
+from mbfit.utils import periodic_table
 from .fragment import Fragment
+from . import molecule_hasher
+from . import molecule_alignment
 
 class Molecule(object):
     """
@@ -25,6 +26,14 @@ class Molecule(object):
         self.fragments = []
         for fragment in fragments:
         	self.add_fragment(fragment)
+        # (num_atoms, 3) array of the positions of the atoms in this molecule, see get_coordinate_array()
+        self.coordinates = None
+        # the part of coordinates each fragment stores its positions in
+        self.fragment_coordinates = []
+        # atomic numbers, masses and atomic symbols of the atoms in this molecule, filled in along with coordinates
+        self.atomic_numbers = None
+        self.masses = None
+        self.symbols = None
         # list of energies for this molecule, filled in by get_nmer_energies
         self.energies = {}
         # list of nmer_energies for this molecule, filled by get_nmer_energies
@@ -210,6 +219,114 @@ class Molecule(object):
             atoms += fragment.get_num_atoms()
         return atoms
 
+    def has_current_coordinates(self):
+        """
+        Checks whether every fragment in this molecule stores the positions of its atoms in the coordinate array of
+        this molecule.
+
+        Args:
+            None
+
+        Returns:
+            True if the coordinate array of this molecule is up to date, otherwise False.
+        """
+
+        if self.coordinates is None or len(self.fragment_coordinates) != len(self.fragments):
+            return False
+
+        for fragment, fragment_coordinates in zip(self.fragments, self.fragment_coordinates):
+            if fragment.coordinates is not fragment_coordinates or not fragment.has_current_coordinates():
+                return False
+
+        return True
+
+    def get_coordinate_array(self):
+        """
+        Gets the positions of the atoms in this molecule as one contiguous array, in the same order as get_atoms().
+
+        The array is shared with the fragments and atoms, so changing it moves the atoms.
+
+        Args:
+            None
+
+        Returns:
+            (num_atoms, 3) numpy array of the positions of the atoms in this molecule.
+        """
+
+        if not self.has_current_coordinates():
+            self.coordinates = numpy.empty((self.get_num_atoms(), 3))
+            self.fragment_coordinates = []
+
+            start = 0
+            for fragment in self.fragments:
+                end = start + fragment.get_num_atoms()
+                fragment.set_coordinate_view(self.coordinates[start:end])
+                self.fragment_coordinates.append(fragment.coordinates)
+                start = end
+
+            self.atomic_numbers = numpy.concatenate([fragment.atomic_numbers for fragment in self.fragments] + [numpy.empty(0, dtype=int)])
+            self.masses = numpy.concatenate([fragment.masses for fragment in self.fragments] + [numpy.empty(0)])
+            self.symbols = numpy.concatenate([fragment.symbols for fragment in self.fragments] + [numpy.empty(0, dtype=str)])
+
+        return self.coordinates
+
+    def get_atomic_numbers(self):
+        """
+        Gets the atomic numbers of the atoms in this molecule, in the same order as get_atoms().
+
+        Args:
+            None
+
+        Returns:
+            numpy array of the atomic numbers of the atoms in this molecule.
+        """
+
+        self.get_coordinate_array()
+
+        return self.atomic_numbers
+
+    def get_covalent_radii(self):
+        """
+        Gets the covalent radii of the atoms in this molecule, in the same order as get_atoms().
+
+        Args:
+            None
+
+        Returns:
+            numpy array of the covalent radii of the atoms in this molecule in angstroms.
+        """
+
+        return periodic_table.get_covalent_radii(self.get_atomic_numbers())
+
+    def get_vdw_radii(self):
+        """
+        Gets the van der Waals radii of the atoms in this molecule, in the same order as get_atoms().
+
+        Args:
+            None
+
+        Returns:
+            numpy array of the van der Waals radii of the atoms in this molecule in angstroms. Raises an
+            InvalidValueError if any atom has no van der Waals radius defined.
+        """
+
+        return periodic_table.get_vdw_radii(self.get_atomic_numbers())
+
+    def get_masses(self):
+        """
+        Gets the masses of the atoms in this molecule, in the same order as get_atoms().
+
+        Args:
+            None
+
+        Returns:
+            numpy array of the masses of the atoms in this molecule in g/mol.
+        """
+
+        self.get_coordinate_array()
+
+        return self.masses
+
     def translate(self, x, y, z):
         """
         Translates all the atoms in this molecule by the given coordinates
@@ -223,8 +340,8 @@ class Molecule(object):
             None
         """
 
-        for fragment in self.get_fragments():
-            fragment.translate(x, y, z)
+        coordinates = self.get_coordinate_array()
+        coordinates += (x, y, z)
 
     def rotate(self, quaternion, origin_x = 0, origin_y = 0, origin_z = 0):
         """
@@ -240,8 +357,11 @@ class Molecule(object):
             None
         """
 
-        for fragment in self.get_fragments():
-            fragment.rotate(quaternion, origin_x, origin_y, origin_z)
+        coordinates = self.get_coordinate_array()
+        coordinates[:] = quaternion.rotate_coordinates(coordinates, origin_x, origin_y, origin_z)
+
+        # adding 0 turns any -0.0 into 0.0, as Atom.set_xyz() does
+        coordinates += 0.0
 
     def move_to_center_of_mass(self):
         """
@@ -254,26 +374,11 @@ class Molecule(object):
             None
         """
 
-        # keep track of the total weighted mass along each axis
-        total_x = 0
-        total_y = 0
-        total_z = 0
-
-        # keeps track of the total mass
-        total_mass = 0
-
-        # loop thru every atom in the molecule, adding its contribution to each coordinate mass
-        for atom in self.get_atoms():
-            total_x += atom.get_x() * atom.get_mass()
-            total_y += atom.get_y() * atom.get_mass()
-            total_z += atom.get_z() * atom.get_mass()
-
-            total_mass += atom.get_mass()
+        coordinates = self.get_coordinate_array()
+        masses = self.get_masses()
 
         # calculate the center of mass my dividing the total weighted mass by the total mass
-        center_x = total_x / total_mass
-        center_y = total_y / total_mass
-        center_z = total_z / total_mass
+        center_x, center_y, center_z = masses @ coordinates / numpy.sum(masses)
 
         # translate this molecule to the center of mass
         self.translate(-center_x, -center_y, -center_z)
@@ -289,69 +394,41 @@ class Molecule(object):
             None
         """
 
-        # first we calculate the moment of inertia tensor
-        # [ Ixx Ixy Ixz ]
-        # [ Iyx Iyy Iyz ]
-        # [ Izx Izy Izz ]
-        
-        I = [[0, 0, 0] for i in range(3)]
-        
-        # loop over every atom and add their contributions to the moment of inertia tensor
-        for atom in self.get_atoms():
-            # Ixx
-            I[0][0] += (atom.get_y() ** 2 + atom.get_z() ** 2) * atom.get_mass()
-            # Ixy
-            I[1][0] += - (atom.get_x() * atom.get_y()) * atom.get_mass()
-            # Ixz
-            I[2][0] += - (atom.get_x() * atom.get_z()) * atom.get_mass()
+        coordinates = self.get_coordinate_array()
 
-            # Iyx
-            I[0][1] += - (atom.get_y() * atom.get_x()) * atom.get_mass()
-            # Iyy
-            I[1][1] += (atom.get_x() ** 2 + atom.get_z() ** 2) * atom.get_mass()
-            # Iyz
-            I[2][1] += - (atom.get_y() * atom.get_z()) * atom.get_mass()
+        principal_axes = molecule_alignment.get_principal_axes(coordinates[numpy.newaxis], self.get_masses())[0]
 
-            # Izx
-            I[0][2] += - (atom.get_z() * atom.get_x()) * atom.get_mass()
-            # Izy
-            I[1][2] += - (atom.get_z() * atom.get_y()) * atom.get_mass()
-            # Izz
-            I[2][2] += (atom.get_x() ** 2 + atom.get_y() ** 2) * atom.get_mass()
-
-        inertia_tensor = numpy.matrix(I)
-
-        # print("Inertia Tensor:", inertia_tensor)
-
-        # get numpy matrix from the matrix of principal moments
-
-        # get the moments and principal axis as eigen values and eigen vectors
-        (moments, principal_axes) = numpy.linalg.eigh(inertia_tensor)
+        # update the position of each atom
+        coordinates[:] = coordinates @ principal_axes
 
-        idx = numpy.argsort(moments)[::-1]
+        # adding 0 turns any -0.0 into 0.0, as Atom.set_xyz() does
+        coordinates += 0.0
 
-        moments = moments[idx]
-        principal_axes = principal_axes[:,idx]
+    def get_matching_coordinates(self, other):
+        """
+        Gets the coordinate arrays of this molecule and another, after checking that the other molecule has the same
+        number and types of atoms in the same order as this one.
 
-        fifthmoment = numpy.zeros(3)
+        Args:
+            other - the molecule to compare this one to
 
-        # only works for molecules with no symmetry
-        for atom in self.get_atoms():
-            fifthmoment += (numpy.matrix([atom.get_x(), atom.get_y(), atom.get_z()]) * principal_axes).getA1() ** 5 * atom.get_mass()
+        Returns:
+            (coordinates of this molecule, coordinates of the other molecule) as (num_atoms, 3) numpy arrays.
+        """
 
-        if fifthmoment[0] < 1e-6:
-            principal_axes[:, 0] *= -1
+        this_coordinates = self.get_coordinate_array()
+        other_coordinates = other.get_coordinate_array()
 
-        if fifthmoment[1] < 1e-6:
-            principal_axes[:, 1] *= -1
+        # fist make sure these molecules have the same number of atoms
+        if len(this_coordinates) != len(other_coordinates):
+            raise InconsistentValueError("number of atoms in self", "number of atoms in other", len(this_coordinates), len(other_coordinates), "number of atoms in each molecule must be the same, make sure you are computing the rmsd of two molecules with the same atoms and fragments")
 
-        if numpy.linalg.det(principal_axes) < 0:
-            principal_axes[:, 2] *= -1
+        # check to make sure that the atoms are the same type
+        mismatches = numpy.flatnonzero(self.symbols != other.symbols)
+        if len(mismatches) > 0:
+            raise InconsistentValueError("self atom symbol", "other atom symbol", self.symbols[mismatches[0]], other.symbols[mismatches[0]], "symbols must be the same, make sure you are computing the rmsd of two molecules with the same atoms and fragments")
 
-        # update the position of each atom
-        for atom in self.get_atoms():
-            x, y, z = (numpy.matrix([atom.get_x(), atom.get_y(), atom.get_z()]) * principal_axes).getA1()
-            atom.set_xyz(float(x), float(y), float(z))
+        return this_coordinates, other_coordinates
 
     def rmsd(self, other):
         """
@@ -368,24 +445,12 @@ class Molecule(object):
             The square-root of the mean squared distance between the atoms in this molecule and the other
         """
 
-        # fist make sure these molecules have the same number of atoms
-        if self.get_num_atoms() != other.get_num_atoms():
-            raise InconsistentValueError("number of atoms in self", "number of atoms in other", self.get_num_atoms(), other.get_num_atoms(), "number of atoms in each molecule must be the same, make sure you are computing the rmsd of two molecules with the same atoms and fragments")
-
-        squared_distance = 0
-
-        # loop thru every pair of atoms in the two molecules
-        for this_atom, other_atom in zip(self.get_atoms(), other.get_atoms()):
-
-            # check to make sure that these atoms are the same type
-            if this_atom.get_name() != other_atom.get_name():
-                raise InconsistentValueError("self atom symbol", "other atom symbol", this_atom.get_name(), other_atom.get_name(), "symbols must be the same, make sure you are computing the rmsd of two molecules with the same atoms and fragments")
+        this_coordinates, other_coordinates = self.get_matching_coordinates(other)
 
-            # add this atom pair's contribution to the squared distance
-            squared_distance += this_atom.distance(other_atom) ** 2
+        squared_distance = numpy.sum((this_coordinates - other_coordinates) ** 2)
 
         # compute rmsd as sqrt of mean squared distance
-        return math.sqrt(squared_distance / self.get_num_atoms())
+        return math.sqrt(squared_distance / len(this_coordinates))
 
     def rmsd2(self, other):
         self_atoms = self.get_atoms()
@@ -424,37 +489,99 @@ class Molecule(object):
             the square-root of the mean squared difference in the distance between each pair of atoms in this molecule and the other
         """
 
-        # fist make sure these molecules have the same number of atoms
-        if self.get_num_atoms() != other_molecule.get_num_atoms():
-            raise InconsistentValueError("number of atoms in self", "number of atoms in other", self.get_num_atoms(), other_molecule.get_num_atoms(), "number of atoms in each molecule must be the same, make sure you are computing the rmsd of two molecules with the same atoms and fragments")
+        this_coordinates, other_coordinates = self.get_matching_coordinates(other_molecule)
 
-        squared_distance_difference = 0
+        # matrices of the distances between every pair of atoms in each molecule
+        this_distances = numpy.sqrt(numpy.sum((this_coordinates[:, numpy.newaxis] - this_coordinates) ** 2, axis=2))
+        other_distances = numpy.sqrt(numpy.sum((other_coordinates[:, numpy.newaxis] - other_coordinates) ** 2, axis=2))
 
-        # loop over each pair of atoms
-        for atom_index, this_atom1, other_atom1 in zip(range(self.get_num_atoms()), self.get_atoms(), other_molecule.get_atoms()):
-            for this_atom2, other_atom2 in zip(self.get_atoms()[atom_index + 1:], other_molecule.get_atoms()[atom_index + 1:]):
+        # each pair of atoms appears twice in the distance matrices
+        squared_distance_difference = numpy.sum((this_distances - other_distances) ** 2) / 2
 
-                # check to make sure that the atom1s have the same type
-                if this_atom1.get_name() != other_atom1.get_name():
-                    raise InconsistentValueError("self atom symbol", "other atom symbol", this_atom.get_name(), other_atom.get_name(), "symbols must be the same, make sure you are computing the rmsd of two molecules with the same atoms and fragments")
+        # compute the rmsd of the sqrt of mean squared distance difference
+        return math.sqrt(squared_distance_difference / len(this_coordinates))
 
-                # check to make sure that the atom2s have the same type
-                if this_atom2.get_name() != other_atom2.get_name():
-                    raise InconsistentValueError("self atom symbol", "other atom symbol", this_atom.get_name(), other_atom.get_name(), "symbols must be the same, make sure you are computing the rmsd of two molecules with the same atoms and fragments")
+    def kabsch_rmsd(self, other):
+        """
+        Computes the RMSD between the positions of the atoms in two molecules after the other molecule is translated and
+        rotated to best match this one with the Kabsch algorithm. Neither molecule is moved.
 
-                # add these atom pairs' contribution to the squared distance difference
-                squared_distance_difference += (this_atom1.distance(this_atom2) - other_atom1.distance(other_atom2)) ** 2
+        molecules must have the same fragments and atoms or an InconsistentValueError will be raised.
 
-        # compute the rmsd of the sqrt of mean squared distance difference
-        return math.sqrt(squared_distance_difference / self.get_num_atoms())
+        Args:
+            other - the molecule to compare this one to
+
+        Returns:
+            The smallest square-root of the mean squared distance between the atoms in this molecule and the other over
+            all translations and rotations of the other
+        """
+
+        this_coordinates, other_coordinates = self.get_matching_coordinates(other)
+
+        aligned_coordinates = molecule_alignment.get_aligned_coordinates(other_coordinates, this_coordinates)
+
+        return molecule_alignment.get_rmsd(aligned_coordinates, this_coordinates)
+
+    def get_equivalent_atom_groups(self):
+        """
+        Gets the groups of atoms in this molecule that are interchangeable, which are the atoms with the same symmetry
+        class. Atoms in different fragments with the same name can be in the same group.
 
-    def compare(self, other, cutoff_rmsd = 0.1):
+        Args:
+            None
+
+        Returns:
+            list of numpy arrays of the indices of the atoms in each group
+        """
+
+        groups = {}
+
+        for index, atom in enumerate(self.get_atoms()):
+            groups.setdefault(atom.get_symmetry_class(), []).append(index)
+
+        return [numpy.array(group) for group in groups.values()]
+
+    def permutation_rmsd(self, other, align = True):
+        """
+        Computes the RMSD between the positions of the atoms in two molecules, matching each atom in this molecule to an
+        atom of the same symmetry class in the other so that the RMSD is as small as possible. The matching is found
+        with the Hungarian algorithm, so unlike trying every permutation it is usable for large molecules.
+
+        molecules must have the same fragments and atoms or an InconsistentValueError will be raised.
+
+        Requires scipy.
+
+        Args:
+            other - the molecule to compare this one to
+            align - if True, the other molecule is also translated and rotated to best match this one, see
+                    molecule_alignment.get_permutation_rmsd(). Neither molecule is moved.
+
+        Returns:
+            The square-root of the mean squared distance between the atoms in this molecule and the matched atoms of
+            the other
+        """
+
+        this_coordinates, other_coordinates = self.get_matching_coordinates(other)
+
+        if [atom.get_symmetry_class() for atom in self.get_atoms()] != [atom.get_symmetry_class() for atom in other.get_atoms()]:
+            raise InconsistentValueError("self symmetry", "other symmetry", self.get_symmetry(), other.get_symmetry(), "symmetry classes must be the same, make sure you are computing the rmsd of two molecules with the same atoms and fragments")
+
+        groups = self.get_equivalent_atom_groups()
+
+        rmsd, order = molecule_alignment.get_permutation_rmsd(other_coordinates, this_coordinates, groups, align=align)
+
+        return rmsd
+
+    def compare(self, other, cutoff_rmsd = 0.1, align = False, permute = False):
         """
         Compares two molecules to see if they are similar to eachother bellow a cutoff rmsd
 
         Args:
             other - the molecule to compare this one to
             cutoff_rmsd - the rmsd level at which False will be returned, defailt is 0.1
+            align - if True, use the rmsd after the other molecule is translated and rotated to best match this one
+            permute - if True, use the rmsd after equivalent atoms of the other molecule are swapped to best match
+                    this one, see permutation_rmsd(). Requires scipy.
 
         Returns:
             True if the rmsd between this molecule and the other is less than cutoff_rmsd, otherwise False
@@ -462,6 +589,10 @@ class Molecule(object):
         """
 
         try:
+            if permute:
+                return self.permutation_rmsd(other, align=align) < cutoff_rmsd
+            if align:
+                return self.kabsch_rmsd(other) < cutoff_rmsd
             return self.rmsd(other) < cutoff_rmsd
         except InconsistentValueError:
             return False
@@ -590,8 +721,26 @@ class Molecule(object):
             SHA1 hash of this molecule
         """
 
-        hash_string = self.get_name() + "\n" + self.to_xyz(num_digits=5) + "\n" + str(self.get_charge()) + "\n" + str(self.get_spin_multiplicity())
-        return sha1(hash_string.encode()).hexdigest()
+        # same as the SHA1 of self.get_name() + "\n" + self.to_xyz(num_digits=5) + "\n" + str(self.get_charge()) + "\n" + str(self.get_spin_multiplicity())
+        coordinates = self.get_coordinate_array()
+        return molecule_hasher.get_SHA1s(self.get_name(), self.symbols, self.get_charge(), self.get_spin_multiplicity(), coordinates)[0]
+
+    def get_quantized_hash(self, num_digits=5):
+        """
+        Generates a hash of this molecule from its coordinates quantized to integers, see
+        molecule_hasher.get_quantized_hashes().
+
+        Faster than get_SHA1(), but gives different hashes, so it cannot be used to look up molecules in databases.
+
+        Args:
+            num_digits      - Coordinates are multiplied by 10 ** num_digits before they are rounded to integers.
+
+        Returns:
+            Hash of this molecule as a hex string.
+        """
+
+        coordinates = self.get_coordinate_array()
+        return molecule_hasher.get_quantized_hashes(self.get_name(), self.symbols, self.get_charge(), self.get_spin_multiplicity(), coordinates, num_digits=num_digits)[0]
 
     def get_symbols(self):
         """
@@ -617,7 +766,7 @@ class Molecule(object):
             list of the positions of the atoms in this moleule
         """
 
-        return [(atom.get_x(), atom.get_y(), atom.get_z()) for atom in self.get_atoms()]
+        return [tuple(xyz) for xyz in self.get_coordinate_array().tolist()]
 
     @staticmethod
     def read_xyz(string, atoms_per_fragment, name_per_fragment, charge_per_fragment, spin_multiplicity_per_fragment, symmetry_per_fragment, SMILE_per_fragment):
@@ -1023,6 +1172,43 @@ class Molecule(object):
         return self.get_reorder_copy([fragment.get_name() for fragment in self.get_fragments()],
                                      [fragment.get_SMILE() for fragment in self.get_fragments()])
 
+    def get_copy_with_coordinates(self, coordinates):
+        """
+        Gets a copy of this molecule with its atoms moved to new positions.
+
+        Unlike get_reordered_copy(), no SMILE strings are parsed and no symmetry classes are checked, so a
+        single molecule can be used as a template that the coordinates of many configurations are stamped into.
+
+        Args:
+            coordinates - The new positions of the atoms in this molecule, either as a flat array-like of
+                    length 3 * num_atoms or as a (num_atoms, 3) array-like.
+
+        Returns:
+            A copy of this molecule with the same fragments and atoms in the same order, at the new positions.
+        """
+
+        coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, 3)
+
+        if len(coordinates) != self.get_num_atoms():
+            raise InconsistentValueError("number of atoms in molecule", "number of coordinates",
+                                         self.get_num_atoms(), len(coordinates),
+                                         "there must be exactly one (x, y, z) position per atom.")
+
+        coordinates = coordinates.tolist()
+
+        fragments = []
+        start = 0
+
+        for fragment in self.get_fragments():
+            end = start + fragment.get_num_atoms()
+            fragments.append(fragment.get_copy_with_coordinates(coordinates[start:end]))
+            start = end
+
+        molecule = Molecule([])
+        molecule.fragments = fragments
+
+        return molecule
+
     def get_standard_order_order(self):
         """
         Gets the order the fragments and atoms in this molecule must be in to be in standard order.
@@ -1036,7 +1222,8 @@ class Molecule(object):
             frag_orders - A list of lists, where each list corresponds to one fragment.
                     where frag_orders[j][i] = index of atom that should be in index i to put the fragment j of the new order in standard order.
         """
-        order = [self.get_fragments().index(frag) for frag in self.get_standard_order()]
+        # same stable sort by name as get_standard_order(), but on indices
+        order = sorted(range(self.get_num_fragments()), key = lambda index: self.get_fragments()[index].get_name())
         frag_orders = [frag.get_standard_order_order() for frag in [self.get_fragments()[index] for index in order]]
         return order, frag_orders
 
@@ -1065,6 +1252,23 @@ class Molecule(object):
 
         return order, frag_orders
 
+    def get_atom_order(self, order, frag_orders):
+        """
+        Gets the order the atoms of this molecule are in after reordering its fragments and atoms.
+
+        Args:
+            order - New order of the fragments, see get_reordered_copy().
+            frag_orders - New order of the atoms within each fragment, see get_reordered_copy().
+
+        Returns:
+            numpy array atom_order, such that self.get_coordinate_array()[atom_order] are the positions of the atoms
+            of self.get_reordered_copy(order, frag_orders, SMILES).
+        """
+
+        starts = numpy.cumsum([0] + [fragment.get_num_atoms() for fragment in self.get_fragments()])
+
+        return numpy.array([starts[index] + atom_index for index, frag_order in zip(order, frag_orders) for atom_index in frag_order], dtype=int)
+
     def get_reordered_copy(self, order, frag_orders, SMILES):
         """
         Gets a copy of this molecule, the fragments and atoms are reordered according to the input.
@@ -1103,6 +1307,14 @@ class Molecule(object):
 
         return Molecule(fragments)
 
+    def __getstate__(self):
+        # copies and unpickled fragments do not share one array, so the coordinate array is left out to be rebuilt
+        state = self.__dict__.copy()
+        state["coordinates"] = None
+        state["fragment_coordinates"] = []
+
+        return state
+
     def __eq__(self, other):
         if not self.get_name() == other.get_name():
             return False
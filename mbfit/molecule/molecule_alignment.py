@@ -0,0 +1,215 @@
+import numpy
+
+from mbfit.exceptions import LibraryNotAvailableError
+
+# only import scipy if it is installed.
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    pass
+
+def get_kabsch_rotation(coordinates, reference_coordinates):
+    """
+    Gets the rotation that best aligns a set of centered positions onto another with the Kabsch algorithm.
+
+    Args:
+        coordinates     - (num_atoms, 3) numpy array of positions centered on the origin.
+        reference_coordinates - (num_atoms, 3) numpy array of the positions to align onto, centered on the origin.
+
+    Returns:
+        (3, 3) numpy rotation matrix, such that coordinates @ rotation minimizes the squared distance to
+        reference_coordinates. Never includes a reflection.
+    """
+
+    covariance = coordinates.T @ reference_coordinates
+
+    u, s, vt = numpy.linalg.svd(covariance)
+
+    # flip the last axis if the best orthogonal matrix is a reflection
+    if numpy.linalg.det(u) * numpy.linalg.det(vt) < 0:
+        u[:, -1] *= -1
+
+    return u @ vt
+
+def get_aligned_coordinates(coordinates, reference_coordinates):
+    """
+    Translates and rotates a set of positions to minimize their squared distance to another.
+
+    Args:
+        coordinates     - (num_atoms, 3) numpy array of the positions to move.
+        reference_coordinates - (num_atoms, 3) numpy array of the positions to align onto.
+
+    Returns:
+        New (num_atoms, 3) numpy array of the aligned positions.
+    """
+
+    center = coordinates.mean(axis=0)
+    reference_center = reference_coordinates.mean(axis=0)
+
+    rotation = get_kabsch_rotation(coordinates - center, reference_coordinates - reference_center)
+
+    return (coordinates - center) @ rotation + reference_center
+
+def get_rmsd(coordinates, reference_coordinates):
+    """
+    Computes the RMSD between two sets of positions.
+
+    Args:
+        coordinates     - (num_atoms, 3) numpy array of positions.
+        reference_coordinates - (num_atoms, 3) numpy array of positions.
+
+    Returns:
+        The square-root of the mean squared distance between the positions.
+    """
+
+    return float(numpy.sqrt(numpy.sum((coordinates - reference_coordinates) ** 2) / len(coordinates)))
+
+def get_assignment_order(coordinates, reference_coordinates, groups):
+    """
+    Finds the order of a set of positions that minimizes their squared distance to another, allowing only positions
+    in the same group to swap. Each group is solved as an assignment problem with the Hungarian algorithm.
+
+    Requires scipy.
+
+    Args:
+        coordinates     - (num_atoms, 3) numpy array of positions.
+        reference_coordinates - (num_atoms, 3) numpy array of positions.
+        groups          - List of numpy arrays of indices of interchangeable positions. Every index must be in exactly
+                one group.
+
+    Returns:
+        numpy array order, such that coordinates[order] is the best match of reference_coordinates.
+    """
+
+    try:
+        linear_sum_assignment
+    except NameError:
+        raise LibraryNotAvailableError("scipy") from None
+
+    order = numpy.arange(len(coordinates))
+
+    for group in groups:
+        if len(group) == 1:
+            continue
+
+        # cost of putting the position at column index in the place of the reference position at row index
+        costs = numpy.sum((reference_coordinates[group][:, numpy.newaxis] - coordinates[group]) ** 2, axis=2)
+
+        rows, columns = linear_sum_assignment(costs)
+        order[group[rows]] = group[columns]
+
+    return order
+
+def get_permutation_rmsd(coordinates, reference_coordinates, groups, align=True, max_iterations=20):
+    """
+    Computes the smallest RMSD between two sets of positions over the orders of the positions that only swap positions
+    in the same group.
+
+    When align is True, the positions are also translated and rotated. Assignment and alignment depend on each other,
+    so they are alternated until the order stops changing. This only finds a local minimum of the RMSD, so it is
+    started from each orientation that lines up the principal axes of the two sets of positions and from the Kabsch
+    alignment of the positions in their given order, and the best result is kept.
+
+    Requires scipy.
+
+    Args:
+        coordinates     - (num_atoms, 3) numpy array of positions.
+        reference_coordinates - (num_atoms, 3) numpy array of positions.
+        groups          - List of numpy arrays of indices of interchangeable positions. Every index must be in exactly
+                one group.
+        align           - If True, also translate and rotate coordinates to minimize the RMSD.
+        max_iterations  - Maximum number of times to alternate assignment and alignment from each start.
+
+    Returns:
+        (rmsd, order) where coordinates[order] is the best match of reference_coordinates.
+    """
+
+    if not align:
+        order = get_assignment_order(coordinates, reference_coordinates, groups)
+        return get_rmsd(coordinates[order], reference_coordinates), order
+
+    # start from both sets of positions centered on the origin
+    coordinates = coordinates - coordinates.mean(axis=0)
+    reference_coordinates = reference_coordinates - reference_coordinates.mean(axis=0)
+
+    starts = [get_aligned_coordinates(coordinates, reference_coordinates)]
+
+    axes = numpy.linalg.eigh(coordinates.T @ coordinates)[1]
+    reference_axes = numpy.linalg.eigh(reference_coordinates.T @ reference_coordinates)[1]
+
+    # the four rotations that line up the axes, the directions of eigenvectors are arbitrary
+    for signs in ((1, 1, 1), (1, -1, -1), (-1, 1, -1), (-1, -1, 1)):
+        rotation = axes @ numpy.diag(signs) @ reference_axes.T
+
+        if numpy.linalg.det(rotation) < 0:
+            rotation = -rotation
+
+        starts.append(coordinates @ rotation)
+
+    best_rmsd, best_order = None, None
+
+    for moved_coordinates in starts:
+        order = None
+
+        for iteration in range(max_iterations):
+            new_order = get_assignment_order(moved_coordinates, reference_coordinates, groups)
+
+            if order is not None and numpy.array_equal(new_order, order):
+                break
+
+            order = new_order
+
+            aligned_coordinates = get_aligned_coordinates(coordinates[order], reference_coordinates)
+            rmsd = get_rmsd(aligned_coordinates, reference_coordinates)
+
+            if best_rmsd is None or rmsd < best_rmsd:
+                best_rmsd, best_order = rmsd, order
+
+            # back in the original order, so the next assignment can be compared to this one
+            moved_coordinates = aligned_coordinates[numpy.argsort(order)]
+
+    return best_rmsd, best_order
+
+def get_principal_axes(coordinates, masses):
+    """
+    Gets the principal axes of many configurations of the same molecule, as Molecule.rotate_on_principal_axes() uses
+    them.
+
+    Args:
+        coordinates     - (num_configs, num_atoms, 3) numpy array of the positions of the atoms in each configuration.
+        masses          - (num_atoms,) numpy array of the masses of the atoms.
+
+    Returns:
+        (num_configs, 3, 3) numpy array, the columns of each matrix are the principal axes of that configuration, from
+        the largest moment of inertia to the smallest. coordinates @ principal_axes rotates each configuration onto
+        its principal axes.
+    """
+
+    # first we calculate the moment of inertia tensor
+    # [ Ixx Ixy Ixz ]
+    # [ Iyx Iyy Iyz ]
+    # [ Izx Izy Izz ]
+
+    # off diagonal elements are - sum(m * x_i * x_j)
+    inertia_tensors = - numpy.einsum("a,nai,naj->nij", masses, coordinates, coordinates)
+
+    # diagonal elements are sum(m * (sum of the squares of the other two coordinates))
+    squares = coordinates ** 2
+    inertia_tensors[:, 0, 0] = (squares[:, :, 1] + squares[:, :, 2]) @ masses
+    inertia_tensors[:, 1, 1] = (squares[:, :, 0] + squares[:, :, 2]) @ masses
+    inertia_tensors[:, 2, 2] = (squares[:, :, 0] + squares[:, :, 1]) @ masses
+
+    # get the moments and principal axis as eigen values and eigen vectors
+    moments, principal_axes = numpy.linalg.eigh(inertia_tensors)
+
+    order = numpy.argsort(moments, axis=1)[:, ::-1]
+    principal_axes = numpy.take_along_axis(principal_axes, order[:, numpy.newaxis, :], axis=2)
+
+    # only works for molecules with no symmetry
+    fifth_moments = numpy.einsum("a,naj->nj", masses, (coordinates @ principal_axes) ** 5)
+
+    principal_axes[:, :, 0] *= numpy.where(fifth_moments[:, 0] < 1e-6, -1, 1)[:, numpy.newaxis]
+    principal_axes[:, :, 1] *= numpy.where(fifth_moments[:, 1] < 1e-6, -1, 1)[:, numpy.newaxis]
+    principal_axes[:, :, 2] *= numpy.where(numpy.linalg.det(principal_axes) < 0, -1, 1)[:, numpy.newaxis]
+
+    return principal_axes
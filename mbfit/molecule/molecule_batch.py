@@ -0,0 +1,344 @@
+import numpy
+
+from mbfit.exceptions import InvalidValueError, InconsistentValueError
+from . import molecule_hasher
+from . import molecule_alignment
+
+class MoleculeBatch(object):
+    """
+    Stores many configurations of the same molecule as one array of coordinates.
+
+    The fragments, atoms, charges, spin multiplicities, symmetries and SMILE strings are shared by all configurations
+    and stored once, in a template Molecule, so a batch takes far less memory than a list of Molecules.
+    """
+
+    def __init__(self, template, coordinates):
+        """
+        Creates a new MoleculeBatch.
+
+        Args:
+            template        - Molecule with the fragments and atoms of every configuration. Its own coordinates are
+                    not used.
+            coordinates     - (num_configs, num_atoms, 3) array-like of the positions of the atoms in each
+                    configuration, in the same order as template.get_atoms(). May also be (num_configs, num_atoms * 3).
+                    A numpy array of floats is stored without being copied.
+
+        Returns:
+            A new MoleculeBatch.
+        """
+
+        self.template = template
+
+        num_atoms = template.get_num_atoms()
+
+        coordinates = numpy.asarray(coordinates, dtype=float)
+
+        if num_atoms == 0 or coordinates.size % (num_atoms * 3) != 0:
+            raise InconsistentValueError("number of atoms in template", "shape of coordinates", num_atoms,
+                                         coordinates.shape, "there must be exactly one (x, y, z) position per atom.")
+
+        self.coordinates = coordinates.reshape(-1, num_atoms, 3)
+
+    @staticmethod
+    def from_molecules(molecules):
+        """
+        Creates a new MoleculeBatch from configurations of the same molecule.
+
+        Args:
+            molecules       - Non-empty iterable of Molecules with the same fragments and atoms in the same order.
+
+        Returns:
+            A new MoleculeBatch with a copy of the coordinates of each molecule.
+        """
+
+        template = None
+        configs = []
+
+        for molecule in molecules:
+            if template is None:
+                template = molecule.get_copy_with_coordinates(molecule.get_coordinate_array())
+                name, symmetry, symbols = template.get_name(), template.get_symmetry(), template.get_symbols()
+
+            elif molecule.get_name() != name or molecule.get_symmetry() != symmetry or molecule.get_symbols() != symbols:
+                raise InconsistentValueError("first molecule", "molecule {}".format(len(configs)),
+                                             template.get_name() + " " + template.get_symmetry(),
+                                             molecule.get_name() + " " + molecule.get_symmetry(),
+                                             "all molecules in a batch must have the same fragments and atoms in the same order.")
+
+            configs.append(molecule.get_coordinate_array())
+
+        if template is None:
+            raise InvalidValueError("molecules", "[]", "must contain at least one molecule")
+
+        return MoleculeBatch(template, numpy.array(configs))
+
+    def get_template(self):
+        """
+        Gets the template molecule of this batch, which has the fragments and atoms of every configuration.
+
+        Args:
+            None.
+
+        Returns:
+            The template Molecule. Its coordinates are not those of any configuration.
+        """
+
+        return self.template
+
+    def get_coordinates(self):
+        """
+        Gets the positions of the atoms in every configuration in this batch.
+
+        The array is the one stored by this batch, so changing it moves the atoms.
+
+        Args:
+            None.
+
+        Returns:
+            (num_configs, num_atoms, 3) numpy array of the positions of the atoms.
+        """
+
+        return self.coordinates
+
+    def get_num_configs(self):
+        """
+        Gets the number of configurations in this batch.
+
+        Args:
+            None.
+
+        Returns:
+            The number of configurations in this batch.
+        """
+
+        return len(self.coordinates)
+
+    def get_num_atoms(self):
+        """
+        Gets the number of atoms in each configuration in this batch.
+
+        Args:
+            None.
+
+        Returns:
+            The number of atoms in each configuration.
+        """
+
+        return self.template.get_num_atoms()
+
+    def get_name(self):
+        """
+        Gets the name of the molecule in this batch, see Molecule.get_name().
+
+        Args:
+            None.
+
+        Returns:
+            The name of the molecule.
+        """
+
+        return self.template.get_name()
+
+    def get_symmetry(self):
+        """
+        Gets the symmetry of the molecule in this batch, see Molecule.get_symmetry().
+
+        Args:
+            None.
+
+        Returns:
+            The symmetry of the molecule.
+        """
+
+        return self.template.get_symmetry()
+
+    def get_charge(self):
+        """
+        Gets the charge of the molecule in this batch.
+
+        Args:
+            None.
+
+        Returns:
+            The charge of the molecule.
+        """
+
+        return self.template.get_charge()
+
+    def get_spin_multiplicity(self):
+        """
+        Gets the spin multiplicity of the molecule in this batch.
+
+        Args:
+            None.
+
+        Returns:
+            The spin multiplicity of the molecule.
+        """
+
+        return self.template.get_spin_multiplicity()
+
+    def get_fragment_sizes(self):
+        """
+        Gets the number of atoms in each fragment of the molecule in this batch.
+
+        Args:
+            None.
+
+        Returns:
+            List of the number of atoms in each fragment.
+        """
+
+        return [fragment.get_num_atoms() for fragment in self.template.get_fragments()]
+
+    def get_symbols(self):
+        """
+        Gets the atomic symbols of the atoms of the molecule in this batch.
+
+        Args:
+            None.
+
+        Returns:
+            List of the atomic symbols of the atoms.
+        """
+
+        return self.template.get_symbols()
+
+    def get_molecule(self, index):
+        """
+        Gets one configuration in this batch as a Molecule.
+
+        Args:
+            index           - The index of the configuration.
+
+        Returns:
+            A new Molecule at the positions of the configuration. Moving it does not change this batch.
+        """
+
+        return self.template.get_copy_with_coordinates(self.coordinates[index])
+
+    def get_molecules(self):
+        """
+        Gets every configuration in this batch as a Molecule, one at a time.
+
+        Args:
+            None.
+
+        Returns:
+            Generator of a new Molecule for each configuration.
+        """
+
+        for index in range(self.get_num_configs()):
+            yield self.get_molecule(index)
+
+    def __len__(self):
+        return self.get_num_configs()
+
+    def __iter__(self):
+        return self.get_molecules()
+
+    def __getitem__(self, index):
+        # a slice or a sequence of indices gives a new batch of those configurations
+        if isinstance(index, slice) or numpy.ndim(index) == 1:
+            return MoleculeBatch(self.template, self.coordinates[index])
+
+        return self.get_molecule(index)
+
+    def translate(self, x, y, z):
+        """
+        Translates every configuration in this batch by the given coordinates.
+
+        Args:
+            x   - amount to translate along x axis
+            y   - amount to translate along y axis
+            z   - amount to translate along z axis
+
+        Returns:
+            None.
+        """
+
+        self.coordinates += (x, y, z)
+
+    def move_to_center_of_mass(self):
+        """
+        Moves every configuration in this batch to its center of mass, as Molecule.move_to_center_of_mass() does, up
+        to floating point rounding.
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        """
+
+        masses = self.template.get_masses()
+
+        centers = numpy.einsum("a,nai->ni", masses, self.coordinates) / numpy.sum(masses)
+
+        self.coordinates -= centers[:, numpy.newaxis, :]
+
+    def rotate_on_principal_axes(self):
+        """
+        Rotates every configuration in this batch on to its principal axes, as Molecule.rotate_on_principal_axes()
+        does, up to floating point rounding.
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        """
+
+        principal_axes = molecule_alignment.get_principal_axes(self.coordinates, self.template.get_masses())
+
+        self.coordinates[:] = self.coordinates @ principal_axes
+
+        # adding 0 turns any -0.0 into 0.0, as Atom.set_xyz() does
+        self.coordinates += 0.0
+
+    def to_xyz(self, num_digits=14):
+        """
+        Gets the string representation of every configuration in this batch in the xyz file format.
+
+        Args:
+            num_digits - The number of digits after the decimal point to include when writing atom coordinates.
+                    Default: 14 Maximum: 14
+
+        Returns:
+            List of strings, the same as Molecule.to_xyz() of each configuration.
+        """
+
+        xyz_format = "\n".join("{:2} %22.14e %22.14e %22.14e".format(symbol) for symbol in self.get_symbols())
+
+        # adding 0 turns any -0.0 into 0.0, as Atom.to_xyz() does
+        return [xyz_format % tuple(round(coordinate, num_digits) + 0.0 for coordinate in config)
+                for config in self.coordinates.reshape(len(self.coordinates), self.get_num_atoms() * 3).tolist()]
+
+    def get_SHA1s(self):
+        """
+        Gets the SHA1 hash of every configuration in this batch.
+
+        Args:
+            None.
+
+        Returns:
+            List of the hashes of each configuration, the same as Molecule.get_SHA1() of each configuration.
+        """
+
+        return molecule_hasher.get_SHA1s(self.get_name(), self.get_symbols(), self.get_charge(),
+                                         self.get_spin_multiplicity(), self.coordinates)
+
+    def get_quantized_hashes(self, num_digits=5):
+        """
+        Gets the quantized hash of every configuration in this batch.
+
+        Args:
+            num_digits      - Coordinates are multiplied by 10 ** num_digits before they are rounded to integers.
+
+        Returns:
+            List of the hashes of each configuration, the same as Molecule.get_quantized_hash() of each configuration.
+        """
+
+        return molecule_hasher.get_quantized_hashes(self.get_name(), self.get_symbols(), self.get_charge(),
+                                                    self.get_spin_multiplicity(), self.coordinates,
+                                                    num_digits=num_digits)
@@ -0,0 +1,180 @@
+import numpy
+
+from hashlib import sha1
+
+# DIGIT_GROUPS[i] = the 4 characters of i with leading zeros packed into one uint32, for 0 <= i < 10000
+DIGIT_GROUPS = numpy.frombuffer("".join("{:04}".format(i) for i in range(10000)).encode(), dtype=numpy.uint32)
+
+def round_coordinates(coordinates, num_digits=5):
+    """
+    Rounds coordinates to a number of digits after the decimal point, with exactly the same results as python's round().
+
+    numpy.round() scales, rounds and unscales, which gives the same result as round() except for values that are
+    within floating point error of halfway between two rounded values. Those few values are rounded with round().
+
+    Args:
+        coordinates     - numpy array of coordinates.
+        num_digits      - The number of digits after the decimal point to round to.
+
+    Returns:
+        A new numpy array of the rounded coordinates. -0.0 is replaced with 0.0.
+    """
+
+    scale = 10.0 ** num_digits
+
+    scaled_coordinates = coordinates * scale
+    rounded_coordinates = numpy.rint(scaled_coordinates) / scale
+
+    distance_from_half = numpy.abs(scaled_coordinates - numpy.floor(scaled_coordinates) - 0.5)
+    near_half = distance_from_half < 1e-6 + numpy.abs(scaled_coordinates) * 1e-15
+
+    for index in zip(*numpy.nonzero(near_half)):
+        rounded_coordinates[index] = round(float(coordinates[index]), num_digits)
+
+    # adding 0 turns any -0.0 into 0.0
+    return rounded_coordinates + 0.0
+
+def get_SHA1s(name, symbols, charge, spin_multiplicity, coordinates):
+    """
+    Gets the SHA1 hashes of many configurations of the same molecule.
+
+    The hashes are identical to the ones Molecule.get_SHA1() gives, and so to the ones stored in existing databases,
+    but the xyz strings the hashes are taken from are built with numpy instead of being formatted atom by atom.
+
+    Args:
+        name            - The name of the molecule.
+        symbols         - The atomic symbols of the atoms in the molecule.
+        charge          - The charge of the molecule.
+        spin_multiplicity - The spin multiplicity of the molecule.
+        coordinates     - (num_configs, num_atoms, 3) or (num_atoms, 3) array-like of the positions of the atoms in
+                each configuration.
+
+    Returns:
+        List of the SHA1 hashes of the configurations as hex strings.
+    """
+
+    coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, len(symbols) * 3)
+
+    header = name + "\n"
+    footer = "\n" + str(charge) + "\n" + str(spin_multiplicity)
+
+    if coordinates.size >= 1000:
+        rounded_coordinates = round_coordinates(coordinates)
+    else:
+        # numpy's overhead is more than it saves on only a few coordinates
+        rounded_coordinates = [[round(coordinate, 5) + 0.0 for coordinate in config] for config in coordinates.tolist()]
+
+    if coordinates.size >= 1000 and numpy.all(numpy.abs(rounded_coordinates) < 1e9):
+        xyz_bytes = get_xyz_bytes(header, symbols, footer, rounded_coordinates)
+    else:
+        # same format as Atom.to_xyz(), one line per atom
+        xyz_format = "\n".join("{:2} %22.14e %22.14e %22.14e".format(symbol) for symbol in symbols)
+
+        xyz_bytes = [(header + xyz_format % tuple(config) + footer).encode() for config in numpy.asarray(rounded_coordinates).tolist()]
+
+    return [sha1(config_bytes).hexdigest() for config_bytes in xyz_bytes]
+
+def get_xyz_bytes(header, symbols, footer, rounded_coordinates):
+    """
+    Builds the utf-8 bytes of header + the xyz string of each configuration + footer, as in Molecule.get_SHA1().
+
+    Each coordinate is written as "{:22.14e}". Because the coordinates are rounded to 5 digits after the decimal
+    point, the 15 significant digits written are exactly the digits of the coordinate times 10 ** 5 as an integer,
+    followed by zeros, so they can be computed with integer arithmetic on the whole array at once.
+
+    Args:
+        header          - String before the xyz string.
+        symbols         - The atomic symbols of the atoms in the molecule.
+        footer          - String after the xyz string.
+        rounded_coordinates - (num_configs, num_atoms * 3) numpy array of coordinates rounded to 5 digits after the
+                decimal point, all with an absolute value less than 1e9.
+
+    Returns:
+        (num_configs, num_bytes) numpy array of uint8, one row for each configuration.
+    """
+
+    num_configs = len(rounded_coordinates)
+
+    # layout of the bytes of one configuration, with space left for each coordinate
+    pieces = [header.encode()]
+    starts = []
+    length = len(pieces[0])
+
+    for index, symbol in enumerate(symbols):
+        piece = ("\n" if index != 0 else "") + "{:2}".format(symbol)
+        pieces.append(piece.encode())
+        length += len(pieces[-1])
+        for dimension in range(3):
+            starts.append(length + 1)
+            pieces.append(b" " * 23)
+            length += 23
+
+    pieces.append(footer.encode())
+    template = b"".join(pieces)
+
+    # integers, such that coordinate = integer * 10 ** -5 exactly
+    integers = numpy.rint(rounded_coordinates * 1e5).astype(numpy.int64)
+    magnitudes = numpy.abs(integers)
+
+    # number of digits in each integer, the written exponent is this - 6
+    num_digits = numpy.maximum(numpy.searchsorted(10 ** numpy.arange(16, dtype=numpy.int64), magnitudes, side="right"), 1)
+    exponents = numpy.where(magnitudes == 0, 0, num_digits - 6)
+
+    # the 15 significant digits of each integer with a leading 0, as characters, looked up four at a time
+    mantissas = magnitudes * 10 ** (15 - num_digits)
+    high = (mantissas // 10 ** 8).astype(numpy.int32)
+    low = (mantissas % 10 ** 8).astype(numpy.int32)
+    groups = numpy.stack([high // 10 ** 4, high % 10 ** 4, low // 10 ** 4, low % 10 ** 4], axis=-1)
+    digits = numpy.take(DIGIT_GROUPS, groups).view(numpy.uint8).reshape(integers.shape + (16,))[..., 1:]
+
+    # characters of each coordinate: "  d.ddddddddddddddesXX" or " -d.ddddddddddddddesXX"
+    characters = numpy.full(integers.shape + (22,), ord(" "), dtype=numpy.uint8)
+    characters[..., 1] = numpy.where(integers < 0, ord("-"), ord(" "))
+    characters[..., 2] = digits[..., 0]
+    characters[..., 3] = ord(".")
+    characters[..., 4:18] = digits[..., 1:]
+    characters[..., 18] = ord("e")
+    characters[..., 19] = numpy.where(exponents < 0, ord("-"), ord("+"))
+    characters[..., 20] = numpy.abs(exponents) // 10 + ord("0")
+    characters[..., 21] = numpy.abs(exponents) % 10 + ord("0")
+
+    xyz_bytes = numpy.tile(numpy.frombuffer(template, dtype=numpy.uint8), (num_configs, 1))
+    xyz_bytes[:, numpy.array(starts)[:, numpy.newaxis] + numpy.arange(22)] = characters
+
+    return xyz_bytes
+
+def get_quantized_hashes(name, symbols, charge, spin_multiplicity, coordinates, num_digits=5):
+    """
+    Gets hashes of many configurations of the same molecule from their coordinates quantized to integers.
+
+    Much faster than get_SHA1s(), because no strings are formatted, but the hashes are different from those of
+    Molecule.get_SHA1(), so they cannot be used to look up molecules in existing databases.
+
+    Args:
+        name            - The name of the molecule.
+        symbols         - The atomic symbols of the atoms in the molecule.
+        charge          - The charge of the molecule.
+        spin_multiplicity - The spin multiplicity of the molecule.
+        coordinates     - (num_configs, num_atoms, 3) or (num_atoms, 3) array-like of the positions of the atoms in
+                each configuration.
+        num_digits      - Coordinates are multiplied by 10 ** num_digits before they are rounded to integers.
+
+    Returns:
+        List of the SHA1 hashes of the configurations as hex strings.
+    """
+
+    coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, len(symbols) * 3)
+
+    header = "{}\n{}\n{}\n{}\n".format(name, ",".join(symbols), charge, spin_multiplicity).encode()
+
+    # the integers are written little-endian, so hashes are the same on every machine
+    quantized_coordinates = numpy.rint(coordinates * 10.0 ** num_digits).astype("<i8")
+
+    hashes = []
+
+    for config in quantized_coordinates:
+        config_hash = sha1(header)
+        config_hash.update(config.tobytes())
+        hashes.append(config_hash.hexdigest())
+
+    return hashes
@@ -1,24 +1,54 @@
+import itertools, numpy
+
 from mbfit.exceptions import XYZFormatError, InconsistentValueError
 from .molecule import Molecule
+from .molecule_batch import MoleculeBatch
+from .configuration_file import is_npz_file, get_template, read_npz_file
+from .xyz_index import IndexedXYZFile, get_xyz_index
 
 '''
 Generates a list of Molecule objects from xyz files in the given directory
+
+If indices is not None, only the molecules at those indices are read, see read_training_set_indices()
 '''
-def xyz_to_molecules(file_path, settings = None):
+def xyz_to_molecules(file_path, settings = None, indices = None):
+
+    if indices is not None:
+        batch, energies = read_training_set_indices(file_path, indices, settings=settings)
+        return list(batch)
 
     return list(parse_training_set_file(file_path, settings=settings))
 
 def parse_training_set_file(file_path, settings = None):
 
+    for batch, energies in parse_training_set_chunks(file_path, settings=settings):
+        yield from batch
+
+def get_molecule_settings(file_path, settings = None):
+    """
+    Gets the information about each fragment needed to read the molecules in an xyz file.
+
+    If settings is None, infers a single fragment named "noname" with charge 0, spin 1, a unique symmetry class for
+    each atom, and a SMILE string of the atoms in the first molecule of the file.
+
+    Args:
+        file_path       - Local path to the ".xyz" file.
+        settings        - SettingsReader with a [molecule] section describing the fragments, or None.
+
+    Returns:
+        (atoms_per_fragment, name_per_fragment, charge_per_fragment, spin_per_fragment, symmetry_per_fragment,
+        SMILE_per_fragment)
+    """
+
     if settings is None:
         charge_per_fragment = [0]
         spin_per_fragment = [1]
         name_per_fragment = ["noname"]
-        
+
         with open(file_path, "r") as xyz_file:
             total_atoms = int(xyz_file.readline())
 
-        atoms_per_fragment = [total_atoms]        
+        atoms_per_fragment = [total_atoms]
 
         symmetry = ""
 
@@ -40,8 +70,9 @@ def parse_training_set_file(file_path, settings = None):
 
         SMILE = ""
 
+        # only read the lines of the first molecule, not the whole file
         with open(file_path, "r") as xyz_file:
-            for line in xyz_file.readlines()[2:2 + total_atoms]:
+            for line in itertools.islice(xyz_file, 2, 2 + total_atoms):
                 SMILE += "[" + line.split()[0] + "]"
 
         SMILE_per_fragment = [SMILE]
@@ -54,14 +85,321 @@ def parse_training_set_file(file_path, settings = None):
         name_per_fragment = settings.get("molecule", "names").split(",")
         symmetry_per_fragment = settings.get("molecule", "symmetry").split(",")
         SMILE_per_fragment = settings.get("molecule", "SMILES").split(",")
-        
 
-    # open the file
+    return atoms_per_fragment, name_per_fragment, charge_per_fragment, spin_per_fragment, symmetry_per_fragment, SMILE_per_fragment
+
+def parse_training_set_chunks(file_path, settings = None, chunk_size = 10000, num_energies = 0, is_training_format = True):
+    """
+    Reads the molecules in an xyz file in a single pass, a chunk at a time.
+
+    Also reads ".npz" configuration files, see configuration_file.write_npz_file(). Their fragments are taken from
+    settings if it is not None, otherwise from the file, and the energies are their first num_energies columns.
+
+    Only the first molecule in the file is built as a Molecule, which checks it against the settings. The coordinates
+    of the others are read straight into numpy arrays, and Molecules are only built for them when they are taken out
+    of the MoleculeBatch.
+
+    Args:
+        file_path       - Local path to the ".xyz" or ".npz" file to read.
+        settings        - SettingsReader with a [molecule] section describing the fragments, see
+                get_molecule_settings().
+        chunk_size      - Maximum number of molecules in each chunk.
+        num_energies    - Number of energies to read from the start of the comment line of each molecule. Anything
+                after them on the comment line is ignored.
+        is_training_format - If True, an XYZFormatError is raised if a comment line does not start with num_energies
+                energies, or an InconsistentValueError if an ".npz" file has less than num_energies energies. If False,
+                the energies of that molecule are all 0.
+
+    Returns:
+        Generator of (batch, energies) for each chunk, where batch is a MoleculeBatch of the molecules in the chunk and
+        energies is a (len(batch), num_energies) numpy array.
+    """
+
+    if is_npz_file(file_path):
+        yield from parse_npz_chunks(file_path, settings, chunk_size, num_energies, is_training_format)
+        return
+
+    atoms_per_fragment, name_per_fragment, charge_per_fragment, spin_per_fragment, symmetry_per_fragment, SMILE_per_fragment = get_molecule_settings(file_path, settings)
+
+    num_atoms = sum(atoms_per_fragment)
+    frame_size = num_atoms + 2
+
+    template = None
+
+    atom_lines = []
+    comment_lines = []
+
     with open(file_path, "r") as xyz_file:
 
+        lines = []
+        index = 0
+        end_of_file = False
+
         while True:
-            try:
-                yield Molecule.read_xyz_file(xyz_file, atoms_per_fragment, name_per_fragment, charge_per_fragment, spin_per_fragment, symmetry_per_fragment, SMILE_per_fragment)
-                
-            except StopIteration:
+
+            # read more of the file once there might not be a whole molecule left in lines
+            if len(lines) - index < frame_size and not end_of_file:
+                new_lines = xyz_file.readlines(1 << 22)
+                end_of_file = len(new_lines) == 0
+                lines = lines[index:] + new_lines
+                index = 0
+                continue
+
+            if index == len(lines):
                 break
+
+            # when lines starts with many molecules with the same atom count line as the first and no blank lines
+            # between them, take all of them at once
+            num_molecules = min((len(lines) - index) // frame_size, chunk_size - len(comment_lines))
+
+            if template is not None and num_molecules > 1:
+                block = lines[index:index + num_molecules * frame_size]
+
+                if block[0::frame_size].count(count_line) == num_molecules:
+                    comment_lines.extend(block[1::frame_size])
+
+                    # remove the atom count lines, then the comment lines
+                    del block[0::frame_size]
+                    del block[0::frame_size - 1]
+                    atom_lines.extend(block)
+
+                    index += num_molecules * frame_size
+
+                    if len(comment_lines) == chunk_size:
+                        yield read_training_set_chunk(template, atom_lines, comment_lines, num_energies, is_training_format)
+
+                        atom_lines = []
+                        comment_lines = []
+
+                    continue
+
+            # skip blank lines between molecules
+            if lines[index].isspace():
+                index += 1
+                continue
+
+            if len(lines) - index < frame_size:
+                raise XYZFormatError("ran out of lines to read from xyz file {} in the middle of a molecule".format(xyz_file.name), "make sure atoms_per_fragment, the atom count line in your xyz file, and the number of atom lines in your xyz file all agree.")
+
+            try:
+                atom_total = int(lines[index])
+            except ValueError:
+                raise XYZFormatError("{}".format(lines[index]), "line should contain a single integer") from None
+
+            if atom_total != num_atoms:
+                raise InconsistentValueError("total atoms in xyz string", "fragments", atom_total, atoms_per_fragment, "fragments list must sum to total atoms from input xyz string")
+
+            if template is None:
+                count_line = lines[index]
+                template = Molecule.read_xyz("".join(lines[index:index + frame_size]), atoms_per_fragment, name_per_fragment, charge_per_fragment, spin_per_fragment, symmetry_per_fragment, SMILE_per_fragment)
+
+            comment_lines.append(lines[index + 1])
+            atom_lines.extend(lines[index + 2:index + frame_size])
+
+            index += frame_size
+
+            if len(comment_lines) == chunk_size:
+                yield read_training_set_chunk(template, atom_lines, comment_lines, num_energies, is_training_format)
+
+                atom_lines = []
+                comment_lines = []
+
+    if len(comment_lines) != 0:
+        yield read_training_set_chunk(template, atom_lines, comment_lines, num_energies, is_training_format)
+
+def read_npz_training_set(file_path, settings = None, num_energies = 0, is_training_format = True):
+    """
+    Reads the molecules in an ".npz" configuration file, see parse_training_set_chunks().
+
+    The coordinates and energies are memory mapped, so only the molecules that are used are read from disk.
+
+    Args:
+        file_path       - Local path to the ".npz" file to read.
+        settings        - SettingsReader with a [molecule] section describing the fragments, or None to use the
+                fragments stored in the file.
+        num_energies    - Number of energies of each molecule to read, from the first column of energies in the file.
+        is_training_format - If True, an InconsistentValueError is raised if the file has less than num_energies
+                energies. If False, the energies are then all 0.
+
+    Returns:
+        (batch, energies) where batch is a MoleculeBatch of every molecule in the file and energies is a
+        (len(batch), num_energies) numpy array.
+    """
+
+    batch, energies, energy_names = read_npz_file(file_path)
+
+    if settings is not None:
+        atoms_per_fragment, name_per_fragment, charge_per_fragment, spin_per_fragment, symmetry_per_fragment, SMILE_per_fragment = get_molecule_settings(file_path, settings)
+
+        batch = MoleculeBatch(get_template(batch.get_symbols(), atoms_per_fragment, name_per_fragment, charge_per_fragment, spin_per_fragment, symmetry_per_fragment, SMILE_per_fragment), batch.get_coordinates())
+
+    if len(energy_names) < num_energies:
+        if is_training_format:
+            raise InconsistentValueError("number of energies", "energies in {}".format(file_path), num_energies, energy_names, "the file must have at least as many energies as are read")
+
+        energies = numpy.zeros((len(batch), num_energies))
+
+    return batch, energies[:, :num_energies]
+
+def parse_npz_chunks(file_path, settings = None, chunk_size = 10000, num_energies = 0, is_training_format = True):
+    """
+    Reads the molecules in an ".npz" configuration file a chunk at a time, see parse_training_set_chunks().
+
+    Args:
+        file_path       - Local path to the ".npz" file to read.
+        settings        - SettingsReader with a [molecule] section describing the fragments, or None to use the
+                fragments stored in the file.
+        chunk_size      - Maximum number of molecules in each chunk.
+        num_energies    - Number of energies of each molecule to read, see read_npz_training_set().
+        is_training_format - If True, an InconsistentValueError is raised if the file has less than num_energies
+                energies. If False, the energies are then all 0.
+
+    Returns:
+        Generator of (batch, energies) for each chunk, where batch is a MoleculeBatch of the molecules in the chunk and
+        energies is a (len(batch), num_energies) numpy array.
+    """
+
+    batch, energies = read_npz_training_set(file_path, settings, num_energies, is_training_format)
+
+    for start in range(0, len(batch), chunk_size):
+        yield batch[start:start + chunk_size], numpy.array(energies[start:start + chunk_size])
+
+def read_training_set_indices(file_path, indices, settings = None, num_energies = 0, is_training_format = True):
+    """
+    Reads only some of the molecules in an ".xyz" or ".npz" file, without reading the rest of the file.
+
+    An ".xyz" file is memory mapped and its molecules are found with an index sidecar file, which is built the first
+    time the file is read this way, see xyz_index.get_xyz_index(). The time and memory this takes only depend on the
+    number of molecules read, not the size of the file.
+
+    Args:
+        file_path       - Local path to the ".xyz" or ".npz" file to read.
+        indices         - Iterable of the indices of the molecules to read, in the order to read them.
+        settings        - SettingsReader with a [molecule] section describing the fragments, see
+                get_molecule_settings().
+        num_energies    - Number of energies to read for each molecule, see parse_training_set_chunks().
+        is_training_format - If True, an error is raised if a molecule does not have num_energies energies. If False,
+                its energies are all 0.
+
+    Returns:
+        (batch, energies) where batch is a MoleculeBatch of the molecules, in the order of indices, and energies is a
+        (len(batch), num_energies) numpy array.
+    """
+
+    indices = list(indices)
+
+    if is_npz_file(file_path):
+        batch, energies = read_npz_training_set(file_path, settings, num_energies, is_training_format)
+
+        return batch[indices], numpy.array(energies[indices])
+
+    atoms_per_fragment, name_per_fragment, charge_per_fragment, spin_per_fragment, symmetry_per_fragment, SMILE_per_fragment = get_molecule_settings(file_path, settings)
+
+    num_atoms = sum(atoms_per_fragment)
+
+    with IndexedXYZFile(file_path) as xyz_file:
+
+        if len(xyz_file) == 0:
+            raise XYZFormatError("xyz file {} file is empty".format(file_path), "make sure the xyz file has at least 1 molecule in it")
+
+        # the first molecule is checked against the settings
+        template = Molecule.read_xyz("".join(xyz_file.get_lines(0)), atoms_per_fragment, name_per_fragment, charge_per_fragment, spin_per_fragment, symmetry_per_fragment, SMILE_per_fragment)
+
+        atom_lines = []
+        comment_lines = []
+
+        for index in indices:
+            lines = xyz_file.get_lines(index)
+
+            if len(lines) != num_atoms + 2:
+                raise InconsistentValueError("total atoms in xyz string", "fragments", int(lines[0]), atoms_per_fragment, "fragments list must sum to total atoms from input xyz string")
+
+            comment_lines.append(lines[1])
+            atom_lines.extend(lines[2:])
+
+    if len(indices) == 0:
+        return MoleculeBatch(template, numpy.zeros((0, num_atoms, 3))), numpy.zeros((0, num_energies))
+
+    return read_training_set_chunk(template, atom_lines, comment_lines, num_energies, is_training_format)
+
+def count_molecules(file_path):
+    """
+    Counts the molecules in an ".xyz" or ".npz" file, without parsing them.
+
+    An ".xyz" file is counted with its index sidecar file, which is built if it is not up to date, see
+    xyz_index.get_xyz_index().
+
+    Args:
+        file_path       - Local path to the ".xyz" or ".npz" file.
+
+    Returns:
+        The number of molecules in the file.
+    """
+
+    if is_npz_file(file_path):
+        batch, energies, energy_names = read_npz_file(file_path)
+        return len(batch)
+
+    return len(get_xyz_index(file_path)) - 1
+
+def read_training_set_chunk(template, atom_lines, comment_lines, num_energies = 0, is_training_format = True):
+    """
+    Reads the atom and comment lines of a chunk of molecules from an xyz file.
+
+    Args:
+        template        - Molecule with the fragments and atoms of every molecule in the chunk.
+        atom_lines      - List of the atom lines of every molecule in the chunk, in order.
+        comment_lines   - List of the comment line of each molecule in the chunk.
+        num_energies    - Number of energies to read from the start of each comment line.
+        is_training_format - If True, an XYZFormatError is raised if a comment line does not start with num_energies
+                energies. If False, the energies of that molecule are all 0.
+
+    Returns:
+        (batch, energies) where batch is a MoleculeBatch of the molecules in the chunk and energies is a
+        (len(comment_lines), num_energies) numpy array.
+    """
+
+    symbols = template.get_symbols()
+
+    # one character longer than the longest symbol, so no longer symbol is cut down to a symbol in the template
+    atom_line_format = [("symbol", "U{}".format(max(len(symbol) for symbol in symbols) + 1)), ("coordinates", float, (3,))]
+
+    try:
+        atoms = numpy.loadtxt(atom_lines, dtype=atom_line_format, comments=None, ndmin=1)
+        is_valid = numpy.all(atoms["symbol"].reshape(len(comment_lines), -1) == numpy.array(symbols))
+    except ValueError:
+        is_valid = False
+
+    # every line must be a symbol and 3 coordinates, the symbol the same as the same atom in the template
+    if not is_valid:
+        for line_index, line in enumerate(atom_lines):
+            try:
+                symbol, x, y, z = line.split()
+                float(x), float(y), float(z)
+            except ValueError:
+                raise XYZFormatError(line, "ATOMIC_SYMBOL X Y Z") from None
+
+            if symbol != symbols[line_index % len(symbols)]:
+                raise InconsistentValueError("atomic symbol in xyz file", "atomic symbol in first molecule", symbol, symbols[line_index % len(symbols)], "every molecule in an xyz file must have the same atoms in the same order")
+
+        # every line is valid, but numpy could not read one of them
+        coordinates = numpy.array([[float(value) for value in line.split()[1:]] for line in atom_lines])
+
+    else:
+        coordinates = numpy.ascontiguousarray(atoms["coordinates"])
+
+    energies = numpy.zeros((len(comment_lines), num_energies))
+
+    if num_energies > 0:
+        for molecule_index, comment_line in enumerate(comment_lines):
+            try:
+                molecule_energies = [float(e) for e in comment_line.split()[:num_energies]]
+            except ValueError:
+                molecule_energies = []
+
+            if len(molecule_energies) == num_energies:
+                energies[molecule_index] = molecule_energies
+            elif is_training_format:
+                raise XYZFormatError(comment_line.strip(), "at least {} energies".format(num_energies))
+
+    return MoleculeBatch(template, coordinates), energies
@@ -0,0 +1,245 @@
+import mmap, os
+import numpy
+
+from mbfit.exceptions import XYZFormatError
+
+# number of bytes of the file searched for line breaks at a time when building an index
+INDEX_BLOCK_SIZE = 1 << 26
+
+def get_index_path(file_path):
+    """
+    Gets the path of the index sidecar file of an xyz file.
+
+    Args:
+        file_path       - Local path to the ".xyz" file.
+
+    Returns:
+        Local path to the index of the file, next to it.
+    """
+
+    return file_path + ".index.npz"
+
+def build_xyz_index(file_path):
+    """
+    Finds the byte offset at which each molecule in an xyz file starts.
+
+    Blank lines between molecules are allowed, and are counted as part of the molecule before them.
+
+    Args:
+        file_path       - Local path to the ".xyz" file.
+
+    Returns:
+        (num_molecules + 1,) numpy array of offsets, molecule i is bytes offsets[i] to offsets[i + 1] of the file.
+    """
+
+    file_size = os.path.getsize(file_path)
+
+    if file_size == 0:
+        return numpy.zeros(1, dtype=numpy.int64)
+
+    with open(file_path, "rb") as xyz_file, mmap.mmap(xyz_file.fileno(), 0, access=mmap.ACCESS_READ) as xyz_map:
+
+        # the offset at which every line starts, found a block at a time
+        line_starts = [numpy.zeros(1, dtype=numpy.int64)]
+
+        for block_start in range(0, file_size, INDEX_BLOCK_SIZE):
+            block = numpy.frombuffer(xyz_map, dtype=numpy.uint8, count=min(INDEX_BLOCK_SIZE, file_size - block_start), offset=block_start)
+            line_starts.append(numpy.flatnonzero(block == ord("\n")) + block_start + 1)
+
+        # the file cannot be unmapped while an array still uses its memory
+        del block
+
+        line_starts = numpy.concatenate(line_starts)
+
+        # the last line break does not start another line
+        if line_starts[-1] == file_size:
+            line_starts = line_starts[:-1]
+
+        line_starts = line_starts.tolist()
+        line_starts.append(file_size)
+
+        num_lines = len(line_starts) - 1
+
+        offsets = []
+        atom_counts = {}
+
+        line_index = 0
+
+        while line_index < num_lines:
+            line = xyz_map[line_starts[line_index]:line_starts[line_index + 1]]
+
+            # skip blank lines between molecules
+            if line.isspace():
+                line_index += 1
+                continue
+
+            # most molecules have the same atom count line, so only parse each different one once
+            if line not in atom_counts:
+                try:
+                    atom_counts[line] = int(line)
+                except ValueError:
+                    raise XYZFormatError("{}".format(line.decode()), "line should contain a single integer") from None
+
+            offsets.append(line_starts[line_index])
+
+            line_index += atom_counts[line] + 2
+
+            if line_index > num_lines:
+                raise XYZFormatError("ran out of lines to read from xyz file {} in the middle of a molecule".format(file_path), "make sure the atom count line in your xyz file and the number of atom lines in your xyz file agree.")
+
+    offsets.append(file_size)
+
+    return numpy.array(offsets, dtype=numpy.int64)
+
+def get_xyz_index(file_path):
+    """
+    Gets the byte offset at which each molecule in an xyz file starts, see build_xyz_index().
+
+    The offsets are read from the index sidecar file of the xyz file if it is up to date. Otherwise, they are found
+    and written to the sidecar, if its directory can be written to.
+
+    Args:
+        file_path       - Local path to the ".xyz" file.
+
+    Returns:
+        (num_molecules + 1,) numpy array of offsets, molecule i is bytes offsets[i] to offsets[i + 1] of the file.
+    """
+
+    index_path = get_index_path(file_path)
+
+    file_stat = os.stat(file_path)
+
+    # the index is out of date if the xyz file changed since it was written
+    if os.path.isfile(index_path):
+        with numpy.load(index_path) as index:
+            if int(index["file_size"]) == file_stat.st_size and int(index["modified_time"]) == file_stat.st_mtime_ns:
+                return index["offsets"]
+
+    offsets = build_xyz_index(file_path)
+
+    try:
+        with open(index_path, "wb") as index_file:
+            numpy.savez(index_file, offsets=offsets, file_size=numpy.array(file_stat.st_size),
+                        modified_time=numpy.array(file_stat.st_mtime_ns))
+    except OSError:
+        pass
+
+    return offsets
+
+class IndexedXYZFile(object):
+    """
+    Reads the lines of molecules from anywhere in an xyz file without reading the rest of it.
+
+    The file is memory mapped, and the molecules are found with an index of the offset of each, see get_xyz_index(),
+    so only the molecules that are used are read from disk. See molecule_parser.read_training_set_indices() to parse
+    them.
+    """
+
+    def __init__(self, file_path):
+        """
+        Opens an xyz file, building its index if it is not up to date.
+
+        Args:
+            file_path       - Local path to the ".xyz" file.
+
+        Returns:
+            A new IndexedXYZFile.
+        """
+
+        self.file_path = file_path
+        self.offsets = get_xyz_index(file_path)
+
+        self.xyz_file = open(file_path, "rb")
+
+        # an empty file cannot be memory mapped
+        self.xyz_map = mmap.mmap(self.xyz_file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] > 0 else None
+
+    def get_num_configs(self):
+        """
+        Gets the number of molecules in this file.
+
+        Args:
+            None.
+
+        Returns:
+            The number of molecules.
+        """
+
+        return len(self.offsets) - 1
+
+    def get_bytes(self, index):
+        """
+        Gets the bytes of one molecule in this file, including any blank lines after it.
+
+        Args:
+            index           - The index of the molecule, negative indices count from the end of the file.
+
+        Returns:
+            The bytes of the molecule.
+        """
+
+        index = range(self.get_num_configs())[index]
+
+        return self.xyz_map[self.offsets[index]:self.offsets[index + 1]]
+
+    def get_lines(self, index):
+        """
+        Gets the lines of one molecule in this file.
+
+        Args:
+            index           - The index of the molecule, negative indices count from the end of the file.
+
+        Returns:
+            List of the atom count line, comment line and atom lines of the molecule.
+        """
+
+        lines = self.get_bytes(index).decode().splitlines(True)
+
+        return lines[:int(lines[0]) + 2]
+
+    def write_xyz(self, file_path, indices):
+        """
+        Copies some of the molecules in this file to another xyz file, exactly as they are in this file.
+
+        Args:
+            file_path       - Local path to the ".xyz" file to write.
+            indices         - Iterable of the indices of the molecules to copy, in the order to write them.
+
+        Returns:
+            None.
+        """
+
+        with open(file_path, "wb") as out_file:
+            for index in indices:
+                molecule_bytes = self.get_bytes(index)
+
+                out_file.write(molecule_bytes)
+
+                # the last molecule in a file may not end in a line break
+                if not molecule_bytes.endswith(b"\n"):
+                    out_file.write(b"\n")
+
+    def close(self):
+        """
+        Closes this file.
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        """
+
+        if self.xyz_map is not None:
+            self.xyz_map.close()
+
+        self.xyz_file.close()
+
+    def __len__(self):
+        return self.get_num_configs()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.close()
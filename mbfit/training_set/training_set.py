@@ -1,5 +1,4 @@
-from mbfit.exceptions import XYZFormatError
-from mbfit.molecule import parse_training_set_file
+from mbfit.molecule import parse_training_set_chunks, read_training_set_indices
 
 from . import TrainingSetElement
 
@@ -22,43 +21,23 @@ class TrainingSet:
         return TrainingSet(elements)
 
     @staticmethod
-    def get_training_set_from_xyz_file(path_to_xyz_file, settings, energy_names, is_training_format = True):
+    def get_training_set_from_xyz_file(path_to_xyz_file, settings, energy_names, is_training_format = True, indices = None):
 
-        molecules = list(parse_training_set_file(path_to_xyz_file, settings=settings))
-
-        num_atoms = sum([int(atom_count) for atom_count in settings.get("molecule", "fragments").split(",")])
-
-        energies_dict = {}
-
-        for energy_name in energy_names:
-            energies_dict[energy_name] = []
-
-        with open(path_to_xyz_file, "r") as xyz_file:
-            while True:
-                atom_count_line = xyz_file.readline()
-                while len(atom_count_line.split()) == 0:
-                    if atom_count_line == "":
-                        return TrainingSet.get_training_set_from_data(molecules, **energies_dict)
-
-                    atom_count_line = xyz_file.readline()
-
-                energies_line = xyz_file.readline()
-                if energies_line == "":
-                    raise XYZFormatError("ran out of lines to read from xyz file {} in the middle of a molecule".format(xyz_file.name), "make sure atoms_per_fragment, the atom count line in your xyz file, and the number of atom lines in your xyz file all agree.")
+        elements = []
 
-                energies = [float(e) for e in energies_line.split()]
+        # molecules and energies are read in the same pass, molecules are only built when they are needed
+        if indices is None:
+            chunks = parse_training_set_chunks(path_to_xyz_file, settings=settings, num_energies=len(energy_names), is_training_format=is_training_format)
 
-                if len(energies) < len(energy_names):
-                    if is_training_format:
-                        raise XYZFormatError("Expected at least {} enegies in line '{}' but found only {}.".format(len(energy_names), energies_line, len(energies)))
-                    else:
-                        energies = [0.0]*len(energy_names)
+        # only the molecules at indices are read from the file
+        else:
+            chunks = [read_training_set_indices(path_to_xyz_file, indices, settings=settings, num_energies=len(energy_names), is_training_format=is_training_format)]
 
-                for index, energy_name in enumerate(energy_names):
-                    energies_dict[energy_name].append(energies[index])
+        for batch, energies in chunks:
+            for index, molecule_energies in enumerate(energies.tolist()):
+                elements.append(TrainingSetElement.from_batch(batch, index, **dict(zip(energy_names, molecule_energies))))
 
-                for index in range(num_atoms):
-                    xyz_file.readline()
+        return TrainingSet(elements)
 
     def __init__(self, elements):
         self.elements = elements
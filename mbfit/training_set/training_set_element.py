@@ -3,9 +3,25 @@ class TrainingSetElement:
     def __init__(self, molecule, **energies):
         self.molecule = molecule
 
+        # if molecule is None, it is built from configuration batch_index of batch when it is first needed
+        self.batch = None
+        self.batch_index = None
+
         self.energies = energies
 
+    @staticmethod
+    def from_batch(batch, batch_index, **energies):
+        element = TrainingSetElement(None, **energies)
+
+        element.batch = batch
+        element.batch_index = batch_index
+
+        return element
+
     def get_molecule(self):
+        if self.molecule is None:
+            self.molecule = self.batch.get_molecule(self.batch_index)
+
         return self.molecule
 
     def has_energy(self, energy_name):
@@ -18,4 +34,4 @@ class TrainingSetElement:
         self.energies[energy_name] = energy
 
     def __str__(self):
-        return self.molecule.to_xyz() + "\n" + str(self.energies)
+        return self.get_molecule().to_xyz() + "\n" + str(self.energies)
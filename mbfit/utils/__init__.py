@@ -1,5 +1,6 @@
-from . import files, system, constants, math
+from . import files, system, constants, math, periodic_table
 from .settings_reader import SettingsReader
 from .quaternion import Quaternion
 from .progress_bar import ProgressBar
 from . import distribution_function
+from .lru_cache import LRUCache
@@ -0,0 +1,133 @@
+# external package imports
+import collections, threading
+
+# absolute module imports
+from mbfit.exceptions import InvalidValueError
+
+class LRUCache(object):
+    """
+    Size-bounded mapping that evicts the least recently used entry once it is full.
+
+    Counts hits and misses, so callers can check how well the cache works. Safe to share between threads.
+    """
+
+    def __init__(self, max_size=4096):
+        """
+        Creates a new, empty LRUCache.
+
+        Args:
+            max_size        - Maximum number of entries to keep.
+
+        Returns:
+            A new LRUCache.
+        """
+
+        if max_size < 1:
+            raise InvalidValueError("max_size", max_size, "must be at least 1")
+
+        self.max_size = max_size
+
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        Gets the value stored for a key, and marks it as most recently used.
+
+        Args:
+            key             - The key to look up.
+            default         - Value to return if key is not in the cache.
+
+        Returns:
+            The value stored for key, or default if there is none.
+        """
+
+        with self.lock:
+            try:
+                value = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Stores a value for a key, evicting the least recently used entry if the cache is full.
+
+        Values are shared by everyone who gets them from the cache, so they should not be modified.
+
+        Args:
+            key             - The key to store the value under.
+            value           - The value to store.
+
+        Returns:
+            None.
+        """
+
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes all entries from the cache and resets its hit and miss counters.
+
+        Args:
+            None.
+
+        Returns:
+            None.
+        """
+
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_size(self):
+        """
+        Gets the number of entries in the cache.
+
+        Args:
+            None.
+
+        Returns:
+            The number of entries in the cache.
+        """
+
+        return len(self.entries)
+
+    def get_hits(self):
+        """
+        Gets the number of calls to get() that found their key.
+
+        Args:
+            None.
+
+        Returns:
+            The number of cache hits.
+        """
+
+        return self.hits
+
+    def get_misses(self):
+        """
+        Gets the number of calls to get() that did not find their key.
+
+        Args:
+            None.
+
+        Returns:
+            The number of cache misses.
+        """
+
+        return self.misses
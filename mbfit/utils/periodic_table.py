@@ -1,35 +1,120 @@
-class PeriodicTable(object):
-    def __init__(self):
-        self.atoms = []
-
-    def get_number(self, number):
-        return self.atoms[number]
-
-    def get_symbol(self, symbol):
-        for atom in self.atoms:
-            if atom.symbol == symbol:
-                return atom
-    
-        return None # should probably raise an exception instead
-
-class Atom(object)
-    def __init__(self, number, symbol):
-        self.number = number
-        self.symbol = symbol
-        self.radius = None
-        self.covalent_radius = None
-        self.mass = {}
-
-    def add_isotope(self, number, mass, weight):
-        self.mass[number] = (mass, weight)
-
-    def get_average_mass(self):
-        weighted_mass = 0
-        total_weight = 0
-        for mass, weight in self.mass:
-            weighted_mass += mass * weight
-            total_weight += weight
-
-        return weighted_mass / total_weight
-
-periodic_table = PeriodicTable()
+import numpy
+
+# absolute module imports
+from mbfit.exceptions import InvalidValueError
+
+# local module imports
+from . import constants
+
+"""
+Properties of the elements as numpy arrays indexed by atomic number, so the properties of many atoms can be looked up
+at once, without searching for their atomic symbols.
+
+Index 0 is not an element, and is nan in every array.
+"""
+
+# atomic number of each atomic symbol
+atomic_numbers = {symbol: number for number, symbol in enumerate(constants.atomic_symbols, start=1)}
+
+# atomic masses in g/mol
+masses = numpy.array([numpy.nan] + constants.atomic_masses)
+
+# atomic radii in angstroms
+radii = numpy.array([numpy.nan] + constants.atomic_radii)
+
+# covalent radii in angstroms
+covalent_radii = numpy.array([numpy.nan] + constants.covalent_radii)
+
+# van der Waals radii in angstroms, nan for elements with no van der Waals radius defined
+vdw_radii = numpy.array([numpy.nan] + [numpy.nan if radius == -1.0 else radius for radius in constants.vdw_radii])
+
+def get_atomic_number(symbol):
+    """
+    Converts an atomic symbol to an atomic number with a dictionary lookup.
+
+    Args:
+        symbol              - The 1 or 2 letter atomic symbol to convert to an atomic number. For example: "He", "F".
+                Case non-sensitive.
+
+    Returns:
+        The atomic number for the atom specified by the given symbol.
+    """
+
+    try:
+        return atomic_numbers[symbol]
+    except KeyError:
+        # symbol_to_number() also accepts symbols in any case, and raises an error for invalid symbols
+        return constants.symbol_to_number(symbol)
+
+def get_atomic_numbers(symbols):
+    """
+    Converts atomic symbols to atomic numbers.
+
+    Args:
+        symbols             - Iterable of 1 or 2 letter atomic symbols. Case non-sensitive.
+
+    Returns:
+        numpy array of the atomic number of each symbol.
+    """
+
+    return numpy.array([get_atomic_number(symbol) for symbol in symbols], dtype=int)
+
+def get_masses(numbers):
+    """
+    Gets the atomic masses of elements.
+
+    Args:
+        numbers             - Atomic number or numpy array of atomic numbers.
+
+    Returns:
+        The atomic mass of each element in g/mol, in the same shape as numbers.
+    """
+
+    return masses[numbers]
+
+def get_radii(numbers):
+    """
+    Gets the atomic radii of elements.
+
+    Args:
+        numbers             - Atomic number or numpy array of atomic numbers.
+
+    Returns:
+        The atomic radius of each element in angstroms, in the same shape as numbers.
+    """
+
+    return radii[numbers]
+
+def get_covalent_radii(numbers):
+    """
+    Gets the covalent radii of elements.
+
+    Args:
+        numbers             - Atomic number or numpy array of atomic numbers.
+
+    Returns:
+        The covalent radius of each element in angstroms, in the same shape as numbers.
+    """
+
+    return covalent_radii[numbers]
+
+def get_vdw_radii(numbers):
+    """
+    Gets the van der Waals radii of elements.
+
+    Args:
+        numbers             - Atomic number or numpy array of atomic numbers.
+
+    Returns:
+        The van der Waals radius of each element in angstroms, in the same shape as numbers. Raises an
+        InvalidValueError if any element has no van der Waals radius defined.
+    """
+
+    radii = vdw_radii[numbers]
+
+    undefined = numpy.flatnonzero(numpy.isnan(radii))
+
+    if len(undefined) > 0:
+        raise InvalidValueError("Element", constants.number_to_symbol(int(numpy.ravel(numbers)[undefined[0]])), "has no valid van der Waals radius defined!")
+
+    return radii
@@ -1,5 +1,5 @@
 # external package imports
-import math
+import math, numpy
 from random import Random
 
 class Quaternion(object):
@@ -64,7 +64,42 @@ class Quaternion(object):
 
         # now create the Quaternion of rotation
         return Quaternion(r, i, j, k)
-    
+
+    @staticmethod
+    def get_random_rotation_matrices(random, num_rotations):
+        """
+        Gets many random rotation matrices at once, such that every rotation is just as likely as any other rotation.
+
+        Uses the same algorithm as get_random_rotation_quaternion(), on arrays of random numbers.
+
+        Args:
+            random          - The numpy random Generator used to generate the rotations.
+            num_rotations   - The number of rotation matrices to generate.
+
+        Returns:
+            (num_rotations, 3, 3) numpy array of rotation matrices M, such that M @ (x, y, z) is (x, y, z) rotated.
+        """
+
+        X0, X1, X2 = random.random((3, num_rotations))
+
+        t1 = 2 * math.pi * X1
+        t2 = 2 * math.pi * X2
+
+        r1 = numpy.sqrt(1 - X0)
+        r2 = numpy.sqrt(X0)
+
+        r = r2 * numpy.cos(t2)
+        i = r1 * numpy.sin(t1)
+        j = r1 * numpy.cos(t1)
+        k = r2 * numpy.sin(t2)
+
+        # the same matrix as get_rotation_matrix() of each Quaternion of rotation
+        return numpy.stack([
+            numpy.stack([r * r + i * i - j * j - k * k, 2 * (i * j - r * k), 2 * (i * k + r * j)], axis=-1),
+            numpy.stack([2 * (i * j + r * k), r * r - i * i + j * j - k * k, 2 * (j * k - r * i)], axis=-1),
+            numpy.stack([2 * (i * k - r * j), 2 * (j * k + r * i), r * r - i * i - j * j + k * k], axis=-1)
+        ], axis=1)
+
     def __init__(self, r, i, j, k):
         """
         Creates a new Quaternion from the given real component (r) and 3 imaginary components (i, j, k).
@@ -302,3 +337,44 @@ class Quaternion(object):
         z = rotated_quaternion.k + origin_z
 
         return x, y, z
+
+    def get_rotation_matrix(self):
+        """
+        Gets the matrix of the rotation defined by this Quaternion
+
+        The matrix is not normalized, so multiplying a vector by it gives the same result as rotate() even if this
+        Quaternion is not a unit Quaternion.
+
+        Args:
+            None.
+
+        Returns:
+            3x3 numpy array M, such that M @ (x, y, z) is (x, y, z) rotated by this Quaternion.
+        """
+
+        r, i, j, k = self.r, self.i, self.j, self.k
+
+        return numpy.array([
+            [r * r + i * i - j * j - k * k, 2 * (i * j - r * k), 2 * (i * k + r * j)],
+            [2 * (i * j + r * k), r * r - i * i + j * j - k * k, 2 * (j * k - r * i)],
+            [2 * (i * k - r * j), 2 * (j * k + r * i), r * r - i * i - j * j + k * k]
+        ])
+
+    def rotate_coordinates(self, coordinates, origin_x = 0, origin_y = 0, origin_z = 0):
+        """
+        Rotates many points in space by the rotation defined by this Quaternion
+
+        Args:
+            coordinates     - (n, 3) numpy array of the points to rotate.
+            origin_x        - The x of the point to rotate about.
+            origin_y        - The y of the point to rotate about.
+            origin_z        - The z of the point to rotate about.
+
+        Returns:
+            New (n, 3) numpy array of the points rotated around the input origin by the rotation defined by this
+            Quaternion.
+        """
+
+        origin = numpy.array([origin_x, origin_y, origin_z], dtype=float)
+
+        return (coordinates - origin) @ self.get_rotation_matrix().T + origin
@@ -0,0 +1,7 @@
+import unittest
+from . import test_overlap_checker, test_normal_modes_configuration_generator, test_configuration_generator, \
+        test_configuration_generator_2b, test_atom_distance_configuration_generator, test_configuration_generator_nb
+
+suite = unittest.TestSuite([test_overlap_checker.suite, test_normal_modes_configuration_generator.suite,
+                            test_configuration_generator.suite, test_configuration_generator_2b.suite,
+                            test_atom_distance_configuration_generator.suite, test_configuration_generator_nb.suite])
@@ -0,0 +1,209 @@
+"""
+Benchmark of NormalModesConfigurationGenerator against the reference implementation it replaced, which built the
+square root of the covariance matrix, G, with a Python loop for every configuration and displaced the atoms one
+coordinate at a time.
+
+Run from the root of the repository with:
+
+    python -m test_mbfit.test_configurations.benchmark_normal_modes [settings.ini geometry.xyz normal_modes.dat]
+
+By default, the water monomer in test_mbfit/test_configurations/resources is used.
+"""
+
+import sys, os, math, time, copy, argparse
+from random import Random
+import numpy
+
+from mbfit.configurations import NormalModesConfigurationGenerator
+from mbfit.molecule import xyz_to_molecules
+from mbfit.utils import system, constants
+
+resources = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources")
+
+def get_reference_mass_scaled_normal_modes(config_generator, molecule):
+    """
+    Mass-scales and normalizes the normal modes of a NormalModesConfigurationGenerator with the reference loops.
+
+    Args:
+        config_generator    - The NormalModesConfigurationGenerator. Its normal modes are not changed.
+        molecule            - The optimized geometry the normal modes are of.
+
+    Returns:
+        List of the mass-scaled, normalized normal modes, each a list of [x, y, z] per atom.
+    """
+
+    normal_modes = copy.deepcopy(config_generator.normal_modes)
+
+    for normal_mode in normal_modes:
+
+        normalization_scale = 0
+
+        for coordinates, atom in zip(normal_mode, molecule.get_atoms()):
+
+            sqrt_mass = math.sqrt(atom.get_mass() * constants.mass_electron_per_mass_proton)
+            for i in range(3):
+                coordinates[i] = coordinates[i] * sqrt_mass
+
+            normalization_scale += coordinates[0] ** 2
+            normalization_scale += coordinates[1] ** 2
+            normalization_scale += coordinates[2] ** 2
+
+        normalization_scale = math.sqrt(normalization_scale)
+
+        for coordinates in normal_mode:
+            for i in range(3):
+                coordinates[i] = coordinates[i] / normalization_scale
+
+    return normal_modes
+
+def get_reference_G(config_generator, normal_modes, temp):
+    """
+    Builds G = ( d * U * U^T )^(1/2), the square root of the mass-scaled covariance matrix, with the reference loops.
+
+    Args:
+        config_generator    - The NormalModesConfigurationGenerator.
+        normal_modes        - The mass-scaled normal modes, from get_reference_mass_scaled_normal_modes().
+        temp                - The temperature in atomic units.
+
+    Returns:
+        G as a list of lists.
+    """
+
+    dim = 3 * len(normal_modes[0])
+
+    freq_cutoff = 10 * constants.cmtoau
+
+    G = [[0 for i in range(dim)] for k in range(dim)]
+
+    for frequency, normal_mode in zip(config_generator.frequencies, normal_modes):
+
+        if frequency >= freq_cutoff:
+
+            if config_generator.classical:
+                d = temp / (frequency ** 2)
+
+            elif temp > 1.0e-8:
+                d = 0.5 / (numpy.tanh(frequency / (2 * temp)) * frequency)
+
+            else:
+                d = 0.5 / frequency
+
+            for i in range(dim):
+                for j in range(dim):
+                    G[i][j] += math.sqrt(d) * normal_mode[i // 3][i % 3] * normal_mode[j // 3][j % 3]
+
+    return G
+
+def make_reference_config(molecule, G, random):
+    """
+    Gets a single configuration based on the input molecule and G, with the reference loops.
+
+    Args:
+        molecule            - The molecule to generate a configuration of. It is not moved.
+        G                   - The sqrt of the mass-scaled covariance matrix, from get_reference_G().
+        random              - The Random object to use to generate the configuration.
+
+    Returns:
+        A new Molecule at the positions of the configuration.
+    """
+
+    molecule = molecule.get_copy()
+
+    dim = 3 * molecule.get_num_atoms()
+
+    displacement = [[0, 0, 0] for i in range(molecule.get_num_atoms())]
+
+    norm_dist_list = [random.normalvariate(0, 1) for i in range(dim)]
+
+    for atom_index, atom, atom_displacement in zip(range(molecule.get_num_atoms()), molecule.get_atoms(),
+                                                   displacement):
+
+        for coordinate_index in range(3):
+            atom_displacement[coordinate_index] = numpy.dot([g[atom_index * 3 + coordinate_index] for g in G],
+                                                            norm_dist_list)
+
+            atom_displacement[coordinate_index] /= math.sqrt(
+                atom.get_mass() * constants.mass_electron_per_mass_proton)
+
+    bohr = constants.bohr * 1e10
+
+    for atom_index, atom in enumerate(molecule.get_atoms()):
+        x = (atom.get_x() / bohr + displacement[atom_index][0]) * bohr
+        y = (atom.get_y() / bohr + displacement[atom_index][1]) * bohr
+        z = (atom.get_z() / bohr + displacement[atom_index][2]) * bohr
+
+        atom.set_xyz(x, y, z)
+
+    return molecule
+
+def generate_reference_configurations(config_generator, molecule, num_configs, seed):
+    """
+    Generates configurations the way NormalModesConfigurationGenerator.generate_configurations() did before it was
+    vectorised. The configurations have the same distribution, but not the same random numbers.
+
+    Args:
+        config_generator    - The NormalModesConfigurationGenerator whose normal modes and temperatures to use.
+        molecule            - The optimized geometry.
+        num_configs         - The number of configurations to generate.
+        seed                - Seed for the random number generator.
+
+    Yields:
+        Molecule objects containing the new configurations.
+    """
+
+    random = Random(seed)
+
+    normal_modes = get_reference_mass_scaled_normal_modes(config_generator, molecule)
+
+    for config_index in range(num_configs):
+        temp = config_generator.temp_distribution.get_value(config_index / max(num_configs - 1, 1))
+
+        yield make_reference_config(molecule, get_reference_G(config_generator, normal_modes, temp), random)
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Times normal modes configuration generation against the reference implementation.")
+    parser.add_argument("paths", nargs="*", default=[os.path.join(resources, "water.ini"),
+                                                      os.path.join(resources, "water.xyz"),
+                                                      os.path.join(resources, "water_normal_modes.dat")],
+                        help="settings .ini, optimized geometry .xyz and normal modes .dat files")
+    parser.add_argument("--num_configs", type=int, default=10000, help="number of configurations to generate")
+    parser.add_argument("--num_reference_configs", type=int, default=200,
+                        help="number of configurations to generate with the reference implementation, which is slow")
+    args = parser.parse_args(args)
+
+    settings_path, geo_path, normal_modes_path = args.paths
+
+    # the generators print their progress, which would drown out the timings
+    format_print = system.format_print
+    system.format_print = lambda *args, **kwargs: None
+
+    try:
+        molecule = xyz_to_molecules(geo_path)[0]
+
+        for classical in [True, False]:
+            config_generator = NormalModesConfigurationGenerator(settings_path, normal_modes_path, classical=classical)
+
+            start = time.perf_counter()
+            for config in generate_reference_configurations(config_generator, molecule, args.num_reference_configs, 1):
+                pass
+            reference_time = (time.perf_counter() - start) / args.num_reference_configs
+
+            start = time.perf_counter()
+            for batch in config_generator.generate_configuration_batches([[molecule]], args.num_configs, seed=1):
+                pass
+            batch_time = (time.perf_counter() - start) / args.num_configs
+
+            start = time.perf_counter()
+            for config in config_generator.generate_configurations([[molecule]], args.num_configs, seed=1):
+                pass
+            molecule_time = (time.perf_counter() - start) / args.num_configs
+
+            print("{:9}  reference: {:10.1f} us/config  batches: {:8.2f} us/config  molecules: {:8.2f} us/config  speedup: {:.0f}x".format(
+                "classical" if classical else "quantum", reference_time * 1e6, batch_time * 1e6, molecule_time * 1e6,
+                reference_time / molecule_time))
+
+    finally:
+        system.format_print = format_print
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
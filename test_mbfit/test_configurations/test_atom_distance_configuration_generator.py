@@ -0,0 +1,50 @@
+import unittest, os, numpy
+
+from test_mbfit.test_case_with_id import TestCaseWithId
+from test_mbfit.test_configurations.test_configuration_generator_2b import get_internal_distances
+from mbfit.configurations import AtomDistanceConfigurationGenerator, OverlapChecker
+from mbfit.molecule import xyz_to_molecules
+
+"""
+Test cases for the AtomDistanceConfigurationGenerator class
+"""
+class TestAtomDistanceConfigurationGenerator(TestCaseWithId):
+    def __init__(self, *args, **kwargs):
+        super(TestAtomDistanceConfigurationGenerator, self).__init__(*args, **kwargs)
+        self.test_folder = os.path.dirname(os.path.abspath(__file__))
+
+    def setUpClass():
+        resources = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources")
+
+        TestAtomDistanceConfigurationGenerator.settings_path = os.path.join(resources, "water_dimer.ini")
+        TestAtomDistanceConfigurationGenerator.molecule = xyz_to_molecules(os.path.join(resources, "water.xyz"))[0]
+
+    def test_atom_distances(self):
+        molecule = TestAtomDistanceConfigurationGenerator.molecule
+
+        overlap_checker = OverlapChecker([molecule, molecule], 0.8)
+        internal_distances = get_internal_distances(molecule.get_coordinate_array())
+
+        # the oxygens, and an oxygen and a hydrogen
+        for mol1_atom_index, mol2_atom_index in [(0, 0), (0, 1)]:
+            config_generator = AtomDistanceConfigurationGenerator(TestAtomDistanceConfigurationGenerator.settings_path,
+                                                                  mol1_atom_index, mol2_atom_index, min_distance=3,
+                                                                  max_distance=5, progression=True)
+
+            configs = numpy.concatenate([batch.get_coordinates() for batch in config_generator.generate_configuration_batches([[molecule], [molecule]], 40, seed=3)])
+
+            self.assertEqual(configs.shape, (40, 6, 3))
+
+            # the centering atoms are the distance apart they were asked to be
+            distances = numpy.linalg.norm(configs[:, 3 + mol2_atom_index] - configs[:, mol1_atom_index], axis=1)
+
+            self.assertTrue(numpy.allclose(distances, 3 + 2 * numpy.arange(40) / 40))
+
+            self.assertFalse(numpy.any(overlap_checker.overlaps_batch(configs)))
+
+            for monomer_configs in [configs[:, :3], configs[:, 3:]]:
+                self.assertTrue(numpy.allclose(get_internal_distances(monomer_configs), internal_distances))
+
+        self.test_passed = True
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestAtomDistanceConfigurationGenerator)
@@ -0,0 +1,114 @@
+import unittest, unittest.mock, os, numpy
+
+from test_mbfit.test_case_with_id import TestCaseWithId
+from mbfit.configurations import ConfigurationGenerator, DistanceSamplingConfigurationGenerator
+from mbfit.configurations import configuration_generator
+from mbfit.molecule import xyz_to_molecules, MoleculeBatch
+from mbfit.utils import SettingsReader, files
+
+"""
+Test cases for the ConfigurationGenerator class
+"""
+class TestConfigurationGenerator(TestCaseWithId):
+    def __init__(self, *args, **kwargs):
+        super(TestConfigurationGenerator, self).__init__(*args, **kwargs)
+        self.test_folder = os.path.dirname(os.path.abspath(__file__))
+
+    def setUpClass():
+        resources = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources")
+
+        TestConfigurationGenerator.settings_path = os.path.join(resources, "water_dimer.ini")
+        TestConfigurationGenerator.geo_path = os.path.join(resources, "water.xyz")
+
+    def get_output_path(self, file_name):
+        # the output directory is moved away after every test
+        return os.path.join(files.init_directory(os.path.join(self.test_folder, "output")), file_name)
+
+    def generate_2b_configs(self, out_path, num_workers):
+        config_generator = DistanceSamplingConfigurationGenerator(TestConfigurationGenerator.settings_path,
+                                                                  min_distance=3, progression=True)
+
+        ConfigurationGenerator.generate_configs_from_file_to_file([TestConfigurationGenerator.geo_path] * 2, out_path,
+                                                                  config_generator, 70, seed=7,
+                                                                  num_workers=num_workers)
+
+        with open(out_path, "r") as out_file:
+            return out_file.read()
+
+    def test_generate_configs_in_parallel(self):
+        # tasks of 20 configurations, so there are more tasks than workers and the last task is smaller
+        with unittest.mock.patch.object(configuration_generator, "CONFIGS_PER_TASK", 20):
+            configs_2_workers = self.generate_2b_configs(self.get_output_path("2b_2_workers.xyz"), 2)
+            configs_3_workers = self.generate_2b_configs(self.get_output_path("2b_3_workers.xyz"), 3)
+
+        # the same seed gives the same configurations in the same order for any number of workers
+        self.assertEqual(configs_3_workers, configs_2_workers)
+
+        molecules = xyz_to_molecules(self.get_output_path("2b_2_workers.xyz"), SettingsReader(TestConfigurationGenerator.settings_path))
+
+        self.assertEqual(len(molecules), 70)
+
+        # the comment line of each configuration is its index in the whole file
+        self.assertEqual(configs_2_workers.splitlines()[1::8], [str(index) for index in range(70)])
+
+        # but not the same configurations as in 1 process
+        configs_1_worker = self.generate_2b_configs(self.get_output_path("2b_1_worker.xyz"), 1)
+
+        self.assertNotEqual(configs_1_worker, configs_2_workers)
+        self.assertEqual(len(configs_1_worker.splitlines()), len(configs_2_workers.splitlines()))
+
+        self.test_passed = True
+
+    def get_distances(self, out_path):
+        batch = MoleculeBatch.from_molecules(xyz_to_molecules(out_path, SettingsReader(TestConfigurationGenerator.settings_path)))
+
+        # distances between the centers of mass of the two monomers
+        coordinates = batch.get_coordinates()
+        masses = batch.get_template().get_masses()
+
+        centers = [numpy.einsum("a,cai->ci", masses[3 * index:3 * index + 3], coordinates[:, 3 * index:3 * index + 3]) / numpy.sum(masses[3 * index:3 * index + 3])
+                   for index in range(2)]
+
+        return numpy.linalg.norm(centers[1] - centers[0], axis=1)
+
+    def test_parallel_distance_distribution(self):
+        for use_grid in [False, True]:
+            config_generator = DistanceSamplingConfigurationGenerator(TestConfigurationGenerator.settings_path,
+                                                                      min_distance=3, max_distance=5,
+                                                                      progression=True, use_grid=use_grid)
+
+            if use_grid:
+                # the 70 configurations are spread over 4 steps of 0.5 angstroms, and no step is split between tasks
+                self.assertEqual(config_generator.get_step_counts(70), [18, 18, 17, 17])
+                self.assertEqual(config_generator.get_task_ranges(70, 20), [(0, 36), (36, 70)])
+            else:
+                self.assertEqual(config_generator.get_task_ranges(70, 20), [(0, 20), (20, 40), (40, 60), (60, 70)])
+
+            distances = []
+
+            for num_workers in [1, 2]:
+                out_path = self.get_output_path("2b_{}_{}.xyz".format(use_grid, num_workers))
+
+                with unittest.mock.patch.object(configuration_generator, "CONFIGS_PER_TASK", 20):
+                    ConfigurationGenerator.generate_configs_from_file_to_file([TestConfigurationGenerator.geo_path] * 2,
+                                                                              out_path, config_generator, 70, seed=7,
+                                                                              num_workers=num_workers)
+
+                distances.append(self.get_distances(out_path))
+
+            serial_distances, parallel_distances = distances
+
+            self.assertEqual(len(parallel_distances), 70)
+
+            # the distances go from min_distance towards max_distance once, in 1 process and in 2
+            self.assertTrue(numpy.all(numpy.diff(parallel_distances) > -1e-8))
+
+            # none of the distances are on the edges of the bins
+            bins = numpy.linspace(2.95, 5.05, 8)
+
+            self.assertEqual(numpy.histogram(parallel_distances, bins)[0].tolist(), numpy.histogram(serial_distances, bins)[0].tolist())
+            self.assertTrue(numpy.allclose(parallel_distances, serial_distances))
+
+        self.test_passed = True
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestConfigurationGenerator)
@@ -0,0 +1,108 @@
+import unittest, os, numpy
+
+from test_mbfit.test_case_with_id import TestCaseWithId
+from mbfit.configurations import DistanceSamplingConfigurationGenerator, OverlapChecker
+from mbfit.molecule import xyz_to_molecules
+
+def get_internal_distances(coordinates):
+    return numpy.linalg.norm(coordinates[..., :, numpy.newaxis, :] - coordinates[..., numpy.newaxis, :, :], axis=-1)
+
+"""
+Test cases for the DistanceSamplingConfigurationGenerator class
+"""
+class TestDistanceSamplingConfigurationGenerator(TestCaseWithId):
+    def __init__(self, *args, **kwargs):
+        super(TestDistanceSamplingConfigurationGenerator, self).__init__(*args, **kwargs)
+        self.test_folder = os.path.dirname(os.path.abspath(__file__))
+
+    def setUpClass():
+        resources = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources")
+
+        TestDistanceSamplingConfigurationGenerator.settings_path = os.path.join(resources, "water_dimer.ini")
+        TestDistanceSamplingConfigurationGenerator.molecule = xyz_to_molecules(os.path.join(resources, "water.xyz"))[0]
+
+    def get_configs(self, num_configs, seed, **kwargs):
+        molecule = TestDistanceSamplingConfigurationGenerator.molecule
+
+        config_generator = DistanceSamplingConfigurationGenerator(TestDistanceSamplingConfigurationGenerator.settings_path, **kwargs)
+
+        batches = list(config_generator.generate_configuration_batches([[molecule], [molecule]], num_configs, seed=seed))
+
+        return numpy.concatenate([batch.get_coordinates() for batch in batches])
+
+    def get_distances(self, configs):
+        # distances between the centers of mass of the two monomers
+        masses = TestDistanceSamplingConfigurationGenerator.molecule.get_masses()
+
+        centers1 = masses @ configs[:, :3] / numpy.sum(masses)
+        centers2 = masses @ configs[:, 3:] / numpy.sum(masses)
+
+        return numpy.linalg.norm(centers2 - centers1, axis=1)
+
+    def assertValidConfigs(self, configs, min_inter_distance):
+        molecule = TestDistanceSamplingConfigurationGenerator.molecule
+
+        overlap_checker = OverlapChecker([molecule, molecule], min_inter_distance)
+
+        # no two atoms of different monomers are too close
+        self.assertFalse(numpy.any(overlap_checker.overlaps_batch(configs)))
+        self.assertFalse(any(overlap_checker.overlaps(config) for config in configs))
+
+        # the monomers are only rotated and moved, so their atoms are as far apart as in the geometry they are from
+        internal_distances = get_internal_distances(molecule.get_coordinate_array())
+
+        for monomer_configs in [configs[:, :3], configs[:, 3:]]:
+            self.assertTrue(numpy.allclose(get_internal_distances(monomer_configs), internal_distances))
+
+    def test_progression(self):
+        configs = self.get_configs(40, 3, min_distance=3, max_distance=5, progression=True)
+
+        self.assertEqual(configs.shape, (40, 6, 3))
+        self.assertValidConfigs(configs, 0.8)
+
+        # every configuration can be placed, so each one is at the distance it was asked for
+        self.assertTrue(numpy.allclose(self.get_distances(configs), 3 + 2 * numpy.arange(40) / 40))
+
+        # the orientations are random
+        self.assertFalse(numpy.allclose(configs[0, :3], configs[1, :3]))
+
+        self.test_passed = True
+
+    def test_use_grid(self):
+        configs = self.get_configs(30, 3, min_distance=3, max_distance=5, progression=True, use_grid=True)
+
+        self.assertValidConfigs(configs, 0.8)
+
+        self.assertTrue(numpy.allclose(self.get_distances(configs), numpy.repeat([3, 3.5, 4, 4.5], [8, 8, 7, 7])))
+
+        self.test_passed = True
+
+    def test_random_distances(self):
+        configs = self.get_configs(40, 3, min_distance=3, max_distance=5)
+
+        self.assertValidConfigs(configs, 0.8)
+
+        distances = self.get_distances(configs)
+
+        self.assertTrue(numpy.all((distances >= 3 - 1e-8) & (distances <= 5 + 1e-8)))
+        self.assertFalse(numpy.all(numpy.diff(distances) > 0))
+
+        self.test_passed = True
+
+    def test_overlapping_distances(self):
+        # the monomers cannot be placed 1 angstrom apart without overlapping, so those configurations are placed at
+        # the larger distances instead
+        configs = self.get_configs(40, 3, min_distance=1, max_distance=5, min_inter_distance=1.2, progression=True)
+
+        self.assertEqual(len(configs), 40)
+        self.assertValidConfigs(configs, 1.2)
+
+        distances = self.get_distances(configs)
+
+        self.assertGreater(distances[0], 1.5)
+        self.assertTrue(numpy.all(numpy.diff(distances) > -1e-8))
+        self.assertTrue(numpy.all(distances <= 5 + 1e-8))
+
+        self.test_passed = True
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestDistanceSamplingConfigurationGenerator)
@@ -0,0 +1,75 @@
+import unittest, os, numpy
+
+from test_mbfit.test_case_with_id import TestCaseWithId
+from test_mbfit.test_configurations.test_configuration_generator_2b import get_internal_distances
+from mbfit.configurations import RandomSamplingConfigurationGenerator, OverlapChecker
+from mbfit.molecule import xyz_to_molecules
+from mbfit.utils.distribution_function import ConstantDistributionFunction
+
+"""
+Test cases for the RandomSamplingConfigurationGenerator class
+"""
+class TestRandomSamplingConfigurationGenerator(TestCaseWithId):
+    def __init__(self, *args, **kwargs):
+        super(TestRandomSamplingConfigurationGenerator, self).__init__(*args, **kwargs)
+        self.test_folder = os.path.dirname(os.path.abspath(__file__))
+
+    def setUpClass():
+        resources = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources")
+
+        TestRandomSamplingConfigurationGenerator.settings_path = os.path.join(resources, "water_trimer.ini")
+        TestRandomSamplingConfigurationGenerator.molecule = xyz_to_molecules(os.path.join(resources, "water.xyz"))[0]
+
+    def get_configs(self, num_configs, seed, **kwargs):
+        molecule = TestRandomSamplingConfigurationGenerator.molecule
+
+        config_generator = RandomSamplingConfigurationGenerator(TestRandomSamplingConfigurationGenerator.settings_path, **kwargs)
+
+        batches = list(config_generator.generate_configuration_batches([[molecule]] * 3, num_configs, seed=seed))
+
+        configs = numpy.concatenate([batch.get_coordinates() for batch in batches])
+
+        self.assertEqual(configs.shape, (num_configs, 9, 3))
+
+        # no two atoms of different monomers are too close
+        overlap_checker = OverlapChecker([molecule] * 3, 0.8)
+
+        self.assertFalse(numpy.any(overlap_checker.overlaps_batch(configs)))
+        self.assertFalse(any(overlap_checker.overlaps(config) for config in configs))
+
+        # the monomers are only rotated and moved
+        internal_distances = get_internal_distances(molecule.get_coordinate_array())
+
+        for index in range(3):
+            self.assertTrue(numpy.allclose(get_internal_distances(configs[:, 3 * index:3 * index + 3]), internal_distances))
+
+        return configs
+
+    def get_distances(self, configs):
+        # distances of the centers of mass of the monomers from the center of the sphere
+        masses = TestRandomSamplingConfigurationGenerator.molecule.get_masses()
+
+        return numpy.stack([numpy.linalg.norm(masses @ configs[:, 3 * index:3 * index + 3] / numpy.sum(masses), axis=1)
+                            for index in range(3)], axis=1)
+
+    def test_radius(self):
+        configs = self.get_configs(50, 3, radius=4)
+
+        distances = self.get_distances(configs)
+
+        # every monomer is inside the sphere, but they are not all at the same distance from its center
+        self.assertTrue(numpy.all(distances <= 4 + 1e-8))
+        self.assertGreater(numpy.ptp(distances), 1)
+
+        self.test_passed = True
+
+    def test_distribution(self):
+        configs = self.get_configs(20, 3, distribution=ConstantDistributionFunction(3))
+
+        # every monomer is at the distance from the center the distribution gives, in a random direction
+        self.assertTrue(numpy.allclose(self.get_distances(configs), 3))
+        self.assertFalse(numpy.allclose(configs[0], configs[1]))
+
+        self.test_passed = True
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestRandomSamplingConfigurationGenerator)
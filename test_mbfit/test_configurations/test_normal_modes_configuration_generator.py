@@ -0,0 +1,118 @@
+import unittest, unittest.mock, os, numpy
+
+from test_mbfit.test_case_with_id import TestCaseWithId
+from test_mbfit.test_configurations import benchmark_normal_modes
+from mbfit.configurations import NormalModesConfigurationGenerator
+from mbfit.configurations import normal_modes_configuration_generator
+from mbfit.molecule import xyz_to_molecules
+from mbfit.utils import constants
+
+"""
+Test cases for the NormalModesConfigurationGenerator class
+"""
+class TestNormalModesConfigurationGenerator(TestCaseWithId):
+    def __init__(self, *args, **kwargs):
+        super(TestNormalModesConfigurationGenerator, self).__init__(*args, **kwargs)
+        self.test_folder = os.path.dirname(os.path.abspath(__file__))
+
+    def setUpClass():
+        resources = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources")
+
+        TestNormalModesConfigurationGenerator.settings_path = os.path.join(resources, "water.ini")
+        TestNormalModesConfigurationGenerator.normal_modes_path = os.path.join(resources, "water_normal_modes.dat")
+        TestNormalModesConfigurationGenerator.molecule = xyz_to_molecules(os.path.join(resources, "water.xyz"))[0]
+
+    def get_config_generator(self, **kwargs):
+        return NormalModesConfigurationGenerator(TestNormalModesConfigurationGenerator.settings_path,
+                                                 TestNormalModesConfigurationGenerator.normal_modes_path, **kwargs)
+
+    def get_configs(self, config_generator, num_configs, seed):
+        molecule = TestNormalModesConfigurationGenerator.molecule
+
+        return numpy.array([config.get_coordinate_array() for config in config_generator.generate_configurations([[molecule]], num_configs, seed=seed)])
+
+    def test_same_seed_any_block_size(self):
+        config_generator = self.get_config_generator(distribution="linear", temperature=(100, 1000))
+
+        configs = self.get_configs(config_generator, 50, 7)
+
+        self.assertEqual(configs.shape, (50, 3, 3))
+
+        # blocks of 7 configurations do not evenly divide the 50 configurations.
+        with unittest.mock.patch.object(normal_modes_configuration_generator, "CONFIG_BLOCK_SIZE", 7):
+            self.assertEqual(self.get_configs(config_generator, 50, 7).tolist(), configs.tolist())
+
+            batches = list(config_generator.generate_configuration_batches([[TestNormalModesConfigurationGenerator.molecule]], 50, seed=7))
+
+            self.assertEqual([len(batch) for batch in batches], [7] * 7 + [1])
+
+        # generating configurations does not change the normal modes, so a second run gives the same configurations.
+        self.assertEqual(self.get_configs(config_generator, 50, 7).tolist(), configs.tolist())
+
+        self.assertNotEqual(self.get_configs(config_generator, 50, 8).tolist(), configs.tolist())
+
+        self.test_passed = True
+
+    def test_get_mode_amplitudes(self):
+        temperatures = [0, 1e-9, 300 * constants.kelvin_to_au, 3000 * constants.kelvin_to_au]
+
+        for classical in [True, False]:
+            config_generator = self.get_config_generator(classical=classical)
+
+            frequencies = numpy.array(config_generator.frequencies)
+
+            # the first normal mode of the water is 5 cm-1, below the 10 cm-1 cutoff
+            self.assertLess(frequencies[0], 10 * constants.cmtoau)
+            self.assertTrue(numpy.all(frequencies[1:] >= 10 * constants.cmtoau))
+
+            amplitudes = config_generator.get_mode_amplitudes(temperatures)
+
+            self.assertEqual(amplitudes.shape, (len(temperatures), 4))
+            self.assertEqual(amplitudes[:, 0].tolist(), [0] * len(temperatures))
+
+            for temperature, temperature_amplitudes in zip(temperatures, amplitudes):
+                for frequency, amplitude in zip(frequencies[1:], temperature_amplitudes[1:]):
+                    if classical:
+                        d = temperature / frequency ** 2
+                    elif temperature > 1e-8:
+                        d = 0.5 / (numpy.tanh(frequency / (2 * temperature)) * frequency)
+                    else:
+                        d = 0.5 / frequency
+
+                    self.assertAlmostEqual(amplitude, numpy.sqrt(d), delta=1e-12 * numpy.sqrt(d))
+
+        self.test_passed = True
+
+    def test_covariance(self):
+        molecule = TestNormalModesConfigurationGenerator.molecule
+
+        for classical in [True, False]:
+            config_generator = self.get_config_generator(classical=classical, distribution="constant", temperature=300)
+
+            configs = self.get_configs(config_generator, 20000, 3)
+
+            # displacements from the optimized geometry in mass-scaled atomic units
+            sqrt_masses = numpy.repeat(numpy.sqrt(molecule.get_masses() * constants.mass_electron_per_mass_proton), 3)
+            displacements = (configs - molecule.get_coordinate_array()).reshape(len(configs), -1) / constants.bohr_to_ang * sqrt_masses
+
+            normal_modes = config_generator.get_mass_scaled_normal_modes(molecule)
+            d = config_generator.get_mode_amplitudes([300 * constants.kelvin_to_au])[0] ** 2
+
+            expected = numpy.einsum("k,ki,kj->ij", d, normal_modes, normal_modes)
+
+            # the reference implementation, G G^T, also has a covariance of sum(d * u u^T)
+            G = numpy.array(benchmark_normal_modes.get_reference_G(config_generator,
+                    benchmark_normal_modes.get_reference_mass_scaled_normal_modes(config_generator, molecule),
+                    300 * constants.kelvin_to_au))
+
+            self.assertTrue(numpy.allclose(G @ G.T, expected, atol=1e-6 * numpy.abs(expected).max()))
+
+            # the sampling error of 20000 configurations is about 1% of the largest variance
+            self.assertTrue(numpy.allclose(numpy.cov(displacements.T), expected, rtol=0, atol=0.05 * numpy.abs(expected).max()))
+
+            # and the mean displacement is 0
+            self.assertTrue(numpy.allclose(displacements.mean(axis=0), 0, atol=0.05 * numpy.sqrt(numpy.abs(expected).max())))
+
+        self.test_passed = True
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestNormalModesConfigurationGenerator)
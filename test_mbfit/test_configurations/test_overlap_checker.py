@@ -0,0 +1,153 @@
+import unittest, unittest.mock, os, numpy
+
+from test_mbfit.test_case_with_id import TestCaseWithId
+from mbfit.molecule import Atom, Fragment, Molecule
+from mbfit.configurations import OverlapChecker
+from mbfit.configurations import overlap_checker
+from mbfit.exceptions import LibraryNotAvailableError
+
+def scipy_installed():
+    try:
+        import scipy
+        return True
+    except ModuleNotFoundError:
+        return False
+
+"""
+Test cases for the OverlapChecker class
+"""
+class TestOverlapChecker(TestCaseWithId):
+    def __init__(self, *args, **kwargs):
+        super(TestOverlapChecker, self).__init__(*args, **kwargs)
+        self.test_folder = os.path.dirname(os.path.abspath(__file__))
+
+    def get_molecules(self, num_molecules):
+        # waters and methanes, so atoms with different van der Waals radii are checked against each other
+        molecules = []
+
+        for molecule_index in range(num_molecules):
+            if molecule_index % 2 == 0:
+                atoms = [Atom("O", "A", 0, 0, 0), Atom("H", "B", 0.96, 0, 0), Atom("H", "B", -0.24, 0.93, 0)]
+                molecules.append(Molecule([Fragment(atoms, "H2O", 0, 1, "O(H)H")]))
+            else:
+                atoms = [Atom("C", "A", 0, 0, 0), Atom("H", "B", 0.63, 0.63, 0.63), Atom("H", "B", -0.63, -0.63, 0.63),
+                         Atom("H", "B", -0.63, 0.63, -0.63), Atom("H", "B", 0.63, -0.63, -0.63)]
+                molecules.append(Molecule([Fragment(atoms, "CH4", 0, 1, "C(H)(H)(H)H")]))
+
+        return molecules
+
+    def get_random_configs(self, molecules, num_configs, box_size, random):
+        # each molecule keeps its shape and is moved to a random point in a box, so the molecules in smaller boxes
+        # are more likely to overlap
+        configs = []
+
+        for config_index in range(num_configs):
+            configs.append(numpy.concatenate([molecule.get_coordinate_array() + random.random(3) * box_size
+                                              for molecule in molecules]))
+
+        return numpy.array(configs)
+
+    def brute_force_overlaps(self, molecules, coordinates, min_inter_distance):
+        atoms = [(molecule_index, radius) for molecule_index, molecule in enumerate(molecules)
+                 for radius in molecule.get_vdw_radii()]
+
+        for index1, (molecule1, radius1) in enumerate(atoms):
+            for index2, (molecule2, radius2) in enumerate(atoms):
+                if molecule1 != molecule2 and numpy.linalg.norm(coordinates[index1] - coordinates[index2]) < min_inter_distance * (radius1 + radius2):
+                    return True
+
+        return False
+
+    def check_against_brute_force(self, num_molecules, box_sizes, **kwargs):
+        random = numpy.random.default_rng(num_molecules)
+
+        molecules = self.get_molecules(num_molecules)
+
+        checkers = [OverlapChecker(molecules, 0.8, **kwargs)]
+
+        if scipy_installed():
+            checkers += [OverlapChecker(molecules, 0.8, use_kd_tree=True), OverlapChecker(molecules, 0.8, use_kd_tree=False)]
+
+        for box_size in box_sizes:
+            configs = self.get_random_configs(molecules, 10, box_size, random)
+
+            expected = [self.brute_force_overlaps(molecules, config, 0.8) for config in configs]
+
+            for checker in checkers:
+                self.assertEqual([checker.overlaps(config) for config in configs], expected)
+                self.assertEqual(checker.overlaps_batch(configs).tolist(), expected)
+
+                if scipy_installed():
+                    self.assertEqual([checker.overlaps_kd_tree(config) for config in configs], expected)
+
+        return expected
+
+    def test_small_cluster(self):
+        molecules = self.get_molecules(3)
+
+        checker = OverlapChecker(molecules, 0.8)
+
+        self.assertEqual(checker.get_num_atoms(), 11)
+        self.assertEqual(checker.block_starts, [0, 11])
+        self.assertFalse(checker.use_kd_tree)
+
+        # the atoms of one molecule are always closer than the sum of their radii, but never overlap each other
+        self.assertFalse(checker.overlaps(numpy.concatenate([molecule.get_coordinate_array() + (10 * index, 0, 0) for index, molecule in enumerate(molecules)])))
+
+        # molecules on top of each other overlap
+        self.assertTrue(checker.overlaps(numpy.concatenate([molecule.get_coordinate_array() for molecule in molecules])))
+
+        self.check_against_brute_force(3, [2, 4, 8])
+
+        self.test_passed = True
+
+    def test_large_cluster(self):
+        # 40 molecules have 160 atoms, so they are checked in more than one block
+        molecules = self.get_molecules(40)
+
+        checker = OverlapChecker(molecules, 0.8, use_kd_tree=False)
+
+        self.assertGreater(len(checker.block_starts), 2)
+        self.assertTrue(all(end - start >= overlap_checker.DENSE_BLOCK_ATOMS for start, end in zip(checker.block_starts[:-2], checker.block_starts[1:-1])))
+
+        # blocks are made of whole molecules
+        self.assertTrue(all(checker.molecule_indices[start] != checker.molecule_indices[start - 1] for start in checker.block_starts[1:-1]))
+
+        # the larger boxes have clusters that do not overlap, the smaller ones clusters that overlap in every block
+        expected = self.check_against_brute_force(40, [10, 20, 40, 80], use_kd_tree=False)
+
+        self.assertIn(True, expected)
+        self.assertIn(False, expected)
+
+        self.test_passed = True
+
+    @unittest.skipUnless(scipy_installed(), "scipy is not installed, so the KD-tree cannot be tested.")
+    def test_use_kd_tree(self):
+        self.assertTrue(OverlapChecker(self.get_molecules(overlap_checker.KD_TREE_MIN_ATOMS), 0.8).use_kd_tree)
+        self.assertFalse(OverlapChecker(self.get_molecules(3), 0.8).use_kd_tree)
+        self.assertTrue(OverlapChecker(self.get_molecules(3), 0.8, use_kd_tree=True).use_kd_tree)
+
+        self.test_passed = True
+
+    def test_scipy_not_available(self):
+        molecules = self.get_molecules(3)
+        coordinates = numpy.concatenate([molecule.get_coordinate_array() for molecule in molecules])
+
+        # pretend scipy is not installed. patch.dict() puts cKDTree back afterwards.
+        with unittest.mock.patch.dict(overlap_checker.__dict__):
+            overlap_checker.__dict__.pop("cKDTree", None)
+
+            with self.assertRaises(LibraryNotAvailableError):
+                OverlapChecker(molecules, 0.8, use_kd_tree=True)
+
+            checker = OverlapChecker(molecules, 0.8)
+
+            self.assertFalse(checker.use_kd_tree)
+            self.assertTrue(checker.overlaps(coordinates))
+
+            with self.assertRaises(LibraryNotAvailableError):
+                checker.overlaps_kd_tree(coordinates)
+
+        self.test_passed = True
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestOverlapChecker)
@@ -1,4 +1,4 @@
 import unittest
-from . import test_database, test_database_job_reader_and_writer
+from . import test_database, test_database_job_reader_and_writer, test_database_filler
 
-suite = unittest.TestSuite([test_database.suite, test_database_job_reader_and_writer.suite])
+suite = unittest.TestSuite([test_database.suite, test_database_job_reader_and_writer.suite, test_database_filler.suite])
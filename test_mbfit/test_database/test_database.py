@@ -1,7 +1,7 @@
 import unittest, os, random
 
 from test_mbfit.test_case_with_id import TestCaseWithId
-from mbfit.database import Database
+from mbfit.database import Database, ConnectionPool, ResultWriter
 from mbfit.exceptions import InvalidValueError, DatabaseConnectionError, DatabaseOperationError
 from mbfit.molecule import Atom, Fragment, Molecule
 
@@ -166,6 +166,71 @@ class TestDatabase(TestCaseWithId):
 
         self.test_passed = True
 
+    def test_set_and_get_itersize(self):
+
+        self.database.set_itersize(8)
+        self.assertEqual(self.database.get_itersize(), 8)
+
+        self.database.set_itersize(15)
+        self.assertEqual(self.database.get_itersize(), 15)
+
+        with self.assertRaises(InvalidValueError):
+            self.database.set_itersize(0)
+
+        self.assertEqual(self.database.get_itersize(), 15)
+
+        self.test_passed = True
+
+    def test_connection_pool(self):
+
+        pool = ConnectionPool(self.config, min_connections=1, max_connections=2)
+
+        database1 = Database(self.config, pool=pool)
+        database2 = Database(self.config, pool=pool)
+
+        # the pool can only lend out 2 connections at once.
+        with self.assertRaises(DatabaseConnectionError):
+            Database(self.config, pool=pool)
+
+        database1.add_calculations([self.get_water_monomer()], "testmethod", "testbasis", False, "database_test")
+        database1.save()
+        database1.close()
+
+        database2.add_calculations([self.get_water_monomer()], "testmethod", "testbasis", False, "database_test")
+        database2.close()
+
+        # the connection given back by database1 is reused, unsaved changes from database2 are lost.
+        with Database(self.config, pool=pool) as database3:
+            self.assertEqual(database3.count_pending_calculations("database_test"), 1)
+
+        pool.close()
+
+        database4 = Database(self.config, pool=True)
+        self.assertIs(database4.pool, ConnectionPool.get_pool(self.config))
+        database4.close()
+
+        ConnectionPool.close_all_pools()
+
+        self.test_passed = True
+
+    def test_open_session(self):
+
+        with Database.open_session(self.config) as database:
+            self.assertIsNot(database, self.database)
+            database.add_calculations([self.get_water_monomer()], "testmethod", "testbasis", False, "database_test")
+
+        self.assertEqual(self.database.count_pending_calculations("database_test"), 1)
+
+        # an open session is saved but not closed.
+        with Database.open_session(self.database) as database:
+            self.assertIs(database, self.database)
+            database.add_calculations([self.get_water_monomer()], "testmethod", "testbasis", False, "database_test")
+
+        # the changes are visible from another connection.
+        self.assertEqual(self.database2.count_pending_calculations("database_test"), 2)
+
+        self.test_passed = True
+
     def test_create(self):
 
         self.test_passed = True
@@ -269,6 +334,121 @@ class TestDatabase(TestCaseWithId):
 
         self.test_passed = True
 
+    def test_concurrent_get_all_calculations(self):
+
+        molecules = []
+        for i in range(20):
+            molecules.append(self.get_water_dimer())
+
+        self.database.add_calculations(molecules, "testmethod", "testbasis", False, "database_test")
+        self.database.save()
+
+        other_database = Database(self.config)
+
+        try:
+            # neither client saves, so the rows claimed by the first client are still locked when the second claims.
+            calculations1 = list(self.database.get_all_calculations("testclient1", "database_test", calculations_to_do = 25))
+            calculations2 = list(other_database.get_all_calculations("testclient2", "database_test", calculations_to_do = 50))
+
+            self.assertEqual(len(calculations1), 25)
+            self.assertEqual(len(calculations2), 35)
+
+            for calculation in calculations1:
+                self.assertNotIn(calculation, calculations2)
+
+            other_database.save()
+        finally:
+            other_database.close()
+
+        self.assertEqual(self.database.count_pending_calculations("database_test"), 0)
+        self.assertEqual(self.database.count_dispatched_calculations(), 60)
+
+        self.test_passed = True
+
+    def test_prefetch_calculations(self):
+
+        molecules = []
+        for i in range(100):
+            molecules.append(self.get_water_dimer())
+
+        self.database.add_calculations(molecules, "testmethod", "testbasis", True, "database_test")
+        self.database.save()
+
+        self.database.set_batch_size(40)
+
+        calculations = list(self.database.get_all_calculations("testclient", "database_test", calculations_to_do = 230, prefetch = True))
+        self.assertEqual(len(calculations), 230)
+        self.assertEqual(self.database.count_pending_calculations("database_test"), 270)
+
+        molecules = [molecule.get_standard_copy() for molecule in molecules]
+
+        for molecule, method, basis, cp, use_cp, frag_indices in calculations:
+            self.assertIn(molecule, molecules)
+            self.assertEqual((method, basis, cp), ("testmethod", "testbasis", True))
+
+        # stopping early leaves at most two batches more than were used dispatched.
+        for calculation in self.database.get_all_calculations("testclient", "database_test", prefetch = True):
+            break
+
+        self.assertGreaterEqual(self.database.count_pending_calculations("database_test"), 270 - 1 - 2 * 40)
+
+        # templates are only built once per session.
+        self.assertIs(self.database.get_molecule_template("H2O-H2O"), self.database.get_molecule_template("H2O-H2O"))
+
+        self.test_passed = True
+
+    def test_bulk_add_calculations(self):
+
+        self.assertEqual(self.database.bulk_add_calculations([], "testmethod", "testbasis", True, "database_test"), 0)
+
+        molecules = []
+        for i in range(100):
+            molecules.append(self.get_water_dimer())
+
+        self.assertEqual(self.database.bulk_add_calculations(molecules, "testmethod", "testbasis", True, "database_test", chunk_size=30), 100)
+
+        # adding the same molecules again should not queue any new calculations.
+        self.assertEqual(self.database.bulk_add_calculations(molecules, "testmethod", "testbasis", True, "database_test"), 0)
+        self.database.add_calculations(molecules, "testmethod", "testbasis", True, "database_test")
+
+        self.assertEqual(self.database.count_pending_calculations("database_test"), 500)
+
+        calculations = list(self.database.get_all_calculations("testclient", "database_test", calculations_to_do = 1000))
+        self.assertEqual(len(calculations), 500)
+
+        molecules = [molecule.get_standard_copy() for molecule in molecules]
+
+        for molecule in molecules:
+            self.assertIn((molecule, "testmethod", "testbasis", True, False, [0]), calculations)
+            self.assertIn((molecule, "testmethod", "testbasis", True, False, [1]), calculations)
+            self.assertIn((molecule, "testmethod", "testbasis", True, True, [0]), calculations)
+            self.assertIn((molecule, "testmethod", "testbasis", True, True, [1]), calculations)
+            self.assertIn((molecule, "testmethod", "testbasis", True, False, [0, 1]), calculations)
+
+        molecules = []
+        for i in range(100):
+            molecules.append(self.get_water_dimer())
+
+        self.database.add_calculations(molecules, "testmethod", "testbasis", False, "database_test", bulk=True)
+
+        # same molecules with another tag should only tag them, not queue them again.
+        self.database.add_calculations(molecules, "testmethod", "testbasis", False, "database_test2", bulk=True)
+
+        self.assertEqual(self.database.count_pending_calculations("database_test"), 300)
+        self.assertEqual(self.database.count_pending_calculations("database_test2"), 300)
+
+        calculations = list(self.database.get_all_calculations("testclient", "database_test2", calculations_to_do = 500))
+        self.assertEqual(len(calculations), 300)
+
+        molecules = [molecule.get_standard_copy() for molecule in molecules]
+
+        for molecule in molecules:
+            self.assertIn((molecule, "testmethod", "testbasis", False, False, [0]), calculations)
+            self.assertIn((molecule, "testmethod", "testbasis", False, False, [1]), calculations)
+            self.assertIn((molecule, "testmethod", "testbasis", False, False, [0, 1]), calculations)
+
+        self.test_passed = True
+
     def test_delete_calculations(self):
 
         molecules = []
@@ -395,6 +575,86 @@ class TestDatabase(TestCaseWithId):
 
         self.test_passed = True
 
+    def test_bulk_set_properties(self):
+        molecules = []
+        for i in range(50):
+            molecules.append(self.get_water_monomer())
+
+        self.database.add_calculations(molecules, "testmethod", "testbasis", False, "database_test")
+
+        calculations = list(self.database.get_all_calculations("testclient", "database_test", calculations_to_do = 50))
+
+        calculation_results = []
+
+        for index, (molecule, method, basis, cp, use_cp, frag_indices) in enumerate(calculations):
+            calculation_results.append([molecule, method, basis, cp, use_cp, frag_indices, index % 2 == 0, random.random(), "some log test"])
+
+        self.assertEqual(self.database.bulk_set_properties(calculation_results, chunk_size=7), 50)
+
+        calculations = list(self.database.export_calculations(["H2O"], ["H1.HO1"], "testmethod", "testbasis", False, "database_test"))
+        self.assertEqual(len(calculations), 25)
+
+        failed = list(self.database.get_failed("H2O", ["H2O"], ["H1.HO1"], "testmethod", "testbasis", False, "database_test"))
+        self.assertEqual(len(failed), 25)
+
+        # without overwrite, complete and failed calculations are left alone.
+        self.assertEqual(self.database.bulk_set_properties(calculation_results), 0)
+
+        for calculation_result in calculation_results:
+            calculation_result[6] = True
+
+        self.database.set_properties(calculation_results, overwrite=True, bulk=True)
+
+        calculations = list(self.database.export_calculations(["H2O"], ["H1.HO1"], "testmethod", "testbasis", False, "database_test"))
+        self.assertEqual(len(calculations), 50)
+
+        for molecule, method, basis, cp, use_cp, frag_indices, result, energy, log_text in calculation_results:
+            self.assertIn((molecule.get_reorder_copy(["H2O"], ["H1.HO1"]), [round(energy, 5)]), [(mol, [round(e, 5) for e in energies]) for mol, energies in calculations])
+
+        failed = list(self.database.get_failed("H2O", ["H2O"], ["H1.HO1"], "testmethod", "testbasis", False, "database_test"))
+        self.assertEqual(len(failed), 0)
+
+        # setting the properties of a pending calculation is an error.
+        molecules = [self.get_water_monomer()]
+        self.database.add_calculations(molecules, "testmethod", "testbasis", False, "database_test")
+
+        with self.assertRaises(DatabaseOperationError):
+            self.database.bulk_set_properties([[molecules[0], "testmethod", "testbasis", False, False, [0], True, 1.0, "some log test"]])
+
+        self.test_passed = True
+
+    def test_result_writer(self):
+        molecules = []
+        for i in range(50):
+            molecules.append(self.get_water_monomer())
+
+        self.database.add_calculations(molecules, "testmethod", "testbasis", False, "database_test")
+
+        calculations = list(self.database.get_all_calculations("testclient", "database_test", calculations_to_do = 50))
+        self.database.save()
+
+        with self.database.open_new_session() as writer_database:
+            with ResultWriter(writer_database, batch_size=7, max_queue_size=3) as writer:
+                for molecule, method, basis, cp, use_cp, frag_indices in calculations:
+                    writer.put((molecule, method, basis, cp, use_cp, frag_indices, True, random.random(), "some log test"))
+
+            self.assertEqual(writer.get_num_written(), 50)
+
+        calculations = list(self.database.export_calculations(["H2O"], ["H1.HO1"], "testmethod", "testbasis", False, "database_test"))
+        self.assertEqual(len(calculations), 50)
+
+        # errors in the writer thread are raised in the calling thread.
+        molecule = self.get_water_monomer()
+        self.database.add_calculations([molecule], "testmethod", "testbasis", False, "database_test")
+        self.database.save()
+
+        with self.database.open_new_session() as writer_database:
+            with self.assertRaises(DatabaseOperationError):
+                with ResultWriter(writer_database) as writer:
+                    writer.put((molecule, "testmethod", "testbasis", False, False, [0], True, 1.0, "some log test"))
+
+        self.test_passed = True
+
     def test_set_properties_and_get_2B_training_set(self):
 
         # water_water dimer
@@ -1034,6 +1294,91 @@ class TestDatabase(TestCaseWithId):
 
         self.test_passed = True
 
+    def test_stream(self):
+
+        self.database.set_itersize(7)
+
+        molecules = []
+        for i in range(30):
+            molecules.append(self.get_water_dimer())
+
+        self.database.add_calculations(molecules, "testmethod", "testbasis", False, "database_test")
+
+        calculations = list(self.database.get_all_calculations("testclient", "database_test", calculations_to_do=40, stream=True))
+        self.assertEqual(len(calculations), 40)
+
+        # saving while streaming should not close the server-side cursor.
+        for calculation in self.database.get_all_calculations("testclient", "database_test", stream=True):
+            calculations.append(calculation)
+            self.database.save()
+
+        self.assertEqual(len(calculations), 90)
+
+        molecules = [molecule.get_standard_copy() for molecule in molecules]
+
+        for molecule in molecules:
+            self.assertIn((molecule, "testmethod", "testbasis", False, False, [0]), calculations)
+            self.assertIn((molecule, "testmethod", "testbasis", False, False, [1]), calculations)
+            self.assertIn((molecule, "testmethod", "testbasis", False, False, [0, 1]), calculations)
+
+        opt_mol = self.get_water_monomer()
+        molecule_energies_pairs = []
+        for i in range(20):
+            molecule_energies_pairs.append((self.get_water_monomer(), [random.random()]))
+
+        self.database.import_calculations(molecule_energies_pairs, "testmethod", "testbasis", False, "database_test", optimized=False)
+        self.database.import_calculations([(opt_mol, [random.random()])], "testmethod", "testbasis", False, "database_test", optimized=True)
+
+        self.assertEqual(list(self.database.export_calculations(["H2O"], ["H1.HO1"], "testmethod", "testbasis", False, "database_test", stream=True)),
+                         list(self.database.export_calculations(["H2O"], ["H1.HO1"], "testmethod", "testbasis", False, "database_test")))
+        self.assertEqual(list(self.database.get_training_set(["H2O"], ["H1.HO1"], "testmethod", "testbasis", False, "database_test", stream=True)),
+                         list(self.database.get_training_set(["H2O"], ["H1.HO1"], "testmethod", "testbasis", False, "database_test")))
+        self.assertEqual(len(list(self.database.get_training_set(["H2O"], ["H1.HO1"], "testmethod", "testbasis", False, "database_test", stream=True))), 21)
+
+        with self.assertRaises(DatabaseOperationError):
+            list(self.database.export_calculations(["H2O"], ["H1.HO1"], "testmethod", "testbasis", False, "no_such_tag", stream=True))
+
+        self.test_passed = True
+
+    def test_keyset_pagination(self):
+
+        # batch size that does not evenly divide the 49 monomers and exactly divides the 49 monomers
+        for batch_size in [10, 7]:
+            self.database.annihilate(confirm="confirm")
+            self.database.set_batch_size(batch_size)
+
+            opt_mol = self.get_water_monomer()
+            molecule_energies_pairs = []
+            for i in range(48):
+                molecule_energies_pairs.append((self.get_water_monomer(), [random.random()]))
+
+            self.database.import_calculations(molecule_energies_pairs, "testmethod", "testbasis", False, "database_test", optimized=False)
+            self.database.import_calculations([(opt_mol, [random.random()])], "testmethod", "testbasis", False, "database_test", optimized=True)
+
+            training_set = list(self.database.get_1B_training_set("H2O", ["H2O"], ["H1.HO1"], "testmethod", "testbasis", False, "database_test"))
+            self.assertEqual(len(training_set), 49)
+            self.assertEqual(len(set(molecule.get_SHA1() for molecule, energy in training_set)), 49)
+
+            training_set = list(self.database.get_training_set(["H2O"], ["H1.HO1"], "testmethod", "testbasis", False, "database_test"))
+            self.assertEqual(len(training_set), 49)
+            self.assertEqual(len(set(molecule.get_SHA1() for molecule, binding, nb, deformation in training_set)), 49)
+
+            calculations = list(self.database.export_calculations(["H2O"], ["H1.HO1"], "testmethod", "testbasis", False, "database_test"))
+            self.assertEqual(len(calculations), 49)
+            self.assertEqual(len(set(molecule.get_SHA1() for molecule, energies in calculations)), 49)
+
+            molecule_energies_pairs = []
+            for i in range(23):
+                molecule_energies_pairs.append((self.get_water_dimer(), [random.random(), random.random(), random.random()]))
+
+            self.database.import_calculations(molecule_energies_pairs, "testmethod", "testbasis", False, "database_test", optimized=False)
+
+            training_set = list(self.database.get_2B_training_set("H2O-H2O", ["H2O", "H2O"], ["H1.HO1", "H1.HO1"], "testmethod", "testbasis", False, "database_test"))
+            self.assertEqual(len(training_set), 23)
+            self.assertEqual(len(set(molecule.get_SHA1() for molecule, binding, interaction, monomer1, monomer2 in training_set)), 23)
+
+        self.test_passed = True
+
     def test_read_privileges(self):
 
         # First, create the training set owned by test_user1
@@ -0,0 +1,184 @@
+import unittest, unittest.mock, os, shutil, time, multiprocessing, threading, signal
+
+from test_mbfit.test_case_with_id import TestCaseWithId
+from mbfit.database import database_filler
+from mbfit.calculator import Calculator
+from mbfit.exceptions import LibraryCallError
+from mbfit.molecule import xyz_to_molecules
+from mbfit.utils import SettingsReader, files
+
+def fork_start_method():
+    # the stub calculator is patched in before the worker processes start, so they must be forked from this process
+    return multiprocessing.get_context().get_start_method() == "fork"
+
+class StubCalculator(Calculator):
+    """
+    Calculator that runs no QM code. The method of each calculation says what it does: "ok" writes a log file and
+    returns the basis as its energy after sleeping for that many seconds, "fail" raises a LibraryCallError with a log
+    file, "empty" raises one with an empty log file and "nolog" raises one without a log file.
+    """
+
+    def calculate_energy(self, molecule, model, fragment_indicies, qm_options={}):
+        log_directory = files.init_directory(self.settings.get("files", "log_path"))
+        log_path = os.path.join(log_directory, "{}_{}.log".format(model.get_basis(), os.getpid()))
+
+        with open(log_path, "w") as log_file:
+            if model.get_method() != "empty":
+                log_file.write("{} {} threads\n".format(model.get_method(), self.settings.get("psi4", "num_threads")))
+
+        if model.get_method() == "nolog":
+            raise LibraryCallError("stub", "calculate_energy", "no log file")
+
+        if model.get_method() != "ok":
+            raise LibraryCallError("stub", "calculate_energy", "calculation failed", log_path)
+
+        time.sleep(float(model.get_basis()))
+
+        return float(model.get_basis()), log_path
+
+"""
+Test cases for the database_filler module, which do not need a database or any QM code.
+"""
+class TestDatabaseFiller(TestCaseWithId):
+    def __init__(self, *args, **kwargs):
+        super(TestDatabaseFiller, self).__init__(*args, **kwargs)
+        self.test_folder = os.path.dirname(os.path.abspath(__file__))
+
+    def setUpClass():
+        resources = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources")
+
+        TestDatabaseFiller.settings = SettingsReader(os.path.join(resources, "water.ini"))
+        TestDatabaseFiller.molecule = xyz_to_molecules(os.path.join(resources, "water_opt.xyz"), TestDatabaseFiller.settings)[0]
+
+    def get_settings_path(self):
+        # the logs are written to the output directory, which is moved away after every test
+        output = files.init_directory(os.path.join(self.test_folder, "output"))
+
+        # each test counts the log directories of its workers, so it needs its own, empty log directory
+        log_path = os.path.join(output, "logs", self._testMethodName)
+        shutil.rmtree(log_path, ignore_errors=True)
+
+        TestDatabaseFiller.settings.set("files", "log_path", log_path)
+
+        settings_path = os.path.join(output, "settings.ini")
+        TestDatabaseFiller.settings.write(settings_path)
+
+        return settings_path
+
+    def get_calculation(self, method, basis):
+        return (TestDatabaseFiller.molecule, method, basis, False, False, [0])
+
+    def test_calculate_energy(self):
+        calc = StubCalculator(self.get_settings_path())
+
+        database_filler.set_num_threads(calc, None)
+        self.assertEqual(calc.settings.get("psi4", "num_threads"), "2")
+
+        database_filler.set_num_threads(calc, 3)
+        self.assertEqual(calc.settings.get("psi4", "num_threads"), "3")
+        self.assertEqual(calc.settings.get("qchem", "num_threads"), "3")
+
+        self.assertEqual(database_filler.calculate_energy(calc, *self.get_calculation("ok", "0.0")),
+                         (TestDatabaseFiller.molecule, "ok", "0.0", False, False, [0], True, 0.0, "ok 3 threads\n"))
+
+        # failed calculations are returned as failed results with their logs rather than raised
+        self.assertEqual(database_filler.calculate_energy(calc, *self.get_calculation("fail", "0.0")),
+                         (TestDatabaseFiller.molecule, "fail", "0.0", False, False, [0], False, 0, "fail 3 threads\n"))
+        self.assertEqual(database_filler.calculate_energy(calc, *self.get_calculation("empty", "0.0"))[6:],
+                         (False, 0, "<Log file was empty.>"))
+        self.assertEqual(database_filler.calculate_energy(calc, *self.get_calculation("nolog", "0.0"))[6:],
+                         (False, 0, "<Error occurred without producing log file.>"))
+
+        self.test_passed = True
+
+    @unittest.skipUnless(fork_start_method(), "worker processes are not forked, so the stub calculator cannot be patched into them.")
+    def test_calculate_energies_in_parallel(self):
+        settings_path = self.get_settings_path()
+
+        # the first calculations take the longest, so they finish after the ones claimed after them
+        calculations = [self.get_calculation("ok", "{:.2f}".format(0.05 * (6 - index))) for index in range(6)]
+        calculations.insert(3, self.get_calculation("fail", "0.00"))
+
+        with unittest.mock.patch("mbfit.calculator.get_calculator", StubCalculator):
+            executor = database_filler.start_workers(settings_path, 3, threads_per_worker=1)
+
+        with executor:
+            results = list(database_filler.calculate_energies_in_parallel(executor, iter(calculations), 3))
+
+        # the results are in the order the calculations were claimed
+        self.assertEqual([result[:6] for result in results], calculations)
+
+        self.assertEqual([result[6] for result in results], [True, True, True, False, True, True, True])
+        self.assertEqual([result[7] for result in results], [0.3, 0.25, 0.2, 0, 0.15, 0.1, 0.05])
+
+        # a failed calculation does not stop the others, and every worker uses the given number of threads
+        self.assertEqual([result[8] for result in results], ["ok 1 threads\n"] * 3 + ["fail 1 threads\n"] + ["ok 1 threads\n"] * 3)
+
+        # each worker writes its logs to its own directory
+        log_directories = os.listdir(TestDatabaseFiller.settings.get("files", "log_path"))
+
+        self.assertTrue(1 <= len(log_directories) <= 3)
+        self.assertTrue(all(log_directory.startswith("worker_") for log_directory in log_directories))
+
+        self.test_passed = True
+
+    @unittest.skipUnless(fork_start_method(), "worker processes are not forked, so the stub calculator cannot be patched into them.")
+    def test_sigterm(self):
+        settings_path = self.get_settings_path()
+
+        # each worker can only finish one of these calculations in the time the test waits for the SIGTERM to stop it
+        calculations = [self.get_calculation("ok", "{:.2f}".format(1 + 0.01 * index)) for index in range(8)]
+
+        with unittest.mock.patch("mbfit.calculator.get_calculator", StubCalculator):
+            executor = database_filler.start_workers(settings_path, 2)
+
+        processes = list(executor._processes.values())
+
+        results = database_filler.calculate_energies_in_parallel(executor, iter(calculations), 2)
+
+        timer = threading.Timer(0.3, os.kill, (os.getpid(), signal.SIGTERM))
+
+        start = time.perf_counter()
+
+        with self.assertRaises(SystemExit):
+            with database_filler.exit_on_sigterm():
+                timer.start()
+                list(results)
+
+        # the SystemExit is raised right away, rather than once the queued calculations are done
+        self.assertLess(time.perf_counter() - start, 0.8)
+
+        with self.assertRaises(RuntimeError):
+            executor.submit(int)
+
+        # the workers still finish the calculations they already took, but not the cancelled ones
+        for process in processes:
+            process.join(5)
+
+        log_path = TestDatabaseFiller.settings.get("files", "log_path")
+
+        self.assertLess(sum(len(os.listdir(os.path.join(log_path, log_directory))) for log_directory in os.listdir(log_path)),
+                        len(calculations))
+
+        self.test_passed = True
+
+    @unittest.skipUnless(fork_start_method(), "worker processes are not forked, so the stub calculator cannot be patched into them.")
+    def test_worker_sigterm(self):
+        settings_path = self.get_settings_path()
+
+        # workers started while SIGTERM is handled do not inherit the handler, so a SIGTERM stops them right away
+        with database_filler.exit_on_sigterm(), unittest.mock.patch("mbfit.calculator.get_calculator", StubCalculator):
+            executor = database_filler.start_workers(settings_path, 1)
+
+        process, = executor._processes.values()
+
+        os.kill(process.pid, signal.SIGTERM)
+        process.join(5)
+
+        self.assertEqual(process.exitcode, -signal.SIGTERM)
+
+        executor.shutdown(wait=False)
+
+        self.test_passed = True
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestDatabaseFiller)
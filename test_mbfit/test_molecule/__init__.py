@@ -1,4 +1,4 @@
 import unittest
-from . import test_atom, test_fragment, test_molecule, test_molecule_parser
+from . import test_atom, test_fragment, test_molecule, test_molecule_batch, test_molecule_hasher, test_molecule_parser, test_configuration_file, test_xyz_index
 
-suite = unittest.TestSuite([test_atom.suite, test_fragment.suite, test_molecule.suite, test_molecule_parser.suite])
+suite = unittest.TestSuite([test_atom.suite, test_fragment.suite, test_molecule.suite, test_molecule_batch.suite, test_molecule_hasher.suite, test_molecule_parser.suite, test_configuration_file.suite, test_xyz_index.suite])
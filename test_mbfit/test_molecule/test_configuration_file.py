@@ -0,0 +1,175 @@
+import unittest, os
+
+from test_mbfit.test_case_with_id import TestCaseWithId
+from mbfit.molecule import molecule_parser
+from mbfit.molecule import ConfigurationWriter, is_npz_file, read_npz_file, write_npz_file, npz_to_xyz
+from mbfit.utils import SettingsReader, files
+from mbfit.exceptions import InconsistentValueError
+
+"""
+Test cases for the configuration_file module
+"""
+class TestConfigurationFile(TestCaseWithId):
+    def __init__(self, *args, **kwargs):
+        super(TestConfigurationFile, self).__init__(*args, **kwargs)
+        self.test_folder = os.path.dirname(os.path.abspath(__file__))
+
+    def setUpClass():
+        TestConfigurationFile.training_set_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "water_dimer_training_set.xyz")
+        TestConfigurationFile.training_set_settings = SettingsReader(os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "water_dimer_training_set.ini"))
+
+    def get_output_path(self, file_name):
+        # the output directory is moved away after every test
+        return os.path.join(files.init_directory(os.path.join(self.test_folder, "output")), file_name)
+
+    def read_training_set(self):
+        chunks = list(molecule_parser.parse_training_set_chunks(TestConfigurationFile.training_set_path, settings=TestConfigurationFile.training_set_settings, num_energies=2))
+
+        self.assertEqual(len(chunks), 1)
+
+        return chunks[0]
+
+    def test_is_npz_file(self):
+        self.assertTrue(is_npz_file("configs.npz"))
+        self.assertTrue(is_npz_file("dir/configs.NPZ"))
+        self.assertFalse(is_npz_file("configs.xyz"))
+        self.assertFalse(is_npz_file("configs.npz.backup-1"))
+
+        self.test_passed = True
+
+    def test_write_and_read_npz_file(self):
+        batch, energies = self.read_training_set()
+
+        npz_path = self.get_output_path("water_dimer_training_set.npz")
+        write_npz_file(npz_path, batch, energies, ["binding_energy", "nb_energy"])
+
+        for mmap in [True, False]:
+            npz_batch, npz_energies, energy_names = read_npz_file(npz_path, mmap=mmap)
+
+            self.assertEqual(list(npz_batch), list(batch))
+            self.assertEqual(npz_energies.tolist(), energies.tolist())
+            self.assertEqual(energy_names, ["binding_energy", "nb_energy"])
+            self.assertEqual(npz_batch.get_name(), "water-water")
+            self.assertEqual(npz_batch.get_symmetry(), "A1B2_A1B2")
+
+        # moving the read molecules does not change the file.
+        npz_batch, npz_energies, energy_names = read_npz_file(npz_path)
+        npz_batch.translate(1, 2, 3)
+        self.assertEqual(list(read_npz_file(npz_path)[0]), list(batch))
+
+        with self.assertRaises(InconsistentValueError):
+            write_npz_file(npz_path, batch, energies, ["binding_energy"])
+
+        self.test_passed = True
+
+    def test_parse_training_set_chunks(self):
+        batch, energies = self.read_training_set()
+
+        npz_path = self.get_output_path("water_dimer_training_set.npz")
+        write_npz_file(npz_path, batch, energies, ["binding_energy", "nb_energy"])
+
+        for settings in [TestConfigurationFile.training_set_settings, None]:
+            chunks = list(molecule_parser.parse_training_set_chunks(npz_path, settings=settings, chunk_size=2, num_energies=1))
+
+            self.assertEqual([len(chunk_batch) for chunk_batch, chunk_energies in chunks], [2, 1])
+            self.assertEqual([chunk_energies.tolist() for chunk_batch, chunk_energies in chunks], [[[1.5], [-0.5]], [[2e-3]]])
+            self.assertEqual([molecule for chunk_batch, chunk_energies in chunks for molecule in chunk_batch], list(batch))
+
+        self.assertEqual(molecule_parser.xyz_to_molecules(npz_path), list(batch))
+
+        with self.assertRaises(InconsistentValueError):
+            list(molecule_parser.parse_training_set_chunks(npz_path, num_energies=3))
+
+        chunks = list(molecule_parser.parse_training_set_chunks(npz_path, num_energies=3, is_training_format=False))
+
+        self.assertEqual(chunks[0][1].tolist(), [[0, 0, 0], [0, 0, 0], [0, 0, 0]])
+
+        self.test_passed = True
+
+    def test_configuration_writer(self):
+        batch, energies = self.read_training_set()
+
+        xyz_path = self.get_output_path("written_training_set.xyz")
+        npz_path = self.get_output_path("written_training_set.npz")
+
+        for path in [xyz_path, npz_path]:
+            with ConfigurationWriter(path, ["binding_energy", "nb_energy"]) as writer:
+                for molecule, molecule_energies in zip(batch, energies.tolist()):
+                    writer.write_molecule(molecule, molecule_energies)
+
+            (written_batch, written_energies), = molecule_parser.parse_training_set_chunks(path, settings=TestConfigurationFile.training_set_settings, num_energies=2)
+
+            self.assertEqual(list(written_batch), list(batch))
+            self.assertEqual(written_energies.tolist(), energies.tolist())
+
+        with open(xyz_path, "r") as xyz_file:
+            self.assertEqual(xyz_file.read(), "".join("6\n{} {}\n{}\n".format(*molecule_energies, molecule.to_xyz()) for molecule, molecule_energies in zip(batch, energies.tolist())))
+
+        # npz_to_xyz() writes the same file as writing the molecules one at a time.
+        converted_path = self.get_output_path("converted_training_set.xyz")
+        npz_to_xyz(npz_path, converted_path)
+
+        with open(xyz_path, "r") as xyz_file, open(converted_path, "r") as converted_file:
+            self.assertEqual(converted_file.read(), xyz_file.read())
+
+        with self.assertRaises(InconsistentValueError):
+            with ConfigurationWriter(npz_path, ["binding_energy", "nb_energy"]) as writer:
+                writer.write_molecule(batch[0], [1.0])
+
+        # moving a molecule after writing it does not change what is written.
+        moved_path = self.get_output_path("moved_training_set.npz")
+
+        with ConfigurationWriter(moved_path, ["binding_energy", "nb_energy"]) as writer:
+            for molecule, molecule_energies in zip(batch, energies.tolist()):
+                molecule = molecule.get_copy()
+                writer.write_molecule(molecule, molecule_energies)
+                molecule.translate(1, 2, 3)
+
+        self.assertEqual(list(read_npz_file(moved_path)[0]), list(batch))
+
+        self.test_passed = True
+
+    def test_configuration_writer_write_batch(self):
+        batch, energies = self.read_training_set()
+
+        for extension in ["xyz", "npz"]:
+            molecule_path = self.get_output_path("molecules." + extension)
+            batch_path = self.get_output_path("batches." + extension)
+
+            with ConfigurationWriter(molecule_path, ["binding_energy", "nb_energy"]) as writer:
+                for molecule, molecule_energies in zip(batch, energies.tolist()):
+                    writer.write_molecule(molecule, molecule_energies)
+
+            # batches and single molecules can be mixed, in any order, and empty batches write nothing.
+            with ConfigurationWriter(batch_path, ["binding_energy", "nb_energy"]) as writer:
+                writer.write_batch(batch[:1], energies[:1])
+                writer.write_molecule(batch[1], energies[1].tolist())
+                writer.write_batch(batch[2:], energies[2:])
+                writer.write_batch(batch[3:], energies[3:])
+
+            if extension == "xyz":
+                with open(molecule_path, "r") as molecule_file, open(batch_path, "r") as batch_file:
+                    self.assertEqual(batch_file.read(), molecule_file.read())
+
+            else:
+                written_batch, written_energies, energy_names = read_npz_file(batch_path)
+
+                self.assertEqual(list(written_batch), list(batch))
+                self.assertEqual(written_energies.tolist(), energies.tolist())
+                self.assertEqual(energy_names, ["binding_energy", "nb_energy"])
+
+        comments_path = self.get_output_path("comments.xyz")
+
+        with ConfigurationWriter(comments_path) as writer:
+            writer.write_batch(batch, comments=range(len(batch)))
+
+        with open(comments_path, "r") as comments_file:
+            self.assertEqual(comments_file.read(), "".join("6\n{}\n{}\n".format(index, molecule.to_xyz()) for index, molecule in enumerate(batch)))
+
+        with self.assertRaises(InconsistentValueError):
+            with ConfigurationWriter(comments_path, ["binding_energy", "nb_energy"]) as writer:
+                writer.write_batch(batch, energies[:, :1])
+
+        self.test_passed = True
+
+suite =unittest.TestLoader().loadTestsFromTestCase(TestConfigurationFile)
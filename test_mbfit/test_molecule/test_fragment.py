@@ -400,6 +400,53 @@ class TestFragment(TestCaseWithId):
 
         self.test_passed = True
 
+    def test_SMILE_cache(self):
+
+        Fragment.SMILE_cache.clear()
+
+        fragment1 = Fragment([Atom("H", "A", 0, 0, 0), Atom("H", "A", 1, 0, 0), Atom("O", "B", 0, 1, 0)], "H2O", 0, 1, "H1.HO1")
+
+        self.assertEqual(Fragment.SMILE_cache.get_misses(), 1)
+        self.assertEqual(Fragment.SMILE_cache.get_hits(), 0)
+
+        fragment2 = Fragment([Atom("H", "A", 0, 0, 1), Atom("H", "A", 1, 0, 1), Atom("O", "B", 0, 1, 1)], "H2O", 0, 1, "H1.HO1")
+
+        self.assertEqual(Fragment.SMILE_cache.get_misses(), 1)
+        self.assertEqual(Fragment.SMILE_cache.get_hits(), 1)
+
+        self.assertEqual(fragment1.get_connectivity_matrix(), fragment2.get_connectivity_matrix())
+
+        # changing the returned matrix must not change the cached one.
+        fragment1.get_connectivity_matrix()[0][0] = True
+        self.assertFalse(fragment2.get_connectivity_matrix()[0][0])
+
+        # invalid SMILE strings are not cached, so they fail every time.
+        for i in range(2):
+            with self.assertRaises(InvalidValueError):
+                Fragment([Atom("H", "A", 0, 0, 0), Atom("O", "B", 0, 1, 0)], "HO", 0, 1, "H1O")
+
+        self.test_passed = True
+
+    def test_standard_order_cache(self):
+
+        Fragment.standard_order_cache.clear()
+
+        fragment1 = Fragment([Atom("H", "A", 0, 0, 0), Atom("O", "B", 0, 1, 0), Atom("H", "A", 1, 0, 0)], "H2O", 0, 1, "HOH")
+
+        self.assertEqual(fragment1.get_standard_order_order(), [1, 0, 2])
+        self.assertEqual(Fragment.standard_order_cache.get_misses(), 1)
+
+        # atoms at the same position are still told apart.
+        fragment2 = Fragment([Atom("H", "A", 0, 0, 0), Atom("O", "B", 0, 0, 0), Atom("H", "A", 0, 0, 0)], "H2O", 0, 1, "HOH")
+
+        self.assertEqual(fragment2.get_standard_order_order(), [1, 0, 2])
+        self.assertEqual(Fragment.standard_order_cache.get_misses(), 1)
+        self.assertEqual(Fragment.standard_order_cache.get_hits(), 1)
+
+        self.assertEqual(fragment1.get_canonical_order(), fragment1.compute_canonical_order())
+
+        self.test_passed = True
+
     def test_get_connectivity_matrix(self):
 
         fragment = Fragment([], "", 0, 1, "")
@@ -1,4 +1,4 @@
-import unittest, random, os
+import unittest, random, os, copy, pickle
 
 from test_mbfit.test_case_with_id import TestCaseWithId
 from mbfit.utils import Quaternion
@@ -7,6 +7,13 @@ from mbfit.molecule import Fragment
 from mbfit.molecule import Molecule
 from mbfit.exceptions import InconsistentValueError
 
+def scipy_installed():
+    try:
+        import scipy
+        return True
+    except ModuleNotFoundError:
+        return False
+
 """
 Test cases for molecule class
 """
@@ -223,6 +230,16 @@ class TestMolecule(TestCaseWithId):
 
         self.test_passed = True
 
+    def test_get_atomic_numbers(self):
+        molecule = Molecule([Fragment([Atom("F", "A", 0, 0, 0)], "F", 1, 2, "F"), Fragment([Atom("F", "B", 0, 0, 3), Atom("Cl", "C", 0, 0, 0)], "FCl", 3, 2, "F[Cl]")])
+
+        self.assertEqual(molecule.get_atomic_numbers().tolist(), [9, 9, 17])
+        self.assertEqual(molecule.get_masses().tolist(), [atom.get_mass() for atom in molecule.get_atoms()])
+        self.assertEqual(molecule.get_covalent_radii().tolist(), [atom.get_covalent_radius() for atom in molecule.get_atoms()])
+        self.assertEqual(molecule.get_vdw_radii().tolist(), [atom.get_vdw_radius() for atom in molecule.get_atoms()])
+
+        self.test_passed = True
+
     def test_translate(self):
 
         for i in range(100):
@@ -421,4 +438,200 @@ class TestMolecule(TestCaseWithId):
 
         self.test_passed = True
 
+    def test_get_copy_with_coordinates(self):
+
+        template = Molecule([Fragment([Atom("O", "A", 0, 0, 0),
+                                       Atom("H", "B", 0, 0, 0)], "OH-", -1, 1, "OH"),
+                             Fragment([Atom("O", "A", 0, 0, 0),
+                                       Atom("H", "B", 0, 0, 0)], "OH-", -1, 1, "OH")
+                             ])
+
+        for i in range(100):
+            coordinates = [random.random() * 100 for j in range(12)]
+
+            ref_mol = Molecule([Fragment([Atom("O", "A", *coordinates[0:3]),
+                                          Atom("H", "B", *coordinates[3:6])], "OH-", -1, 1, "OH"),
+                                Fragment([Atom("O", "A", *coordinates[6:9]),
+                                          Atom("H", "B", *coordinates[9:12])], "OH-", -1, 1, "OH")
+                                ])
+
+            mol = template.get_copy_with_coordinates(coordinates)
+
+            self.assertEqual(mol, ref_mol)
+            self.assertEqual(mol.get_SHA1(), ref_mol.get_SHA1())
+
+        # the template itself should not be modified.
+        self.assertEqual(template.get_coordinates(), [(0, 0, 0)] * 4)
+
+        with self.assertRaises(InconsistentValueError):
+            template.get_copy_with_coordinates([0, 0, 0])
+
+        self.test_passed = True
+
+    def test_get_coordinate_array(self):
+
+        mol = Molecule([Fragment([Atom("O", "A", 2, -2, 0),
+                                  Atom("H", "B", 3, -3, 0)], "OH-", -1, 1, "OH"),
+                        Fragment([Atom("O", "A", 5, -5, 0),
+                                  Atom("H", "B", 4, -4, 0)], "OH-", -1, 1, "OH")
+                        ])
+
+        coordinates = mol.get_coordinate_array()
+
+        self.assertEqual(coordinates.shape, (4, 3))
+        self.assertEqual(coordinates.tolist(), [list(xyz) for xyz in mol.get_coordinates()])
+        self.assertEqual(mol.get_masses().tolist(), [atom.get_mass() for atom in mol.get_atoms()])
+
+        # the array is shared with the fragments and atoms.
+        coordinates[2] = (1, 2, 3)
+        self.assertEqual(mol.get_atoms()[2].get_x(), 1)
+        self.assertEqual(mol.get_fragments()[1].get_coordinate_array()[0].tolist(), [1, 2, 3])
+
+        mol.get_atoms()[3].set_xyz(4, 5, 6)
+        self.assertEqual(coordinates[3].tolist(), [4, 5, 6])
+
+        mol.get_fragments()[0].translate(1, 1, 1)
+        self.assertEqual(coordinates[0].tolist(), [3, -1, 1])
+
+        # a fragment added to another molecule should still move with this molecule.
+        other_mol = Molecule([mol.get_fragments()[1]])
+        other_mol.translate(1, 0, 0)
+        mol.translate(0, 1, 0)
+        self.assertEqual(mol.get_coordinates(), [(3, 0, 1), (4, -1, 1), (2, 3, 3), (5, 6, 6)])
+        self.assertEqual(other_mol.get_coordinates(), [(2, 3, 3), (5, 6, 6)])
+
+        self.test_passed = True
+
+    def test_copy_and_pickle(self):
+
+        mol = Molecule([Fragment([Atom("O", "A", 0, 0, 0),
+                                  Atom("H", "B", 1, 0, 0),
+                                  Atom("H", "B", 0, 1, 0)], "H2O", 0, 1, "O(H)H")
+                        ])
+
+        mol.translate(1, 1, 1)
+
+        for copied_mol in [copy.deepcopy(mol), pickle.loads(pickle.dumps(mol)), mol.get_copy()]:
+            copied_mol.translate(5, 0, 0)
+
+            # the atoms, fragments and coordinate array of the copy move together, and the original does not move.
+            self.assertEqual(copied_mol.get_coordinates(), [(6, 1, 1), (7, 1, 1), (6, 2, 1)])
+            self.assertEqual(copied_mol.get_coordinate_array().tolist(), [[6, 1, 1], [7, 1, 1], [6, 2, 1]])
+            self.assertEqual(copied_mol.get_fragments()[0].get_coordinate_array().tolist(), [[6, 1, 1], [7, 1, 1], [6, 2, 1]])
+            self.assertEqual(mol.get_coordinates(), [(1, 1, 1), (2, 1, 1), (1, 2, 1)])
+
+            expected_mol = Molecule([Fragment([Atom("O", "A", 6, 1, 1),
+                                               Atom("H", "B", 7, 1, 1),
+                                               Atom("H", "B", 6, 2, 1)], "H2O", 0, 1, "O(H)H")
+                                     ])
+
+            self.assertEqual(copied_mol.to_xyz(), expected_mol.to_xyz())
+            self.assertEqual(copied_mol.get_SHA1(), expected_mol.get_SHA1())
+
+            # moving an atom of the copy also moves the coordinate array.
+            copied_mol.get_atoms()[0].set_xyz(0, 0, 0)
+            self.assertEqual(copied_mol.get_coordinate_array()[0].tolist(), [0, 0, 0])
+
+        fragment = mol.get_fragments()[0]
+
+        for copied_fragment in [copy.deepcopy(fragment), pickle.loads(pickle.dumps(fragment))]:
+            copied_fragment.translate(0, 5, 0)
+
+            self.assertEqual([atom.get_y() for atom in copied_fragment.get_atoms()], [6, 6, 7])
+            self.assertEqual(copied_fragment.get_coordinate_array()[:, 1].tolist(), [6, 6, 7])
+            self.assertEqual(fragment.get_coordinate_array()[:, 1].tolist(), [1, 1, 2])
+
+        self.test_passed = True
+
+    def test_get_atom_order(self):
+
+        mol = Molecule([Fragment([Atom("H", "A", 1, 0, 0),
+                                  Atom("O", "B", 2, 0, 0),
+                                  Atom("H", "A", 3, 0, 0)], "H2O", 0, 1, "[H]O[H]"),
+                        Fragment([Atom("Cl", "C", 4, 0, 0)], "Cl-", -1, 1, "[Cl]")
+                        ])
+
+        order, frag_orders = mol.get_standard_order_order()
+        SMILES = [frag.get_standard_SMILE() for frag in mol.get_standard_order()]
+
+        reordered_mol = mol.get_reordered_copy(order, frag_orders, SMILES)
+        atom_order = mol.get_atom_order(order, frag_orders)
+
+        self.assertEqual(mol.get_coordinate_array()[atom_order].tolist(), reordered_mol.get_coordinate_array().tolist())
+        self.assertEqual(mol.get_atom_order([1, 0], [[0], [2, 1, 0]]).tolist(), [3, 2, 1, 0])
+
+        self.test_passed = True
+
+    def test_rmsd(self):
+
+        mol1 = Molecule([Fragment([Atom("O", "A", 0, 0, 0),
+                                   Atom("H", "B", 1, 0, 0),
+                                   Atom("H", "B", 0, 1, 0)], "H2O", 0, 1, "O(H)H")])
+        mol2 = Molecule([Fragment([Atom("O", "A", 0, 0, 1),
+                                   Atom("H", "B", 1, 0, 1),
+                                   Atom("H", "B", 0, 1, 3)], "H2O", 0, 1, "O(H)H")])
+
+        self.assertAlmostEqual(mol1.rmsd(mol2), (11 / 3) ** 0.5)
+
+        # distance from H to H changes from 2 ** 0.5 to 6 ** 0.5, and from O to the second H from 1 to 5 ** 0.5
+        self.assertAlmostEqual(mol1.distancermsd(mol2), (((6 ** 0.5 - 2 ** 0.5) ** 2 + (5 ** 0.5 - 1) ** 2) / 3) ** 0.5)
+
+        with self.assertRaises(InconsistentValueError):
+            mol1.rmsd(Molecule([Fragment([Atom("O", "A", 0, 0, 0)], "O", 0, 1, "O")]))
+
+        self.test_passed = True
+
+    def test_kabsch_rmsd(self):
+
+        coordinates = [random.random() * 10 for j in range(12)]
+
+        mol1 = Molecule([Fragment([Atom("O", "A", *coordinates[0:3]),
+                                   Atom("H", "B", *coordinates[3:6]),
+                                   Atom("H", "B", *coordinates[6:9])], "H2O", 0, 1, "O(H)H"),
+                         Fragment([Atom("Cl", "C", *coordinates[9:12])], "Cl-", -1, 1, "[Cl]")])
+
+        mol2 = mol1.get_copy_with_coordinates(coordinates)
+        mol2.rotate(Quaternion.get_random_rotation_quaternion(), 1, 2, 3)
+        mol2.translate(4, 5, 6)
+
+        self.assertGreater(mol1.rmsd(mol2), 1e-3)
+        self.assertAlmostEqual(mol1.kabsch_rmsd(mol2), 0)
+        self.assertTrue(mol1.compare(mol2, align=True))
+
+        # neither molecule is moved.
+        self.assertEqual(mol1.get_coordinate_array().flatten().tolist(), coordinates)
+
+        self.test_passed = True
+
+    @unittest.skipUnless(scipy_installed(), "scipy is not installed, so permutation_rmsd cannot be tested.")
+    def test_permutation_rmsd(self):
+
+        fragments = []
+        for i in range(5):
+            fragments.append(Fragment([Atom("O", "A", *[random.random() * 10 for j in range(3)]),
+                                       Atom("H", "B", *[random.random() * 10 for j in range(3)]),
+                                       Atom("H", "B", *[random.random() * 10 for j in range(3)])], "H2O", 0, 1, "O(H)H"))
+        mol1 = Molecule(fragments)
+
+        groups = mol1.get_equivalent_atom_groups()
+        self.assertEqual([group.tolist() for group in groups], [[0, 3, 6, 9, 12], [1, 2, 4, 5, 7, 8, 10, 11, 13, 14]])
+
+        # swap two of the waters, and the hydrogens of a third.
+        coordinates = mol1.get_coordinate_array()[[6, 7, 8, 3, 4, 5, 0, 1, 2, 9, 11, 10, 12, 13, 14]]
+        mol2 = mol1.get_copy_with_coordinates(coordinates.flatten().tolist())
+
+        self.assertGreater(mol1.rmsd(mol2), 1e-3)
+        self.assertAlmostEqual(mol1.permutation_rmsd(mol2, align=False), 0)
+
+        mol2.rotate(Quaternion.get_random_rotation_quaternion(), 1, 2, 3)
+
+        self.assertAlmostEqual(mol1.permutation_rmsd(mol2), 0)
+        self.assertTrue(mol1.compare(mol2, align=True, permute=True))
+        self.assertFalse(mol1.compare(mol2))
+
+        with self.assertRaises(InconsistentValueError):
+            mol1.permutation_rmsd(Molecule([Fragment([Atom("O", "A", 0, 0, 0)], "O", 0, 1, "O")]))
+
+        self.test_passed = True
+
 suite = unittest.TestLoader().loadTestsFromTestCase(TestMolecule)
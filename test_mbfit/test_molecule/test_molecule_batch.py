@@ -0,0 +1,89 @@
+import unittest, random, os
+import numpy
+
+from test_mbfit.test_case_with_id import TestCaseWithId
+from mbfit.molecule import Atom
+from mbfit.molecule import Fragment
+from mbfit.molecule import Molecule
+from mbfit.molecule import MoleculeBatch
+from mbfit.exceptions import InvalidValueError, InconsistentValueError
+
+"""
+Test cases for MoleculeBatch class
+"""
+class TestMoleculeBatch(TestCaseWithId):
+    def __init__(self, *args, **kwargs):
+        super(TestMoleculeBatch, self).__init__(*args, **kwargs)
+        self.test_folder = os.path.dirname(os.path.abspath(__file__))
+
+    def get_random_molecule(self):
+        return Molecule([Fragment([Atom("O", "A", *[random.uniform(-3, 3) for i in range(3)]),
+                                   Atom("H", "B", *[random.uniform(-3, 3) for i in range(3)]),
+                                   Atom("H", "B", *[random.uniform(-3, 3) for i in range(3)])], "H2O", 0, 1, "O(H)H"),
+                         Fragment([Atom("Cl", "C", *[random.uniform(-3, 3) for i in range(3)])], "Cl-", -1, 1, "[Cl]")])
+
+    def test_from_molecules(self):
+        molecules = [self.get_random_molecule() for i in range(20)]
+
+        batch = MoleculeBatch.from_molecules(molecules)
+
+        self.assertEqual(len(batch), 20)
+        self.assertEqual(batch.get_num_atoms(), 4)
+        self.assertEqual(batch.get_coordinates().shape, (20, 4, 3))
+        self.assertEqual(batch.get_name(), "H2O-Cl-")
+        self.assertEqual(batch.get_symmetry(), "A1B2_C1")
+        self.assertEqual(batch.get_charge(), -1)
+        self.assertEqual(batch.get_spin_multiplicity(), 1)
+        self.assertEqual(batch.get_fragment_sizes(), [3, 1])
+        self.assertEqual(batch.get_symbols(), ["O", "H", "H", "Cl"])
+
+        self.assertEqual(list(batch), molecules)
+        self.assertEqual(batch[5], molecules[5])
+        self.assertEqual(list(batch[2:4]), molecules[2:4])
+        self.assertEqual(list(batch[[3, 1]]), [molecules[3], molecules[1]])
+
+        # molecules from the batch are copies.
+        batch[0].translate(1, 1, 1)
+        self.assertEqual(batch[0], molecules[0])
+
+        with self.assertRaises(InconsistentValueError):
+            MoleculeBatch.from_molecules(molecules + [Molecule([Fragment([Atom("O", "A", 0, 0, 0)], "O", 0, 1, "O")])])
+
+        with self.assertRaises(InvalidValueError):
+            MoleculeBatch.from_molecules([])
+
+        with self.assertRaises(InconsistentValueError):
+            MoleculeBatch(molecules[0], numpy.zeros((2, 5, 3)))
+
+        self.test_passed = True
+
+    def test_to_xyz_and_hashes(self):
+        molecules = [self.get_random_molecule() for i in range(300)]
+
+        batch = MoleculeBatch.from_molecules(molecules)
+
+        self.assertEqual(batch.to_xyz(), [molecule.to_xyz() for molecule in molecules])
+        self.assertEqual(batch.to_xyz(num_digits=5), [molecule.to_xyz(num_digits=5) for molecule in molecules])
+        self.assertEqual(batch.get_SHA1s(), [molecule.get_SHA1() for molecule in molecules])
+        self.assertEqual(batch.get_quantized_hashes(), [molecule.get_quantized_hash() for molecule in molecules])
+
+        self.test_passed = True
+
+    def test_move_to_center_of_mass_and_rotate_on_principal_axes(self):
+        molecules = [self.get_random_molecule() for i in range(50)]
+
+        batch = MoleculeBatch.from_molecules(molecules)
+
+        batch.move_to_center_of_mass()
+        batch.rotate_on_principal_axes()
+
+        for molecule, batch_molecule in zip(molecules, batch):
+            molecule.move_to_center_of_mass()
+            molecule.rotate_on_principal_axes()
+
+            for coordinate, batch_coordinate in zip(molecule.get_coordinate_array().flatten(), batch_molecule.get_coordinate_array().flatten()):
+                self.assertAlmostEqual(coordinate, batch_coordinate)
+
+        self.test_passed = True
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestMoleculeBatch)
@@ -0,0 +1,79 @@
+import unittest, random, os
+import numpy
+
+from hashlib import sha1
+
+from test_mbfit.test_case_with_id import TestCaseWithId
+from mbfit.molecule import Atom
+from mbfit.molecule import Fragment
+from mbfit.molecule import Molecule
+from mbfit.molecule import molecule_hasher
+
+"""
+Test cases for the molecule_hasher module
+"""
+class TestMoleculeHasher(TestCaseWithId):
+    def __init__(self, *args, **kwargs):
+        super(TestMoleculeHasher, self).__init__(*args, **kwargs)
+        self.test_folder = os.path.dirname(os.path.abspath(__file__))
+
+    def get_reference_SHA1(self, molecule):
+        hash_string = molecule.get_name() + "\n" + molecule.to_xyz(num_digits=5) + "\n" + str(molecule.get_charge()) + "\n" + str(molecule.get_spin_multiplicity())
+        return sha1(hash_string.encode()).hexdigest()
+
+    def test_round_coordinates(self):
+        values = [0.000005, -0.000005, 1.234565, -2.5e-6, 1e-7, -1e-7, 0, 123456.123455, 0.1 + 0.2]
+        values += [random.uniform(-1000, 1000) for i in range(1000)]
+
+        rounded = molecule_hasher.round_coordinates(numpy.array(values))
+
+        self.assertEqual(rounded.tolist(), [round(value, 5) + 0.0 for value in values])
+
+        self.test_passed = True
+
+    def test_get_SHA1s(self):
+        template = Molecule([Fragment([Atom("O", "A", 0, 0, 0),
+                                       Atom("H", "B", 0, 0, 0),
+                                       Atom("H", "B", 0, 0, 0)], "H2O", 0, 1, "O(H)H"),
+                             Fragment([Atom("Cl", "C", 0, 0, 0)], "Cl-", -1, 1, "[Cl]")
+                             ])
+
+        # enough configurations to build the xyz strings with numpy.
+        coordinates = numpy.array([[random.uniform(-10, 10) for j in range(12)] for i in range(200)])
+        coordinates[0, :] = 0
+        coordinates[1, :] = [0.000005, -0.000005, 1e-7, -1e-7, 99999.999995, -12345.678905, 2.5e-6, 1, -1, 10, 1e5, -1e-5]
+
+        hashes = molecule_hasher.get_SHA1s(template.get_name(), template.get_symbols(), template.get_charge(),
+                                           template.get_spin_multiplicity(), coordinates)
+
+        self.assertEqual(len(hashes), 200)
+
+        for config, config_hash in zip(coordinates, hashes):
+            molecule = template.get_copy_with_coordinates(config)
+
+            self.assertEqual(config_hash, self.get_reference_SHA1(molecule))
+            self.assertEqual(molecule.get_SHA1(), config_hash)
+
+        self.test_passed = True
+
+    def test_get_quantized_hashes(self):
+        molecule = Molecule([Fragment([Atom("H", "A", 0.1, 0.2, 0.3), Atom("F", "B", 1, 2, 3)], "HF", 0, 1, "HF")])
+
+        config_hash = molecule.get_quantized_hash()
+
+        self.assertEqual(molecule.get_quantized_hash(), config_hash)
+
+        # differences smaller than the rounding give the same hash.
+        molecule.translate(1e-7, 0, 0)
+        self.assertEqual(molecule.get_quantized_hash(), config_hash)
+
+        molecule.translate(1e-4, 0, 0)
+        self.assertNotEqual(molecule.get_quantized_hash(), config_hash)
+
+        self.assertEqual(molecule_hasher.get_quantized_hashes(molecule.get_name(), molecule.get_symbols(), 0, 1,
+                                                              [molecule.get_coordinate_array()] * 3),
+                         [molecule.get_quantized_hash()] * 3)
+
+        self.test_passed = True
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestMoleculeHasher)
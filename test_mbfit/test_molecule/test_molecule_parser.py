@@ -4,6 +4,7 @@ import os
 from test_mbfit.test_case_with_id import TestCaseWithId
 from mbfit.molecule import molecule_parser, Atom, Fragment, Molecule
 from mbfit.utils import SettingsReader
+from mbfit.exceptions import XYZFormatError, InconsistentValueError
 
 class TestMoleculeParser(TestCaseWithId):
     def __init__(self, *args, **kwargs):
@@ -14,10 +15,12 @@ class TestMoleculeParser(TestCaseWithId):
         TestMoleculeParser.monomer_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "water_monomer.xyz")
         TestMoleculeParser.dimer_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "NO2-_NO2-_dimer.xyz")
         TestMoleculeParser.trimer_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "NO2-_water_water_trimer.xyz")
+        TestMoleculeParser.training_set_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "water_dimer_training_set.xyz")
 
         TestMoleculeParser.monomer_settings = SettingsReader(os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "water_monomer.ini"))
         TestMoleculeParser.dimer_settings = SettingsReader(os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "NO2-_NO2-_dimer.ini"))
         TestMoleculeParser.trimer_settings = SettingsReader(os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "NO2-_water_water_trimer.ini"))
+        TestMoleculeParser.training_set_settings = SettingsReader(os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "water_dimer_training_set.ini"))
 
 
     def test_xyz_to_molecules_monomer(self):
@@ -156,5 +159,30 @@ class TestMoleculeParser(TestCaseWithId):
 
         self.test_passed = True
 
+    def test_parse_training_set_chunks(self):
+        chunks = list(molecule_parser.parse_training_set_chunks(TestMoleculeParser.training_set_path, settings=TestMoleculeParser.training_set_settings, chunk_size=2, num_energies=2))
+
+        self.assertEqual([len(batch) for batch, energies in chunks], [2, 1])
+        self.assertEqual([energies.tolist() for batch, energies in chunks], [[[1.5, -2.25], [-0.5, 4.0]], [[2e-3, 1e2]]])
+
+        molecules = [molecule for batch, energies in chunks for molecule in batch]
+
+        self.assertEqual(molecules, molecule_parser.xyz_to_molecules(TestMoleculeParser.training_set_path, settings=TestMoleculeParser.training_set_settings))
+        self.assertEqual(molecules[2].get_name(), "water-water")
+        self.assertEqual(molecules[2].get_coordinates()[3], (3.0, 0.0, 0.2))
+
+        with self.assertRaises(XYZFormatError):
+            list(molecule_parser.parse_training_set_chunks(TestMoleculeParser.training_set_path, settings=TestMoleculeParser.training_set_settings, num_energies=3))
+
+        chunks = list(molecule_parser.parse_training_set_chunks(TestMoleculeParser.training_set_path, settings=TestMoleculeParser.training_set_settings, num_energies=3, is_training_format=False))
+
+        self.assertEqual(chunks[0][1].tolist(), [[0, 0, 0], [0, 0, 0], [0, 0, 0]])
+
+        # every molecule in the file must have the same atoms as the first.
+        with self.assertRaises(InconsistentValueError):
+            list(molecule_parser.parse_training_set_chunks(TestMoleculeParser.monomer_path, settings=TestMoleculeParser.training_set_settings))
+
+        self.test_passed = True
+
 
 suite = unittest.TestLoader().loadTestsFromTestCase(TestMoleculeParser)
@@ -0,0 +1,122 @@
+import unittest, os, shutil
+
+from test_mbfit.test_case_with_id import TestCaseWithId
+from mbfit.molecule import molecule_parser, xyz_index
+from mbfit.molecule import IndexedXYZFile, write_npz_file
+from mbfit.utils import SettingsReader, files
+from mbfit.exceptions import XYZFormatError
+
+"""
+Test cases for the xyz_index module
+"""
+class TestXYZIndex(TestCaseWithId):
+    def __init__(self, *args, **kwargs):
+        super(TestXYZIndex, self).__init__(*args, **kwargs)
+        self.test_folder = os.path.dirname(os.path.abspath(__file__))
+
+    def setUpClass():
+        TestXYZIndex.training_set_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "water_dimer_training_set.xyz")
+        TestXYZIndex.training_set_settings = SettingsReader(os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "water_dimer_training_set.ini"))
+
+    def get_output_path(self, file_name):
+        # the output directory is moved away after every test
+        return os.path.join(files.init_directory(os.path.join(self.test_folder, "output")), file_name)
+
+    def copy_training_set(self):
+        # copy the training set, so its index is not written next to the resources
+        xyz_path = self.get_output_path("water_dimer_training_set.xyz")
+        shutil.copyfile(TestXYZIndex.training_set_path, xyz_path)
+
+        return xyz_path
+
+    def test_build_xyz_index(self):
+        with open(TestXYZIndex.training_set_path, "rb") as xyz_file:
+            contents = xyz_file.read()
+
+        offsets = xyz_index.build_xyz_index(TestXYZIndex.training_set_path)
+
+        self.assertEqual(len(offsets), 4)
+        self.assertEqual(offsets[0], 0)
+        self.assertEqual(offsets[-1], len(contents))
+
+        # the blank line after the second molecule is part of it
+        self.assertEqual([contents[offset:offset + 2] for offset in offsets[:-1]], [b"6\n"] * 3)
+        self.assertEqual(contents[offsets[2] - 2:offsets[2]], b"\n\n")
+
+        # a file does not have to end in a line break
+        xyz_path = self.get_output_path("no_line_break.xyz")
+
+        with open(xyz_path, "wb") as xyz_file:
+            xyz_file.write(b"\n" + contents.rstrip())
+
+        self.assertEqual(xyz_index.build_xyz_index(xyz_path).tolist(), [1] + [offset + 1 for offset in offsets[1:-1]] + [len(contents)])
+
+        with open(xyz_path, "wb") as xyz_file:
+            xyz_file.write(contents[:-20])
+
+        with self.assertRaises(XYZFormatError):
+            xyz_index.build_xyz_index(xyz_path)
+
+        self.test_passed = True
+
+    def test_get_xyz_index(self):
+        xyz_path = self.copy_training_set()
+
+        offsets = xyz_index.get_xyz_index(xyz_path)
+
+        self.assertTrue(os.path.isfile(xyz_index.get_index_path(xyz_path)))
+        self.assertEqual(xyz_index.get_xyz_index(xyz_path).tolist(), offsets.tolist())
+
+        # the index is rebuilt once the file changes
+        with open(xyz_path, "a") as xyz_file:
+            xyz_file.write("1\n\nHe 0.0 0.0 0.0\n")
+
+        self.assertEqual(xyz_index.get_xyz_index(xyz_path).tolist(), offsets.tolist()[:-1] + [offsets[-1], offsets[-1] + 18])
+        self.assertEqual(molecule_parser.count_molecules(xyz_path), 4)
+
+        self.test_passed = True
+
+    def test_indexed_xyz_file(self):
+        xyz_path = self.copy_training_set()
+
+        with IndexedXYZFile(xyz_path) as xyz_file:
+            self.assertEqual(len(xyz_file), 3)
+            self.assertEqual(xyz_file.get_lines(1)[:2], ["6\n", "-0.5 4.0 extra\n"])
+            self.assertEqual(xyz_file.get_lines(-1), xyz_file.get_lines(2))
+            self.assertEqual(len(xyz_file.get_lines(2)), 8)
+
+            with self.assertRaises(IndexError):
+                xyz_file.get_lines(3)
+
+            copy_path = self.get_output_path("copy.xyz")
+            xyz_file.write_xyz(copy_path, [2, 0])
+
+        self.assertEqual(molecule_parser.xyz_to_molecules(copy_path, TestXYZIndex.training_set_settings),
+                         molecule_parser.xyz_to_molecules(xyz_path, TestXYZIndex.training_set_settings, indices=[2, 0]))
+
+        self.test_passed = True
+
+    def test_read_training_set_indices(self):
+        xyz_path = self.copy_training_set()
+
+        (all_batch, all_energies), = molecule_parser.parse_training_set_chunks(xyz_path, settings=TestXYZIndex.training_set_settings, num_energies=2)
+
+        npz_path = self.get_output_path("water_dimer_training_set.npz")
+        write_npz_file(npz_path, all_batch, all_energies, ["binding_energy", "nb_energy"])
+
+        for path in [xyz_path, npz_path]:
+            batch, energies = molecule_parser.read_training_set_indices(path, [2, 0, 2], settings=TestXYZIndex.training_set_settings, num_energies=2)
+
+            self.assertEqual(list(batch), [all_batch[2], all_batch[0], all_batch[2]])
+            self.assertEqual(energies.tolist(), [[2e-3, 1e2], [1.5, -2.25], [2e-3, 1e2]])
+
+            batch, energies = molecule_parser.read_training_set_indices(path, [], settings=TestXYZIndex.training_set_settings, num_energies=2)
+
+            self.assertEqual(len(batch), 0)
+            self.assertEqual(energies.shape, (0, 2))
+
+            self.assertEqual(molecule_parser.count_molecules(path), 3)
+
+        self.test_passed = True
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestXYZIndex)
@@ -0,0 +1,46 @@
+import unittest, os
+
+from test_mbfit.test_case_with_id import TestCaseWithId
+from mbfit.utils import LRUCache
+from mbfit.exceptions import InvalidValueError
+
+class TestLRUCache(TestCaseWithId):
+    def __init__(self, *args, **kwargs):
+        super(TestLRUCache, self).__init__(*args, **kwargs)
+        self.test_folder = os.path.dirname(os.path.abspath(__file__))
+
+    def test_get_and_put(self):
+        cache = LRUCache(max_size=2)
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("a", 5), 5)
+
+        cache.put("a", 1)
+        cache.put("b", 2)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("b"), 2)
+
+        self.assertEqual(cache.get_hits(), 2)
+        self.assertEqual(cache.get_misses(), 2)
+
+        # "a" is now the least recently used entry, so it is evicted first.
+        cache.put("c", 3)
+
+        self.assertEqual(cache.get_size(), 2)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), 2)
+        self.assertEqual(cache.get("c"), 3)
+
+        cache.clear()
+
+        self.assertEqual(cache.get_size(), 0)
+        self.assertEqual(cache.get_hits(), 0)
+        self.assertEqual(cache.get_misses(), 0)
+
+        with self.assertRaises(InvalidValueError):
+            LRUCache(max_size=0)
+
+        self.test_passed = True
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestLRUCache)
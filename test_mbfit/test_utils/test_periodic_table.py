@@ -0,0 +1,51 @@
+import unittest, os
+import numpy
+
+from test_mbfit.test_case_with_id import TestCaseWithId
+from mbfit.utils import constants, periodic_table
+from mbfit.exceptions import InvalidValueError
+
+class TestPeriodicTable(TestCaseWithId):
+    def __init__(self, *args, **kwargs):
+        super(TestPeriodicTable, self).__init__(*args, **kwargs)
+        self.test_folder = os.path.dirname(os.path.abspath(__file__))
+
+    def test_get_atomic_number(self):
+        for symbol in constants.atomic_symbols:
+            self.assertEqual(periodic_table.get_atomic_number(symbol), constants.symbol_to_number(symbol))
+
+        self.assertEqual(periodic_table.get_atomic_number("NE"), 10)
+        self.assertEqual(periodic_table.get_atomic_number("cl"), 17)
+
+        with self.assertRaises(InvalidValueError):
+            periodic_table.get_atomic_number("Xx")
+
+        self.assertEqual(periodic_table.get_atomic_numbers(["O", "H", "H", "Cl"]).tolist(), [8, 1, 1, 17])
+
+        self.test_passed = True
+
+    def test_properties(self):
+        numbers = periodic_table.get_atomic_numbers(constants.atomic_symbols)
+
+        self.assertEqual(periodic_table.get_masses(numbers).tolist(), [constants.symbol_to_mass(symbol) for symbol in constants.atomic_symbols])
+        self.assertEqual(periodic_table.get_radii(numbers).tolist(), [constants.symbol_to_radius(symbol) for symbol in constants.atomic_symbols])
+        self.assertEqual(periodic_table.get_covalent_radii(numbers).tolist(), [constants.symbol_to_covalent_radius(symbol) for symbol in constants.atomic_symbols])
+
+        self.assertEqual(periodic_table.get_masses(numpy.array([[1, 8], [8, 1]])).tolist(), [[1.008, 15.999], [15.999, 1.008]])
+
+        self.test_passed = True
+
+    def test_get_vdw_radii(self):
+        self.assertEqual(periodic_table.get_vdw_radii(numpy.array([1, 8, 17])).tolist(), [1.2, 1.52, 1.75])
+        self.assertEqual(periodic_table.get_vdw_radii(2), 1.4)
+
+        # Sc has no van der Waals radius.
+        with self.assertRaises(InvalidValueError):
+            periodic_table.get_vdw_radii(numpy.array([1, 21]))
+
+        with self.assertRaises(InvalidValueError):
+            constants.symbol_to_vdw_radius("Sc")
+
+        self.test_passed = True
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestPeriodicTable)
@@ -1,4 +1,4 @@
-import unittest, random, math, os
+import unittest, random, math, os, numpy
 
 from test_mbfit.test_case_with_id import TestCaseWithId
 from mbfit.utils import quaternion
@@ -202,4 +202,40 @@ class TestQuaternion(TestCaseWithId):
 
         self.test_passed = True
 
+    def test_rotate_coordinates(self):
+
+        for i in range(100):
+            q = quaternion.Quaternion(random.random(), random.random(), random.random(), random.random())
+
+            coordinates = numpy.random.random((5, 3))
+            origin = random.random(), random.random(), random.random()
+
+            rotated_coordinates = q.rotate_coordinates(coordinates, *origin)
+
+            for (x1, y1, z1), (x2, y2, z2) in zip(coordinates, rotated_coordinates):
+                x3, y3, z3 = q.rotate(x1, y1, z1, *origin)
+                self.assertAlmostEqual(x2, x3)
+                self.assertAlmostEqual(y2, y3)
+                self.assertAlmostEqual(z2, z3)
+
+        self.test_passed = True
+
+    def test_get_random_rotation_matrices(self):
+
+        matrices = quaternion.Quaternion.get_random_rotation_matrices(numpy.random.default_rng(5), 1000)
+
+        self.assertEqual(matrices.shape, (1000, 3, 3))
+
+        # every matrix is a proper rotation
+        self.assertTrue(numpy.allclose(matrices @ matrices.transpose(0, 2, 1), numpy.identity(3)))
+        self.assertTrue(numpy.allclose(numpy.linalg.det(matrices), 1))
+
+        # the same seed gives the same rotations
+        self.assertTrue(numpy.array_equal(matrices, quaternion.Quaternion.get_random_rotation_matrices(numpy.random.default_rng(5), 1000)))
+
+        # rotations are evenly distributed, so the rotated x axes average to roughly 0
+        self.assertTrue(numpy.all(numpy.abs(numpy.mean(matrices[:, :, 0], axis=0)) < 0.1))
+
+        self.test_passed = True
+
 suite = unittest.TestLoader().loadTestsFromTestCase(TestQuaternion)